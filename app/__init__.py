@@ -2,10 +2,13 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from config import config
+from app.utils.db_routing import RoutingSession, init_read_replica
+from app.utils.sharding import init_meal_log_shards
 import os
 
-# Initialize extensions
-db = SQLAlchemy()
+# Initialize extensions (reads can be routed to a replica and meal logs to
+# per-user shards, see app/utils/db_routing.py and app/utils/sharding.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 
 def create_app(config_name=None):
@@ -23,6 +26,8 @@ def create_app(config_name=None):
     # Initialize extensions with app
     db.init_app(app)
     login_manager.init_app(app)
+    init_read_replica(app)
+    init_meal_log_shards(app)
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
     login_manager.login_message_category = 'info'
@@ -43,33 +48,62 @@ def create_app(config_name=None):
     from app.api import bp as api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
     
-    # Register Swagger API Documentation blueprint
-    from app.swagger_api import swagger_bp
-    app.register_blueprint(swagger_bp, url_prefix='/api/docs')
-    
     from app.main import bp as main_bp
     app.register_blueprint(main_bp)
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
-        
-        # Create default admin user if it doesn't exist
-        from app.models import User
-        admin_user = User.query.filter_by(username='admin').first()
-        if not admin_user:
-            admin_user = User(
-                username='admin',
-                email='admin@nutritracker.com',
-                is_admin=True
-            )
-            admin_user.set_password('admin123')
-            db.session.add(admin_user)
-            db.session.commit()
-            print("Default admin user created: admin/admin123")
+    # Register Swagger API Documentation (flask-restx is heavy to import)
+    docs_mode = app.config.get('API_DOCS_MODE', 'lazy')
+    if docs_mode == 'eager':
+        from app.swagger_api import swagger_bp
+        app.register_blueprint(swagger_bp, url_prefix='/api/docs')
+    elif docs_mode == 'lazy':
+        from app.utils.lazy_dispatch import LazyPrefixDispatcher
+        # flask-restx serves the Swagger UI assets from its restx_doc blueprint at /swaggerui
+        app.wsgi_app = LazyPrefixDispatcher(app.wsgi_app, ('/api/docs', '/swaggerui'),
+                                            lambda: create_docs_app(app))
+    
+    from app.utils.compression import init_compression
+    init_compression(app)
+    
+    from app.cli import register_commands
+    register_commands(app)
+    
+    # Periodic export cleanup and disk quota (EXPORT_REAPER_INTERVAL, 0 disables)
+    from app.services.export_reaper import ExportReaper
+    ExportReaper.start_scheduler(app)
+    
+    # Resume bulk uploads whose worker was restarted (UPLOAD_RESUME_INTERVAL, 0 disables).
+    # Started by the first request, so `flask` CLI processes never claim an upload
+    from app.services.bulk_upload_processor import BulkUploadProcessor
+    BulkUploadProcessor.start_resume_scheduler_on_first_request(app)
+    
+    # Schema creation and admin seeding are CLI commands (flask init-db / seed-admin);
+    # AUTO_INIT_DB keeps the old run-on-startup behaviour for local development
+    if app.config.get('AUTO_INIT_DB'):
+        from app.cli import init_db, seed_admin
+        with app.app_context():
+            init_db()
+            if seed_admin():
+                print("Default admin user created: admin/admin123")
     
     return app
 
+def create_docs_app(parent_app):
+    """Build the standalone Swagger docs app served under /api/docs."""
+    docs_app = Flask(__name__)
+    docs_app.config.from_mapping(parent_app.config)
+    
+    db.init_app(docs_app)
+    login_manager.init_app(docs_app)
+    init_meal_log_shards(docs_app)
+    
+    from app.swagger_api import swagger_bp
+    docs_app.register_blueprint(swagger_bp, url_prefix='/api/docs')
+    
+    from app.utils.compression import init_compression
+    init_compression(docs_app)
+    return docs_app
+
 @login_manager.user_loader
 def load_user(user_id):
     """Load user by ID for Flask-Login."""
@@ -1,5 +1,5 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, FloatField, SelectField, TextAreaField, BooleanField, SubmitField, PasswordField, HiddenField
+from wtforms import StringField, FloatField, SelectField, TextAreaField, BooleanField, SubmitField, PasswordField, HiddenField, DateField
 from wtforms.validators import DataRequired, Length, NumberRange, Email, EqualTo, ValidationError, Optional
 from app.models import User, Food, FoodServing
 
@@ -68,6 +68,31 @@ class FoodForm(FlaskForm):
     is_verified = BooleanField('Verified Food Item', default=True)
     submit = SubmitField('Save Food Item')
 
+class EditFoodForm(FoodForm):
+    """Form for editing food items, including how corrections reach logged meals."""
+    history_scope = SelectField('Apply nutrition changes to logged meals', choices=[
+        ('all', 'All logged meals'),
+        ('from_date', 'Meals logged from a date'),
+        ('none', 'Do not update logged meals')
+    ], default='all')
+    history_from = DateField('From date', validators=[Optional()])
+
+    def validate(self, extra_validators=None):
+        """Require a date when only meals from a date should be updated."""
+        if not super().validate(extra_validators):
+            return False
+
+        if self.history_scope.data == 'from_date' and not self.history_from.data:
+            self.history_from.errors.append('Choose the date from which logged meals should be updated.')
+            return False
+
+        return True
+
+class NutritionPropagationForm(FlaskForm):
+    """Form for re-applying a food's current nutrition to logged meals."""
+    from_date = DateField('From date', validators=[Optional()])
+    submit = SubmitField('Recalculate Logged Meals')
+
 class UserManagementForm(FlaskForm):
     """Form for managing users."""
     username = StringField('Username', validators=[
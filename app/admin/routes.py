@@ -1,77 +1,38 @@
 import csv
 import io
 import json
+from collections import Counter
 from datetime import datetime, timedelta
-from flask import render_template, redirect, url_for, flash, request, jsonify, current_app, session
+from flask import (render_template, redirect, url_for, flash, request, jsonify, current_app, session,
+                   stream_with_context)
 from flask_login import login_required, current_user
-from sqlalchemy import desc, func, text
+from sqlalchemy import desc, func, select, text
 from app import db
 from app.admin import bp
 from app.admin.forms import (
-    FoodForm, UserManagementForm, AdminPasswordForm, ResetUserPasswordForm,
-    ChallengeForm, BulkFoodUploadForm, FoodServingForm, EditFoodServingForm, 
+    FoodForm, EditFoodForm, NutritionPropagationForm, UserManagementForm, AdminPasswordForm,
+    ResetUserPasswordForm, ChallengeForm, BulkFoodUploadForm, FoodServingForm, EditFoodServingForm,
     DefaultServingForm
 )
 from app.models import User, Food, MealLog, NutritionGoal, Challenge, UserChallenge, FoodServing
 from app.services.bulk_upload_processor import BulkUploadProcessor
+from app.services.food_duplicate_detector import FoodDuplicateDetector
 from app.services.food_export_service import FoodExportService
+from app.services.export_reaper import ExportReaper
+from app.services.food_key_resolver import FoodKeyError, FoodKeyResolver
+from app.services.food_merge_service import FoodMergeService
+from app.services.job_progress import JobProgressStream
+from app.services.nutrition_propagation_service import NutritionPropagationService
 from app.services.serving_export_service import ServingExportService
-from app.models import BulkUploadJob, ExportJob, ServingUploadJob, ServingUploadJobItem
+from app.services.upload_dedup import UploadDeduplicator
+from app.models import BulkUploadJob, ExportJob, ServingUploadJob, ServingUploadJobItem, NutritionPropagationJob
 from flask_wtf.csrf import generate_csrf
 
-# Security: Rate limiting for bulk upload
-from functools import wraps
-from datetime import datetime, timedelta
-import json
-
-# In-memory rate limiting (for production, use Redis or database)
-upload_attempts = {}
-
-def rate_limit_upload(max_attempts=3, window_minutes=10):
-    """
-    Rate limiting decorator for upload endpoints.
-    
-    Args:
-        max_attempts: Maximum attempts allowed
-        window_minutes: Time window in minutes
-    """
-    def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            client_ip = request.remote_addr
-            user_id = current_user.id if current_user.is_authenticated else None
-            
-            # Create unique key for rate limiting
-            rate_key = f"{client_ip}_{user_id}" if user_id else client_ip
-            now = datetime.utcnow()
-            
-            # Clean old entries
-            cutoff_time = now - timedelta(minutes=window_minutes)
-            if rate_key in upload_attempts:
-                upload_attempts[rate_key] = [
-                    attempt for attempt in upload_attempts[rate_key] 
-                    if attempt > cutoff_time
-                ]
-            
-            # Check rate limit
-            attempts = upload_attempts.get(rate_key, [])
-            if len(attempts) >= max_attempts:
-                current_app.logger.warning(
-                    f"[SECURITY] Rate limit exceeded for {rate_key}. "
-                    f"Attempts: {len(attempts)} in {window_minutes} minutes"
-                )
-                return jsonify({
-                    'error': f'Rate limit exceeded. Maximum {max_attempts} attempts per {window_minutes} minutes.'
-                }), 429
-            
-            # Record this attempt
-            if rate_key not in upload_attempts:
-                upload_attempts[rate_key] = []
-            upload_attempts[rate_key].append(now)
-            
-            return f(*args, **kwargs)
-        return decorated_function
-    return decorator
+from app.utils.compression import send_precompressed
+from app.utils.db_routing import read_replica
+from app.utils.meal_log_archive import count_archived, delete_archived_logs
+from app.utils.rate_limiter import rate_limit
+from app.utils.sharding import scatter_all, scatter_sum, use_user_shard
 
 def admin_required(f):
     """Decorator to require admin access."""
@@ -93,6 +54,7 @@ def index():
 @bp.route('/dashboard')
 @login_required
 @admin_required
+@read_replica
 def dashboard():
     """Admin dashboard with statistics."""
     # Get statistics
@@ -111,7 +73,7 @@ def dashboard():
     
     # Meal logs in last 7 days
     seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    recent_logs = MealLog.query.filter(MealLog.logged_at >= seven_days_ago).count()
+    recent_logs = scatter_sum(select(func.count()).select_from(MealLog).where(MealLog.logged_at >= seven_days_ago))
     
     stats = {
         'total_users': total_users,
@@ -136,6 +98,7 @@ def dashboard():
 @bp.route('/users')
 @login_required
 @admin_required
+@read_replica
 def users():
     """List all users."""
     try:
@@ -249,6 +212,8 @@ def delete_user(user_id):
         return redirect(url_for('admin.users'))
     
     username = user.username
+    use_user_shard(user.id)  # The cascade deletes the user's meal logs and goals on their shard
+    delete_archived_logs(user.id)
     db.session.delete(user)
     db.session.commit()
     
@@ -259,6 +224,7 @@ def delete_user(user_id):
 @bp.route('/foods')
 @login_required
 @admin_required
+@read_replica
 def foods():
     """
     Enhanced food management with secure sorting and comprehensive data protection.
@@ -517,7 +483,7 @@ def edit_food(food_id):
         )
         
         food = Food.query.get_or_404(food_id)
-        form = FoodForm()
+        form = EditFoodForm()
         
         # Debug: Log form validation status
         current_app.logger.debug(f"Form validation for food {food_id}: valid={form.validate_on_submit()}")
@@ -576,13 +542,11 @@ def edit_food(food_id):
                 # Security: Validate required fields
                 if not food.name or len(food.name.strip()) == 0:
                     flash('Food name is required and cannot be empty.', 'danger')
-                    servings = FoodServing.query.filter_by(food_id=food_id).order_by(FoodServing.serving_name).all()
-                    return render_template('admin/edit_food.html', title='Edit Food', form=form, food=food, servings=servings)
+                    return _render_edit_food(form, food)
                 
                 if not food.category or len(food.category.strip()) == 0:
                     flash('Food category is required and cannot be empty.', 'danger')
-                    servings = FoodServing.query.filter_by(food_id=food_id).order_by(FoodServing.serving_name).all()
-                    return render_template('admin/edit_food.html', title='Edit Food', form=form, food=food, servings=servings)
+                    return _render_edit_food(form, food)
                 
                 # Security: Check for duplicate food names (excluding current food)
                 existing_food = Food.query.filter(
@@ -594,12 +558,10 @@ def edit_food(food_id):
                     if food.brand and existing_food.brand:
                         if food.brand.lower() == existing_food.brand.lower():
                             flash(f'A food item with name "{food.name}" and brand "{food.brand}" already exists.', 'warning')
-                            servings = FoodServing.query.filter_by(food_id=food_id).order_by(FoodServing.serving_name).all()
-                            return render_template('admin/edit_food.html', title='Edit Food', form=form, food=food, servings=servings)
+                            return _render_edit_food(form, food)
                     elif not food.brand and not existing_food.brand:
                         flash(f'A food item with name "{food.name}" already exists.', 'warning')
-                        servings = FoodServing.query.filter_by(food_id=food_id).order_by(FoodServing.serving_name).all()
-                        return render_template('admin/edit_food.html', title='Edit Food', form=form, food=food, servings=servings)
+                        return _render_edit_food(form, food)
                 
                 # Security: Validate verification status change
                 if hasattr(form, 'is_verified'):
@@ -629,6 +591,12 @@ def edit_food(food_id):
                     )
                 
                 flash(f'Food item "{food.name}" updated successfully!', 'success')
+                
+                # Recompute stored nutrition on logged meals in the background
+                if form.history_scope.data != 'none' and \
+                        NutritionPropagationService.nutrients_changed(original_values, food):
+                    from_date = form.history_from.data if form.history_scope.data == 'from_date' else None
+                    _enqueue_nutrition_propagation(food, from_date, reason='food_edit')
                 return redirect(url_for('admin.edit_food', food_id=food_id))
                 
             except Exception as e:
@@ -639,8 +607,7 @@ def edit_food(food_id):
                     exc_info=True
                 )
                 flash('An error occurred while updating the food item. Please try again.', 'danger')
-                servings = FoodServing.query.filter_by(food_id=food_id).order_by(FoodServing.serving_name).all()
-                return render_template('admin/edit_food.html', title='Edit Food', form=form, food=food, servings=servings)
+                return _render_edit_food(form, food)
         
         elif request.method == 'GET':
             # Security: Populate form with sanitized data
@@ -658,10 +625,7 @@ def edit_food(food_id):
             if hasattr(form, 'is_verified'):
                 form.is_verified.data = food.is_verified
         
-        # Get servings for this food
-        servings = FoodServing.query.filter_by(food_id=food_id).order_by(FoodServing.serving_name).all()
-        
-        return render_template('admin/edit_food.html', title='Edit Food', form=form, food=food, servings=servings)
+        return _render_edit_food(form, food)
         
     except Exception as e:
         current_app.logger.error(
@@ -671,6 +635,59 @@ def edit_food(food_id):
         flash('An unexpected error occurred. Please try again.', 'danger')
         return redirect(url_for('admin.foods'))
 
+def _render_edit_food(form, food):
+    """Render the edit page with the food's servings and recent propagation jobs."""
+    servings = FoodServing.query.filter_by(food_id=food.id).order_by(FoodServing.serving_name).all()
+    propagation_jobs = NutritionPropagationJob.query.filter_by(food_id=food.id).order_by(
+        desc(NutritionPropagationJob.created_at)
+    ).limit(5).all()
+    return render_template('admin/edit_food.html', title='Edit Food', form=form, food=food, servings=servings,
+                           propagation_form=NutritionPropagationForm(), propagation_jobs=propagation_jobs)
+
+def _enqueue_nutrition_propagation(food, from_date, reason):
+    """Queue recomputation of logged meals for food and tell the admin."""
+    job = NutritionPropagationService().enqueue(
+        food.id, from_date=from_date, created_by=current_user.id, reason=reason
+    )
+    scope = f"from {from_date.isoformat()}" if from_date else "for all history"
+    current_app.logger.info(
+        f"[AUDIT] Nutrition propagation {job.job_id} queued for food {food.id} {scope} by user {current_user.id}"
+    )
+    flash(f'Logged meals {scope} are being recalculated with the new nutrition values.', 'info')
+    return job
+
+@bp.route('/foods/<int:food_id>/propagate-nutrition', methods=['POST'])
+@login_required
+@admin_required
+def propagate_food_nutrition(food_id):
+    """Re-apply a food's current per-100g values to its logged meals from a chosen date."""
+    food = Food.query.get_or_404(food_id)
+    form = NutritionPropagationForm()
+    
+    if form.validate_on_submit():
+        _enqueue_nutrition_propagation(food, form.from_date.data, reason='manual')
+    else:
+        flash('Please enter a valid date.', 'danger')
+    
+    return redirect(url_for('admin.edit_food', food_id=food_id))
+
+@bp.route('/nutrition-propagation/<job_id>/status')
+@login_required
+@admin_required
+def nutrition_propagation_status(job_id):
+    """Get nutrition propagation job status."""
+    try:
+        status = NutritionPropagationService().get_job_status(job_id)
+        
+        if not status:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify(status)
+        
+    except Exception as e:
+        current_app.logger.error(f"Propagation status check error: {str(e)}")
+        return jsonify({'error': 'Failed to get job status'}), 500
+
 @bp.route('/foods/<int:food_id>/delete', methods=['POST'])
 @login_required
 @admin_required
@@ -713,7 +730,8 @@ def delete_food(food_id):
         
         # Security: Check referential integrity - prevent deletion if food is referenced
         try:
-            meal_logs_count = MealLog.query.filter_by(food_id=food_id).count()
+            meal_logs_count = scatter_sum(select(func.count()).select_from(MealLog).where(MealLog.food_id == food_id))
+            meal_logs_count += count_archived('food_id', food_id)
             
             if meal_logs_count > 0:
                 current_app.logger.warning(
@@ -792,6 +810,82 @@ def delete_food(food_id):
             flash('An unexpected error occurred. Please try again.', 'danger')
             return redirect(url_for('admin.foods'))
 
+@bp.route('/foods/duplicates')
+@login_required
+@admin_required
+def food_duplicates():
+    """Review clusters of likely duplicate foods, most similar first."""
+    threshold = request.args.get('threshold', FoodDuplicateDetector.DEFAULT_THRESHOLD, type=float)
+    threshold = min(max(threshold, FoodDuplicateDetector.MIN_SIMILARITY), 1.0)
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = 20
+    
+    clusters = FoodDuplicateDetector.find_clusters(threshold)
+    pages = max(1, -(-len(clusters) // per_page))
+    page = min(page, pages)
+    shown = clusters[(page - 1) * per_page:page * per_page]
+    
+    food_ids = [food_id for cluster in shown for food_id in cluster.food_ids]
+    foods_by_id = {food.id: food for food in Food.query.filter(Food.id.in_(food_ids))}
+    meal_log_counts = Counter()
+    for food_id, count in scatter_all(select(MealLog.food_id, func.count(MealLog.id))
+                                      .where(MealLog.food_id.in_(food_ids)).group_by(MealLog.food_id)):
+        meal_log_counts[food_id] += count
+    serving_counts = dict(db.session.query(FoodServing.food_id, func.count(FoodServing.id))
+                          .filter(FoodServing.food_id.in_(food_ids)).group_by(FoodServing.food_id))
+    
+    groups = []
+    for cluster in shown:
+        members = [{
+            'food': foods_by_id[food_id],
+            'meal_logs': meal_log_counts.get(food_id, 0),
+            'servings': serving_counts.get(food_id, 0)
+        } for food_id in cluster.food_ids if food_id in foods_by_id]
+        if len(members) < 2:
+            continue
+        # Suggest keeping the verified, most-used, oldest food
+        members.sort(key=lambda m: (not m['food'].is_verified, -m['meal_logs'], -m['servings'], m['food'].id))
+        groups.append({'similarity': cluster.similarity, 'members': members})
+    
+    return render_template('admin/food_duplicates.html', groups=groups, threshold=threshold,
+                           total_clusters=len(clusters), page=page, pages=pages, csrf_token=generate_csrf)
+
+
+@bp.route('/foods/merge', methods=['POST'])
+@login_required
+@admin_required
+def merge_foods():
+    """Merge duplicate foods into the selected food."""
+    keep_id = request.form.get('keep_id', type=int)
+    duplicate_ids = request.form.getlist('duplicate_ids', type=int)
+    redirect_to = url_for('admin.food_duplicates', threshold=request.form.get('threshold'),
+                          page=request.form.get('page'))
+    
+    if keep_id is None:
+        flash('Select the food to keep.', 'danger')
+        return redirect(redirect_to)
+    
+    try:
+        result = FoodMergeService().merge(keep_id, duplicate_ids, merged_by=current_user.id)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(redirect_to)
+    except Exception as e:
+        current_app.logger.error(f'Food merge into {keep_id} failed: {str(e)}', exc_info=True)
+        flash('Failed to merge foods. Please try again.', 'danger')
+        return redirect(redirect_to)
+    
+    current_app.logger.info(
+        f"[AUDIT] Foods {result['merged_ids']} merged into food {keep_id} by user {current_user.id}: "
+        f"meal_logs={result['meal_logs']}, servings_moved={result['servings_moved']}, "
+        f"servings_folded={result['servings_folded']}, propagation_job={result['propagation_job_id']}"
+    )
+    flash(f"Merged {len(result['merged_ids'])} food(s) into food {keep_id}: {result['meal_logs']} meal log(s) "
+          f"and {result['servings_moved'] + result['servings_folded']} serving(s) re-pointed.", 'success')
+    if result['propagation_job_id']:
+        flash('Moved meal logs are being recalculated with the kept food\'s nutrition values.', 'info')
+    return redirect(redirect_to)
+
 # Food Serving Management Routes
 @bp.route('/foods/<int:food_id>/servings/add', methods=['POST'])
 @login_required
@@ -975,8 +1069,8 @@ def delete_food_serving(food_id, serving_id):
         serving = FoodServing.query.filter_by(id=serving_id, food_id=food_id).first_or_404()
         
         # Check if this serving is referenced in meal logs
-        from app.models import MealLog
-        meal_log_count = MealLog.query.filter_by(serving_id=serving_id).count()
+        meal_log_count = scatter_sum(select(func.count()).select_from(MealLog).where(MealLog.serving_id == serving_id))
+        meal_log_count += count_archived('serving_id', serving_id)
         
         if meal_log_count > 0:
             return jsonify({
@@ -1127,7 +1221,7 @@ def bulk_upload_redirect():
 
 # Async Bulk Upload Routes
 @bp.route('/bulk-upload-async', methods=['POST'])
-@rate_limit_upload(max_attempts=5, window_minutes=15)  # Security: Rate limiting
+@rate_limit(limit=5, window_seconds=15 * 60, scope='bulk_upload')  # Security: Rate limiting
 @login_required
 @admin_required
 def bulk_upload_async():
@@ -1195,9 +1289,28 @@ def bulk_upload_async():
         file_hash = hashlib.sha256(file_content).hexdigest()
         current_app.logger.info(f"[SECURITY] File hash: {file_hash}, Size: {file_size_mb:.2f}MB")
         
+        # Idempotency: an identical file that was already uploaded is not imported again
+        processor = BulkUploadProcessor()
+        force = request.form.get('force', '').lower() in ('1', 'true', 'on', 'yes')
+        existing_job = None if force else processor.find_existing_upload(file_hash)
+        if existing_job:
+            current_app.logger.info(
+                f"[AUDIT] Duplicate upload of {file.filename} by user {current_user.id} "
+                f"answered with job {existing_job.job_id}"
+            )
+            return jsonify({
+                'success': True,
+                'duplicate': True,
+                'job_id': existing_job.job_id,
+                'message': f'This file was already uploaded (job {existing_job.job_id[:8]}, {existing_job.status}). '
+                           f'Check "reprocess" to import it again.',
+                'file_hash': file_hash,
+                'job': processor.get_job_status(existing_job.job_id)
+            })
+        
         # Security: Validate file content encoding
         try:
-            csv_content = file_content.decode('utf-8')
+            csv_content = file_content.decode('utf-8-sig')
         except UnicodeDecodeError:
             try:
                 csv_content = file_content.decode('latin-1')
@@ -1234,13 +1347,13 @@ def bulk_upload_async():
             f"Hash: {file_hash[:16]}..."
         )
         
-        # Initialize processor and start upload
-        processor = BulkUploadProcessor()
+        # Start upload (a forced upload also re-imports unchanged chunks)
         job_id = processor.start_async_upload(
             csv_content=csv_content,
             filename=file.filename,
             user_id=current_user.id,
-            file_hash=file_hash  # Add file hash for audit trail
+            file_hash=file_hash,
+            reuse_chunks=not force
         )
         
         processing_time = time.time() - start_time
@@ -1272,6 +1385,57 @@ def bulk_upload_async():
         )
         return jsonify({'error': 'Failed to start bulk upload. Please try again.'}), 500
 
+@bp.route('/bulk-upload-dry-run', methods=['POST'])
+@rate_limit(limit=20, window_seconds=15 * 60, scope='bulk_upload_dry_run')
+@login_required
+@admin_required
+def bulk_upload_dry_run():
+    """
+    Validate a food upload CSV without importing it.
+    
+    The file (.csv, or .csv.gz for large files) is streamed through the
+    upload schema and every row is checked; the response counts all invalid
+    rows and lists the first max_errors of them.
+    """
+    import gzip
+    import time
+    
+    if 'file' not in request.files or not request.files['file'].filename:
+        return jsonify({'error': 'No file provided'}), 400
+    
+    file = request.files['file']
+    filename = file.filename.lower()
+    if not filename.endswith(('.csv', '.csv.gz')):
+        return jsonify({'error': 'Only .csv and .csv.gz files are supported'}), 400
+    
+    max_errors = min(request.form.get('max_errors', 1000, type=int), 10000)
+    raw = gzip.GzipFile(fileobj=file.stream) if filename.endswith('.gz') else file.stream
+    stream = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+    
+    started = time.perf_counter()
+    result = BulkUploadProcessor().validate_csv_stream(stream, max_reported=max(max_errors, 0))
+    elapsed = time.perf_counter() - started
+    
+    if 'exception' in result:
+        # Undecodable text, a corrupt .gz or malformed CSV
+        current_app.logger.warning(f"Dry run of {file.filename} by user {current_user.id} failed: {result['exception']}")
+        return jsonify({'error': 'File could not be read. Please upload a UTF-8 CSV, optionally gzip-compressed.'}), 400
+    
+    current_app.logger.info(
+        f"[AUDIT] Upload dry run of {file.filename} by user {current_user.id}: "
+        f"{result.get('row_count', 0)} rows, {result.get('total_invalid', 0)} invalid, {elapsed:.2f}s"
+    )
+    
+    result.update(
+        dry_run=True,
+        filename=file.filename,
+        truncated=result.get('total_invalid', 0) > len(result.get('invalid_rows', [])),
+        elapsed_ms=round(elapsed * 1000, 2),
+        rows_per_second=round(result.get('row_count', 0) / elapsed) if elapsed else None
+    )
+    return jsonify(result)
+
+
 @bp.route('/bulk-upload-status/<job_id>')
 @login_required
 @admin_required
@@ -1290,6 +1454,38 @@ def bulk_upload_status(job_id):
         current_app.logger.error(f"Status check error: {str(e)}")
         return jsonify({'error': 'Failed to get job status'}), 500
 
+@bp.route('/jobs/events')
+@login_required
+@admin_required
+def job_events():
+    """
+    Stream upload and export job progress as Server-Sent Events.
+    
+    With type and one or more job_id parameters, watches those jobs (e.g. the
+    ones listed on a page, whoever started them); otherwise watches the
+    current user's active jobs (optionally of one type). Replaces polling the status
+    endpoints: the page keeps one connection open and receives only the
+    fields that changed.
+    """
+    try:
+        stream = JobProgressStream(
+            current_user.id,
+            job_type=request.args.get('type') or None,
+            job_ids=[job_id for job_id in request.args.getlist('job_id') if job_id],
+            db_refresh_seconds=current_app.config.get('JOB_PROGRESS_DB_REFRESH'),
+            max_seconds=current_app.config.get('JOB_PROGRESS_STREAM_SECONDS')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # The stream reads on short-lived connections of its own; don't keep the one
+    # that loaded current_user checked out (and in a transaction) for its lifetime
+    db.session.remove()
+    response = current_app.response_class(stream_with_context(stream.events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Don't let a proxy buffer the stream
+    return response
+
 @bp.route('/bulk-upload-details/<job_id>')
 @login_required
 @admin_required
@@ -1359,6 +1555,7 @@ def bulk_upload_details(job_id):
 @bp.route('/food-uploads')
 @login_required
 @admin_required
+@read_replica
 def food_uploads():
     """
     Unified Food Uploads interface - combines bulk upload and job history.
@@ -1436,6 +1633,7 @@ def change_password():
 @bp.route('/foods/export-legacy')
 @login_required
 @admin_required
+@rate_limit(limit=30, window_seconds=10 * 60, scope='export_download')
 def export_foods():
     """
     Legacy route for backward compatibility - redirects to new export page.
@@ -1446,6 +1644,7 @@ def export_foods():
 @bp.route('/foods/export', methods=['GET', 'POST'])
 @login_required
 @admin_required
+@rate_limit(limit=10, window_seconds=10 * 60, scope='export', methods=['POST'])
 def export_foods_page():
     """
     Food export interface with form handling.
@@ -1479,7 +1678,7 @@ def export_foods_page():
             format_type = request.form.get('format', 'csv').lower().strip()
             
             # Security: Validate format parameter
-            if format_type not in ['csv', 'json']:
+            if format_type not in FoodExportService.SUPPORTED_FORMATS:
                 flash('Invalid export format requested.', 'danger')
                 return redirect(url_for('admin.export_foods_page'))
             
@@ -1556,11 +1755,7 @@ def export_foods_page():
                     f"with filters: {json.dumps(filters, default=str)}"
                 )
                 
-                flash(
-                    f'Export started successfully! Job ID: {job_id}. '
-                    f'You can monitor progress in the Export Jobs section.',
-                    'success'
-                )
+                _flash_export_started(job_id)
                 return redirect(url_for('admin.export_jobs'))
                 
             except Exception as e:
@@ -1577,9 +1772,26 @@ def export_foods_page():
         return redirect(url_for('admin.foods'))
 
 
+def _flash_export_started(job_id):
+    """Flash the outcome of an export request (new job or reused result)."""
+    job = ExportJob.query.filter_by(job_id=job_id).first()
+    if job is not None and job.status == 'completed':
+        flash(
+            f'An identical export is already available and ready to download. Job ID: {job_id}.',
+            'success'
+        )
+    else:
+        flash(
+            f'Export started successfully! Job ID: {job_id}. '
+            f'You can monitor progress in the Export Jobs section.',
+            'success'
+        )
+
+
 @bp.route('/servings/export', methods=['GET', 'POST'])
 @login_required
 @admin_required
+@rate_limit(limit=10, window_seconds=10 * 60, scope='export', methods=['POST'])
 def export_servings_page():
     """
     Serving export interface with form handling.
@@ -1616,7 +1828,7 @@ def export_servings_page():
             format_type = request.form.get('format', 'servings_csv').lower().strip()
             
             # Security: Validate format parameter
-            if format_type not in ['servings_csv', 'servings_json']:
+            if format_type not in ServingExportService.SUPPORTED_FORMATS:
                 flash('Invalid export format requested.', 'danger')
                 return redirect(url_for('admin.export_servings_page'))
             
@@ -1705,11 +1917,7 @@ def export_servings_page():
                     f"with filters: {json.dumps(filters, default=str)}"
                 )
                 
-                flash(
-                    f'Export started successfully! Job ID: {job_id}. '
-                    f'You can monitor progress in the Export Jobs section.',
-                    'success'
-                )
+                _flash_export_started(job_id)
                 return redirect(url_for('admin.export_jobs'))
                 
             except Exception as e:
@@ -1729,6 +1937,7 @@ def export_servings_page():
 @bp.route('/export-jobs')
 @login_required
 @admin_required
+@read_replica
 def export_jobs():
     """
     Display export jobs with pagination and status tracking.
@@ -1786,6 +1995,7 @@ def export_status(job_id):
 @bp.route('/download-export/<job_id>')
 @login_required
 @admin_required
+@rate_limit(limit=30, window_seconds=10 * 60, scope='export_download')
 def download_export(job_id):
     """
     Download completed export file.
@@ -1819,13 +2029,20 @@ def download_export(job_id):
             f"from IP: {request.remote_addr} at {datetime.utcnow().isoformat()}"
         )
         
-        # Send file
+        # Send file (exports are stored gzip-compressed; older ones are plain).
+        # '.gz' formats download as the gzip file itself
         from flask import send_file
+        filename = status['filename']
+        if filename.endswith('.gz'):
+            return send_file(file_path, as_attachment=True, download_name=filename, mimetype='application/gzip')
+        mimetype = FoodExportService.MIMETYPES.get(filename.rsplit('.', 1)[-1], 'text/csv')
+        if file_path.endswith('.gz'):
+            return send_precompressed(file_path, download_name=filename, mimetype=mimetype)
         return send_file(
             file_path,
             as_attachment=True,
-            download_name=status['filename'],
-            mimetype='application/octet-stream'
+            download_name=filename,
+            mimetype=mimetype
         )
         
     except Exception as e:
@@ -1839,19 +2056,20 @@ def download_export(job_id):
 @admin_required
 def cleanup_exports():
     """
-    Clean up expired export files.
+    Clean up expired, over-quota and orphaned export files.
     """
     try:
-        export_service = FoodExportService()
-        export_service.cleanup_expired_exports()
+        metrics = ExportReaper().run()
         
         # Security: Log cleanup action
         current_app.logger.info(
             f"[AUDIT] Export cleanup performed by user {current_user.id} "
-            f"from IP: {request.remote_addr} at {datetime.utcnow().isoformat()}"
+            f"from IP: {request.remote_addr} at {datetime.utcnow().isoformat()} - "
+            f"{metrics['files_deleted']} files, {metrics['bytes_reclaimed']} bytes reclaimed"
         )
         
-        flash('Expired export files have been cleaned up.', 'success')
+        flash(f"Export cleanup removed {metrics['files_deleted']} file(s) and reclaimed "
+              f"{metrics['bytes_reclaimed'] / (1024 * 1024):.1f} MB.", 'success')
         
     except Exception as e:
         current_app.logger.error(f'Error cleaning up exports: {str(e)}', exc_info=True)
@@ -1864,6 +2082,7 @@ def cleanup_exports():
 @bp.route('/food-servings/uploads')
 @login_required
 @admin_required
+@read_replica
 def food_servings_uploads():
     """
     Unified Food Servings Uploads interface - combines bulk upload and job history.
@@ -1990,6 +2209,7 @@ def food_servings_upload():
 @bp.route('/food-servings/upload-async', methods=['POST'])
 @login_required
 @admin_required
+@rate_limit(limit=5, window_seconds=15 * 60, scope='bulk_upload')  # Security: Rate limiting
 def food_servings_upload_async():
     """
     Async bulk upload for food servings via CSV.
@@ -2010,18 +2230,39 @@ def food_servings_upload_async():
         if not file.filename.lower().endswith('.csv'):
             return jsonify({'error': 'Invalid file type. Please upload a CSV file.'}), 400
         
+        # Idempotency: an identical file that was already uploaded is not imported again
+        raw_content = file.read()
+        dedup = UploadDeduplicator('servings', ServingUploadJob)
+        file_hash = dedup.file_hash(raw_content)
+        force = request.form.get('force', '').lower() in ('1', 'true', 'on', 'yes')
+        existing_job = None if force else dedup.find_existing(file_hash)
+        if existing_job:
+            current_app.logger.info(
+                f"[AUDIT] Duplicate serving upload of {file.filename} by user {current_user.id} "
+                f"answered with job {existing_job.job_id}"
+            )
+            return jsonify({
+                'success': True,
+                'duplicate': True,
+                'job_id': existing_job.job_id,
+                'message': f'This file was already uploaded (job {existing_job.job_id[:8]}). '
+                           f'Processed: {existing_job.processed_rows or 0}, Success: {existing_job.successful_rows or 0}, '
+                           f'Errors: {existing_job.failed_rows or 0}'
+            })
+        
         # Create upload job
         job_id = str(uuid.uuid4())
         upload_job = ServingUploadJob(
             job_id=job_id,
             filename=file.filename,
             created_by=current_user.id,
-            status='pending'
+            status='pending',
+            file_hash=file_hash
         )
         
         try:
             # Read and validate CSV
-            file_content = file.read().decode('utf-8')
+            file_content = raw_content.decode('utf-8-sig')
             csv_reader = csv.DictReader(io.StringIO(file_content))
             
             # Validate headers
@@ -2041,23 +2282,27 @@ def food_servings_upload_async():
             db.session.commit()
             
             # Process CSV synchronously for now (can be made async later)
-            results = process_food_servings_csv_with_job(rows, upload_job)
+            results = process_food_servings_csv_with_job(rows, upload_job, reuse_chunks=not force)
             
             # Update job status
-            upload_job.status = 'completed' if results['success'] > 0 else 'failed'
+            upload_job.status = 'completed' if results['success'] > 0 or results['reused'] > 0 else 'failed'
             upload_job.completed_at = datetime.utcnow()
             db.session.commit()
             
             current_app.logger.info(
                 f"Food servings async upload completed for user {current_user.id}: "
                 f"job_id={job_id}, processed={results['processed']}, "
-                f"success={results['success']}, errors={len(results['errors'])}"
+                f"success={results['success']}, reused={results['reused']}, errors={len(results['errors'])}"
             )
             
+            message = f'Upload completed. Processed: {results["processed"]}, Success: {results["success"]}, Errors: {len(results["errors"])}'
+            if results['reused']:
+                message += f', Unchanged (skipped): {results["reused"]}'
             return jsonify({
                 'success': True,
                 'job_id': job_id,
-                'message': f'Upload completed. Processed: {results["processed"]}, Success: {results["success"]}, Errors: {len(results["errors"])}'
+                'message': message,
+                'unresolved_keys': results['unresolved_keys']
             })
             
         except UnicodeDecodeError:
@@ -2110,6 +2355,8 @@ def servings_upload_status_check(job_id):
             'total_rows': job.total_rows or 0,
             'successful_rows': job.successful_rows or 0,
             'failed_rows': job.failed_rows or 0,
+            'reused_rows': job.reused_rows or 0,
+            'file_hash': job.file_hash,
             'progress_percentage': progress_percentage,
             'error_message': job.error_message,
             'created_at': job.created_at.isoformat() if job.created_at else None,
@@ -2156,7 +2403,7 @@ def food_servings_upload_old():
         # Read and validate CSV
         try:
             # Read file content
-            file_content = file.read().decode('utf-8')
+            file_content = file.read().decode('utf-8-sig')
             csv_reader = csv.DictReader(io.StringIO(file_content))
             
             # Validate headers
@@ -2254,6 +2501,9 @@ def process_food_servings_csv(csv_reader):
     }
     
     try:
+        # One catalog index for the whole upload instead of a query per row
+        resolver = FoodKeyResolver.current()
+        
         for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 for header
             results['processed'] += 1
             
@@ -2270,21 +2520,11 @@ def process_food_servings_csv(csv_reader):
                     results['errors'].append(f'Row {row_num}: Missing required fields')
                     continue
                 
-                # Find food by ID or custom key
-                food = None
-                if food_key.isdigit():
-                    food = Food.query.get(int(food_key))
-                else:
-                    # Look for food by name or custom identifier
-                    food = Food.query.filter(
-                        db.or_(
-                            Food.name.ilike(f'%{food_key}%'),
-                            Food.brand.ilike(f'%{food_key}%')
-                        )
-                    ).first()
-                
-                if not food:
-                    results['errors'].append(f'Row {row_num}: Food not found for key "{food_key}"')
+                # Find food by ID, name or name and brand
+                try:
+                    food = db.session.get(Food, resolver.resolve_id(food_key))
+                except FoodKeyError as e:
+                    results['errors'].append(f'Row {row_num}: {e}')
                     continue
                 
                 # Validate grams_per_unit
@@ -2349,147 +2589,173 @@ def process_food_servings_csv(csv_reader):
         return results
 
 
-def process_food_servings_csv_with_job(rows, upload_job):
+def process_food_servings_csv_with_job(rows, upload_job, reuse_chunks=True):
     """
     Process CSV data and upsert food servings with job tracking.
     
     Args:
         rows: List of CSV row dictionaries
         upload_job: ServingUploadJob instance for tracking progress
+        reuse_chunks: Skip row chunks an earlier upload already processed without errors
         
     Returns:
-        dict: Results summary with processed, success, and error counts
+        dict: Results summary with processed, success, reused and error counts,
+            and the food keys that matched no food or several (unresolved_keys)
     """
     from app.models import ServingUploadJobItem
     
     results = {
         'processed': 0,
         'success': 0,
-        'errors': []
+        'reused': 0,
+        'errors': [],
+        'unresolved_keys': {'ambiguous': [], 'not_found': []}
     }
+    dedup = UploadDeduplicator('servings', ServingUploadJob)
     
     try:
         upload_job.status = 'processing'
         upload_job.started_at = datetime.utcnow()
         db.session.commit()
         
-        for row_num, row in enumerate(rows, start=2):  # Start at 2 for header
-            results['processed'] += 1
-            upload_job.processed_rows = results['processed']
-            
-            # Create job item for tracking
-            job_item = ServingUploadJobItem(
-                job_id=upload_job.id,
-                row_number=row_num,
-                food_key=str(row.get('food_key', '')).strip(),
-                serving_name=str(row.get('serving_name', '')).strip(),
-                status='processing'
-            )
-            db.session.add(job_item)
+        chunks = dedup.chunks(rows)
+        processed_chunks = dedup.processed_chunks(c.chunk_hash for c in chunks) if reuse_chunks else set()
+        
+        # Resolve every distinct food key up front against one catalog index
+        resolver = FoodKeyResolver.current()
+        resolutions = resolver.resolve_all(
+            str(row.get('food_key', '')).strip()
+            for chunk in chunks if chunk.chunk_hash not in processed_chunks
+            for row in chunk.rows
+        )
+        resolutions.pop('', None)
+        results['unresolved_keys'] = resolver.summarize(resolutions)
+        
+        for chunk in chunks:
+            # Unchanged chunk of an earlier upload: nothing to import
+            if chunk.chunk_hash in processed_chunks:
+                results['processed'] += len(chunk.rows)
+                results['reused'] += len(chunk.rows)
+                upload_job.processed_rows = results['processed']
+                upload_job.reused_rows = results['reused']
+                dedup.record_chunk(upload_job.job_id, chunk, 0)
+                db.session.commit()
+                continue
             
-            try:
-                # Extract and validate data
-                food_key = str(row.get('food_key', '')).strip()
-                serving_name = str(row.get('serving_name', '')).strip()
-                unit = str(row.get('unit', '')).strip()
-                grams_per_unit_str = str(row.get('grams_per_unit', '')).strip()
-                is_default_str = str(row.get('is_default', 'false')).strip().lower()
-                
-                # Validation
-                if not food_key:
-                    raise ValueError("food_key is required")
+            errors_before = len(results['errors'])
+            for row_num, row in enumerate(chunk.rows, start=chunk.first_row + 2):  # Start at 2 for header
+                results['processed'] += 1
+                upload_job.processed_rows = results['processed']
                 
-                if not serving_name:
-                    raise ValueError("serving_name is required")
-                
-                if not unit:
-                    raise ValueError("unit is required")
-                
-                # Convert grams_per_unit to float
-                try:
-                    grams_per_unit = float(grams_per_unit_str)
-                    if grams_per_unit <= 0:
-                        raise ValueError("grams_per_unit must be positive")
-                except (ValueError, TypeError):
-                    raise ValueError(f"Invalid grams_per_unit: '{grams_per_unit_str}'. Must be a positive number.")
-                
-                # Convert is_default to boolean
-                is_default = is_default_str in ('true', '1', 'yes', 'y')
-                
-                # Find the food (by ID or food_key)
-                food = None
+                # Create job item for tracking
+                job_item = ServingUploadJobItem(
+                    job_id=upload_job.id,
+                    row_number=row_num,
+                    food_key=str(row.get('food_key', '')).strip(),
+                    serving_name=str(row.get('serving_name', '')).strip(),
+                    status='processing'
+                )
+                db.session.add(job_item)
                 
-                # Try as integer ID first
                 try:
-                    food_id = int(food_key)
-                    food = Food.query.get(food_id)
-                except (ValueError, TypeError):
-                    pass
-                
-                # If not found by ID, try by name (food_key as name)
-                if not food:
-                    food = Food.query.filter_by(name=food_key).first()
-                
-                if not food:
-                    raise ValueError(f"Food not found for key: '{food_key}'")
-                
-                # Check for existing serving (upsert logic)
-                existing_serving = FoodServing.query.filter_by(
-                    food_id=food.id,
-                    serving_name=serving_name
-                ).first()
-                
-                if existing_serving:
-                    # Update existing serving
-                    existing_serving.unit = unit
-                    existing_serving.grams_per_unit = grams_per_unit
-                    current_serving = existing_serving
-                else:
-                    # Create new serving
-                    current_serving = FoodServing(
+                    # Extract and validate data
+                    food_key = str(row.get('food_key', '')).strip()
+                    serving_name = str(row.get('serving_name', '')).strip()
+                    unit = str(row.get('unit', '')).strip()
+                    grams_per_unit_str = str(row.get('grams_per_unit', '')).strip()
+                    is_default_str = str(row.get('is_default', 'false')).strip().lower()
+                    
+                    # Validation
+                    if not food_key:
+                        raise ValueError("food_key is required")
+                    
+                    if not serving_name:
+                        raise ValueError("serving_name is required")
+                    
+                    if not unit:
+                        raise ValueError("unit is required")
+                    
+                    # Convert grams_per_unit to float
+                    try:
+                        grams_per_unit = float(grams_per_unit_str)
+                        if grams_per_unit <= 0:
+                            raise ValueError("grams_per_unit must be positive")
+                    except (ValueError, TypeError):
+                        raise ValueError(f"Invalid grams_per_unit: '{grams_per_unit_str}'. Must be a positive number.")
+                    
+                    # Convert is_default to boolean
+                    is_default = is_default_str in ('true', '1', 'yes', 'y')
+                    
+                    # Find the food (by ID, name or name and brand)
+                    resolution = resolutions[food_key]
+                    if resolution.food_id is None:
+                        raise FoodKeyError(resolver.describe(resolution))
+                    food = db.session.get(Food, resolution.food_id)
+                    
+                    # Check for existing serving (upsert logic)
+                    existing_serving = FoodServing.query.filter_by(
                         food_id=food.id,
-                        serving_name=serving_name,
-                        unit=unit,
-                        grams_per_unit=grams_per_unit
-                    )
-                    db.session.add(current_serving)
-                
-                # Flush to get the serving ID
-                db.session.flush()
-                
-                # Handle default serving logic using food.default_serving_id
-                if is_default:
-                    food.default_serving_id = current_serving.id
-                
-                # Commit this row
-                db.session.commit()
-                
-                # Update job item
-                job_item.status = 'success'
-                job_item.serving_id = current_serving.id
-                job_item.processed_at = datetime.utcnow()
-                
-                results['success'] += 1
-                upload_job.successful_rows = results['success']
-                
-                db.session.commit()
-                
-            except Exception as e:
-                db.session.rollback()
-                error_msg = str(e)
-                results['errors'].append(f'Row {row_num}: {error_msg}')
-                
-                # Update job item
-                job_item.status = 'failed'
-                job_item.error_message = error_msg
-                job_item.processed_at = datetime.utcnow()
-                
-                upload_job.failed_rows = len(results['errors'])
-                
-                db.session.commit()
-                
-                current_app.logger.error(f'Error processing serving row {row_num}: {str(e)}')
-                continue
+                        serving_name=serving_name
+                    ).first()
+                    
+                    if existing_serving:
+                        # Update existing serving
+                        existing_serving.unit = unit
+                        existing_serving.grams_per_unit = grams_per_unit
+                        current_serving = existing_serving
+                    else:
+                        # Create new serving
+                        current_serving = FoodServing(
+                            food_id=food.id,
+                            serving_name=serving_name,
+                            unit=unit,
+                            grams_per_unit=grams_per_unit
+                        )
+                        db.session.add(current_serving)
+                    
+                    # Flush to get the serving ID
+                    db.session.flush()
+                    
+                    # Handle default serving logic using food.default_serving_id
+                    if is_default:
+                        food.default_serving_id = current_serving.id
+                    
+                    # Commit this row
+                    db.session.commit()
+                    
+                    # Update job item
+                    job_item.status = 'success'
+                    job_item.serving_id = current_serving.id
+                    job_item.processed_at = datetime.utcnow()
+                    
+                    results['success'] += 1
+                    upload_job.successful_rows = results['success']
+                    
+                    db.session.commit()
+                    
+                except Exception as e:
+                    db.session.rollback()
+                    error_msg = str(e)
+                    results['errors'].append(f'Row {row_num}: {error_msg}')
+                    
+                    # Update job item
+                    job_item.status = 'failed'
+                    job_item.error_message = error_msg
+                    job_item.processed_at = datetime.utcnow()
+                    
+                    upload_job.failed_rows = len(results['errors'])
+                    
+                    db.session.commit()
+                    
+                    current_app.logger.error(f'Error processing serving row {row_num}: {str(e)}')
+                    continue
+            
+            dedup.record_chunk(upload_job.job_id, chunk, len(results['errors']) - errors_before)
+            db.session.commit()
+        
+        # Chunks become reusable at the catalog version this upload left
+        dedup.stamp_chunks(upload_job.job_id)
+        db.session.commit()
         
         return results
         
@@ -0,0 +1,131 @@
+"""
+Read queries shared by the API routes and the asynchronous read tier.
+
+The statements are Core SELECTs over the model tables, so they execute the
+same way on a Flask-SQLAlchemy session and on an async connection
+(app/async_api). The serialize_* functions turn their rows into the JSON
+bodies the endpoints return, which keeps both tiers' responses identical.
+"""
+
+from datetime import date
+from typing import Any, Dict, Iterable
+
+from sqlalchemy import func, select
+
+from app.models import Food, FoodServing, User
+from app.utils.meal_log_archive import daily_totals
+
+SEARCH_VERIFIED_LIMIT = 50
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner', 'snack')
+SUMMARY_NUTRIENTS = ('calories', 'protein', 'carbs', 'fat', 'fiber', 'sugar', 'sodium')
+
+_food = Food.__table__
+_serving = FoodServing.__table__
+_user = User.__table__
+
+
+def user_query(user_id: int):
+    """The fields of a logged-in user the read endpoints need."""
+    return select(_user.c.id, _user.c.is_admin).where(_user.c.id == user_id)
+
+
+def search_verified_query(query: str):
+    """Verified foods whose name contains query (case-insensitive)."""
+    return select(
+        _food.c.id, _food.c.name, _food.c.category, _food.c.calories, _food.c.protein, _food.c.carbs,
+        _food.c.fat, _food.c.is_verified, _food.c.default_serving_size_grams
+    ).where(
+        _food.c.is_verified == True,
+        _food.c.name.ilike(f'%{query}%')
+    ).limit(SEARCH_VERIFIED_LIMIT)
+
+
+def serialize_search_row(row) -> Dict[str, Any]:
+    """Search result in the /api/foods/search-verified format."""
+    return {
+        'id': row.id,
+        'name': row.name,
+        'category': row.category,
+        'calories_per_100g': row.calories,
+        'protein_per_100g': row.protein,
+        'carbs_per_100g': row.carbs,
+        'fat_per_100g': row.fat,
+        'verified': row.is_verified,
+        'default_serving_size_grams': row.default_serving_size_grams
+    }
+
+
+def food_query(food_id: int):
+    """Columns of one food used by the API v2 food details."""
+    return select(
+        _food.c.id, _food.c.name, _food.c.brand, _food.c.category, _food.c.description, _food.c.calories,
+        _food.c.protein, _food.c.carbs, _food.c.fat, _food.c.fiber, _food.c.sugar, _food.c.sodium,
+        _food.c.is_verified, _food.c.default_serving_id
+    ).where(_food.c.id == food_id)
+
+
+def servings_query(food_id: int):
+    """Servings of one food."""
+    return select(
+        _serving.c.id, _serving.c.serving_name, _serving.c.unit, _serving.c.grams_per_unit
+    ).where(_serving.c.food_id == food_id)
+
+
+def serialize_food_v2(food, servings: Iterable) -> Dict[str, Any]:
+    """Food details in the API v2 format (see serialize_food_for_api_v2 in app/api/routes.py)."""
+    return {
+        'id': food.id,
+        'name': food.name,
+        'brand': food.brand,
+        'category': food.category,
+        'description': food.description,
+        'calories_per_100g': food.calories,
+        'protein_per_100g': food.protein,
+        'carbs_per_100g': food.carbs,
+        'fat_per_100g': food.fat,
+        'fiber_per_100g': food.fiber,
+        'sugar_per_100g': food.sugar,
+        'sodium_per_100g': food.sodium,
+        'verified': food.is_verified,
+        'servings': [{
+            'id': serving.id,
+            'serving_name': serving.serving_name,
+            'unit': serving.unit,
+            'grams_per_unit': serving.grams_per_unit
+        } for serving in servings],
+        'default_serving_id': food.default_serving_id
+    }
+
+
+def nutrition_summary_query(user_id: int, target_date: date, archived: bool = False):
+    """
+    A user's nutrient totals and log count for one day, one row per meal type.
+
+    archived: Whether the day may be archived (before archive_cutoff()), so
+        its stored daily totals are added
+    """
+    totals = daily_totals(target_date, include_archived=archived)
+    return select(
+        totals.c.meal_type,
+        *(func.coalesce(func.sum(totals.c[nutrient]), 0.0).label(nutrient) for nutrient in SUMMARY_NUTRIENTS),
+        func.sum(totals.c.meal_count).label('meal_count')
+    ).where(
+        totals.c.user_id == user_id,
+        totals.c.date == target_date
+    ).group_by(totals.c.meal_type)
+
+
+def serialize_nutrition_summary(target_date: date, rows: Iterable) -> Dict[str, Any]:
+    """Daily totals and the breakdown by meal type from nutrition_summary_query rows."""
+    by_meal = {row.meal_type: row for row in rows}
+    summary = {'date': target_date.isoformat()}
+    for nutrient in SUMMARY_NUTRIENTS:
+        summary[f'total_{nutrient}'] = round(sum(getattr(row, nutrient) for row in by_meal.values()), 2)
+
+    summary['meal_breakdown'] = {}
+    for meal_type in MEAL_TYPES:
+        row = by_meal.get(meal_type)
+        breakdown = {nutrient: getattr(row, nutrient) if row else 0 for nutrient in SUMMARY_NUTRIENTS}
+        breakdown['count'] = row.meal_count if row else 0
+        summary['meal_breakdown'][meal_type] = breakdown
+    return summary
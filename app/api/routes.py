@@ -1,11 +1,15 @@
-from flask import request, jsonify
+from flask import request, jsonify, current_app
 from flask_login import current_user
 from app.models import Food, User, MealLog, FoodServing
 from app import db
 from datetime import datetime, date
 from functools import wraps
-from sqlalchemy import case
+from sqlalchemy import case, func, select
 from app.api import bp
+from app.api.queries import nutrition_summary_query, serialize_nutrition_summary
+from app.utils.meal_log_archive import count_archived, reads_archive
+from app.utils.rate_limiter import rate_limit
+from app.utils.sharding import scatter_sum
 
 def api_login_required(f):
     """Custom decorator for API routes that handles authentication for AJAX requests."""
@@ -18,6 +22,7 @@ def api_login_required(f):
 
 @bp.route('/foods/search')
 @api_login_required
+@rate_limit(limit=120, window_seconds=60, scope='food_search')
 def search_foods():
     """Search for foods."""
     query = request.args.get('q', '').strip()
@@ -38,6 +43,7 @@ def search_foods():
     } for f in foods])
 
 @bp.route('/foods/search-verified')
+@rate_limit(limit=120, window_seconds=60, scope='food_search')
 def search_verified_foods():
     """API endpoint for searching only verified foods for meal logging."""
     try:
@@ -380,6 +386,80 @@ def create_user():
         db.session.rollback()
         return jsonify({'error': f'Failed to create user: {str(e)}'}), 500
 
+@bp.route('/admin/users/bulk', methods=['POST'])
+@api_login_required
+@rate_limit(limit=5, window_seconds=15 * 60, scope='user_provisioning')
+def bulk_create_users():
+    """
+    Start a bulk user provisioning job (Admin only).
+    
+    Accepts a CSV or JSON file upload ('file') or a JSON body with a list of
+    users (or {"users": [...]}). Rows need first_name, last_name and password;
+    user_id, username, email and is_admin are optional. Returns 202 with a
+    job ID to poll at /api/admin/users/bulk/<job_id>.
+    """
+    from app.services.user_provisioning_service import UserProvisioningService
+    
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    try:
+        service = UserProvisioningService()
+        
+        if 'file' in request.files:
+            file = request.files['file']
+            filename = file.filename or ''
+            source_format = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+            if source_format not in service.SUPPORTED_FORMATS:
+                return jsonify({'error': 'Only CSV and JSON files are supported'}), 400
+            content = file.read().decode('utf-8-sig')
+        elif request.is_json:
+            filename = 'request.json'
+            source_format = 'json'
+            content = request.get_data(as_text=True)
+        else:
+            return jsonify({'error': 'Provide a CSV/JSON file or a JSON body'}), 400
+        
+        try:
+            rows = service.parse_content(content, source_format)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        job_id = service.start_async_provisioning(rows, filename, source_format, current_user.id)
+        
+        current_app.logger.info(
+            f"[AUDIT] Bulk user provisioning job {job_id} started by admin {current_user.id} "
+            f"with {len(rows)} rows from {filename}"
+        )
+        
+        return jsonify({
+            'message': 'User provisioning started',
+            'job_id': job_id,
+            'total_rows': len(rows)
+        }), 202
+        
+    except UnicodeDecodeError:
+        return jsonify({'error': 'File must be UTF-8 encoded'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to start user provisioning: {str(e)}'}), 500
+
+@bp.route('/admin/users/bulk/<job_id>')
+@api_login_required
+def bulk_create_users_status(job_id):
+    """Get status and per-row results of a bulk user provisioning job (Admin only)."""
+    from app.services.user_provisioning_service import UserProvisioningService
+    
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    include_items = request.args.get('include_items', 'false').lower() == 'true'
+    status = UserProvisioningService(hash_workers=0).get_job_status(job_id, include_items=include_items)
+    if not status:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify(status)
+
 @bp.route('/admin/users/<int:user_id>')
 @api_login_required
 def get_user(user_id):
@@ -416,7 +496,8 @@ def delete_food_admin_api(food_id):
             return jsonify({'error': 'Food not found'}), 404
         
         # Check referential integrity - prevent deletion if food is referenced in meal logs
-        meal_log_count = MealLog.query.filter_by(food_id=food_id).count()
+        meal_log_count = scatter_sum(select(func.count()).select_from(MealLog).where(MealLog.food_id == food_id))
+        meal_log_count += count_archived('food_id', food_id)
         
         if meal_log_count > 0:
             return jsonify({
@@ -511,6 +592,25 @@ def get_food_v2(food_id):
         return jsonify({'error': f'Failed to load food details: {str(e)}'}), 500
 
 
+@bp.route('/v2/nutrition/summary')
+@api_login_required
+def nutrition_summary_v2():
+    """API v2: Nutrition totals for a day (default today), overall and by meal type."""
+    date_param = request.args.get('date')
+    if date_param:
+        try:
+            target_date = datetime.strptime(date_param, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'date must be in YYYY-MM-DD format'}), 400
+    else:
+        target_date = date.today()
+    
+    rows = db.session.execute(
+        nutrition_summary_query(current_user.id, target_date, archived=reads_archive(target_date))
+    ).all()
+    return jsonify(serialize_nutrition_summary(target_date, rows))
+
+
 @bp.route('/v2/meals', methods=['POST'])
 @api_login_required
 def create_meal_log_v2():
@@ -674,6 +774,7 @@ def create_meal_log_v2():
 
 @bp.route('/v2/foods/search')
 @api_login_required
+@rate_limit(limit=120, window_seconds=60, scope='food_search')
 def search_foods_v2():
     """API v2: Search for foods with enhanced serving information."""
     try:
@@ -767,4 +868,137 @@ def get_food_servings_v2(food_id):
         
     except Exception as e:
         print(f"[API ERROR] Failed to get servings v2 for food_id {food_id}: {str(e)}")
-        return jsonify({'error': f'Failed to get servings: {str(e)}'}), 500
\ No newline at end of file
+        return jsonify({'error': f'Failed to get servings: {str(e)}'}), 500
+
+@bp.route('/v2/foods/query')
+@api_login_required
+@rate_limit(limit=120, window_seconds=60, scope='food_search')
+def query_foods_v2():
+    """
+    API v2: Nutrient range query over the food catalog.
+    
+    Supports min_/max_ filters on every per-100g nutrient column and on the
+    computed ratios protein_per_100kcal and fiber_per_100kcal, e.g.
+    /api/v2/foods/query?min_protein=20&max_calories=150&sort=protein_per_100kcal
+    """
+    from app.services.food_query_service import FoodQueryService
+    
+    try:
+        try:
+            filters = FoodQueryService.parse_range_filters(request.args)
+            sort, order = FoodQueryService.parse_sort(
+                request.args.get('sort'), request.args.get('order')
+            )
+            page = max(1, int(request.args.get('page', 1)))
+            per_page = min(
+                FoodQueryService.MAX_PER_PAGE,
+                max(1, int(request.args.get('per_page', FoodQueryService.DEFAULT_PER_PAGE)))
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        category = request.args.get('category', '').strip()
+        
+        # Only admins may include unverified foods
+        verified_only = True
+        if current_user.is_admin and request.args.get('verified', 'true').lower() == 'false':
+            verified_only = False
+        
+        foods_query = FoodQueryService.build_query(
+            filters=filters,
+            category=category or None,
+            verified_only=verified_only,
+            sort=sort,
+            order=order
+        )
+        
+        # Fetch one extra row to detect a next page without a full COUNT over the catalog
+        rows = foods_query.offset((page - 1) * per_page).limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        foods = rows[:per_page]
+        
+        pagination = {
+            'page': page,
+            'per_page': per_page,
+            'has_prev': page > 1,
+            'has_next': has_next
+        }
+        
+        # Total count is opt-in: on large catalogs it costs more than the page itself
+        if request.args.get('include_total', 'false').lower() == 'true':
+            total = FoodQueryService.count(foods_query)
+            pagination['total'] = total
+            pagination['pages'] = (total + per_page - 1) // per_page
+        
+        return jsonify({
+            'foods': [FoodQueryService.serialize_food(food) for food in foods],
+            'filters': filters,
+            'sort': sort,
+            'order': order,
+            'pagination': pagination
+        })
+        
+    except Exception as e:
+        print(f"[API ERROR] Failed to query foods v2: {str(e)}")
+        return jsonify({'error': f'Failed to query foods: {str(e)}'}), 500
+
+@bp.route('/v2/recommendations/remaining')
+@api_login_required
+def recommend_remaining_v2():
+    """
+    API v2: Recommend portions that fill the user's remaining daily nutrition.
+    
+    Remaining calories, protein, carbs, fat and fiber can be passed explicitly,
+    e.g. /api/v2/recommendations/remaining?calories=600&protein=45&k=5.
+    When none are given they are derived from the active NutritionGoal minus
+    today's logged totals.
+    """
+    from app.services.food_recommender import FoodRecommender
+    
+    try:
+        try:
+            k = min(FoodRecommender.MAX_K, max(1, int(request.args.get('k', FoodRecommender.DEFAULT_K))))
+            remaining = {}
+            for nutrient in FoodRecommender.NUTRIENTS:
+                raw_value = request.args.get(nutrient)
+                if raw_value is not None and raw_value.strip() != '':
+                    remaining[nutrient] = float(raw_value)
+        except ValueError:
+            return jsonify({'error': 'k and remaining nutrient values must be valid numbers'}), 400
+        
+        source = 'request'
+        if not remaining:
+            goal = current_user.get_current_nutrition_goal()
+            if not goal:
+                return jsonify({'error': 'No active nutrition goal; pass remaining values explicitly'}), 400
+            
+            totals = db.session.query(
+                func.coalesce(func.sum(MealLog.calories), 0),
+                func.coalesce(func.sum(MealLog.protein), 0),
+                func.coalesce(func.sum(MealLog.carbs), 0),
+                func.coalesce(func.sum(MealLog.fat), 0),
+                func.coalesce(func.sum(MealLog.fiber), 0)
+            ).filter(
+                MealLog.user_id == current_user.id,
+                MealLog.date == date.today()
+            ).one()
+            targets = (goal.target_calories, goal.target_protein, goal.target_carbs,
+                       goal.target_fat, goal.target_fiber)
+            remaining = {
+                nutrient: round((target or 0) - consumed, 1)
+                for nutrient, target, consumed in zip(FoodRecommender.NUTRIENTS, targets, totals)
+            }
+            source = 'goal'
+        
+        recommendations = FoodRecommender.recommend(remaining, k=k)
+        
+        return jsonify({
+            'remaining': remaining,
+            'source': source,
+            'catalog_version': FoodRecommender.get_matrix().version,
+            'recommendations': recommendations
+        })
+        
+    except Exception as e:
+        print(f"[API ERROR] Failed to recommend foods v2: {str(e)}")
+        return jsonify({'error': f'Failed to recommend foods: {str(e)}'}), 500
@@ -0,0 +1,28 @@
+"""
+Asynchronous read-only API tier
+
+Search typeahead, food details and the daily nutrition summary are
+read-only and I/O bound, but under gunicorn they queue for the same sync
+workers as slow admin requests. create_asgi_app() wraps the Flask app in an
+ASGI application that serves
+
+    GET /api/foods/search-verified
+    GET /api/v2/foods/<id>
+    GET /api/v2/nutrition/summary
+
+on an asyncio event loop from a read-only aiosqlite engine, and runs every
+other request through the Flask app on a thread pool (wsgi_bridge.py). The
+queries and response bodies are shared with the Flask routes
+(app/api/queries.py), so both tiers answer identically.
+
+Requests are authenticated from the same signed Flask session cookie. A
+request carrying only a remember-me cookie is handed to Flask, which
+restores the session. The search rate limit uses the Flask app's limiter.
+
+The tier is optional and needs aiosqlite plus an ASGI server; asgi.py is
+the entry point, e.g.
+
+    gunicorn -k uvicorn.workers.UvicornWorker --workers 2 asgi:app
+"""
+
+from app.async_api.server import AsyncReadApi, create_asgi_app, create_read_engine
@@ -0,0 +1,293 @@
+"""
+ASGI application serving the read-only API endpoints on an event loop.
+"""
+
+import asyncio
+import gzip
+import json
+import re
+from datetime import date, datetime
+from typing import Any, Dict, NamedTuple, Optional
+from urllib.parse import parse_qsl
+
+from itsdangerous import BadSignature
+from sqlalchemy import event
+from werkzeug.http import parse_accept_header, parse_cookie
+
+from app import db
+from app.api.queries import (food_query, nutrition_summary_query, search_verified_query, serialize_food_v2,
+                             serialize_nutrition_summary, serialize_search_row, servings_query, user_query)
+from app.async_api.wsgi_bridge import WsgiBridge
+from app.utils.meal_log_archive import archive_cutoff
+from app.utils.rate_limiter import MemoryRateLimitBackend, get_rate_limiter
+from app.utils.sharding import shard_engines
+
+try:
+    import aiosqlite
+except ImportError:  # optional dependency, only needed by the ASGI deployment
+    aiosqlite = None
+
+
+class AsyncRequest(NamedTuple):
+    """The parts of an ASGI request the handlers use."""
+    scope: Dict[str, Any]
+    path_params: tuple
+    args: Dict[str, str]
+    headers: Dict[str, str]
+    cookies: Dict[str, str]
+
+    @classmethod
+    def from_scope(cls, scope, path_params=()) -> 'AsyncRequest':
+        args = {}
+        for name, value in parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True):
+            args.setdefault(name, value)  # First value wins, like request.args.get
+        headers = {}
+        for name, value in scope.get('headers', []):
+            name, value = name.decode('latin-1'), value.decode('latin-1')
+            headers[name] = f'{headers[name]}, {value}' if name in headers else value
+        cookies = parse_cookie(headers.get('cookie', ''))
+        return cls(scope, tuple(path_params), args, headers, dict(cookies))
+
+    @property
+    def remote_addr(self) -> Optional[str]:
+        client = self.scope.get('client')
+        return client[0] if client else None
+
+
+class JsonResponse(NamedTuple):
+    """A handler's result: the body to serialize, status and extra headers."""
+    payload: Any
+    status: int = 200
+    headers: tuple = ()
+
+
+class PassThrough(Exception):
+    """Raised by a handler to hand the request to the Flask app instead."""
+
+
+class AsyncReadApi:
+    """ASGI app: read-only API endpoints served natively, everything else by Flask."""
+
+    ROUTES = (
+        (re.compile(r'/api/foods/search-verified'), 'search_verified'),
+        (re.compile(r'/api/v2/foods/(\d+)'), 'food_v2'),
+        (re.compile(r'/api/v2/nutrition/summary'), 'nutrition_summary'),
+    )
+
+    def __init__(self, flask_app, engine=None):
+        """
+        Args:
+            flask_app: The Flask application; serves every other request and
+                provides config, the session cookie signer and the rate limiter
+            engine: Async engine to read from (see create_read_engine); without
+                one every request is passed to the Flask app
+        """
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        self.engine = engine
+        # Handlers hold at most one pooled connection; admitting no more than
+        # the pool size serves a burst first come, first served instead of
+        # interleaving every request (and timing out pool checkouts)
+        self._slots = asyncio.Semaphore(self.config.get('ASYNC_API_DB_POOL_SIZE', 8))
+        self.fallback = WsgiBridge(flask_app, threads=self.config.get('ASYNC_API_WSGI_THREADS', 8))
+        self._session_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        with flask_app.app_context():
+            self._limiter = get_rate_limiter()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if self.engine is not None and scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            for pattern, name in self.ROUTES:
+                match = pattern.fullmatch(scope['path'])
+                if match:
+                    request = AsyncRequest.from_scope(scope, match.groups())
+                    try:
+                        async with self._slots:
+                            response = await getattr(self, name)(request)
+                    except PassThrough:
+                        break
+                    await self._send_json(request, response, send)
+                    return
+        await self.fallback(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.engine is not None:
+                    await self.engine.dispose()
+                self.fallback.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _send_json(self, request: AsyncRequest, response: JsonResponse, send):
+        """Send a JSON body as Flask's jsonify would, gzipped like app/utils/compression.py."""
+        body = (json.dumps(response.payload, sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8')
+        headers = [(b'content-type', b'application/json')]
+        headers.extend((name.lower().encode('latin-1'), str(value).encode('latin-1'))
+                       for name, value in response.headers)
+
+        if (self.config.get('COMPRESSION_ENABLED', True)
+                and len(body) >= self.config.get('COMPRESSION_MIN_SIZE', 1024)
+                and parse_accept_header(request.headers.get('accept-encoding')).quality('gzip') > 0):
+            body = gzip.compress(body, compresslevel=self.config.get('COMPRESSION_GZIP_LEVEL', 6))
+            headers.extend([(b'content-encoding', b'gzip'), (b'vary', b'Accept-Encoding')])
+        headers.append((b'content-length', str(len(body)).encode('latin-1')))
+
+        await send({'type': 'http.response.start', 'status': response.status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b'' if request.scope['method'] == 'HEAD' else body})
+
+    def session_user_id(self, request: AsyncRequest) -> Optional[int]:
+        """
+        User ID from the signed Flask session cookie, or None.
+
+        Raises:
+            PassThrough: If only a remember-me cookie is present; Flask-Login
+                restores the session from it
+        """
+        cookie = request.cookies.get(self.config.get('SESSION_COOKIE_NAME', 'session'))
+        user_id = None
+        if cookie:
+            max_age = int(self.flask_app.permanent_session_lifetime.total_seconds())
+            try:
+                user_id = self._session_serializer.loads(cookie, max_age=max_age).get('_user_id')
+            except BadSignature:
+                user_id = None
+        if user_id is None and self.config.get('REMEMBER_COOKIE_NAME', 'remember_token') in request.cookies:
+            raise PassThrough()
+        return int(user_id) if user_id is not None else None
+
+    async def load_user(self, request: AsyncRequest, connection):
+        """(id, is_admin) row of the logged-in user, or None."""
+        user_id = self.session_user_id(request)
+        if user_id is None:
+            return None
+        return (await connection.execute(user_query(user_id))).first()
+
+    async def rate_limited(self, request: AsyncRequest, scope: str, limit: int, window_seconds: int,
+                           user_id: Optional[int]) -> Optional[JsonResponse]:
+        """The 429 response of app.utils.rate_limiter.rate_limit, or None when allowed."""
+        if not self.config.get('RATE_LIMIT_ENABLED', True):
+            return None
+        client_ip = request.remote_addr or 'unknown'
+        key = f"{scope}:{client_ip}_{user_id}" if user_id is not None else f"{scope}:{client_ip}"
+
+        if isinstance(self._limiter.backend, MemoryRateLimitBackend):
+            result = self._limiter.hit(key, limit, window_seconds)
+        else:
+            # The database backend writes through Flask-SQLAlchemy
+            def hit():
+                with self.flask_app.app_context():
+                    return self._limiter.hit(key, limit, window_seconds)
+            result = await asyncio.get_running_loop().run_in_executor(self.fallback.executor, hit)
+
+        if result.allowed:
+            return None
+        self.flask_app.logger.warning(
+            f"[SECURITY] Rate limit exceeded for {key}. Limit: {limit} per {window_seconds} seconds"
+        )
+        message = (f'Rate limit exceeded. Maximum {limit} requests per {window_seconds} seconds. '
+                   f'Try again in {result.retry_after} seconds.')
+        return JsonResponse({'error': message, 'retry_after': result.retry_after}, 429, (
+            ('Retry-After', result.retry_after), ('X-RateLimit-Limit', limit), ('X-RateLimit-Remaining', 0)
+        ))
+
+    async def search_verified(self, request: AsyncRequest) -> JsonResponse:
+        """GET /api/foods/search-verified (see app/api/routes.py)."""
+        limited = await self.rate_limited(request, 'food_search', 120, 60, self.session_user_id(request))
+        if limited:
+            return limited
+        try:
+            query = request.args.get('q', '').strip()
+            if not query:
+                return JsonResponse({'error': 'Query parameter required'}, 400)
+            async with self.engine.connect() as connection:
+                rows = (await connection.execute(search_verified_query(query))).all()
+            return JsonResponse([serialize_search_row(row) for row in rows])
+        except Exception as e:
+            return JsonResponse({'error': f'Search failed: {str(e)}'}, 500)
+
+    async def food_v2(self, request: AsyncRequest) -> JsonResponse:
+        """GET /api/v2/foods/<id> (see app/api/routes.py)."""
+        food_id = int(request.path_params[0])
+        async with self.engine.connect() as connection:
+            user = await self.load_user(request, connection)
+            if user is None:
+                return JsonResponse({'error': 'Authentication required'}, 401)
+            try:
+                food = (await connection.execute(food_query(food_id))).first()
+                if food is None:
+                    return JsonResponse({'error': 'Food not found'}, 404)
+                if not food.is_verified and not user.is_admin:
+                    return JsonResponse({'error': 'Food not available'}, 403)
+                servings = (await connection.execute(servings_query(food_id))).all()
+                return JsonResponse(serialize_food_v2(food, servings))
+            except Exception as e:
+                self.flask_app.logger.error(f"[API ERROR] Failed to get food v2 for food_id {food_id}: {str(e)}")
+                return JsonResponse({'error': f'Failed to load food details: {str(e)}'}, 500)
+
+    async def nutrition_summary(self, request: AsyncRequest) -> JsonResponse:
+        """GET /api/v2/nutrition/summary (see app/api/routes.py)."""
+        if shard_engines(self.flask_app):
+            raise PassThrough()  # Sharded meal logs are routed by the Flask app's session
+        async with self.engine.connect() as connection:
+            user = await self.load_user(request, connection)
+            if user is None:
+                return JsonResponse({'error': 'Authentication required'}, 401)
+            date_param = request.args.get('date')
+            if date_param:
+                try:
+                    target_date = datetime.strptime(date_param, '%Y-%m-%d').date()
+                except ValueError:
+                    return JsonResponse({'error': 'date must be in YYYY-MM-DD format'}, 400)
+            else:
+                target_date = date.today()
+
+            archived = target_date < archive_cutoff(app=self.flask_app)
+            rows = (await connection.execute(nutrition_summary_query(user.id, target_date, archived))).all()
+            return JsonResponse(serialize_nutrition_summary(target_date, rows))
+
+
+def create_read_engine(flask_app):
+    """
+    Read-only aiosqlite engine on the Flask app's SQLite database.
+
+    Raises:
+        RuntimeError: If aiosqlite is missing or the database is not a SQLite file
+    """
+    if aiosqlite is None:
+        raise RuntimeError('The async API tier needs the aiosqlite package (pip install aiosqlite)')
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    with flask_app.app_context():
+        url = db.engine.url
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        raise RuntimeError(f"The async API tier reads from a SQLite database file, not {url.render_as_string()}")
+
+    # Each aiosqlite connection is a thread; keep a fixed pool of them
+    # (SQLAlchemy would otherwise open one per checkout)
+    engine = create_async_engine(url.set(drivername='sqlite+aiosqlite'), poolclass=AsyncAdaptedQueuePool,
+                                 pool_size=flask_app.config.get('ASYNC_API_DB_POOL_SIZE', 8))
+
+    @event.listens_for(engine.sync_engine, 'connect')
+    def query_only(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA query_only = ON')
+        cursor.close()
+
+    return engine
+
+
+def create_asgi_app(flask_app) -> AsyncReadApi:
+    """
+    Wrap a Flask app in the async read tier.
+
+    Raises:
+        RuntimeError: If aiosqlite is not installed or the database is not a SQLite file
+    """
+    return AsyncReadApi(flask_app, create_read_engine(flask_app))
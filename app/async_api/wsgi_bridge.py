@@ -0,0 +1,124 @@
+"""
+WSGI-under-ASGI bridge for the requests the async tier doesn't serve.
+
+Each request runs the Flask app on a thread pool, start to finish in one
+thread: Flask's contexts and the scoped session are per thread, and
+stream_with_context generators (job progress streams, CSV downloads) must
+be resumed in the thread that started them. Body chunks are handed back to
+the event loop as they are produced, so streamed responses stay streamed.
+"""
+
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Request bodies larger than this are spooled to a temporary file (bulk uploads)
+SPOOL_MAX_BYTES = 1024 * 1024
+
+
+def build_environ(scope: Dict[str, Any], body) -> Dict[str, Any]:
+    """PEP 3333 environ for an ASGI HTTP scope."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{name}'
+        value = value.decode('latin-1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+class WsgiBridge:
+    """ASGI application that runs a WSGI application on a thread pool."""
+
+    def __init__(self, wsgi_app: Callable, threads: int = 8):
+        """
+        Args:
+            wsgi_app: The WSGI application (the Flask app)
+            threads: Requests handled concurrently; like gunicorn --threads
+        """
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return
+            body.write(message.get('body', b''))
+            more_body = message.get('more_body', False)
+        body.seek(0)
+
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self.executor, self._run, build_environ(scope, body), loop, send)
+        finally:
+            body.close()
+
+    def _run(self, environ, loop, send):
+        """Call the WSGI app and relay its response (runs on a pool thread)."""
+        def relay(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response: List[Optional[Tuple[str, list]]] = [None]
+        started = [False]
+
+        def write(data: bytes = b'', more_body: bool = True):
+            if not started[0]:
+                status, headers = response[0]
+                relay({
+                    'type': 'http.response.start',
+                    'status': int(status.split(' ', 1)[0]),
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+                })
+                started[0] = True
+            if data or not more_body:
+                relay({'type': 'http.response.body', 'body': data, 'more_body': more_body})
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info is not None and started[0]:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response[0] = (status, headers)
+            return write
+
+        iterable = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in iterable:
+                if chunk:
+                    write(chunk)
+            write(more_body=False)
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+    def shutdown(self):
+        """Stop the thread pool once running requests finish."""
+        self.executor.shutdown(wait=True)
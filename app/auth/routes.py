@@ -9,8 +9,10 @@ from app.auth.forms import (
     ResetPasswordRequestForm, ResetPasswordForm
 )
 from app.models import User
+from app.utils.rate_limiter import rate_limit
 
 @bp.route('/login', methods=['GET', 'POST'])
+@rate_limit(limit=10, window_seconds=5 * 60, methods=['POST'])  # Slow down password guessing
 def login():
     """User login route."""
     if current_user.is_authenticated:
@@ -0,0 +1,288 @@
+"""
+Flask CLI commands for database setup.
+
+Schema creation and admin seeding used to run inside create_app on every
+worker boot; they are now explicit, idempotent commands:
+
+    flask --app wsgi init-db [--seed-admin]
+    flask --app wsgi seed-admin [--username admin] [--password ...]
+
+Versioned schema migrations and online backfills (see app/migrations):
+
+    flask --app wsgi migrate status
+    flask --app wsgi migrate upgrade [--target VERSION] [--chunk-size N] [--throttle SECONDS]
+    flask --app wsgi migrate stamp VERSION
+
+Batch re-evaluation of challenge progress (e.g. nightly, so day boundaries
+and late-logged meals are reflected for users who have not logged since):
+
+    flask --app wsgi evaluate-challenges
+
+Archival of meal logs older than MEAL_LOG_ARCHIVE_AFTER_DAYS into monthly
+tables, keeping their daily totals (see app/utils/meal_log_archive.py):
+
+    flask --app wsgi archive-meal-logs [--batch-size N] [--dry-run]
+
+Export cleanup (also runs every EXPORT_REAPER_INTERVAL seconds in-process):
+
+    flask --app wsgi reap-exports [--quota-mb N] [--batch-size N]
+
+Local read replica: copy a SQLite primary into the SQLite file named by
+DATABASE_REPLICA_URL, once or every N seconds (see app/utils/db_routing.py):
+
+    flask --app wsgi sync-replica [--interval SECONDS]
+
+Meal logs sharded by user over MEAL_LOG_SHARD_URLS (see app/utils/sharding.py):
+create the shard tables, count rows per shard, and move rows that are not on
+their user's shard (after enabling sharding or adding a shard):
+
+    flask --app wsgi shards init
+    flask --app wsgi shards status
+    flask --app wsgi shards rebalance [--batch-size N] [--dry-run]
+"""
+
+import os
+import time
+
+import click
+from flask import current_app
+
+
+def init_db():
+    """Create any missing tables (on the meal-log shards too, when configured)."""
+    from app import db
+    from app import models  # noqa: F401 - register models with the metadata
+    from app.utils.sharding import create_shard_tables
+
+    db.create_all()
+    create_shard_tables()
+
+
+def seed_admin(username='admin', password=None, email=None):
+    """
+    Create the default admin user if it does not exist.
+
+    Returns:
+        True if a user was created, False if it already existed
+    """
+    from app import db
+    from app.models import User
+
+    if User.query.filter_by(username=username).first():
+        return False
+
+    if email is None and username == 'admin':
+        email = 'admin@nutritracker.com'
+    admin_user = User(username=username, email=email, is_admin=True)
+    admin_user.set_password(password or os.environ.get('ADMIN_PASSWORD') or 'admin123')
+    db.session.add(admin_user)
+    db.session.commit()
+    return True
+
+
+def register_commands(app):
+    """Attach the database setup commands to the app's CLI."""
+
+    @app.cli.command('init-db')
+    @click.option('--seed-admin', 'with_admin', is_flag=True, help='Also create the default admin user.')
+    def init_db_command(with_admin):
+        """Create database tables (safe to run repeatedly)."""
+        init_db()
+        click.echo(f"Database tables ready ({current_app.config['SQLALCHEMY_DATABASE_URI']})")
+        if with_admin:
+            _seed_admin_and_report('admin', None, None)
+
+    @app.cli.command('seed-admin')
+    @click.option('--username', default='admin', show_default=True)
+    @click.option('--password', default=None, help='Defaults to $ADMIN_PASSWORD, then admin123.')
+    @click.option('--email', default=None, help='Defaults to admin@nutritracker.com for the admin user.')
+    def seed_admin_command(username, password, email):
+        """Create the default admin user if missing."""
+        _seed_admin_and_report(username, password, email)
+
+    @app.cli.command('evaluate-challenges')
+    def evaluate_challenges_command():
+        """Recompute progress and completion for all active challenge participants."""
+        from app.services.challenge_progress_service import ChallengeProgressService
+
+        result = ChallengeProgressService().evaluate()
+        click.echo(f"Evaluated {result['evaluated']} participant(s): "
+                   f"{result['updated']} updated, {result['completed']} completed")
+
+    @app.cli.command('archive-meal-logs')
+    @click.option('--batch-size', default=None, type=click.IntRange(min=1),
+                  help='Meal logs moved per transaction (default: MEAL_LOG_ARCHIVE_BATCH_SIZE).')
+    @click.option('--dry-run', is_flag=True, help='Only report what would be archived.')
+    def archive_meal_logs_command(batch_size, dry_run):
+        """Move meal logs older than MEAL_LOG_ARCHIVE_AFTER_DAYS into monthly archive tables."""
+        from app.services.meal_log_archive_service import MealLogArchiveService
+        from app.utils.meal_log_archive import archive_cutoff
+        from app.utils.sharding import create_shard_tables
+
+        create_shard_tables()
+        cutoff = archive_cutoff()
+        result = MealLogArchiveService(batch_size=batch_size, log=click.echo).archive(cutoff, dry_run=dry_run)
+        verb = 'Would archive' if dry_run else 'Archived'
+        click.echo(f"{verb} {result['rows']} meal log(s) dated before {cutoff.isoformat()} "
+                   f"into {result['months']} monthly table(s)")
+
+    @app.cli.command('reap-exports')
+    @click.option('--quota-mb', default=None, type=click.IntRange(min=0),
+                  help='Disk quota for export files (default: EXPORT_DISK_QUOTA_MB, 0 for none).')
+    @click.option('--batch-size', default=None, type=click.IntRange(min=1), help='Rows per transaction.')
+    def reap_exports_command(quota_mb, batch_size):
+        """Expire old exports, enforce the disk quota and delete orphan files."""
+        from app.services.export_reaper import ExportReaper
+
+        quota_bytes = quota_mb * 1024 * 1024 if quota_mb is not None else None
+        metrics = ExportReaper(quota_bytes=quota_bytes, batch_size=batch_size).run()
+        click.echo(f"Expired {metrics['jobs_expired']} job(s); deleted {metrics['files_deleted']} file(s) "
+                   f"({metrics['evicted']} over quota, {metrics['orphans']} orphaned), "
+                   f"reclaimed {metrics['bytes_reclaimed']} bytes; exports now use {metrics['disk_usage']} bytes")
+
+    @app.cli.command('resume-uploads')
+    def resume_uploads_command():
+        """Resume stalled bulk food uploads from their last checkpoint."""
+        from app.services.bulk_upload_processor import BulkUploadProcessor
+
+        resumed = BulkUploadProcessor().resume_stalled_jobs()
+        click.echo(f"Resumed {resumed} stalled upload(s)")
+
+    @app.cli.command('sync-replica')
+    @click.option('--interval', default=0.0, type=click.FloatRange(min=0),
+                  help='Keep syncing every INTERVAL seconds (default: sync once).')
+    def sync_replica_command(interval):
+        """Copy the SQLite database to its SQLite read replica with the backup API."""
+        from app import db
+        from app.utils.db_routing import EXTENSION_KEY, sync_sqlite_replica
+
+        if EXTENSION_KEY not in current_app.extensions:
+            raise click.ClickException('No read replica configured (set DATABASE_REPLICA_URL)')
+        primary, replica = db.engine.url, current_app.extensions[EXTENSION_KEY].url
+        for url in (primary, replica):
+            if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+                raise click.ClickException(f"sync-replica copies between SQLite files, not {url.render_as_string()}")
+
+        while True:
+            pages = sync_sqlite_replica(primary.database, replica.database)
+            click.echo(f"Synced {pages} page(s) to {replica.database}")
+            if not interval:
+                break
+            time.sleep(interval)
+
+    @app.cli.group('shards')
+    def shards_group():
+        """User-sharded meal log storage."""
+
+    @shards_group.command('init')
+    def shards_init_command():
+        """Create the meal log tables on every shard (safe to run repeatedly)."""
+        from app.utils.sharding import create_shard_tables
+
+        _require_shards()
+        click.echo(f"Shard tables ready on {create_shard_tables()} shard(s)")
+
+    @shards_group.command('status')
+    def shards_status_command():
+        """Count users and rows per shard, and rows still on the primary."""
+        from sqlalchemy import func, inspect, select
+        from app import db
+        from app.utils.sharding import SHARDED_TABLES, shard_metadata
+
+        metadata = shard_metadata()
+        databases = [('primary', db.engine)] + [(f'shard {index}', engine)
+                                                for index, engine in enumerate(_require_shards())]
+        for label, engine in databases:
+            counts = []
+            with engine.connect() as connection:
+                existing = set(inspect(connection).get_table_names())
+                for name in SHARDED_TABLES:
+                    table = metadata.tables[name]
+                    if name not in existing:
+                        counts.append(f"{name}: missing")
+                        continue
+                    rows, users = connection.execute(
+                        select(func.count(), func.count(table.c.user_id.distinct()))
+                    ).one()
+                    counts.append(f"{name}: {rows} row(s), {users} user(s)")
+            click.echo(f"{label:<9} {engine.url.render_as_string()}  " + ', '.join(counts))
+
+    @shards_group.command('rebalance')
+    @click.option('--batch-size', default=500, show_default=True, type=click.IntRange(min=1),
+                  help='Rows moved per transaction.')
+    @click.option('--dry-run', is_flag=True, help='Only report what would move.')
+    def shards_rebalance_command(batch_size, dry_run):
+        """Move rows that are not on their user's home shard."""
+        from app.utils.sharding import create_shard_tables, rebalance
+
+        _require_shards()
+        create_shard_tables()
+        result = rebalance(batch_size=batch_size, dry_run=dry_run, log=click.echo)
+        verb = 'Would move' if dry_run else 'Moved'
+        click.echo(f"{verb} {result['rows']} row(s) of {result['users']} user(s)")
+
+    @app.cli.group('migrate')
+    def migrate_group():
+        """Versioned schema migrations."""
+
+    @migrate_group.command('status')
+    def migrate_status_command():
+        """List migrations and any in-progress backfills."""
+        for row in _migration_runner().status():
+            applied = row['applied_at'].strftime('%Y-%m-%d %H:%M') if row['applied_at'] else 'pending'
+            click.echo(f"{row['version']}  {row['name']:<40} {applied}")
+            for backfill in row['backfills']:
+                if backfill['status'] != 'completed':
+                    click.echo(f"        {backfill['step']}: {backfill['status']}, "
+                               f"{backfill['rows_processed']} rows, last key {backfill['last_key']}")
+
+    @migrate_group.command('upgrade')
+    @click.option('--target', default=None, help='Stop after this version (default: latest).')
+    @click.option('--chunk-size', default=1000, show_default=True, type=click.IntRange(min=1),
+                  help='Rows per backfill chunk (one short transaction each).')
+    @click.option('--throttle', default=0.0, show_default=True, type=click.FloatRange(min=0),
+                  help='Seconds to pause after each backfill chunk.')
+    @click.option('--throttle-ratio', default=0.0, show_default=True, type=click.FloatRange(min=0),
+                  help='Extra pause as a multiple of each chunk\'s duration.')
+    def migrate_upgrade_command(target, chunk_size, throttle, throttle_ratio):
+        """Apply pending migrations; interrupted backfills resume from their checkpoint."""
+        runner = _migration_runner(chunk_size=chunk_size, throttle_seconds=throttle,
+                                   throttle_ratio=throttle_ratio)
+        try:
+            applied = runner.upgrade(target)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Applied {len(applied)} migration(s)" if applied else "Database is up to date")
+
+    @migrate_group.command('stamp')
+    @click.argument('version')
+    def migrate_stamp_command(version):
+        """Mark migrations up to VERSION as applied without running them."""
+        try:
+            stamped = _migration_runner().stamp(version)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Stamped {len(stamped)} migration(s)")
+
+
+def _require_shards():
+    from app.utils.sharding import shard_engines
+
+    engines = shard_engines()
+    if not engines:
+        raise click.ClickException('Meal logs are not sharded (set MEAL_LOG_SHARD_URLS)')
+    return engines
+
+
+def _migration_runner(**kwargs):
+    from app import db
+    from app.migrations import MigrationRunner
+
+    return MigrationRunner(db.engine, log=click.echo, **kwargs)
+
+
+def _seed_admin_and_report(username, password, email):
+    if seed_admin(username=username, password=password, email=email):
+        click.echo(f"Default admin user created: {username}")
+    else:
+        click.echo(f"Admin user '{username}' already exists")
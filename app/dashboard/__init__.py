@@ -1,6 +1,10 @@
 from flask import Blueprint
+from app.utils.sharding import pin_current_user_shard
 
 bp = Blueprint('dashboard', __name__)
 
+# Meal logs and nutrition goals are read from the logged-in user's shard
+bp.before_request(pin_current_user_shard)
+
 # Import routes to register them with the blueprint
 from app.dashboard import routes
@@ -1,14 +1,21 @@
 from datetime import datetime, date, timedelta
-from flask import render_template, redirect, url_for, flash, request, jsonify, make_response
+from flask import render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
-from sqlalchemy import func, desc, and_
-from sqlalchemy.orm import joinedload
+from sqlalchemy import func, desc, and_, select
+from sqlalchemy.orm import selectinload
 import csv
 import io
+import json
 from app import db
 from app.dashboard import bp
 from app.dashboard.forms import MealLogForm, NutritionGoalForm, FoodSearchForm
-from app.models import User, Food, MealLog, NutritionGoal, Challenge, UserChallenge, FoodServing
+from app.models import User, Food, MealLog, MealLogDailyTotal, NutritionGoal, Challenge, UserChallenge, FoodServing
+from app.services.challenge_leaderboard_service import ChallengeLeaderboardService
+from app.services.challenge_progress_service import ChallengeProgressService
+from app.utils.compression import send_stream
+from app.utils.db_routing import read_replica
+from app.utils.meal_log_archive import archive_cutoff, daily_totals, meal_log_source
+from app.utils.rate_limiter import rate_limit
 
 def serialize_food_for_js(food: Food) -> dict:
     """Return a JSON-serializable dict for the front-end preselect."""
@@ -123,7 +130,7 @@ def log_meal():
     edit_meal = None
     if edit_meal_id:
         edit_meal = MealLog.query.options(
-            db.joinedload(MealLog.food)
+            selectinload(MealLog.food)
         ).filter(
             MealLog.id == edit_meal_id,
             MealLog.user_id == current_user.id
@@ -256,11 +263,15 @@ def log_meal():
     if meal_type in ['breakfast', 'lunch', 'dinner', 'snack']:
         form.meal_type.data = meal_type
     
-    # Get recently logged foods for quick access
-    recent_foods = db.session.query(Food).join(MealLog).filter(
-        MealLog.user_id == current_user.id,
+    # Get recently logged foods for quick access (no join: meal logs may live on a shard)
+    recent_food_ids = [food_id for food_id, in db.session.query(MealLog.food_id).filter(
+        MealLog.user_id == current_user.id
+    ).group_by(MealLog.food_id).order_by(func.max(MealLog.logged_at).desc())]
+    verified_foods = {food.id: food for food in Food.query.filter(
+        Food.id.in_(recent_food_ids),
         Food.is_verified == True
-    ).distinct().order_by(MealLog.logged_at.desc()).limit(10).all()
+    )} if recent_food_ids else {}
+    recent_foods = [verified_foods[food_id] for food_id in recent_food_ids if food_id in verified_foods][:10]
     
     # Build JSON-safe selected_food for template
     selected_food_json = None
@@ -282,6 +293,7 @@ def log_meal():
 
 @bp.route('/search-foods')
 @login_required
+@rate_limit(limit=120, window_seconds=60, scope='food_search')
 def search_foods():
     """Search for verified foods to log."""
     form = FoodSearchForm()
@@ -419,28 +431,32 @@ def history():
     end_date = request.args.get('end_date', '', type=str)
     meal_type = request.args.get('meal_type', '', type=str)
     
-    # Build query
-    query = MealLog.query.filter(MealLog.user_id == current_user.id)
-    
+    start_date_obj = end_date_obj = None
     if start_date:
         try:
             start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-            query = query.filter(MealLog.date >= start_date_obj)
         except ValueError:
             pass
     
     if end_date:
         try:
             end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-            query = query.filter(MealLog.date <= end_date_obj)
         except ValueError:
             pass
     
+    # Build query (over the archive too when the range reaches back that far)
+    source = meal_log_source(current_user.id, start_date_obj, end_date_obj)
+    query = db.session.query(source).filter(source.user_id == current_user.id)
+    if start_date_obj:
+        query = query.filter(source.date >= start_date_obj)
+    if end_date_obj:
+        query = query.filter(source.date <= end_date_obj)
+    
     if meal_type:
-        query = query.filter(MealLog.meal_type == meal_type)
+        query = query.filter(source.meal_type == meal_type)
     
     # Get paginated results
-    pagination = query.order_by(desc(MealLog.date), desc(MealLog.logged_at)).paginate(
+    pagination = query.order_by(desc(source.date), desc(source.logged_at)).paginate(
         page=page, per_page=20, error_out=False
     )
     
@@ -451,6 +467,7 @@ def history():
 
 @bp.route('/reports')
 @login_required
+@read_replica
 def reports():
     """View nutrition reports and analytics."""
     # Get period from request parameters (default 30 days)
@@ -460,19 +477,20 @@ def reports():
     end_date = date.today()
     start_date = end_date - timedelta(days=period)
     
-    # Get daily nutrition data
+    # Get daily nutrition data (archived days come from their daily totals)
+    totals = daily_totals(start_date)
     daily_data = db.session.query(
-        MealLog.date,
-        func.sum(MealLog.calories).label('calories'),
-        func.sum(MealLog.protein).label('protein'),
-        func.sum(MealLog.carbs).label('carbs'),
-        func.sum(MealLog.fat).label('fat'),
-        func.count(MealLog.id).label('meal_count')
+        totals.c.date,
+        func.sum(totals.c.calories).label('calories'),
+        func.sum(totals.c.protein).label('protein'),
+        func.sum(totals.c.carbs).label('carbs'),
+        func.sum(totals.c.fat).label('fat'),
+        func.sum(totals.c.meal_count).label('meal_count')
     ).filter(
-        MealLog.user_id == current_user.id,
-        MealLog.date >= start_date,
-        MealLog.date <= end_date
-    ).group_by(MealLog.date).order_by(MealLog.date).all()
+        totals.c.user_id == current_user.id,
+        totals.c.date >= start_date,
+        totals.c.date <= end_date
+    ).group_by(totals.c.date).order_by(totals.c.date).all()
     
     # Get weekly averages
     if daily_data:
@@ -483,15 +501,21 @@ def reports():
     else:
         avg_calories = avg_protein = avg_carbs = avg_fat = 0
     
-    # Get top foods
-    top_foods = db.session.query(
-        Food.name,
-        func.count(MealLog.id).label('log_count'),
-        func.sum(MealLog.logged_grams).label('total_quantity')
-    ).join(MealLog).filter(
-        MealLog.user_id == current_user.id,
-        MealLog.date >= start_date
-    ).group_by(Food.id).order_by(desc('log_count')).limit(10).all()
+    # Get top foods (names looked up separately: meal logs may live on a shard)
+    source = meal_log_source(current_user.id, start_date)
+    top_food_rows = db.session.query(
+        source.food_id,
+        func.count(source.id).label('log_count'),
+        func.sum(source.logged_grams).label('total_quantity')
+    ).filter(
+        source.user_id == current_user.id,
+        source.date >= start_date
+    ).group_by(source.food_id).order_by(desc('log_count')).limit(10).all()
+    food_names = dict(db.session.query(Food.id, Food.name).filter(
+        Food.id.in_([row.food_id for row in top_food_rows])
+    )) if top_food_rows else {}
+    top_foods = [{'name': food_names[row.food_id], 'log_count': row.log_count, 'total_quantity': row.total_quantity}
+                 for row in top_food_rows if row.food_id in food_names]
     
     # Get current goals for comparison
     current_goal = current_user.get_current_nutrition_goal()
@@ -508,10 +532,78 @@ def reports():
                          daily_data=daily_data, summary=summary, top_foods=top_foods,
                          current_goal=current_goal, start_date=start_date, end_date=end_date, period=period)
 
+# Meal logs serialized per chunk of a streamed data export
+EXPORT_BATCH_SIZE = 500
+EXPORT_NUTRIENTS = ('calories', 'protein', 'carbs', 'fat', 'fiber')
+
+def _meal_log_export_row(meal_log):
+    """Values of one exported meal log, shared by the CSV and NDJSON exports."""
+    return {
+        'date': meal_log.date.strftime('%Y-%m-%d'),
+        'meal_type': meal_log.meal_type.title(),
+        'food_name': meal_log.food.name,
+        'brand': meal_log.food.brand or '',
+        'quantity': meal_log.get_display_quantity_and_unit(),
+        'calories': meal_log.calories or 0.0,
+        'protein': meal_log.protein or 0.0,
+        'carbs': meal_log.carbs or 0.0,
+        'fat': meal_log.fat or 0.0,
+        'fiber': meal_log.fiber or 0.0
+    }
+
+def _meal_logs_in_batches(statement):
+    """
+    Meal logs of a yield_per statement, with each batch's foods and servings
+    loaded in one query apiece (not joined: meal logs may live on a shard).
+    """
+    for batch in db.session.execute(statement).scalars().partitions():
+        # Held while the batch is yielded, so meal_log.food is served from the identity map
+        foods = Food.query.filter(Food.id.in_({meal_log.food_id for meal_log in batch})).all()
+        servings = FoodServing.query.filter(
+            FoodServing.id.in_({meal_log.serving_id for meal_log in batch if meal_log.serving_id})
+        ).all()
+        yield from batch
+
+def _meal_log_csv_chunks(meal_logs):
+    """Yield the CSV export a batch of rows at a time."""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow([
+        'Date', 'Meal Type', 'Food Name', 'Brand', 'Quantity', 
+        'Calories', 'Protein (g)', 'Carbs (g)', 'Fat (g)', 'Fiber (g)'
+    ])
+    for count, meal_log in enumerate(meal_logs, 1):
+        row = _meal_log_export_row(meal_log)
+        writer.writerow([
+            row['date'], row['meal_type'], row['food_name'], row['brand'], row['quantity'],
+            *(f"{row[nutrient]:.1f}" for nutrient in EXPORT_NUTRIENTS)
+        ])
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue()
+
+def _meal_log_ndjson_chunks(meal_logs):
+    """Yield the NDJSON export (one meal log per line, CSV order) a batch at a time."""
+    lines = []
+    for meal_log in meal_logs:
+        row = _meal_log_export_row(meal_log)
+        for nutrient in EXPORT_NUTRIENTS:
+            row[nutrient] = round(row[nutrient], 1)
+        lines.append(json.dumps(row, ensure_ascii=False))
+        if len(lines) == EXPORT_BATCH_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
 @bp.route('/export-data')
 @login_required
+@rate_limit(limit=10, window_seconds=10 * 60, scope='export')
+@read_replica
 def export_data():
-    """Export nutrition data in CSV or PDF format."""
+    """Export nutrition data as CSV or NDJSON (optionally as a .gz file), or PDF."""
     
     format_type = request.args.get('format', 'csv').lower()
     period = request.args.get('period', '30').lower()
@@ -531,45 +623,24 @@ def export_data():
         start_date = end_date - timedelta(days=30)
         period_name = "Last 30 Days"
     
-    # Get meal logs for the period
-    meal_logs = MealLog.query.filter(
-        MealLog.user_id == current_user.id,
-        MealLog.date >= start_date,
-        MealLog.date <= end_date
-    ).order_by(MealLog.date.desc(), MealLog.logged_at.desc()).all()
-    
-    if format_type == 'csv':
-        # Create CSV export
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write headers
-        writer.writerow([
-            'Date', 'Meal Type', 'Food Name', 'Brand', 'Quantity', 
-            'Calories', 'Protein (g)', 'Carbs (g)', 'Fat (g)', 'Fiber (g)'
-        ])
-        
-        # Write data rows
-        for meal_log in meal_logs:
-            writer.writerow([
-                meal_log.date.strftime('%Y-%m-%d'),
-                meal_log.meal_type.title(),
-                meal_log.food.name,
-                meal_log.food.brand or '',
-                meal_log.get_display_quantity_and_unit() if meal_log else "",
-                f"{meal_log.calories:.1f}" if meal_log.calories else "0.0",
-                f"{meal_log.protein:.1f}" if meal_log.protein else "0.0",
-                f"{meal_log.carbs:.1f}" if meal_log.carbs else "0.0",
-                f"{meal_log.fat:.1f}" if meal_log.fat else "0.0",
-                f"{meal_log.fiber:.1f}" if meal_log.fiber else "0.0"
-            ])
-        
-        # Create response
-        response = make_response(output.getvalue())
-        response.headers['Content-Type'] = 'text/csv'
-        response.headers['Content-Disposition'] = f'attachment; filename=nutrition_data_{period}_{end_date.strftime("%Y%m%d")}.csv'
-        
-        return response
+    # Meal logs for the period (archived ones too if it reaches back that far), streamed in batches
+    source = meal_log_source(current_user.id, start_date, end_date)
+    meal_logs = _meal_logs_in_batches(select(source).where(
+        source.user_id == current_user.id,
+        source.date >= start_date,
+        source.date <= end_date
+    ).order_by(
+        source.date.desc(), source.logged_at.desc(), source.id.desc()
+    ).execution_options(yield_per=EXPORT_BATCH_SIZE))
+    
+    base_format, _, compressed = format_type.partition('.')
+    if base_format in ('csv', 'ndjson') and compressed in ('', 'gz'):
+        filename = f'nutrition_data_{period}_{end_date.strftime("%Y%m%d")}.{format_type}'
+        if base_format == 'csv':
+            chunks, mimetype = _meal_log_csv_chunks(meal_logs), 'text/csv'
+        else:
+            chunks, mimetype = _meal_log_ndjson_chunks(meal_logs), 'application/x-ndjson'
+        return send_stream(chunks, download_name=filename, mimetype=mimetype, gzip_file=bool(compressed))
     
     elif format_type == 'pdf':
         # For now, redirect to CSV until PDF library is installed
@@ -577,7 +648,7 @@ def export_data():
         return redirect(url_for('dashboard.export_data', format='csv', period=period))
     
     else:
-        flash('Invalid export format. Please use CSV or PDF.', 'error')
+        flash('Invalid export format. Please use CSV, NDJSON or PDF.', 'error')
         return redirect(url_for('dashboard.reports'))
 
 @bp.route('/delete-meal/<int:meal_id>', methods=['POST'])
@@ -615,10 +686,20 @@ def challenges():
         UserChallenge.is_completed == True
     ).order_by(desc(UserChallenge.completed_at)).limit(5).all()
     
+    # Precomputed leaderboards: cached top N plus the user's indexed rank
+    leaderboards = {
+        challenge.id: {
+            'top': ChallengeLeaderboardService.get_top(challenge.id),
+            'standing': ChallengeLeaderboardService.get_standing(challenge.id, current_user.id)
+        }
+        for challenge in available_challenges
+    }
+    
     return render_template('dashboard/challenges.html', title='Challenges',
                          available_challenges=available_challenges,
                          user_challenges=user_challenges,
-                         completed_challenges=completed_challenges)
+                         completed_challenges=completed_challenges,
+                         leaderboards=leaderboards)
 
 @bp.route('/join-challenge/<int:challenge_id>', methods=['POST'])
 @login_required
@@ -648,6 +729,9 @@ def join_challenge(challenge_id):
     db.session.add(user_challenge)
     db.session.commit()
     
+    # Count meals already logged today towards the new challenge
+    ChallengeProgressService().evaluate(user_ids=[current_user.id])
+    
     flash(f'Successfully joined "{challenge.name}" challenge!', 'success')
     return redirect(url_for('dashboard.challenges'))
 
@@ -712,6 +796,11 @@ def calculate_logging_streak(user_id):
             MealLog.user_id == user_id,
             MealLog.date == current_date
         ).count()
+        if not logs_count and current_date < archive_cutoff():
+            logs_count = MealLogDailyTotal.query.filter(
+                MealLogDailyTotal.user_id == user_id,
+                MealLogDailyTotal.date == current_date
+            ).count()
         
         if logs_count > 0:
             streak += 1
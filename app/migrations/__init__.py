@@ -0,0 +1,15 @@
+"""
+Versioned database migrations.
+
+Replaces the one-off migrate_*.py / backfill scripts at the repository root
+with an ordered list of idempotent migrations (versions.py), a runner that
+records applied versions in the schema_migration table, and online backfill
+steps that process large tables in checkpointed, throttled chunks.
+
+    flask --app wsgi migrate status
+    flask --app wsgi migrate upgrade [--target 0004] [--chunk-size 1000] [--throttle 0.05]
+"""
+
+from app.migrations.operations import (AddColumn, Backfill, CopyRows, CreateIndexes, CreateTables,
+                                       Migration, Step)
+from app.migrations.runner import MigrationRunner
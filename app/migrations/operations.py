@@ -0,0 +1,226 @@
+"""
+Migration steps
+
+Every step is idempotent, so re-running a migration that was interrupted
+part-way is always safe. Schema steps are short metadata changes; data
+changes on large tables use Backfill, which walks the table in
+keyset-ordered chunks with one short transaction per chunk.
+"""
+
+import time
+from datetime import datetime
+from typing import Dict, Optional, Sequence
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+
+
+class Step:
+    """Base class for a single migration step."""
+
+    #: Unique name within the migration (used for checkpoints and logging)
+    name = None
+
+    def apply(self, runner, migration):
+        raise NotImplementedError
+
+
+class CreateTables(Step):
+    """Create model tables that do not exist yet, with their declared indexes."""
+
+    def __init__(self, *table_names: str):
+        self.table_names = table_names
+        self.name = 'create_tables'
+
+    def apply(self, runner, migration):
+        from app import db
+        from app import models  # noqa: F401 - register models with the metadata
+
+        tables = [db.metadata.tables[name] for name in self.table_names] if self.table_names else None
+        db.metadata.create_all(runner.engine, tables=tables, checkfirst=True)
+
+
+class CreateIndexes(Step):
+    """Create any indexes declared on a model table that are missing in the database."""
+
+    def __init__(self, table_name: str):
+        self.table_name = table_name
+        self.name = f'create_indexes_{table_name}'
+
+    def apply(self, runner, migration):
+        from app import db
+        from app import models  # noqa: F401
+
+        # IF NOT EXISTS rather than reflection: SQLite does not reflect
+        # expression indexes such as the nutrient density ones
+        with runner.engine.begin() as connection:
+            for index in sorted(db.metadata.tables[self.table_name].indexes, key=lambda ix: ix.name):
+                connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+class AddColumn(Step):
+    """ALTER TABLE ... ADD COLUMN, skipped when the column already exists."""
+
+    def __init__(self, table_name: str, column_name: str, ddl: str):
+        self.table_name = table_name
+        self.column_name = column_name
+        self.ddl = ddl
+        self.name = f'add_{table_name}_{column_name}'
+
+    def apply(self, runner, migration):
+        columns = {column['name'] for column in inspect(runner.engine).get_columns(self.table_name)}
+        if self.column_name in columns:
+            return
+        runner.log(f"   📝 Adding {self.table_name}.{self.column_name}")
+        with runner.engine.begin() as connection:
+            connection.execute(text(
+                f"ALTER TABLE {self.table_name} ADD COLUMN {self.column_name} {self.ddl}"
+            ))
+
+
+class Backfill(Step):
+    """
+    Online data backfill over a large table.
+
+    Rows are visited in primary-key order in chunks of chunk_size keys. Each
+    chunk is a single set-based UPDATE bounded by (last_key, upper_key] and
+    runs in its own short transaction together with the checkpoint write, so
+    the live app only ever waits for one chunk and a restart resumes exactly
+    where the last committed chunk ended. The runner sleeps between chunks
+    to leave headroom for foreground traffic.
+
+    Args:
+        name: Step name, unique within the migration
+        table_name: Table to update
+        assignments: SQL for the SET clause (may reference the table's columns)
+        where: Optional SQL predicate selecting rows that still need the change;
+            it keeps the step idempotent and skips rows already correct
+        key: Integer primary-key column used for keyset ordering
+        chunk_size: Keys per chunk (defaults to the runner's chunk size)
+        params: Extra bind parameters for assignments/where
+    """
+
+    #: Past tense used in the completion log line
+    verb = 'updated'
+
+    def __init__(self, name: str, table_name: str, assignments: Optional[str], where: Optional[str] = None,
+                 key: str = 'id', chunk_size: Optional[int] = None, params: Optional[Dict] = None):
+        self.name = name
+        self.table_name = table_name
+        self.assignments = assignments
+        self.where = where
+        self.key = key
+        self.chunk_size = chunk_size
+        self.params = params or {}
+
+    def apply(self, runner, migration):
+        from app.models import MigrationCheckpoint
+
+        checkpoints = MigrationCheckpoint.__table__
+        chunk_size = self.chunk_size or runner.chunk_size
+        checkpoint_key = (checkpoints.c.version == migration.version) & (checkpoints.c.step == self.name)
+
+        with runner.engine.begin() as connection:
+            checkpoint = connection.execute(checkpoints.select().where(checkpoint_key)).first()
+            if checkpoint is None:
+                connection.execute(checkpoints.insert().values(
+                    version=migration.version, step=self.name, last_key=0, rows_processed=0,
+                    status='running', started_at=datetime.utcnow(), updated_at=datetime.utcnow()
+                ))
+                last_key, rows_processed = 0, 0
+            elif checkpoint.status == 'completed':
+                return
+            else:
+                last_key, rows_processed = checkpoint.last_key, checkpoint.rows_processed
+                runner.log(f"   ⏩ Resuming {self.name} after {self.key}={last_key} ({rows_processed} rows done)")
+
+        next_upper = text(
+            f"SELECT MAX({self.key}) FROM ("
+            f"SELECT {self.key} FROM {self.table_name} WHERE {self.key} > :last_key "
+            f"ORDER BY {self.key} LIMIT :chunk_size) AS chunk"
+        )
+        update = self.chunk_statement()
+
+        while True:
+            started = time.monotonic()
+            with runner.engine.begin() as connection:
+                upper_key = connection.execute(
+                    next_upper, {'last_key': last_key, 'chunk_size': chunk_size}
+                ).scalar()
+                if upper_key is None:
+                    connection.execute(checkpoints.update().where(checkpoint_key).values(
+                        status='completed', updated_at=datetime.utcnow()
+                    ))
+                    break
+
+                result = connection.execute(
+                    update, {**self.params, 'last_key': last_key, 'upper_key': upper_key}
+                )
+                rows_processed += max(result.rowcount, 0)
+                last_key = upper_key
+                connection.execute(checkpoints.update().where(checkpoint_key).values(
+                    last_key=last_key, rows_processed=rows_processed, updated_at=datetime.utcnow()
+                ))
+
+            runner.throttle(time.monotonic() - started)
+
+        runner.log(f"   ✅ {self.name}: {rows_processed} rows {self.verb}")
+
+    def chunk_statement(self):
+        """Statement applied to the keys in (:last_key, :upper_key]."""
+        return text(
+            f"UPDATE {self.table_name} SET {self.assignments} "
+            f"WHERE {self.key} > :last_key AND {self.key} <= :upper_key"
+            + (f" AND ({self.where})" if self.where else "")
+        )
+
+
+class CopyRows(Backfill):
+    """
+    Online INSERT ... SELECT from a large table, chunked like Backfill.
+
+    Chunks walk the source table's keys; `where` should exclude rows already
+    copied (e.g. NOT EXISTS on the target) so a re-run skips them.
+
+    Args:
+        name: Step name, unique within the migration
+        table_name: Source table walked in key order
+        target_table: Table receiving the rows
+        columns: Target column names
+        select: SQL select list producing the columns (may reference the source's columns)
+        where: Optional SQL predicate on the source rows
+        key: Integer primary-key column of the source
+        chunk_size: Keys per chunk (defaults to the runner's chunk size)
+        params: Extra bind parameters for select/where
+    """
+
+    verb = 'copied'
+
+    def __init__(self, name: str, table_name: str, target_table: str, columns: Sequence[str], select: str,
+                 where: Optional[str] = None, key: str = 'id', chunk_size: Optional[int] = None,
+                 params: Optional[Dict] = None):
+        super().__init__(name, table_name, assignments=None, where=where, key=key,
+                         chunk_size=chunk_size, params=params)
+        self.target_table = target_table
+        self.columns = columns
+        self.select = select
+
+    def chunk_statement(self):
+        return text(
+            f"INSERT INTO {self.target_table} ({', '.join(self.columns)}) "
+            f"SELECT {self.select} FROM {self.table_name} "
+            f"WHERE {self.key} > :last_key AND {self.key} <= :upper_key"
+            + (f" AND ({self.where})" if self.where else "")
+        )
+
+
+class Migration:
+    """An ordered list of steps recorded under a single version."""
+
+    def __init__(self, version: str, name: str, steps: Sequence[Step]):
+        self.version = version
+        self.name = name
+        self.steps = list(steps)
+
+    def __repr__(self):
+        return f'<Migration {self.version} {self.name}>'
@@ -0,0 +1,160 @@
+"""
+Versioned Migration Runner
+
+Applies the migrations in app.migrations.versions in order and records each
+one in the schema_migration table once all of its steps have finished.
+Backfill progress is checkpointed in migration_checkpoint, so an upgrade
+that is interrupted (deploy timeout, Ctrl-C, crash) continues from the last
+committed chunk when it is run again.
+"""
+
+import time
+from typing import Callable, Dict, List, Optional
+
+from app.migrations.operations import Migration
+
+
+class MigrationRunner:
+    """Applies pending migrations against an engine."""
+
+    DEFAULT_CHUNK_SIZE = 1000
+
+    def __init__(self, engine, migrations: Optional[List[Migration]] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, throttle_seconds: float = 0.0,
+                 throttle_ratio: float = 0.0, log: Callable[[str], None] = print,
+                 sleep: Callable[[float], None] = time.sleep):
+        """
+        Args:
+            engine: SQLAlchemy engine to migrate
+            migrations: Ordered migrations (defaults to app.migrations.versions.MIGRATIONS)
+            chunk_size: Default keys per backfill chunk
+            throttle_seconds: Fixed pause after every backfill chunk
+            throttle_ratio: Extra pause as a fraction of the chunk's own duration,
+                e.g. 1.0 keeps the backfill below roughly half of the database's time
+            log: Progress output callback
+            sleep: Sleep function (injectable for tests)
+        """
+        if migrations is None:
+            from app.migrations.versions import MIGRATIONS
+            migrations = MIGRATIONS
+
+        versions = [migration.version for migration in migrations]
+        if versions != sorted(versions) or len(set(versions)) != len(versions):
+            raise ValueError("Migration versions must be unique and in ascending order")
+
+        self.engine = engine
+        self.migrations = migrations
+        self.chunk_size = chunk_size
+        self.throttle_seconds = throttle_seconds
+        self.throttle_ratio = throttle_ratio
+        self.log = log
+        self._sleep = sleep
+
+    def ensure_version_tables(self):
+        """Create the bookkeeping tables if they are missing."""
+        from app.models import MigrationCheckpoint, SchemaMigration
+
+        SchemaMigration.__table__.create(self.engine, checkfirst=True)
+        MigrationCheckpoint.__table__.create(self.engine, checkfirst=True)
+
+    def applied_versions(self) -> Dict[str, object]:
+        """Return {version: applied_at} for every recorded migration."""
+        from app.models import SchemaMigration
+
+        table = SchemaMigration.__table__
+        self.ensure_version_tables()
+        with self.engine.connect() as connection:
+            rows = connection.execute(table.select().with_only_columns(table.c.version, table.c.applied_at))
+            return dict(rows.all())
+
+    def pending(self, target: Optional[str] = None) -> List[Migration]:
+        """Migrations not yet applied, up to and including target."""
+        applied = self.applied_versions()
+        return [
+            migration for migration in self.migrations
+            if migration.version not in applied and (target is None or migration.version <= target)
+        ]
+
+    def status(self) -> List[Dict]:
+        """Per-migration status rows, including in-progress backfill checkpoints."""
+        from app.models import MigrationCheckpoint
+
+        applied = self.applied_versions()
+        checkpoints = MigrationCheckpoint.__table__
+        with self.engine.connect() as connection:
+            progress = {}
+            for row in connection.execute(checkpoints.select()):
+                progress.setdefault(row.version, []).append({
+                    'step': row.step, 'status': row.status,
+                    'last_key': row.last_key, 'rows_processed': row.rows_processed
+                })
+
+        return [{
+            'version': migration.version,
+            'name': migration.name,
+            'applied_at': applied.get(migration.version),
+            'backfills': progress.get(migration.version, [])
+        } for migration in self.migrations]
+
+    def upgrade(self, target: Optional[str] = None) -> List[str]:
+        """
+        Apply pending migrations in order.
+
+        Args:
+            target: Stop after this version (defaults to the latest)
+
+        Returns:
+            Versions applied by this call
+        """
+        if target is not None and target not in {m.version for m in self.migrations}:
+            raise ValueError(f"Unknown migration version: {target}")
+
+        applied = []
+        for migration in self.pending(target):
+            self.apply(migration)
+            applied.append(migration.version)
+        return applied
+
+    def apply(self, migration: Migration):
+        """Run every step of one migration, then record it as applied."""
+        from app.models import SchemaMigration
+
+        self.log(f"🔄 Applying {migration.version} {migration.name}...")
+        started = time.monotonic()
+        for step in migration.steps:
+            step.apply(self, migration)
+        duration_ms = int((time.monotonic() - started) * 1000)
+
+        with self.engine.begin() as connection:
+            connection.execute(SchemaMigration.__table__.insert().values(
+                version=migration.version, name=migration.name, duration_ms=duration_ms
+            ))
+        self.log(f"✅ {migration.version} applied in {duration_ms} ms")
+
+    def stamp(self, version: str) -> List[str]:
+        """
+        Record every migration up to version as applied without running it.
+
+        Useful for databases created with `init-db`, which already have the
+        current schema.
+        """
+        from app.models import SchemaMigration
+
+        if version not in {m.version for m in self.migrations}:
+            raise ValueError(f"Unknown migration version: {version}")
+
+        stamped = self.pending(version)
+        if not stamped:
+            return []
+        with self.engine.begin() as connection:
+            connection.execute(SchemaMigration.__table__.insert(), [
+                {'version': migration.version, 'name': migration.name, 'duration_ms': 0}
+                for migration in stamped
+            ])
+        return [migration.version for migration in stamped]
+
+    def throttle(self, chunk_seconds: float):
+        """Pause between backfill chunks."""
+        pause = self.throttle_seconds + self.throttle_ratio * chunk_seconds
+        if pause > 0:
+            self._sleep(pause)
@@ -0,0 +1,144 @@
+"""
+Ordered list of database migrations.
+
+Versions are zero-padded strings applied in ascending order; append new
+migrations at the end and never edit one that has shipped. 0002-0007 fold
+in the legacy root-level scripts so any existing database can be brought up
+to date by running `flask migrate upgrade`:
+
+    0002  migrate_meal_log_columns.py
+    0003  migrate_add_default_serving_id.py, migrate_default_serving_size.py
+    0004  migrate_add_goal_timing_fields.py, migrate_add_target_weight.py
+    0005  migrate_add_food_nutrient_indexes.py
+    0006  backfill_quantity_to_grams.py
+    0007  fix_nutrition_values.py
+
+The food_serving table rebuild (migrate_food_serving_model.py) and the
+serving upload job tables are covered by 0001, which creates any missing
+model table with its current definition. migrate_standard_servings.py seeds
+catalog data rather than changing the schema and remains a separate script.
+"""
+
+from app.migrations.operations import AddColumn, Backfill, CopyRows, CreateIndexes, CreateTables, Migration
+
+
+# Category-based default serving sizes from migrate_default_serving_size.py
+_CATEGORY_SERVING_GRAMS = """
+    CASE category
+        WHEN 'Dairy' THEN 250 WHEN 'Grains' THEN 50 WHEN 'Vegetables' THEN 100
+        WHEN 'Fruits' THEN 150 WHEN 'Proteins' THEN 100 WHEN 'Legumes' THEN 50
+        WHEN 'Nuts' THEN 30 WHEN 'Beverages' THEN 250 WHEN 'Snacks' THEN 30
+        WHEN 'Oils' THEN 15 WHEN 'Spices' THEN 5 WHEN 'Condiments' THEN 15
+        ELSE 100.0
+    END
+"""
+
+# Per-100g value of a nutrient for the logged food, scaled by the logged grams
+_NUTRIENT_FROM_FOOD = (
+    "(SELECT COALESCE(food.{nutrient}, 0) * COALESCE(meal_log.logged_grams, meal_log.quantity) / 100.0 "
+    "FROM food WHERE food.id = meal_log.food_id)"
+)
+_MEAL_LOG_NUTRIENTS = ('calories', 'protein', 'carbs', 'fat', 'fiber', 'sugar', 'sodium')
+
+
+MIGRATIONS = [
+    Migration('0001', 'baseline_tables', [
+        CreateTables(),
+    ]),
+    Migration('0002', 'meal_log_gram_and_micro_columns', [
+        AddColumn('meal_log', 'logged_grams', 'FLOAT'),
+        AddColumn('meal_log', 'sugar', 'FLOAT'),
+        AddColumn('meal_log', 'sodium', 'FLOAT'),
+        Backfill('logged_grams_from_quantity', 'meal_log',
+                 assignments='logged_grams = COALESCE(quantity, 0)',
+                 where='logged_grams IS NULL'),
+    ]),
+    Migration('0003', 'food_default_serving', [
+        AddColumn('food', 'default_serving_id', 'INTEGER'),
+        AddColumn('food', 'default_serving_size_grams', 'FLOAT DEFAULT 100.0'),
+        Backfill('default_serving_size_by_category', 'food',
+                 assignments=f'default_serving_size_grams = {_CATEGORY_SERVING_GRAMS}',
+                 where='default_serving_size_grams IS NULL'),
+    ]),
+    Migration('0004', 'nutrition_goal_timing_and_weight', [
+        AddColumn('nutrition_goal', 'goal_date', 'DATETIME'),
+        AddColumn('nutrition_goal', 'target_duration', 'VARCHAR(20)'),
+        AddColumn('nutrition_goal', 'target_date', 'DATE'),
+        AddColumn('nutrition_goal', 'target_weight', 'FLOAT'),
+        Backfill('goal_date_from_created_at', 'nutrition_goal',
+                 assignments='goal_date = created_at',
+                 where='goal_date IS NULL'),
+    ]),
+    Migration('0005', 'food_nutrient_indexes', [
+        CreateIndexes('food'),
+    ]),
+    Migration('0006', 'meal_log_quantity_in_grams', [
+        Backfill('quantity_from_logged_grams', 'meal_log',
+                 assignments='quantity = logged_grams',
+                 where='logged_grams IS NOT NULL AND (quantity IS NULL OR quantity <> logged_grams)'),
+    ]),
+    Migration('0007', 'meal_log_missing_nutrition', [
+        Backfill('nutrition_from_food', 'meal_log',
+                 assignments=', '.join(
+                     f'{nutrient} = {_NUTRIENT_FROM_FOOD.format(nutrient=nutrient)}'
+                     for nutrient in _MEAL_LOG_NUTRIENTS
+                 ),
+                 where='calories IS NULL AND EXISTS (SELECT 1 FROM food WHERE food.id = meal_log.food_id)'),
+    ]),
+    Migration('0008', 'nutrition_propagation', [
+        CreateTables('nutrition_propagation_job'),
+        CreateIndexes('meal_log'),
+    ]),
+    Migration('0009', 'challenge_progress_indexes', [
+        CreateIndexes('meal_log'),
+        CreateIndexes('user_challenge'),
+    ]),
+    Migration('0010', 'challenge_leaderboards', [
+        CreateTables('challenge_ranking', 'leaderboard_version'),
+        CopyRows('rankings_from_user_challenges', 'user_challenge', 'challenge_ranking',
+                 columns=('user_challenge_id', 'challenge_id', 'user_id', 'score', 'updated_at'),
+                 select='id, challenge_id, user_id, COALESCE(current_progress, 0), CURRENT_TIMESTAMP',
+                 where='NOT EXISTS (SELECT 1 FROM challenge_ranking '
+                       'WHERE challenge_ranking.user_challenge_id = user_challenge.id)'),
+    ]),
+    Migration('0011', 'export_artifacts', [
+        CreateTables('export_artifact'),
+        AddColumn('export_job', 'content_key', 'VARCHAR(64)'),
+        AddColumn('export_job', 'artifact_id', 'INTEGER REFERENCES export_artifact (id)'),
+        CreateIndexes('export_job'),
+    ]),
+    Migration('0012', 'export_shard_progress', [
+        AddColumn('export_job', 'shard_count', 'INTEGER DEFAULT 0'),
+        AddColumn('export_job', 'shards_completed', 'INTEGER DEFAULT 0'),
+    ]),
+    Migration('0013', 'upload_content_hashes', [
+        AddColumn('bulk_upload_job', 'file_hash', 'VARCHAR(64)'),
+        AddColumn('bulk_upload_job', 'reused_rows', 'INTEGER DEFAULT 0'),
+        AddColumn('serving_upload_job', 'file_hash', 'VARCHAR(64)'),
+        AddColumn('serving_upload_job', 'reused_rows', 'INTEGER DEFAULT 0'),
+        CreateIndexes('bulk_upload_job'),
+        CreateIndexes('serving_upload_job'),
+        CreateTables('upload_chunk'),
+    ]),
+    Migration('0014', 'resumable_bulk_uploads', [
+        AddColumn('bulk_upload_job', 'reuse_chunks', 'BOOLEAN DEFAULT 1'),
+        AddColumn('bulk_upload_job', 'spool_path', 'VARCHAR(500)'),
+        AddColumn('bulk_upload_job', 'checkpoint_row', 'INTEGER DEFAULT 0'),
+        AddColumn('bulk_upload_job', 'updated_at', 'DATETIME'),
+        Backfill('upload_job_updated_at', 'bulk_upload_job',
+                 assignments='updated_at = COALESCE(completed_at, started_at, created_at)',
+                 where='updated_at IS NULL'),
+    ]),
+    Migration('0015', 'propagation_shard_checkpoint', [
+        AddColumn('nutrition_propagation_job', 'shard_index', 'INTEGER DEFAULT 0'),
+    ]),
+    Migration('0016', 'meal_log_daily_totals', [
+        CreateTables('meal_log_daily_total'),
+    ]),
+    Migration('0017', 'upload_chunk_catalog_version', [
+        AddColumn('upload_chunk', 'catalog_version', 'INTEGER'),
+    ]),
+    Migration('0018', 'food_sugar_sodium_indexes', [
+        CreateIndexes('food'),
+    ]),
+]
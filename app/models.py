@@ -1,6 +1,9 @@
 from datetime import datetime, date as dt_date
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import case, event, inspect, literal_column
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import Session
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
 import re
@@ -207,7 +210,8 @@ class Food(db.Model):
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
     
     # Relationships
-    meal_logs = db.relationship('MealLog', backref='food', lazy='dynamic')
+    # Not loaded on delete: meal logs may live on a user's shard, and deletes check for them first
+    meal_logs = db.relationship('MealLog', backref='food', lazy='dynamic', passive_deletes=True)
     default_serving = db.relationship('FoodServing', uselist=False, foreign_keys='Food.default_serving_id', post_update=True)
     
     def get_nutrition_per_serving(self):
@@ -223,9 +227,50 @@ class Food(db.Model):
             'sodium': self.sodium * factor
         }
     
+    @hybrid_property
+    def protein_per_100kcal(self):
+        """Protein density in grams per 100 kcal (None when calories are 0)."""
+        if not self.calories or self.calories <= 0:
+            return None
+        return (self.protein or 0) * 100.0 / self.calories
+    
+    @protein_per_100kcal.expression
+    def protein_per_100kcal(cls):
+        # Literal columns (not bound parameters) so the SQL matches the expression index below
+        return case(
+            (cls.calories > literal_column('0'), cls.protein * literal_column('100.0') / cls.calories),
+            else_=None
+        )
+    
+    @hybrid_property
+    def fiber_per_100kcal(self):
+        """Fiber density in grams per 100 kcal (None when calories are 0)."""
+        if not self.calories or self.calories <= 0:
+            return None
+        return (self.fiber or 0) * 100.0 / self.calories
+    
+    @fiber_per_100kcal.expression
+    def fiber_per_100kcal(cls):
+        return case(
+            (cls.calories > literal_column('0'), cls.fiber * literal_column('100.0') / cls.calories),
+            else_=None
+        )
+    
     def __repr__(self):
         return f'<Food {self.name}>'
 
+# Composite indexes backing the nutrient range-query API (/api/v2/foods/query).
+# Every interactive query is scoped to verified foods, so is_verified leads each index.
+db.Index('ix_food_verified_calories', Food.is_verified, Food.calories)
+db.Index('ix_food_verified_protein', Food.is_verified, Food.protein)
+db.Index('ix_food_verified_carbs', Food.is_verified, Food.carbs)
+db.Index('ix_food_verified_fat', Food.is_verified, Food.fat)
+db.Index('ix_food_verified_fiber', Food.is_verified, Food.fiber)
+db.Index('ix_food_verified_sugar', Food.is_verified, Food.sugar)
+db.Index('ix_food_verified_sodium', Food.is_verified, Food.sodium)
+db.Index('ix_food_verified_protein_density', Food.is_verified, Food.protein_per_100kcal)
+db.Index('ix_food_verified_fiber_density', Food.is_verified, Food.fiber_per_100kcal)
+
 class MealLog(db.Model):
     """Meal logging model with UOM support."""
     id = db.Column(db.Integer, primary_key=True)
@@ -255,7 +300,14 @@ class MealLog(db.Model):
     sodium = db.Column(db.Float)  # Added for completeness
     
     # Relationships
-    serving = db.relationship('FoodServing', backref='meal_logs')
+    serving = db.relationship('FoodServing', backref=db.backref('meal_logs', passive_deletes=True))
+    
+    __table_args__ = (
+        # Keyset scans over one food's logs (nutrition propagation)
+        db.Index('ix_meal_log_food_id_id', 'food_id', 'id'),
+        # Per-user daily totals (challenge progress)
+        db.Index('ix_meal_log_user_id_date', 'user_id', 'date'),
+    )
     
     def calculate_nutrition(self):
         """Calculate nutrition values using the nutrition service."""
@@ -311,6 +363,37 @@ class MealLog(db.Model):
     def __repr__(self):
         return f'<MealLog {self.user.username} - {self.food.name}>'
 
+class MealLogDailyTotal(db.Model):
+    """Daily nutrient totals of a user's archived meal logs, per meal type.
+
+    Written by the meal log archive job in the transaction that moves the
+    day's logs into their monthly archive table (app/utils/meal_log_archive.py),
+    so per-day aggregates add these rows to the live meal_log rows instead of
+    reading the archive.
+    """
+    __tablename__ = 'meal_log_daily_total'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    meal_type = db.Column(db.String(20), nullable=False)
+    meal_count = db.Column(db.Integer, nullable=False, default=0)
+
+    calories = db.Column(db.Float, default=0)
+    protein = db.Column(db.Float, default=0)
+    carbs = db.Column(db.Float, default=0)
+    fat = db.Column(db.Float, default=0)
+    fiber = db.Column(db.Float, default=0)
+    sugar = db.Column(db.Float, default=0)
+    sodium = db.Column(db.Float, default=0)
+
+    __table_args__ = (
+        db.Index('ix_meal_log_daily_total_user_id_date', 'user_id', 'date', 'meal_type', unique=True),
+    )
+
+    def __repr__(self):
+        return f'<MealLogDailyTotal {self.user_id} {self.date} {self.meal_type}>'
+
 class NutritionGoal(db.Model):
     """User nutrition goals model."""
     id = db.Column(db.Integer, primary_key=True)
@@ -353,6 +436,25 @@ class Challenge(db.Model):
     # Relationships
     user_challenges = db.relationship('UserChallenge', backref='challenge', lazy='dynamic')
     
+    @property
+    def unit(self):
+        """Unit of target_value for display."""
+        return {'protein': 'g protein/day', 'calories': 'kcal/day', 'streak': 'days'}.get(self.challenge_type, '')
+    
+    @property
+    def completion_target(self):
+        """
+        Progress needed to complete the challenge.
+        
+        Protein and calorie challenges count the days on which the daily
+        target was met (protein at least target_value, calories at most
+        target_value), so they complete after duration_days such days.
+        Streak challenges complete at target_value consecutive logged days.
+        """
+        if self.challenge_type == 'streak':
+            return self.target_value
+        return self.duration_days
+    
     def __repr__(self):
         return f'<Challenge {self.name}>'
 
@@ -371,9 +473,84 @@ class UserChallenge(db.Model):
     # Relationships
     user = db.relationship('User', backref='user_challenges')
     
+    __table_args__ = (
+        # Active challenges of one user (incremental progress updates)
+        db.Index('ix_user_challenge_user_id_is_completed', 'user_id', 'is_completed'),
+    )
+    
+    @property
+    def progress_percentage(self):
+        """Progress towards the challenge's completion target, capped at 100."""
+        target = self.challenge.completion_target if self.challenge else None
+        if not target:
+            return 0
+        return min(100.0, round((self.current_progress or 0) / target * 100, 1))
+    
     def __repr__(self):
         return f'<UserChallenge {self.user.username} - {self.challenge.name}>'
 
+class ChallengeRanking(db.Model):
+    """Leaderboard entry mirroring one UserChallenge's progress.
+
+    Kept in step with UserChallenge.current_progress by the challenge progress
+    service and the after_flush hook below, so a rank is a single indexed
+    count and the top of a leaderboard is an index range scan.
+    """
+    user_challenge_id = db.Column(db.Integer, db.ForeignKey('user_challenge.id'), primary_key=True)
+    challenge_id = db.Column(db.Integer, db.ForeignKey('challenge.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    score = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    user = db.relationship('User')
+    
+    __table_args__ = (
+        # A user's own entry (rank lookups)
+        db.Index('ix_challenge_ranking_user_id_challenge_id', 'user_id', 'challenge_id'),
+    )
+    
+    def __repr__(self):
+        return f'<ChallengeRanking {self.challenge_id}: {self.user_challenge_id} = {self.score}>'
+
+# Leaderboard order (highest score first, earliest participant on ties);
+# also serves the "how many participants score higher" rank count.
+db.Index('ix_challenge_ranking_leaderboard', ChallengeRanking.challenge_id,
+         ChallengeRanking.score.desc(), ChallengeRanking.user_challenge_id)
+
+class LeaderboardVersion(db.Model):
+    """Per-challenge counter bumped whenever the top of its leaderboard changes.
+
+    Cached top-N lists compare against this value to know when to reload.
+    """
+    challenge_id = db.Column(db.Integer, db.ForeignKey('challenge.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @staticmethod
+    def current(challenge_id):
+        """Return the leaderboard version of a challenge (0 if never bumped)."""
+        version = db.session.query(LeaderboardVersion.version).filter_by(challenge_id=challenge_id).scalar()
+        return version or 0
+    
+    @staticmethod
+    def bump(connection, challenge_ids):
+        """Increment the versions of the given challenges, creating rows as needed."""
+        table = LeaderboardVersion.__table__
+        for challenge_id in challenge_ids:
+            result = connection.execute(
+                table.update()
+                .where(table.c.challenge_id == challenge_id)
+                .values(version=table.c.version + 1, updated_at=datetime.utcnow())
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(
+                    challenge_id=challenge_id, version=1, updated_at=datetime.utcnow()
+                ))
+    
+    def __repr__(self):
+        return f'<LeaderboardVersion {self.challenge_id}: {self.version}>'
+
 class FoodNutrition(db.Model):
     """Extended nutrition information for foods with UOM support."""
     id = db.Column(db.Integer, primary_key=True)
@@ -537,9 +714,20 @@ class BulkUploadJob(db.Model):
     status = db.Column(db.String(20), default='pending')  # pending, processing, completed, failed
     error_message = db.Column(db.Text)
     
+    # Idempotency: SHA-256 of the uploaded file, and rows skipped because their chunk was already imported
+    file_hash = db.Column(db.String(64), index=True)
+    reused_rows = db.Column(db.Integer, default=0)
+    reuse_chunks = db.Column(db.Boolean, default=True)
+    
+    # Resuming after a worker restart: the spooled input file, and the number of
+    # data rows whose chunk has been committed (updated_at is the heartbeat)
+    spool_path = db.Column(db.String(500))
+    checkpoint_row = db.Column(db.Integer, default=0)
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     started_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime)
     
     # User who initiated the job
@@ -587,6 +775,120 @@ class BulkUploadJobItem(db.Model):
     def __repr__(self):
         return f'<BulkUploadJobItem {self.job.job_id} - Row {self.row_number}>'
 
+class NutritionPropagationJob(db.Model):
+    """Recompute stored MealLog nutrition after a food's per-100g values change."""
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(36), unique=True, nullable=False, index=True)
+    
+    # What to recompute
+    food_id = db.Column(db.Integer, db.ForeignKey('food.id'), nullable=False, index=True)
+    from_date = db.Column(db.Date)  # Only meal logs on or after this date; NULL means all history
+    reason = db.Column(db.String(20), default='food_edit')  # food_edit, manual, food_merge
+    
+    # Progress; shard_index and last_meal_log_id are the keyset checkpoint for resuming
+    total_rows = db.Column(db.Integer, default=0)
+    processed_rows = db.Column(db.Integer, default=0)
+    shard_index = db.Column(db.Integer, default=0)  # Meal-log shard being processed (sharded storage)
+    last_meal_log_id = db.Column(db.Integer, default=0)
+    
+    # Job status
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, processing, completed, failed
+    error_message = db.Column(db.Text)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+    
+    # User who triggered the job
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    
+    # Relationships
+    food = db.relationship('Food', backref=db.backref('propagation_jobs', lazy='dynamic'))
+    user = db.relationship('User', backref='nutrition_propagation_jobs')
+    
+    def __init__(self, **kwargs):
+        if 'job_id' not in kwargs or not kwargs['job_id']:
+            kwargs['job_id'] = str(uuid.uuid4())
+        super(NutritionPropagationJob, self).__init__(**kwargs)
+    
+    @property
+    def progress_percentage(self):
+        """Calculate job progress as percentage."""
+        if not self.total_rows:
+            return 100 if self.status == 'completed' else 0
+        return round((self.processed_rows / self.total_rows) * 100, 2)
+    
+    def __repr__(self):
+        return f'<NutritionPropagationJob {self.job_id} - food {self.food_id} - {self.status}>'
+
+class UserProvisioningJob(db.Model):
+    """Track admin bulk user provisioning jobs."""
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(36), unique=True, nullable=False, index=True)
+    
+    # Job details
+    filename = db.Column(db.String(255), nullable=False)
+    source_format = db.Column(db.String(10), nullable=False)  # csv, json
+    total_rows = db.Column(db.Integer, default=0)
+    processed_rows = db.Column(db.Integer, default=0)
+    successful_rows = db.Column(db.Integer, default=0)
+    failed_rows = db.Column(db.Integer, default=0)
+    
+    # Job status
+    status = db.Column(db.String(20), default='pending')  # pending, processing, completed, failed
+    error_message = db.Column(db.Text)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    
+    # Admin who initiated the job
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    
+    # Relationships
+    user = db.relationship('User', foreign_keys=[created_by], backref='provisioning_jobs')
+    job_items = db.relationship('UserProvisioningJobItem', backref='job', lazy='dynamic', cascade='all, delete-orphan')
+    
+    def __init__(self, **kwargs):
+        if 'job_id' not in kwargs or not kwargs['job_id']:
+            kwargs['job_id'] = str(uuid.uuid4())
+        super(UserProvisioningJob, self).__init__(**kwargs)
+    
+    @property
+    def progress_percentage(self):
+        """Calculate job progress as percentage."""
+        if self.total_rows == 0:
+            return 0
+        return round((self.processed_rows / self.total_rows) * 100, 2)
+    
+    def __repr__(self):
+        return f'<UserProvisioningJob {self.job_id} - {self.status}>'
+
+class UserProvisioningJobItem(db.Model):
+    """Per-row result of a bulk user provisioning job."""
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('user_provisioning_job.id'), nullable=False, index=True)
+    
+    # Row information
+    row_number = db.Column(db.Integer, nullable=False)
+    user_key = db.Column(db.String(36))  # User.user_id requested or generated for the row
+    username = db.Column(db.String(80))
+    email = db.Column(db.String(120))
+    
+    # Processing status
+    status = db.Column(db.String(20), default='pending')  # pending, success, failed
+    error_message = db.Column(db.Text)
+    created_user_id = db.Column(db.Integer, db.ForeignKey('user.id'))  # Reference to created user
+    
+    # Timestamps
+    processed_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<UserProvisioningJobItem {self.job_id} - Row {self.row_number}>'
+
 class ExportJob(db.Model):
     """Track food data export jobs."""
     id = db.Column(db.Integer, primary_key=True)
@@ -615,8 +917,17 @@ class ExportJob(db.Model):
     # User who requested the export
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
+    # Sharded export progress (see app/services/sharded_export.py)
+    shard_count = db.Column(db.Integer, default=0)
+    shards_completed = db.Column(db.Integer, default=0)
+    
+    # Shared output file (see ExportArtifact); content_key identifies the result
+    content_key = db.Column(db.String(64), index=True)
+    artifact_id = db.Column(db.Integer, db.ForeignKey('export_artifact.id'), index=True)
+    
     # Relationships
     user = db.relationship('User', backref='export_jobs')
+    artifact = db.relationship('ExportArtifact', backref='jobs')
     
     def __init__(self, **kwargs):
         if 'job_id' not in kwargs or not kwargs['job_id']:
@@ -636,6 +947,32 @@ class ExportJob(db.Model):
         return f'<ExportJob {self.job_id} - {self.export_type}>'
 
 
+class ExportArtifact(db.Model):
+    """Export output file shared by every job that asked for the same content.
+
+    content_key is a hash of (export type, normalized filters, catalog
+    version), so an identical request against an unchanged catalog reuses the
+    file instead of writing it again. ref_count is the number of unexpired
+    jobs pointing at the file; the file is deleted once it reaches zero.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    content_key = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    export_type = db.Column(db.String(20), nullable=False)
+    
+    # File information
+    filename = db.Column(db.String(255), nullable=False)  # Download name
+    file_path = db.Column(db.String(500), nullable=False)
+    file_size = db.Column(db.Integer)
+    total_records = db.Column(db.Integer, default=0)
+    
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ExportArtifact {self.content_key[:12]} ({self.ref_count} refs)>'
+
+
 class ServingUploadJob(db.Model):
     """Track serving upload jobs for async processing."""
     id = db.Column(db.Integer, primary_key=True)
@@ -652,6 +989,10 @@ class ServingUploadJob(db.Model):
     status = db.Column(db.String(20), default='pending')  # pending, processing, completed, failed
     error_message = db.Column(db.Text)
     
+    # Idempotency: SHA-256 of the uploaded file, and rows skipped because their chunk was already imported
+    file_hash = db.Column(db.String(64), index=True)
+    reused_rows = db.Column(db.Integer, default=0)
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     started_at = db.Column(db.DateTime)
@@ -703,3 +1044,185 @@ class ServingUploadJobItem(db.Model):
     
     def __repr__(self):
         return f'<ServingUploadJobItem {self.job.job_id} - Row {self.row_number}>'
+
+
+class UploadChunk(db.Model):
+    """Content hash of a chunk of upload rows that a job has processed.
+
+    A later upload of the same kind skips chunks whose hash was already
+    processed without failures, while the catalog is unchanged since (see
+    app/services/upload_dedup.py).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    upload_type = db.Column(db.String(20), nullable=False)  # foods, servings
+    job_id = db.Column(db.String(36), nullable=False, index=True)  # BulkUploadJob / ServingUploadJob job_id
+    chunk_hash = db.Column(db.String(64), nullable=False)
+    
+    # Rows of the chunk (first_row is the 0-based index of its first data row)
+    first_row = db.Column(db.Integer, nullable=False)
+    row_count = db.Column(db.Integer, nullable=False)
+    failed_rows = db.Column(db.Integer, default=0)
+    
+    # Catalog version when the job finished; the chunk is reused only while it is current
+    catalog_version = db.Column(db.Integer)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('idx_upload_chunk_lookup', 'upload_type', 'chunk_hash'),
+    )
+    
+    def __repr__(self):
+        return f'<UploadChunk {self.upload_type} {self.chunk_hash[:12]} ({self.row_count} rows)>'
+
+
+class CatalogVersion(db.Model):
+    """Single-row counter bumped whenever foods, servings or nutrition rows change.
+
+    In-memory caches derived from the catalog (e.g. the recommender's nutrient
+    matrix) compare against this value to know when to rebuild.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @staticmethod
+    def current(session=None):
+        """Return the current catalog version (0 if never bumped), read through session (default db.session)."""
+        version = (session or db.session).query(CatalogVersion.version).filter_by(id=1).scalar()
+        return version or 0
+    
+    @staticmethod
+    def bump(connection):
+        """Increment the catalog version on the given connection, creating the row if needed."""
+        table = CatalogVersion.__table__
+        result = connection.execute(
+            table.update()
+            .where(table.c.id == 1)
+            .values(version=table.c.version + 1, updated_at=datetime.utcnow())
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(id=1, version=1, updated_at=datetime.utcnow()))
+    
+    def __repr__(self):
+        return f'<CatalogVersion {self.version}>'
+
+
+CATALOG_MODELS = (Food, FoodServing, FoodNutrition)
+
+
+@event.listens_for(Session, 'after_flush')
+def bump_catalog_version(session, flush_context):
+    """Bump the catalog version in the same transaction as any catalog change."""
+    changed = any(isinstance(obj, CATALOG_MODELS) for obj in session.new) or \
+        any(isinstance(obj, CATALOG_MODELS) for obj in session.deleted) or \
+        any(isinstance(obj, CATALOG_MODELS) and session.is_modified(obj, include_collections=False)
+            for obj in session.dirty)
+    if changed:
+        CatalogVersion.bump(session.connection())
+
+
+@event.listens_for(Session, 'after_flush')
+def update_challenge_progress(session, flush_context):
+    """Re-evaluate the challenges of users whose meal logs changed, in the same transaction."""
+    user_ids = {obj.user_id for obj in session.new if isinstance(obj, MealLog)} | \
+        {obj.user_id for obj in session.deleted if isinstance(obj, MealLog)} | \
+        {obj.user_id for obj in session.dirty
+         if isinstance(obj, MealLog) and session.is_modified(obj, include_collections=False)}
+    user_ids.discard(None)
+    if user_ids:
+        from app.services.challenge_progress_service import ChallengeProgressService
+        ChallengeProgressService().evaluate(session.connection(), user_ids=user_ids, session=session)
+
+
+@event.listens_for(Session, 'after_flush')
+def sync_challenge_rankings(session, flush_context):
+    """Mirror joined, removed and ORM-updated UserChallenges into the leaderboard."""
+    scores = [
+        {'uc_id': obj.id, 'challenge_id': obj.challenge_id, 'user_id': obj.user_id,
+         'old': None, 'new': obj.current_progress or 0}
+        for obj in session.new if isinstance(obj, UserChallenge)
+    ] + [
+        {'uc_id': obj.id, 'challenge_id': obj.challenge_id, 'user_id': obj.user_id,
+         'old': obj.current_progress or 0, 'new': None}
+        for obj in session.deleted if isinstance(obj, UserChallenge)
+    ]
+    for obj in session.dirty:
+        if isinstance(obj, UserChallenge):
+            history = inspect(obj).attrs.current_progress.history
+            if history.has_changes():
+                scores.append({'uc_id': obj.id, 'challenge_id': obj.challenge_id, 'user_id': obj.user_id,
+                               'old': (history.deleted or [0])[0] or 0, 'new': obj.current_progress or 0})
+    if scores:
+        from app.services.challenge_leaderboard_service import ChallengeLeaderboardService
+        ChallengeLeaderboardService.record_scores(session.connection(), scores)
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_job_progress(session, flush_context):
+    """Snapshot upload and export jobs written in this flush, for publishing on commit."""
+    from app.services.job_progress import snapshot
+    for obj in list(session.new) + list(session.dirty):
+        state = snapshot(obj)
+        if state is not None:
+            session.info.setdefault('job_progress', {})[state[:2]] = state
+
+
+@event.listens_for(Session, 'after_commit')
+def publish_job_progress(session):
+    """Push the committed job snapshots to streams watching them (see app/services/job_progress.py)."""
+    pending = session.info.pop('job_progress', None)
+    if pending:
+        from app.services.job_progress import progress_channel
+        for job_type, job_id, user_id, state in pending.values():
+            progress_channel.publish(job_type, job_id, user_id, state)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard_job_progress(session, previous_transaction):
+    """Drop snapshots of a rolled-back transaction (a rolled-back savepoint keeps them)."""
+    if not previous_transaction.nested:
+        session.info.pop('job_progress', None)
+
+
+class RateLimitBucket(db.Model):
+    """Per-key request counter for one fixed rate-limit window.
+
+    Backs the shared rate limiter so all gunicorn workers see the same
+    counts. Rows older than two windows are pruned by the limiter itself.
+    """
+    key = db.Column(db.String(200), primary_key=True)
+    window_start = db.Column(db.Integer, primary_key=True)  # Unix time, aligned to the window size
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<RateLimitBucket {self.key} @ {self.window_start}: {self.count}>'
+
+
+class SchemaMigration(db.Model):
+    """A versioned migration that has been fully applied (see app/migrations)."""
+    version = db.Column(db.String(20), primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+    duration_ms = db.Column(db.Integer)
+    
+    def __repr__(self):
+        return f'<SchemaMigration {self.version} {self.name}>'
+
+
+class MigrationCheckpoint(db.Model):
+    """Progress of one chunked backfill step, so an interrupted run can resume.
+
+    last_key is the highest primary key already processed; it is written in
+    the same transaction as the chunk it describes.
+    """
+    version = db.Column(db.String(20), primary_key=True)
+    step = db.Column(db.String(100), primary_key=True)
+    last_key = db.Column(db.Integer, nullable=False, default=0)
+    rows_processed = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, completed
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<MigrationCheckpoint {self.version}/{self.step} @ {self.last_key} ({self.status})>'
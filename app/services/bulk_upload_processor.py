@@ -4,18 +4,27 @@ Async Bulk Upload Processor for Food Data with UOM Support
 This service handles asynchronous processing of bulk food uploads with comprehensive
 validation, sanitization, and progress tracking. Supports Unit of Measure (UOM)
 data for foods with detailed nutrition information and serving sizes.
+
+Uploads are spooled to instance/upload_spool and committed chunk by chunk
+together with a row checkpoint, so a job whose worker is restarted is
+resumed where it stopped (resume_stalled_jobs, `flask resume-uploads` and
+the UPLOAD_RESUME_INTERVAL scheduler).
 """
 
 import csv
 import io
+import os
 import threading
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
+from itertools import chain
 from typing import Dict, List, Optional, Tuple, Any
 from flask import current_app
+from sqlalchemy import select
 from app import db
 from app.models import Food, FoodNutrition, FoodServing, BulkUploadJob, BulkUploadJobItem
-import re
+from app.services.csv_schema import Column, CsvSchema
+from app.services.upload_dedup import UploadDeduplicator
 import uuid
 
 
@@ -41,70 +50,83 @@ class BulkUploadProcessor:
         'serving_size', 'description'  # description field can be ignored
     ]
     
+    NUMERIC_FIELDS = [
+        'calories_per_100g', 'protein_per_100g', 'carbs_per_100g', 'fat_per_100g',
+        'fiber_per_100g', 'sugar_per_100g', 'sodium_per_100g', 'calcium_per_100g',
+        'iron_per_100g', 'vitamin_c_per_100g', 'vitamin_d_per_100g', 'serving_quantity'
+    ]
+    
+    # Validation and conversion of a row in one pass (see app/services/csv_schema.py)
+    SCHEMA = CsvSchema(
+        [
+            Column('name', required=True, max_length=200, label='Food name'),
+            Column('brand', max_length=100, label='Brand name'),
+            Column('category'),
+            Column('description'),
+            Column('base_unit', required=True, choices=chain.from_iterable(SUPPORTED_UNITS.values()),
+                   label='Base unit', default='g'),
+        ] + [Column(field, kind='number') for field in NUMERIC_FIELDS],
+        required_headers=REQUIRED_HEADERS
+    )
+    
+    # Jobs left pending or processing without a committed chunk for this long
+    # are resumed from their checkpoint (see resume_stalled_jobs)
+    STALE_AFTER = timedelta(minutes=5)
+    
+    # Guards starting the resume scheduler from concurrent first requests
+    _scheduler_lock = threading.Lock()
+    
     def __init__(self):
         """Initialize the bulk upload processor."""
         self.current_job = None
         self.processing_lock = threading.Lock()
+        self.dedup = UploadDeduplicator('foods', BulkUploadJob)
     
-    def validate_csv_format(self, csv_content: str) -> Dict[str, Any]:
+    def validate_csv_format(self, csv_content: str, max_reported: int = 10) -> Dict[str, Any]:
         """
-        Validate CSV format and headers.
+        Validate CSV format, headers and every row.
         
         Args:
             csv_content: Raw CSV content as string
+            max_reported: Invalid rows to include in the result (all are counted)
             
         Returns:
             Dict with validation results
         """
-        try:
-            # Parse CSV content
-            csv_file = io.StringIO(csv_content)
-            reader = csv.DictReader(csv_file)
-            headers = reader.fieldnames or []
-            
-            # Check required headers
-            missing_headers = [h for h in self.REQUIRED_HEADERS if h not in headers]
-            if missing_headers:
-                return {
-                    'is_valid': False,
-                    'error': f"Missing required headers: {', '.join(missing_headers)}",
-                    'missing_headers': missing_headers
-                }
-            
-            # Validate data rows
-            rows = list(reader)
-            if not rows:
-                return {
-                    'is_valid': False,
-                    'error': "CSV file contains no data rows",
-                    'row_count': 0
-                }
-            
-            # Basic row validation
-            invalid_rows = []
-            for i, row in enumerate(rows, 1):
-                row_errors = self._validate_row_basic(row, i)
-                if row_errors:
-                    invalid_rows.append({
-                        'row': i,
-                        'errors': row_errors,
-                        'data': row
-                    })
-            
-            return {
-                'is_valid': len(invalid_rows) == 0,
-                'row_count': len(rows),
-                'headers': headers,
-                'invalid_rows': invalid_rows[:10],  # Limit to first 10 errors
-                'total_invalid': len(invalid_rows)
-            }
+        return self.validate_csv_stream(io.StringIO(csv_content), max_reported)
+    
+    def validate_csv_stream(self, stream, max_reported: int = 10) -> Dict[str, Any]:
+        """
+        Validate a CSV text stream without loading it into memory (used for dry runs).
+        
+        Args:
+            stream: Text stream positioned at the header row
+            max_reported: Invalid rows to include in the result (all are counted)
             
+        Returns:
+            Dict with is_valid, row_count, headers, invalid_rows, total_invalid,
+            total_errors and, when invalid, an error summary
+        """
+        try:
+            result = self.SCHEMA.validate(stream, max_reported)
         except Exception as e:
             return {
                 'is_valid': False,
                 'error': f"CSV parsing error: {str(e)}",
                 'exception': str(e)
             }
+        
+        if result['missing_headers']:
+            result['error'] = f"Missing required headers: {', '.join(result['missing_headers'])}"
+        elif not result['row_count']:
+            result['error'] = "CSV file contains no data rows"
+        elif result['total_invalid']:
+            first = result['invalid_rows'][0]
+            result['error'] = (
+                f"{result['total_invalid']} invalid row(s); "
+                f"row {first['row']}: {'; '.join(first['errors'])}"
+            )
+        return result
     
     def _validate_row_basic(self, row: Dict[str, str], row_number: int) -> List[str]:
         """
@@ -117,38 +139,7 @@ class BulkUploadProcessor:
         Returns:
             List of validation errors
         """
-        errors = []
-        
-        # Required fields validation
-        if not row.get('name', '').strip():
-            errors.append("Food name is required")
-        
-        if not row.get('base_unit', '').strip():
-            errors.append("Base unit is required")
-        elif row['base_unit'].strip().lower() not in [u.lower() for units in self.SUPPORTED_UNITS.values() for u in units]:
-            errors.append(f"Unsupported base unit: {row['base_unit']}")
-        
-        # Numeric field validation
-        numeric_fields = [
-            'calories_per_100g', 'protein_per_100g', 'carbs_per_100g', 'fat_per_100g',
-            'fiber_per_100g', 'sugar_per_100g', 'sodium_per_100g', 'calcium_per_100g',
-            'iron_per_100g', 'vitamin_c_per_100g', 'vitamin_d_per_100g', 'serving_quantity'
-        ]
-        
-        for field in numeric_fields:
-            value = row.get(field, '').strip()
-            if value and not self._is_valid_number(value):
-                errors.append(f"Invalid numeric value for {field}: {value}")
-        
-        # Name length validation
-        if len(row.get('name', '')) > 200:
-            errors.append("Food name too long (max 200 characters)")
-        
-        # Brand length validation
-        if len(row.get('brand', '')) > 100:
-            errors.append("Brand name too long (max 100 characters)")
-        
-        return errors
+        return self.SCHEMA.convert_mapping(row)[1]
     
     def _format_error_message(self, error: Exception, row: Dict[str, str], row_number: int) -> str:
         """
@@ -217,56 +208,44 @@ class BulkUploadProcessor:
         """
         Sanitize and convert row data to appropriate types.
         
+        Strings are trimmed with inner whitespace collapsed (empty ones are
+        left out), numbers become floats (0.0 if empty or invalid) and
+        base_unit defaults to 'g'.
+        
         Args:
             row: Raw CSV row data
             
         Returns:
             Sanitized data dictionary
         """
-        sanitized = {}
-        
-        # String fields - trim and clean (only supported fields)
-        string_fields = ['name', 'brand', 'category', 'description', 'base_unit']
-        for field in string_fields:
-            value = row.get(field, '').strip()
-            if value:
-                # Remove extra whitespace and special characters
-                value = re.sub(r'\s+', ' ', value)
-                value = value.replace('\n', '').replace('\r', '')
-                sanitized[field] = value
-        
-        # Numeric fields - convert to float
-        numeric_fields = [
-            'calories_per_100g', 'protein_per_100g', 'carbs_per_100g', 'fat_per_100g',
-            'fiber_per_100g', 'sugar_per_100g', 'sodium_per_100g', 'calcium_per_100g',
-            'iron_per_100g', 'vitamin_c_per_100g', 'vitamin_d_per_100g', 'serving_quantity'
-        ]
-        
-        for field in numeric_fields:
-            value = row.get(field, '').strip()
-            if value:
-                try:
-                    sanitized[field] = float(value)
-                except (ValueError, TypeError):
-                    sanitized[field] = 0.0
-            else:
-                sanitized[field] = 0.0
-        
-        # Ensure required defaults
-        if 'base_unit' not in sanitized or not sanitized['base_unit']:
-            sanitized['base_unit'] = 'g'
+        return self.SCHEMA.convert_mapping(row)[0]
+    
+    def find_existing_upload(self, file_hash: str) -> Optional[BulkUploadJob]:
+        """
+        Find an earlier upload of an identical file.
         
-        return sanitized
+        Args:
+            file_hash: SHA256 hash of the uploaded file
+            
+        Returns:
+            The latest pending, processing or completed job for the file, or None
+        """
+        return self.dedup.find_existing(file_hash)
     
-    def start_async_upload(self, csv_content: str, filename: str, user_id: int, file_hash: str = None) -> str:
+    def start_async_upload(self, csv_content: str, filename: str, user_id: int, file_hash: str = None,
+                           reuse_chunks: bool = True) -> str:
         """
         Start asynchronous bulk upload processing with enhanced security.
         
+        The CSV is spooled to disk first, so the job can be resumed from its
+        checkpoint if the worker running it is restarted.
+        
         Args:
             csv_content: Raw CSV content
             filename: Original filename
             user_id: ID of user initiating upload
-            file_hash: Optional SHA256 hash of file for integrity verification
+            file_hash: SHA256 hash of the uploaded file (computed from csv_content if omitted)
+            reuse_chunks: Skip row chunks an earlier upload already processed without failures
             
         Returns:
             Job ID for tracking progress
@@ -281,60 +260,189 @@ class BulkUploadProcessor:
             filename=filename,
             total_rows=validation_result['row_count'],
             created_by=user_id,
-            status='pending'
+            status='pending',
+            file_hash=file_hash or UploadDeduplicator.file_hash(csv_content),
+            reuse_chunks=reuse_chunks
         )
-        
-        # Add file hash to job metadata if provided
-        if file_hash:
-            job.metadata = {'file_hash': file_hash, 'validation_passed': True}
+        job.spool_path = self._spool(job.job_id, csv_content)
         
         db.session.add(job)
         db.session.commit()
-          # Start processing in background thread
-        from flask import current_app
+        
+        # Start processing in background thread
         app = current_app._get_current_object()  # Get actual app instance
         thread = threading.Thread(
             target=self._process_upload_async,
-            args=(app, job.job_id, csv_content, user_id),
+            args=(app, job.job_id, csv_content),
             daemon=True
         )
         thread.start()
 
         return job.job_id
     
-    def _process_upload_async(self, app, job_id: str, csv_content: str, user_id: int):
+    @staticmethod
+    def _spool(job_id: str, csv_content: str) -> str:
+        """Write an upload's CSV to the spool folder and return its path."""
+        folder = os.path.join(current_app.instance_path, current_app.config.get('UPLOAD_SPOOL_FOLDER', 'upload_spool'))
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f'{job_id}.csv')
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(csv_content)
+        return path
+    
+    @staticmethod
+    def _read_spool(job: BulkUploadJob) -> str:
+        if not job.spool_path or not os.path.exists(job.spool_path):
+            raise ValueError('The spooled upload file is missing, so the upload cannot be resumed')
+        with open(job.spool_path, encoding='utf-8', newline='') as f:
+            return f.read()
+    
+    @staticmethod
+    def _discard_spool(job: BulkUploadJob):
+        if job.spool_path and os.path.exists(job.spool_path):
+            os.remove(job.spool_path)
+        job.spool_path = None
+    
+    def _process_upload_async(self, app, job_id: str, csv_content: Optional[str] = None):
         """
         Process bulk upload asynchronously.
         
         Args:
             app: Flask app instance
             job_id: Job ID to update
-            csv_content: CSV content to process
-            user_id: User ID
+            csv_content: CSV content to process (read from the spool if omitted)
         """
         with self.processing_lock:
             try:
                 # Create app context for database operations
                 with app.app_context():
-                    self._process_upload_job(job_id, csv_content, user_id)
+                    if self._claim_job(job_id):
+                        self._process_upload_job(job_id, csv_content)
             except Exception as e:
-                # Update job with error
+                # _process_upload_job has already marked the job failed
                 with app.app_context():
-                    job = BulkUploadJob.query.filter_by(job_id=job_id).first()
-                    if job:
-                        job.status = 'failed'
-                        job.error_message = str(e)
-                        job.completed_at = datetime.utcnow()
-                        db.session.commit()
+                    current_app.logger.error(f'Bulk upload {job_id} failed: {str(e)}')
+    
+    def _claimable_filter(self, table, stalled_only: bool):
+        waiting = table.c.status == 'pending'
+        if not stalled_only:
+            return waiting
+        stale_before = datetime.utcnow() - self.STALE_AFTER
+        return (waiting | (table.c.status == 'processing')) & (table.c.updated_at < stale_before)
+    
+    def _claim_job(self, job_id: str, stalled_only: bool = False) -> bool:
+        """
+        Atomically mark a job as taken by this worker.
+        
+        Args:
+            job_id: Job to claim
+            stalled_only: Only claim it if no worker has made progress for STALE_AFTER
+            
+        Returns:
+            True if this worker now owns the job
+        """
+        table = BulkUploadJob.__table__
+        with db.engine.begin() as connection:
+            return connection.execute(
+                table.update()
+                .where(table.c.job_id == job_id, self._claimable_filter(table, stalled_only))
+                .values(status='processing', updated_at=datetime.utcnow())
+            ).rowcount == 1
+    
+    def resume_stalled_jobs(self) -> int:
+        """
+        Resume uploads whose worker died, from their last committed chunk.
+        
+        A job counts as stalled when it is pending or processing and has not
+        committed a chunk for STALE_AFTER.
+        
+        Returns:
+            Number of jobs resumed
+        """
+        table = BulkUploadJob.__table__
+        resumed = 0
+        while True:
+            job_id = db.session.execute(
+                select(table.c.job_id).where(self._claimable_filter(table, stalled_only=True))
+                .order_by(table.c.id).limit(1)
+            ).scalar()
+            db.session.commit()
+            if job_id is None:
+                return resumed
+            if not self._claim_job(job_id, stalled_only=True):
+                continue  # Another worker resumed it first
+            
+            current_app.logger.info(f"[AUDIT] Resuming bulk upload {job_id} from its checkpoint")
+            try:
+                self._process_upload_job(job_id)
+            except Exception as e:
+                current_app.logger.error(f'Resumed bulk upload {job_id} failed: {str(e)}')
+            resumed += 1
+    
+    @classmethod
+    def start_resume_scheduler_on_first_request(cls, app):
+        """
+        Start the resume scheduler when the app serves its first request.
+        
+        Only web processes resume uploads: a `flask` CLI command (migrate
+        upgrade, archive-meal-logs, sync-replica) never serves a request, and
+        would otherwise claim a stalled upload and drop it mid-chunk on exit.
+        """
+        if app.config.get('UPLOAD_RESUME_INTERVAL', 0) <= 0:
+            return
+        
+        @app.before_request
+        def start_upload_resumer():
+            if 'upload_resumer' not in app.extensions:
+                cls.start_resume_scheduler(app)
+    
+    @classmethod
+    def start_resume_scheduler(cls, app) -> Optional[threading.Thread]:
+        """
+        Resume stalled uploads every UPLOAD_RESUME_INTERVAL seconds in a daemon thread.
+        
+        Does nothing if the interval is 0 or the app already has a scheduler.
+        
+        Returns:
+            The started thread, or None
+        """
+        interval = app.config.get('UPLOAD_RESUME_INTERVAL', 0)
+        with cls._scheduler_lock:
+            if interval <= 0 or 'upload_resumer' in app.extensions:
+                return None
+            stop = threading.Event()
+            app.extensions['upload_resumer'] = stop
+        
+        thread = threading.Thread(target=cls._resume_periodically, args=(app, interval, stop),
+                                  name='upload-resumer', daemon=True)
+        thread.start()
+        return thread
+    
+    @classmethod
+    def _resume_periodically(cls, app, interval: int, stop: threading.Event):
+        while not stop.wait(interval):
+            with app.app_context():
+                try:
+                    cls().resume_stalled_jobs()
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error(f'Resuming bulk uploads failed: {str(e)}', exc_info=True)
     
-    def _process_upload_job(self, job_id: str, csv_content: str, user_id: int):
+    def _process_upload_job(self, job_id: str, csv_content: Optional[str] = None, user_id: Optional[int] = None,
+                            reuse_chunks: Optional[bool] = None):
         """
         Main job processing logic.
         
+        Rows are applied one chunk at a time. Each chunk's rows, the job
+        counters and the checkpoint are committed in one transaction, so a
+        job interrupted mid-chunk loses that chunk's work and redoes it on
+        resume; no row is applied twice.
+        
         Args:
             job_id: Job ID to update
-            csv_content: CSV content to process
-            user_id: User ID
+            csv_content: CSV content to process (read from the spool if omitted)
+            user_id: User ID (defaults to the job's creator)
+            reuse_chunks: Skip chunks already processed by an earlier upload (defaults to the job's setting)
         """
         job = BulkUploadJob.query.filter_by(job_id=job_id).first()
         if not job:
@@ -343,50 +451,88 @@ class BulkUploadProcessor:
         try:
             # Update job status
             job.status = 'processing'
-            job.started_at = datetime.utcnow()
+            job.started_at = job.started_at or datetime.utcnow()
+            job.updated_at = datetime.utcnow()
             db.session.commit()
             
+            if csv_content is None:
+                csv_content = self._read_spool(job)
+            if user_id is None:
+                user_id = job.created_by
+            if reuse_chunks is None:
+                reuse_chunks = job.reuse_chunks is not False
+            
             # Parse CSV
             csv_file = io.StringIO(csv_content)
             reader = csv.DictReader(csv_file)
-            rows = list(reader)
+            chunks = UploadDeduplicator.chunks(reader)
+            processed_chunks = self.dedup.processed_chunks(c.chunk_hash for c in chunks) if reuse_chunks else set()
             
-            # Process each row
-            for i, row in enumerate(rows, 1):
-                try:
-                    self._process_single_row(job, row, i, user_id)
-                    job.processed_rows = i
-                    job.successful_rows += 1
-                except Exception as row_error:
-                    # Create detailed error message based on error type
-                    error_details = self._format_error_message(row_error, row, i)
-                    
-                    # Create failed job item
-                    job_item = BulkUploadJobItem(
-                        job_id=job.id,
-                        row_number=i,
-                        food_name=row.get('name', 'Unknown'),
-                        status='failed',
-                        error_message=error_details,
-                        processed_at=datetime.utcnow()
-                    )
-                    db.session.add(job_item)
-                    job.processed_rows = i
-                    job.failed_rows += 1
+            for chunk in chunks:
+                chunk_end = chunk.first_row + len(chunk.rows)
                 
-                # Commit progress every 10 rows
-                if i % 10 == 0:
+                # Committed before an interruption
+                if chunk_end <= (job.checkpoint_row or 0):
+                    continue
+                
+                # Heartbeat; this UPDATE also opens the chunk's transaction before the row savepoints
+                job.updated_at = datetime.utcnow()
+                db.session.flush()
+                
+                # Unchanged chunk of an earlier upload: nothing to import
+                if chunk.chunk_hash in processed_chunks:
+                    job.processed_rows = chunk_end
+                    job.reused_rows = (job.reused_rows or 0) + len(chunk.rows)
+                    job.checkpoint_row = chunk_end
+                    self.dedup.record_chunk(job.job_id, chunk, 0)
                     db.session.commit()
+                    continue
+                
+                failed_before = job.failed_rows
+                
+                # Process each row; a failing row only rolls back its own savepoint
+                for i, row in enumerate(chunk.rows, chunk.first_row + 1):
+                    try:
+                        with db.session.begin_nested():
+                            self._process_single_row(job, row, i, user_id)
+                        job.processed_rows = i
+                        job.successful_rows += 1
+                    except Exception as row_error:
+                        # Create detailed error message based on error type
+                        error_details = self._format_error_message(row_error, row, i)
+                        
+                        # Create failed job item
+                        job_item = BulkUploadJobItem(
+                            job_id=job.id,
+                            row_number=i,
+                            food_name=row.get('name', 'Unknown'),
+                            status='failed',
+                            error_message=error_details,
+                            processed_at=datetime.utcnow()
+                        )
+                        db.session.add(job_item)
+                        job.processed_rows = i
+                        job.failed_rows += 1
+                
+                self.dedup.record_chunk(job.job_id, chunk, job.failed_rows - failed_before)
+                job.checkpoint_row = chunk_end
+                db.session.commit()
             
-            # Final job update
+            # Final job update (chunks become reusable at the catalog version the job left)
+            self.dedup.stamp_chunks(job.job_id)
             job.status = 'completed'
             job.completed_at = datetime.utcnow()
+            job.updated_at = job.completed_at
+            self._discard_spool(job)
             db.session.commit()
             
         except Exception as e:
+            db.session.rollback()
             job.status = 'failed'
             job.error_message = str(e)
             job.completed_at = datetime.utcnow()
+            job.updated_at = job.completed_at
+            self._discard_spool(job)
             db.session.commit()
             raise
     
@@ -508,6 +654,9 @@ class BulkUploadProcessor:
             'processed_rows': job.processed_rows,
             'successful_rows': job.successful_rows,
             'failed_rows': job.failed_rows,
+            'reused_rows': job.reused_rows or 0,
+            'checkpoint_row': job.checkpoint_row or 0,
+            'file_hash': job.file_hash,
             'progress_percentage': job.progress_percentage,
             'error_message': job.error_message,
             'created_at': job.created_at.isoformat(),
@@ -552,6 +701,9 @@ class BulkUploadProcessor:
             'processed_rows': job.processed_rows,
             'successful_rows': job.successful_rows,
             'failed_rows': job.failed_rows,
+            'reused_rows': job.reused_rows or 0,
+            'checkpoint_row': job.checkpoint_row or 0,
+            'file_hash': job.file_hash,
             'progress_percentage': job.progress_percentage,
             'error_message': job.error_message,
             'created_at': job.created_at.isoformat(),
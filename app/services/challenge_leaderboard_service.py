@@ -0,0 +1,153 @@
+"""
+Challenge Leaderboard Service
+
+Leaderboards are read from challenge_ranking, a copy of every participant's
+score kept current in the same transaction as UserChallenge.current_progress
+(by ChallengeProgressService and the UserChallenge after_flush hook). The
+(challenge_id, score DESC, user_challenge_id) index makes a user's rank a
+single range count and the top of a leaderboard a short index scan, so no
+viewer sorts all participants.
+
+Top-N lists are cached per process and tagged with the challenge's
+LeaderboardVersion. Writers only bump the version when a changed score is
+at or above the current N-th best score, so progress further down the table
+does not invalidate the cache.
+"""
+
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func, select
+
+from app import db
+from app.models import ChallengeRanking, LeaderboardVersion, User
+
+
+class ChallengeLeaderboardService:
+    """Maintains and reads precomputed challenge rankings."""
+
+    TOP_N = 10
+
+    _cache: Dict[int, Tuple[int, List[Dict[str, Any]]]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def record_scores(cls, connection, scores: Iterable[Dict[str, Any]]):
+        """
+        Apply score changes to the rankings and invalidate affected leaderboards.
+
+        Args:
+            connection: Connection of the transaction that changed the scores
+            scores: Dicts with uc_id, challenge_id, user_id, old and new; old is
+                None for a new participant and new is None for a removed one
+        """
+        scores = list(scores)
+        rankings = ChallengeRanking.__table__
+
+        added = [score for score in scores if score['old'] is None and score['new'] is not None]
+        removed = [score['uc_id'] for score in scores if score['new'] is None]
+        changed = [score for score in scores if score['old'] is not None and score['new'] is not None]
+
+        if added:
+            connection.execute(rankings.insert(), [
+                {'user_challenge_id': score['uc_id'], 'challenge_id': score['challenge_id'],
+                 'user_id': score['user_id'], 'score': score['new']}
+                for score in added
+            ])
+        if removed:
+            connection.execute(rankings.delete().where(rankings.c.user_challenge_id.in_(removed)))
+        if changed:
+            connection.execute(
+                rankings.update()
+                .where(rankings.c.user_challenge_id == bindparam('uc_id'))
+                .values(score=bindparam('new_score'), updated_at=datetime.utcnow()),
+                [{'uc_id': score['uc_id'], 'new_score': score['new']} for score in changed]
+            )
+
+        # Highest old/new score per challenge decides whether its top N moved
+        highest = {}
+        for score in scores:
+            value = max(value for value in (score['old'], score['new']) if value is not None)
+            highest[score['challenge_id']] = max(value, highest.get(score['challenge_id'], value))
+
+        stale = [
+            challenge_id for challenge_id, value in highest.items()
+            if cls._cutoff(connection, challenge_id) <= value
+        ]
+        if stale:
+            LeaderboardVersion.bump(connection, sorted(stale))
+
+    @classmethod
+    def _cutoff(cls, connection, challenge_id: int) -> float:
+        """Score of the N-th ranked participant (-inf while fewer than N take part)."""
+        rankings = ChallengeRanking.__table__
+        cutoff = connection.execute(
+            select(rankings.c.score)
+            .where(rankings.c.challenge_id == challenge_id)
+            .order_by(rankings.c.score.desc())
+            .offset(cls.TOP_N - 1).limit(1)
+        ).scalar()
+        return float('-inf') if cutoff is None else cutoff
+
+    @classmethod
+    def get_top(cls, challenge_id: int) -> List[Dict[str, Any]]:
+        """
+        Return the cached top-N entries of a challenge's leaderboard.
+
+        A single-row version lookup is issued per call; the entries are only
+        reloaded when the version has moved on.
+
+        Returns:
+            List of dicts with rank, user_id, username and score; tied scores
+            share a rank
+        """
+        version = LeaderboardVersion.current(challenge_id)
+        cached = cls._cache.get(challenge_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        rows = db.session.query(
+            ChallengeRanking.user_id, User.username, ChallengeRanking.score
+        ).join(
+            User, User.id == ChallengeRanking.user_id
+        ).filter(
+            ChallengeRanking.challenge_id == challenge_id
+        ).order_by(
+            ChallengeRanking.score.desc(), ChallengeRanking.user_challenge_id
+        ).limit(cls.TOP_N).all()
+
+        entries = []
+        for position, row in enumerate(rows, start=1):
+            rank = entries[-1]['rank'] if entries and entries[-1]['score'] == row.score else position
+            entries.append({'rank': rank, 'user_id': row.user_id, 'username': row.username, 'score': row.score})
+
+        with cls._lock:
+            cls._cache[challenge_id] = (version, entries)
+        return entries
+
+    @classmethod
+    def get_standing(cls, challenge_id: int, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Rank of a user's latest participation in a challenge.
+
+        Returns:
+            Dict with rank, score and participants, or None if the user has not joined
+        """
+        entry = db.session.query(ChallengeRanking.score).filter(
+            ChallengeRanking.challenge_id == challenge_id,
+            ChallengeRanking.user_id == user_id
+        ).order_by(ChallengeRanking.user_challenge_id.desc()).first()
+        if entry is None:
+            return None
+
+        participants = ChallengeRanking.query.filter_by(challenge_id=challenge_id)
+        ahead = participants.filter(ChallengeRanking.score > entry.score).with_entities(func.count()).scalar()
+        return {'rank': ahead + 1, 'score': entry.score,
+                'participants': participants.with_entities(func.count()).scalar()}
+
+    @classmethod
+    def invalidate(cls):
+        """Drop all cached leaderboards (e.g. between tests)."""
+        with cls._lock:
+            cls._cache.clear()
@@ -0,0 +1,258 @@
+"""
+Challenge Progress Service
+
+Computes UserChallenge.current_progress and completion for the supported
+challenge types:
+
+    protein   Days in the challenge window with total protein >= target_value
+    calories  Logged days in the window with total calories <= target_value
+    streak    Longest run of consecutive logged days in the window
+
+Protein and calorie challenges complete after duration_days qualifying days;
+streak challenges complete at target_value consecutive days (see
+Challenge.completion_target).
+
+The same evaluation runs in two modes. Batch mode (`flask
+evaluate-challenges`) covers every active participant. Incremental mode runs
+from the MealLog after_flush hook and is restricted to the users whose logs
+changed. Either way it is a fixed number of grouped aggregate queries, with
+no per-participant loop. Completion is a single conditional UPDATE guarded
+by is_completed, so a challenge is completed exactly once even when batch
+and incremental evaluation race. Changed scores are passed on to
+ChallengeLeaderboardService in the same transaction.
+
+When meal logs are sharded (app/utils/sharding.py) they cannot be joined to
+user_challenge, so step 2 reads each shard's daily totals for its
+participants and folds them in Python instead.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional, Union
+
+from sqlalchemy import Select, and_, bindparam, case, func, literal_column, or_, select, union_all
+
+from app import db
+from app.models import Challenge, UserChallenge
+from app.services.challenge_leaderboard_service import ChallengeLeaderboardService
+from app.utils.meal_log_archive import daily_totals
+from app.utils.sharding import jump_hash, scatter_all, shard_engines
+
+
+class ChallengeProgressService:
+    """Evaluates challenge progress with grouped aggregate queries."""
+
+    SUPPORTED_TYPES = ('protein', 'calories', 'streak')
+
+    # Challenges stay open for evaluation this long after end_date, so meals
+    # logged late for the last days still count
+    EXPIRY_GRACE_DAYS = 7
+
+    def evaluate(self, connection=None, user_ids: Optional[Union[Iterable[int], Select]] = None,
+                 today: Optional[date] = None, session=None) -> Dict[str, int]:
+        """
+        Recompute progress for active user challenges and mark completions.
+
+        Args:
+            connection: Connection to run on (defaults to the session's, which
+                is what the after_flush hook passes so updates join the
+                caller's transaction)
+            user_ids: Restrict evaluation to these users (incremental mode);
+                an iterable of IDs or a SELECT returning them (run on every
+                shard first when meal logs are sharded)
+            today: Evaluation date (defaults to date.today())
+            session: Session whose shard connections sharded meal logs are
+                read on (defaults to db.session; the after_flush hook passes
+                its own so the flushed logs are seen)
+
+        Returns:
+            Dict with evaluated, updated and completed counts
+        """
+        engines = shard_engines()
+        if engines and isinstance(user_ids, Select):
+            user_ids = {row[0] for row in scatter_all(user_ids)}
+        if user_ids is not None and not isinstance(user_ids, Select):
+            user_ids = list(user_ids)
+            if not user_ids:
+                return {'evaluated': 0, 'updated': 0, 'completed': 0}
+
+        own_session = connection is None
+        if own_session:
+            connection = db.session.connection()
+        today = today or date.today()
+
+        uc = UserChallenge.__table__
+        ch = Challenge.__table__
+        active = self._active_filter(uc, ch, user_ids, today)
+
+        # 1. Active participants and their stored progress
+        stored = {row.id: row for row in connection.execute(
+            select(uc.c.id, uc.c.challenge_id, uc.c.user_id, uc.c.current_progress, uc.c.start_date)
+            .select_from(uc.join(ch, ch.c.id == uc.c.challenge_id))
+            .where(active)
+        )}
+        if not stored:
+            return {'evaluated': 0, 'updated': 0, 'completed': 0}
+
+        # 2. Progress for every participant with at least one logged day
+        first_day = min(row.start_date for row in stored.values())
+        if engines:
+            progress = self._sharded_progress(connection, session or db.session, engines, uc, ch, active,
+                                              first_day, today)
+        else:
+            progress = dict(connection.execute(
+                self._progress_query(uc, ch, active, first_day, today, connection.dialect.name)
+            ).all())
+
+        # 3. Write back only what changed, and mirror it into the leaderboards
+        changes = [
+            {'uc_id': uc_id, 'challenge_id': row.challenge_id, 'user_id': row.user_id,
+             'old': row.current_progress or 0, 'new': float(progress.get(uc_id, 0))}
+            for uc_id, row in stored.items()
+            if float(progress.get(uc_id, 0)) != (row.current_progress or 0)
+        ]
+        if changes:
+            connection.execute(
+                uc.update().where(uc.c.id == bindparam('uc_id')).values(current_progress=bindparam('progress')),
+                [{'uc_id': change['uc_id'], 'progress': change['new']} for change in changes]
+            )
+            ChallengeLeaderboardService.record_scores(connection, changes)
+
+        # 4. Atomically complete everything that reached its target
+        completion_target = select(
+            case((ch.c.challenge_type == 'streak', ch.c.target_value), else_=ch.c.duration_days)
+        ).where(ch.c.id == uc.c.challenge_id).scalar_subquery()
+        completed = connection.execute(
+            uc.update()
+            .where(uc.c.id.in_(select(uc.c.id).select_from(uc.join(ch, ch.c.id == uc.c.challenge_id))
+                               .where(active)),
+                   uc.c.is_completed == False,  # noqa: E712
+                   uc.c.current_progress >= completion_target)
+            .values(is_completed=True, completed_at=datetime.utcnow())
+        ).rowcount
+
+        if own_session:
+            db.session.commit()
+
+        return {'evaluated': len(stored), 'updated': len(changes), 'completed': max(completed, 0)}
+
+    def _active_filter(self, uc, ch, user_ids, today):
+        conditions = [
+            uc.c.is_completed == False,  # noqa: E712
+            ch.c.is_active == True,  # noqa: E712
+            ch.c.challenge_type.in_(self.SUPPORTED_TYPES),
+            uc.c.start_date <= today,
+            or_(uc.c.end_date.is_(None), uc.c.end_date >= today - timedelta(days=self.EXPIRY_GRACE_DAYS))
+        ]
+        if user_ids is not None:
+            conditions.append(uc.c.user_id.in_(user_ids))
+        return and_(*conditions)
+
+    def _progress_query(self, uc, ch, active, first_day, today, dialect_name):
+        """
+        One statement returning (user_challenge_id, progress) rows.
+
+        Meal logs (and the daily totals of archived ones, when a window
+        starts before the archive cutoff) are grouped once into
+        per-participant daily totals; nutrient challenges count qualifying
+        days and streak challenges take the longest gaps-and-islands run of
+        consecutive days.
+        """
+        ml = daily_totals(first_day)
+        daily = select(
+            uc.c.id.label('uc_id'),
+            ch.c.challenge_type.label('challenge_type'),
+            ch.c.target_value.label('target_value'),
+            ml.c.date.label('day'),
+            func.coalesce(func.sum(ml.c.protein), 0).label('protein'),
+            func.coalesce(func.sum(ml.c.calories), 0).label('calories')
+        ).select_from(
+            uc.join(ch, ch.c.id == uc.c.challenge_id).join(ml, and_(
+                ml.c.user_id == uc.c.user_id,
+                ml.c.date >= uc.c.start_date,
+                ml.c.date <= today,
+                or_(uc.c.end_date.is_(None), ml.c.date < uc.c.end_date)
+            ))
+        ).where(active).group_by(
+            uc.c.id, ch.c.challenge_type, ch.c.target_value, ml.c.date
+        ).subquery()
+
+        qualifying_days = select(
+            daily.c.uc_id,
+            func.sum(case(
+                (and_(daily.c.challenge_type == 'protein', daily.c.protein >= daily.c.target_value), 1),
+                (and_(daily.c.challenge_type == 'calories', daily.c.calories > 0,
+                      daily.c.calories <= daily.c.target_value), 1),
+                else_=0
+            )).label('progress')
+        ).where(daily.c.challenge_type != 'streak').group_by(daily.c.uc_id)
+
+        # Consecutive days share the same (day number - row number)
+        islands = select(
+            daily.c.uc_id,
+            (_day_number(daily.c.day, dialect_name)
+             - func.row_number().over(partition_by=daily.c.uc_id, order_by=daily.c.day)).label('island')
+        ).where(daily.c.challenge_type == 'streak').subquery()
+        runs = select(
+            islands.c.uc_id, func.count().label('length')
+        ).group_by(islands.c.uc_id, islands.c.island).subquery()
+        longest_streak = select(runs.c.uc_id, func.max(runs.c.length)).group_by(runs.c.uc_id)
+
+        return union_all(qualifying_days, longest_streak)
+
+    def _sharded_progress(self, connection, session, engines, uc, ch, active, first_day, today):
+        """
+        {user_challenge_id: progress} from daily totals read on each shard.
+
+        Counts the same qualifying days and longest consecutive run as
+        _progress_query, for participants with at least one logged day.
+        """
+        windows = connection.execute(
+            select(uc.c.id, uc.c.user_id, uc.c.start_date, uc.c.end_date,
+                   ch.c.challenge_type, ch.c.target_value)
+            .select_from(uc.join(ch, ch.c.id == uc.c.challenge_id))
+            .where(active)
+        ).all()
+        users_by_shard = defaultdict(set)
+        for window in windows:
+            users_by_shard[jump_hash(window.user_id, len(engines))].add(window.user_id)
+
+        ml = daily_totals(first_day)
+        totals_by_user = defaultdict(dict)  # user_id -> {day: (protein, calories)}
+        for index, shard_user_ids in users_by_shard.items():
+            shard_connection = session.connection(bind_arguments={'bind': engines[index]})
+            for row in shard_connection.execute(
+                select(ml.c.user_id, ml.c.date,
+                       func.coalesce(func.sum(ml.c.protein), 0), func.coalesce(func.sum(ml.c.calories), 0))
+                .where(ml.c.user_id.in_(shard_user_ids), ml.c.date >= first_day, ml.c.date <= today)
+                .group_by(ml.c.user_id, ml.c.date)
+            ):
+                totals_by_user[row[0]][row[1]] = (row[2], row[3])
+
+        progress = {}
+        for window in windows:
+            totals = totals_by_user[window.user_id]
+            days = sorted(day for day in totals
+                          if day >= window.start_date and (window.end_date is None or day < window.end_date))
+            if not days:
+                continue
+            if window.challenge_type == 'streak':
+                longest = run = 0
+                for previous, day in zip([None] + days, days):
+                    run = run + 1 if previous is not None and (day - previous).days == 1 else 1
+                    longest = max(longest, run)
+                progress[window.id] = longest
+            elif window.target_value is None:
+                progress[window.id] = 0
+            elif window.challenge_type == 'protein':
+                progress[window.id] = sum(1 for day in days if totals[day][0] >= window.target_value)
+            else:
+                progress[window.id] = sum(1 for day in days if 0 < totals[day][1] <= window.target_value)
+        return progress
+
+
+def _day_number(column, dialect_name):
+    """Integer day number of a DATE column (for consecutive-day arithmetic)."""
+    if dialect_name == 'postgresql':
+        return column - literal_column("DATE '1970-01-01'")
+    return func.julianday(column)
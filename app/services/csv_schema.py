@@ -0,0 +1,270 @@
+"""
+CSV Schema Validation
+
+Upload CSVs are validated and converted in a single pass. A CsvSchema is a
+list of Column definitions; compiling it against a file's header yields one
+converter per column position, with its lookup tables (allowed values,
+lower-cased once) and error messages prepared up front. Each converter
+parses its raw cell exactly once and both records errors and returns the
+typed value, so there is no separate sanitization pass re-parsing the same
+fields.
+
+Rows are read with csv.reader (lists, not dicts); columns missing from the
+header are converted once at compile time. validate() streams a whole file
+and only keeps the first max_reported invalid rows, so a dry run over a
+million-row file runs in constant memory.
+"""
+
+import csv
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, TextIO, Tuple
+
+# Converter result for an empty optional string column: leave the key out
+OMIT = object()
+
+
+class Column:
+    """One CSV column: its type, constraints and the label used in error messages."""
+
+    def __init__(self, name: str, kind: str = 'string', required: bool = False, max_length: Optional[int] = None,
+                 choices: Optional[Iterable[str]] = None, label: Optional[str] = None, default: Any = OMIT):
+        """
+        Args:
+            name: Header name
+            kind: 'string' (whitespace collapsed) or 'number' (float)
+            required: An empty value is an error
+            max_length: Maximum length of the raw value (strings)
+            choices: Allowed values, compared case-insensitively (strings)
+            label: Name used in error messages (defaults to the header name)
+            default: Value for an empty cell (strings omit the key by default, numbers use 0.0)
+        """
+        self.name = name
+        self.kind = kind
+        self.required = required
+        self.max_length = max_length
+        self.choices = tuple(choices) if choices is not None else None
+        self.label = label or name
+        self.default = 0.0 if kind == 'number' and default is OMIT else default
+
+    def compile(self) -> Callable[[str, List[str]], Any]:
+        """Build the converter: fn(raw, errors) returns the value and appends any errors."""
+        if self.kind == 'number':
+            return self._compile_number()
+        return self._compile_string()
+
+    def compile_check(self) -> Optional[Callable[[str, List[str]], None]]:
+        """
+        Build a validation-only check for a string column: fn(raw, errors).
+
+        Skips building the converted value where it can. Returns None if the
+        column has no constraints (number columns are checked by CompiledSchema).
+        """
+        if self.kind == 'number' or not (self.required or self.max_length or self.choices):
+            return None
+
+        max_length = self.max_length
+        required_error = f"{self.label} is required" if self.required else None
+        length_error = f"{self.label} too long (max {max_length} characters)" if max_length else None
+        allowed = frozenset(choice.lower() for choice in self.choices) if self.choices else None
+        allowed_as_written = allowed | frozenset(self.choices) if allowed is not None else None
+        unsupported = f"Unsupported {self.label.lower()}: "
+
+        def check(raw, errors):
+            if not raw or raw.isspace():
+                if required_error:
+                    errors.append(required_error)
+                return
+            if max_length and len(raw) > max_length:
+                errors.append(length_error)
+            if allowed is not None and raw not in allowed_as_written \
+                    and ' '.join(raw.split()).lower() not in allowed:
+                errors.append(unsupported + raw)
+
+        return check
+
+    def _compile_number(self):
+        name, default = self.name, self.default
+
+        def convert(raw, errors):
+            try:
+                return float(raw)  # float() ignores surrounding whitespace
+            except ValueError:
+                value = raw.strip()
+                if value:
+                    errors.append(f"Invalid numeric value for {name}: {value}")
+                return default
+
+        return convert
+
+    def _compile_string(self):
+        default, max_length = self.default, self.max_length
+        required_error = f"{self.label} is required" if self.required else None
+        length_error = f"{self.label} too long (max {max_length} characters)" if max_length else None
+        allowed = frozenset(choice.lower() for choice in self.choices) if self.choices else None
+        unsupported = f"Unsupported {self.label.lower()}: "
+
+        def convert(raw, errors):
+            value = ' '.join(raw.split())
+            if not value:
+                if required_error:
+                    errors.append(required_error)
+                return default
+            if max_length and len(raw) > max_length:
+                errors.append(length_error)
+            if allowed is not None and value.lower() not in allowed:
+                errors.append(unsupported + raw)
+            return value
+
+        return convert
+
+
+class CompiledSchema:
+    """A CsvSchema bound to the column positions of one header row."""
+
+    def __init__(self, columns: Sequence[Column], headers: Sequence[str], required_headers: Sequence[str]):
+        self.headers = list(headers)
+        self.missing_headers = [name for name in required_headers if name not in self.headers]
+        positions = {name: index for index, name in reversed(list(enumerate(self.headers)))}
+
+        self._converters = []
+        self._constants: Dict[str, Any] = {}
+        self._constant_errors: List[str] = []
+        # Numeric columns are converted together with one float() per cell;
+        # only a row with an empty or invalid number goes through their converters
+        self._number_names: List[str] = []
+        self._number_indexes: List[int] = []
+        self._number_converters = []
+        self._checks = []
+        for column in columns:
+            convert = column.compile()
+            if column.name not in positions:
+                value = convert('', self._constant_errors)
+                if value is not OMIT:
+                    self._constants[column.name] = value
+            elif column.kind == 'number':
+                self._number_names.append(column.name)
+                self._number_indexes.append(positions[column.name])
+                self._number_converters.append(convert)
+            else:
+                self._converters.append((positions[column.name], column.name, convert))
+                check = column.compile_check()
+                if check is not None:
+                    self._checks.append((positions[column.name], check))
+        self._width = max(positions.values(), default=-1) + 1
+
+    def convert(self, values: Sequence[str]) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Validate and convert one row.
+
+        Args:
+            values: Raw cells in header order
+
+        Returns:
+            (converted values by column name, error messages)
+        """
+        if len(values) < self._width:
+            values = list(values) + [''] * (self._width - len(values))
+        data = dict(self._constants)
+        errors = list(self._constant_errors)
+        for index, name, convert in self._converters:
+            value = convert(values[index], errors)
+            if value is not OMIT:
+                data[name] = value
+
+        try:
+            numbers = [float(values[index]) for index in self._number_indexes]
+        except ValueError:
+            numbers = [convert(values[index], errors)
+                       for index, convert in zip(self._number_indexes, self._number_converters)]
+        data.update(zip(self._number_names, numbers))
+        return data, errors
+
+    def check(self, values: Sequence[str]) -> List[str]:
+        """Errors convert() would report for a row, without building the converted values."""
+        if len(values) < self._width:
+            values = list(values) + [''] * (self._width - len(values))
+        errors = list(self._constant_errors)
+        for index, check in self._checks:
+            check(values[index], errors)
+        try:
+            for index in self._number_indexes:
+                float(values[index])
+        except ValueError:
+            for index, convert in zip(self._number_indexes, self._number_converters):
+                convert(values[index], errors)
+        return errors
+
+
+class CsvSchema:
+    """Column definitions for one kind of upload CSV."""
+
+    def __init__(self, columns: Sequence[Column], required_headers: Sequence[str] = ()):
+        """
+        Args:
+            columns: Columns to validate and convert (others are ignored)
+            required_headers: Headers that must be present
+        """
+        self.columns = list(columns)
+        self.required_headers = list(required_headers)
+        self._compiled: Dict[Tuple[str, ...], CompiledSchema] = {}
+
+    def compile(self, headers: Sequence[str]) -> CompiledSchema:
+        """Compile converters for a header row (cached per header)."""
+        key = tuple(headers)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            compiled = self._compiled[key] = CompiledSchema(self.columns, key, self.required_headers)
+        return compiled
+
+    def convert_mapping(self, row: Dict[str, Optional[str]]) -> Tuple[Dict[str, Any], List[str]]:
+        """Validate and convert a csv.DictReader row."""
+        compiled = self.compile([key for key in row if isinstance(key, str)])
+        return compiled.convert([row[key] or '' for key in compiled.headers])
+
+    def validate(self, stream: TextIO, max_reported: int = 10) -> Dict[str, Any]:
+        """
+        Validate a whole CSV file.
+
+        Args:
+            stream: Text stream positioned at the header row
+            max_reported: Invalid rows to include in the result (all are counted)
+
+        Returns:
+            Dict with is_valid, row_count, headers, missing_headers,
+            invalid_rows (row number, errors and raw values), total_invalid
+            and total_errors
+        """
+        reader = csv.reader(stream)
+        compiled = self.compile(next(reader, None) or [])
+        result = {
+            'is_valid': False,
+            'row_count': 0,
+            'headers': compiled.headers,
+            'missing_headers': compiled.missing_headers,
+            'invalid_rows': [],
+            'total_invalid': 0,
+            'total_errors': 0
+        }
+        if compiled.missing_headers:
+            return result
+
+        check = compiled.check
+        invalid_rows = result['invalid_rows']
+        row_count = total_invalid = total_errors = 0
+        for values in reader:
+            if not values:
+                continue  # Blank line (csv.DictReader skips these too)
+            row_count += 1
+            errors = check(values)
+            if errors:
+                total_invalid += 1
+                total_errors += len(errors)
+                if len(invalid_rows) < max_reported:
+                    invalid_rows.append({
+                        'row': row_count,
+                        'errors': errors,
+                        'data': dict(zip(compiled.headers, values))
+                    })
+
+        result.update(is_valid=row_count > 0 and total_invalid == 0, row_count=row_count,
+                      total_invalid=total_invalid, total_errors=total_errors)
+        return result
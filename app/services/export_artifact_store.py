@@ -0,0 +1,270 @@
+"""
+Export Artifact Store
+
+Content-addressed reuse of export files. Every export request is keyed by
+a SHA-256 of (export type, normalized filters, catalog version). When a
+completed ExportArtifact with that key exists, the request is answered with
+a new ExportJob pointing at the same file instead of re-querying the
+catalog; an identical export that is still running is returned as-is.
+
+Artifacts are reference counted by the jobs that point at them. Expiring a
+job releases its reference, and a file is only deleted once no unexpired job
+refers to it. Reference changes are conditional UPDATEs, so a request that
+reuses an artifact and a cleanup that deletes it cannot both succeed.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select
+
+from app import db
+from app.models import CatalogVersion, ExportArtifact, ExportJob
+
+
+class ExportArtifactStore:
+    """Looks up, publishes and releases shared export files."""
+
+    # Expired jobs / unreferenced artifacts handled per transaction
+    BATCH_SIZE = 500
+
+    @staticmethod
+    def normalize_filters(filters: Optional[Dict[str, Any]]) -> str:
+        """Canonical JSON for a filter dict (sorted keys, empty values dropped)."""
+        cleaned = {key: value for key, value in (filters or {}).items() if value is not None and value != ''}
+        return json.dumps(cleaned, sort_keys=True, separators=(',', ':'), default=str)
+
+    @classmethod
+    def content_key(cls, export_type: str, filters: Optional[Dict[str, Any]],
+                    catalog_version: Optional[int] = None) -> str:
+        """
+        Hash identifying the content of an export.
+
+        Args:
+            export_type: ExportJob.export_type ('csv', 'servings_json', ...)
+            filters: Filter criteria as passed to start_export
+            catalog_version: Catalog version (defaults to the current one)
+        """
+        if catalog_version is None:
+            catalog_version = CatalogVersion.current()
+        payload = f'{export_type}\n{cls.normalize_filters(filters)}\n{catalog_version}'
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def reads_keyed_catalog(cls, job: ExportJob, filters: Optional[Dict[str, Any]], session) -> bool:
+        """
+        Whether a session sees the catalog version the job's content key was made from.
+
+        A lagging read replica does not; exporting from it would store stale
+        data under the new key.
+        """
+        if not job.content_key:
+            return True
+        return cls.content_key(job.export_type, filters, CatalogVersion.current(session)) == job.content_key
+
+    @classmethod
+    def find_existing(cls, export_type: str, filters: Optional[Dict[str, Any]], content_key: str,
+                      user_id: int) -> Optional[ExportJob]:
+        """
+        Answer an export request from an existing result, if there is one.
+
+        Args:
+            export_type: Requested export type
+            filters: Requested filters (stored on the new job)
+            content_key: Key from content_key()
+            user_id: ID of the requesting user
+
+        Returns:
+            A new, already completed job sharing a stored artifact; the
+            pending or processing job for the same key; or None
+        """
+        artifact = ExportArtifact.query.filter_by(content_key=content_key).first()
+        if artifact is not None and os.path.exists(artifact.file_path) and cls._acquire(artifact.id):
+            now = datetime.utcnow()
+            job = ExportJob(
+                export_type=export_type,
+                filter_criteria=json.dumps(filters or {}),
+                created_by=user_id,
+                status='completed',
+                content_key=content_key,
+                started_at=now,
+                completed_at=now
+            )
+            cls._attach(job, artifact)
+            db.session.add(job)
+            db.session.commit()
+            return job
+
+        return ExportJob.query.filter(
+            ExportJob.content_key == content_key,
+            ExportJob.status.in_(('pending', 'processing'))
+        ).order_by(ExportJob.id).first()
+
+    @classmethod
+    def publish(cls, job: ExportJob, file_path: str, filename: str, total_records: int):
+        """
+        Attach a freshly written export file to its job.
+
+        If an identical artifact was published while this job ran, the new
+        file is discarded and the job shares the existing one. The caller
+        commits.
+
+        Args:
+            job: Job that produced the file
+            file_path: Path of the written file
+            filename: Download name
+            total_records: Number of exported records
+        """
+        if job.content_key is None:
+            # Job queued before content keys existed: keep the file to itself
+            job.filename = filename
+            job.file_path = file_path
+            job.file_size = os.path.getsize(file_path)
+            job.total_records = total_records
+            return
+
+        existing = ExportArtifact.query.filter_by(content_key=job.content_key).first()
+        if existing is not None and os.path.exists(existing.file_path) and cls._acquire(existing.id):
+            if existing.file_path != file_path:
+                os.remove(file_path)
+            artifact = existing
+        else:
+            if existing is not None:
+                # Unreferenced or missing its file: replace it
+                cls._delete_if_unreferenced(existing.id, force=True)
+            artifact = ExportArtifact(
+                content_key=job.content_key,
+                export_type=job.export_type,
+                filename=filename,
+                file_path=file_path,
+                file_size=os.path.getsize(file_path),
+                total_records=total_records,
+                ref_count=1
+            )
+            db.session.add(artifact)
+            db.session.flush()
+        cls._attach(job, artifact)
+
+    @classmethod
+    def release_expired(cls, batch_size: Optional[int] = None) -> Dict[str, int]:
+        """
+        Expire completed jobs past expires_at and delete unreferenced files.
+
+        Jobs and artifacts are processed batch_size at a time, each batch in
+        its own transaction, so a large backlog never holds one long write
+        lock or loads every expired job at once.
+
+        Args:
+            batch_size: Rows per transaction (default BATCH_SIZE)
+
+        Returns:
+            Counts of expired 'jobs', deleted 'files' and reclaimed 'bytes'
+        """
+        batch_size = batch_size or cls.BATCH_SIZE
+        result = {'jobs': 0, 'files': 0, 'bytes': 0}
+        table = ExportArtifact.__table__
+
+        while True:
+            expired_jobs = ExportJob.query.filter(
+                ExportJob.expires_at < datetime.utcnow(),
+                ExportJob.status == 'completed'
+            ).order_by(ExportJob.id).limit(batch_size).all()
+            for job in expired_jobs:
+                if job.artifact_id is not None:
+                    db.session.execute(
+                        table.update().where(table.c.id == job.artifact_id).values(ref_count=table.c.ref_count - 1)
+                    )
+                else:
+                    # Export written before artifacts were shared
+                    cls._count_removed(result, cls.remove_file(job.file_path))
+                job.status = 'expired'
+                job.file_path = None
+            db.session.commit()
+            result['jobs'] += len(expired_jobs)
+            if len(expired_jobs) < batch_size:
+                break
+
+        while True:
+            unreferenced = db.session.execute(
+                select(table.c.id).where(table.c.ref_count <= 0).order_by(table.c.id).limit(batch_size)
+            ).scalars().all()
+            for artifact_id in unreferenced:
+                cls._count_removed(result, cls._delete_if_unreferenced(artifact_id))
+            db.session.commit()
+            if len(unreferenced) < batch_size:
+                break
+        return result
+
+    @classmethod
+    def evict(cls, artifact_id: int) -> Optional[int]:
+        """
+        Expire every job sharing an artifact and delete it, even if still referenced.
+
+        Used to enforce the export disk quota. The caller commits.
+
+        Returns:
+            Bytes freed, or None if no file was removed
+        """
+        jobs = ExportJob.__table__
+        db.session.execute(
+            jobs.update()
+            .where(jobs.c.artifact_id == artifact_id, jobs.c.status == 'completed')
+            .values(status='expired', file_path=None)
+        )
+        return cls._delete_if_unreferenced(artifact_id, force=True)
+
+    @staticmethod
+    def _count_removed(result: Dict[str, int], freed: Optional[int]):
+        if freed is not None:
+            result['files'] += 1
+            result['bytes'] += freed
+
+    @staticmethod
+    def remove_file(file_path: Optional[str]) -> Optional[int]:
+        """Delete a file; returns its size, or None if it was not removed."""
+        if not file_path or not os.path.exists(file_path):
+            return None
+        try:
+            size = os.path.getsize(file_path)
+            os.remove(file_path)
+            return size
+        except OSError:
+            return None  # File might be in use or already deleted
+
+    @staticmethod
+    def _attach(job: ExportJob, artifact: ExportArtifact):
+        job.artifact_id = artifact.id
+        job.filename = artifact.filename
+        job.file_path = artifact.file_path
+        job.file_size = artifact.file_size
+        job.total_records = artifact.total_records
+
+    @staticmethod
+    def _acquire(artifact_id: int) -> bool:
+        """Take a reference unless the artifact is already unreferenced (and about to go)."""
+        table = ExportArtifact.__table__
+        return db.session.execute(
+            table.update()
+            .where(table.c.id == artifact_id, table.c.ref_count > 0)
+            .values(ref_count=table.c.ref_count + 1, last_used_at=datetime.utcnow())
+        ).rowcount == 1
+
+    @classmethod
+    def _delete_if_unreferenced(cls, artifact_id: int, force: bool = False) -> Optional[int]:
+        """Delete an artifact row and its file if nothing references it; returns bytes freed."""
+        table = ExportArtifact.__table__
+        file_path = db.session.execute(select(table.c.file_path).where(table.c.id == artifact_id)).scalar()
+        condition = [table.c.id == artifact_id]
+        if not force:
+            condition.append(table.c.ref_count <= 0)
+        if db.session.execute(table.delete().where(*condition)).rowcount != 1:
+            return None
+        db.session.execute(
+            ExportJob.__table__.update()
+            .where(ExportJob.__table__.c.artifact_id == artifact_id)
+            .values(artifact_id=None)
+        )
+        return cls.remove_file(file_path)
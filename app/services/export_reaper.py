@@ -0,0 +1,238 @@
+"""
+Export Reaper
+
+Keeps instance/exports bounded. Each run:
+
+1. expires completed jobs past expires_at and deletes files that no
+   unexpired job refers to (ExportArtifactStore.release_expired, in batches);
+2. if the directory is still over EXPORT_DISK_QUOTA_MB, evicts the least
+   recently used artifacts and pre-artifact job files, oldest first, and
+   expires the jobs that point at them;
+3. deletes orphan files that no ExportArtifact or ExportJob refers to (left
+   behind by a crashed worker or a failed export) once they are older than
+   EXPORT_ORPHAN_GRACE.
+
+create_app starts it in a daemon thread every EXPORT_REAPER_INTERVAL
+seconds; it also runs from `flask reap-exports` and the admin cleanup
+button. Deletions are conditional, so runs in several gunicorn workers at
+once are safe. Each run returns its metrics (files deleted, bytes
+reclaimed, disk usage) and adds them to per-process totals.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import select
+
+from app import db
+from app.models import ExportArtifact, ExportJob
+from app.services.export_artifact_store import ExportArtifactStore
+
+
+class ExportReaper:
+    """Batched cleanup and disk-quota enforcement for export files."""
+
+    # Jobs, artifacts or files handled per transaction
+    BATCH_SIZE = 200
+
+    _totals_lock = threading.Lock()
+    _totals = {'runs': 0, 'jobs_expired': 0, 'files_deleted': 0, 'bytes_reclaimed': 0}
+
+    def __init__(self, export_directory: Optional[str] = None, quota_bytes: Optional[int] = None,
+                 orphan_grace: Optional[int] = None, batch_size: Optional[int] = None):
+        """
+        Args:
+            export_directory: Directory holding export files (default instance/exports)
+            quota_bytes: Disk quota, 0 for none (default EXPORT_DISK_QUOTA_MB)
+            orphan_grace: Minimum age in seconds of an orphan file before deletion
+            batch_size: Rows per transaction
+        """
+        config = current_app.config
+        self.export_directory = export_directory or os.path.join(current_app.instance_path, 'exports')
+        if quota_bytes is None:
+            quota_bytes = config.get('EXPORT_DISK_QUOTA_MB', 0) * 1024 * 1024
+        self.quota_bytes = quota_bytes
+        self.orphan_grace = config.get('EXPORT_ORPHAN_GRACE', 3600) if orphan_grace is None else orphan_grace
+        self.batch_size = batch_size or self.BATCH_SIZE
+
+    @classmethod
+    def totals(cls) -> Dict[str, int]:
+        """Cumulative metrics of all runs in this process."""
+        with cls._totals_lock:
+            return dict(cls._totals)
+
+    def run(self) -> Dict[str, int]:
+        """
+        Expire, enforce the quota and remove orphans.
+
+        Returns:
+            Metrics: jobs_expired, files_deleted, bytes_reclaimed, evicted,
+            orphans, disk_usage (bytes after the run) and duration_ms
+        """
+        started = time.perf_counter()
+        expired = ExportArtifactStore.release_expired(self.batch_size)
+        evicted = self.enforce_quota()
+        orphans = self.remove_orphans()
+
+        metrics = {
+            'jobs_expired': expired['jobs'],
+            'files_deleted': expired['files'] + evicted['files'] + orphans['files'],
+            'bytes_reclaimed': expired['bytes'] + evicted['bytes'] + orphans['bytes'],
+            'evicted': evicted['files'],
+            'orphans': orphans['files'],
+            'disk_usage': self.disk_usage(),
+            'duration_ms': int((time.perf_counter() - started) * 1000)
+        }
+        with self._totals_lock:
+            self._totals['runs'] += 1
+            for key in ('jobs_expired', 'files_deleted', 'bytes_reclaimed'):
+                self._totals[key] += metrics[key]
+
+        current_app.logger.info('Export reaper: ' + ' '.join(f'{key}={value}' for key, value in metrics.items()))
+        return metrics
+
+    def disk_usage(self) -> int:
+        """Total size in bytes of the files in the export directory."""
+        if not os.path.isdir(self.export_directory):
+            return 0
+        total = 0
+        with os.scandir(self.export_directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        total += entry.stat().st_size
+                except OSError:
+                    pass  # Deleted while scanning
+        return total
+
+    def enforce_quota(self) -> Dict[str, int]:
+        """
+        Evict the oldest exports until the directory fits the quota.
+
+        Returns:
+            Counts of evicted 'files' and reclaimed 'bytes'
+        """
+        result = {'files': 0, 'bytes': 0}
+        if not self.quota_bytes:
+            return result
+
+        usage = self.disk_usage()
+        while usage > self.quota_bytes:
+            candidates = self._eviction_candidates()
+            if not candidates:
+                break
+            for _, kind, candidate_id in candidates:
+                if usage <= self.quota_bytes:
+                    break
+                if kind == 'artifact':
+                    freed = ExportArtifactStore.evict(candidate_id)
+                else:
+                    freed = self._expire_job_file(candidate_id)
+                if freed is not None:
+                    result['files'] += 1
+                    result['bytes'] += freed
+                    usage -= freed
+            db.session.commit()
+        return result
+
+    def remove_orphans(self) -> Dict[str, int]:
+        """
+        Delete files in the export directory that no artifact or job refers to.
+
+        Files of pending or processing jobs (named after their job_id) and
+        files younger than orphan_grace are left alone.
+
+        Returns:
+            Counts of deleted 'files' and reclaimed 'bytes'
+        """
+        result = {'files': 0, 'bytes': 0}
+        if not os.path.isdir(self.export_directory):
+            return result
+
+        referenced = {os.path.abspath(path) for path in db.session.execute(
+            select(ExportArtifact.file_path)
+        ).scalars()}
+        referenced.update(os.path.abspath(path) for path in db.session.execute(
+            select(ExportJob.file_path).where(ExportJob.file_path.isnot(None))
+        ).scalars())
+        in_flight = tuple(f'{job_id}_' for job_id in db.session.execute(
+            select(ExportJob.job_id).where(ExportJob.status.in_(('pending', 'processing')))
+        ).scalars())
+
+        cutoff = time.time() - self.orphan_grace
+        with os.scandir(self.export_directory) as entries:
+            for entry in entries:
+                try:
+                    if (not entry.is_file() or os.path.abspath(entry.path) in referenced
+                            or entry.name.startswith(in_flight) or entry.stat().st_mtime > cutoff):
+                        continue
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                except OSError:
+                    continue  # Removed or replaced concurrently
+                result['files'] += 1
+                result['bytes'] += size
+        return result
+
+    def _eviction_candidates(self) -> List[Tuple[datetime, str, int]]:
+        """Oldest artifacts and pre-artifact job files, merged by last use."""
+        artifacts = db.session.execute(
+            select(ExportArtifact.last_used_at, ExportArtifact.id)
+            .order_by(ExportArtifact.last_used_at, ExportArtifact.id)
+            .limit(self.batch_size)
+        ).all()
+        legacy_jobs = db.session.execute(
+            select(ExportJob.completed_at, ExportJob.id)
+            .where(ExportJob.status == 'completed', ExportJob.artifact_id.is_(None),
+                   ExportJob.file_path.isnot(None))
+            .order_by(ExportJob.completed_at, ExportJob.id)
+            .limit(self.batch_size)
+        ).all()
+
+        candidates = [(used_at or datetime.min, 'artifact', artifact_id) for used_at, artifact_id in artifacts]
+        candidates += [(completed_at or datetime.min, 'job', job_id) for completed_at, job_id in legacy_jobs]
+        candidates.sort()
+        return candidates[:self.batch_size]
+
+    @staticmethod
+    def _expire_job_file(job_id: int) -> Optional[int]:
+        job = db.session.get(ExportJob, job_id)
+        file_path = job.file_path
+        job.status = 'expired'
+        job.file_path = None
+        return ExportArtifactStore.remove_file(file_path)
+
+    @classmethod
+    def start_scheduler(cls, app) -> Optional[threading.Thread]:
+        """
+        Run the reaper every EXPORT_REAPER_INTERVAL seconds in a daemon thread.
+
+        Does nothing if the interval is 0 or the app already has a scheduler.
+
+        Returns:
+            The started thread, or None
+        """
+        interval = app.config.get('EXPORT_REAPER_INTERVAL', 0)
+        if interval <= 0 or 'export_reaper' in app.extensions:
+            return None
+
+        stop = threading.Event()
+        app.extensions['export_reaper'] = stop
+        thread = threading.Thread(target=cls._run_periodically, args=(app, interval, stop),
+                                  name='export-reaper', daemon=True)
+        thread.start()
+        return thread
+
+    @classmethod
+    def _run_periodically(cls, app, interval: int, stop: threading.Event):
+        while not stop.wait(interval):
+            with app.app_context():
+                try:
+                    cls().run()
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error(f'Export reaper failed: {str(e)}', exc_info=True)
@@ -0,0 +1,261 @@
+"""
+Near-Duplicate Food Detection
+
+Bulk uploads only reject exact (name, brand) repeats, so the catalog
+collects variants such as "Moong Dal (cooked)" and "Moong dal cooked".
+This service finds them without comparing every pair of foods:
+
+1. Each name is normalized (NFKC, case-folded, punctuation dropped, tokens
+   sorted) and split into character trigrams.
+2. A MinHash signature of the trigram set is computed for every food with
+   vectorized NumPy hashing (SIGNATURE_SIZE hash functions).
+3. Signatures are cut into LSH_BANDS bands; foods of the same brand whose
+   band values collide in any band become candidate pairs. This is a sort
+   per band, so the work grows near-linearly with the catalog.
+4. Candidates are confirmed with the exact trigram Jaccard similarity and
+   linked into clusters with union-find.
+
+The confirmed pairs are cached per catalog version, so the admin review page
+only re-clusters them for the requested threshold.
+"""
+
+import re
+import threading
+import unicodedata
+import zlib
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app import db
+from app.models import CatalogVersion, Food
+
+
+class _CrcCache(dict):
+    """CRC32 of strings, computed on first lookup."""
+
+    def __missing__(self, text):
+        value = self[text] = zlib.crc32(text.encode('utf-8'))
+        return value
+
+
+class DuplicateCluster(NamedTuple):
+    """Foods that are likely the same item."""
+    food_ids: Tuple[int, ...]
+    similarity: float  # Lowest similarity among the pairs linking the cluster
+
+
+class DuplicateIndex:
+    """Confirmed near-duplicate pairs for one catalog version."""
+
+    def __init__(self, version: int, food_count: int, pairs: List[Tuple[float, int, int]]):
+        self.version = version
+        self.food_count = food_count
+        self.pairs = sorted(pairs, reverse=True)  # (similarity, food_id, food_id), most similar first
+
+    def clusters(self, threshold: float) -> List[DuplicateCluster]:
+        """
+        Group foods linked by pairs at or above threshold.
+
+        Returns:
+            Clusters ordered by similarity, then size
+        """
+        parent: Dict[int, int] = {}
+
+        def find(food_id):
+            root = food_id
+            while parent[root] != root:
+                root = parent[root]
+            while food_id != root:
+                parent[food_id], food_id = root, parent[food_id]
+            return root
+
+        weakest: Dict[int, float] = {}
+        for similarity, a, b in self.pairs:
+            if similarity < threshold:
+                break  # Pairs are sorted, the rest are weaker
+            parent.setdefault(a, a)
+            parent.setdefault(b, b)
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parent[root_b] = root_a
+                weakest.pop(root_b, None)
+                weakest[root_a] = similarity  # No stronger than any earlier link
+
+        members: Dict[int, List[int]] = {}
+        for food_id in parent:
+            members.setdefault(find(food_id), []).append(food_id)
+        clusters = [DuplicateCluster(tuple(sorted(ids)), weakest[root]) for root, ids in members.items()]
+        clusters.sort(key=lambda cluster: (-cluster.similarity, -len(cluster.food_ids), cluster.food_ids))
+        return clusters
+
+
+class FoodDuplicateDetector:
+    """Finds likely duplicate foods with MinHash signatures and LSH."""
+
+    SIGNATURE_SIZE = 60
+    LSH_BANDS = 20  # 3 rows per band: pairs above ~0.4 similarity nearly always collide
+
+    # Lowest similarity kept in the index; the review page can filter above it
+    MIN_SIMILARITY = 0.4
+    DEFAULT_THRESHOLD = 0.7
+
+    # Larger LSH buckets are linked to their first member instead of pairwise
+    PAIRWISE_BUCKET_SIZE = 8
+
+    # Foods hashed per NumPy batch
+    BATCH_SIZE = 4096
+
+    _PRIME = (1 << 31) - 1
+    _rng = np.random.default_rng(20240611)
+    _A = _rng.integers(1, _PRIME, SIGNATURE_SIZE, dtype=np.uint64)[:, None]
+    _B = _rng.integers(0, _PRIME, SIGNATURE_SIZE, dtype=np.uint64)[:, None]
+
+    _NON_WORD = re.compile(r'[\W_]+')
+
+    _index: Optional[DuplicateIndex] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def normalize(cls, text: Optional[str]) -> str:
+        """Order-insensitive canonical form: "Moong Dal (cooked)" -> "cooked dal moong"."""
+        if not text:
+            return ''
+        text = unicodedata.normalize('NFKC', text).casefold()
+        return ' '.join(sorted(cls._NON_WORD.sub(' ', text).split()))
+
+    @staticmethod
+    def shingles(key: str) -> FrozenSet[str]:
+        """Character trigrams of a normalized key, padded so short words count."""
+        padded = f' {key} '
+        return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    @staticmethod
+    def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+        return len(a & b) / len(a | b) if a or b else 1.0
+
+    @classmethod
+    def signatures(cls, shingle_sets: Sequence[FrozenSet[str]]) -> np.ndarray:
+        """
+        MinHash signatures, one row per (non-empty) shingle set.
+
+        Each trigram is hashed once with CRC32; the SIGNATURE_SIZE hash
+        functions are (a * x + b) mod p applied to a whole batch at once,
+        and np.minimum.reduceat takes the per-food minimum.
+        """
+        result = np.empty((len(shingle_sets), cls.SIGNATURE_SIZE), dtype=np.uint32)
+        crc = _CrcCache()  # Names share most trigrams; hash each distinct one once
+        for start in range(0, len(shingle_sets), cls.BATCH_SIZE):
+            batch = shingle_sets[start:start + cls.BATCH_SIZE]
+            lengths = np.fromiter((len(s) for s in batch), dtype=np.int64, count=len(batch))
+            hashes = np.fromiter((crc[shingle] for s in batch for shingle in s),
+                                 dtype=np.uint64, count=int(lengths.sum()))
+            hashes %= cls._PRIME
+            permuted = (cls._A * hashes + cls._B) % cls._PRIME
+            offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            result[start:start + len(batch)] = np.minimum.reduceat(permuted, offsets, axis=1).T
+        return result
+
+    @classmethod
+    def candidate_pairs(cls, signatures: np.ndarray, groups: np.ndarray) -> Iterable[Tuple[int, int]]:
+        """
+        Row pairs that share a group and collide in at least one LSH band.
+
+        Args:
+            signatures: MinHash signatures (rows x SIGNATURE_SIZE)
+            groups: One integer per row; only rows in the same group are paired (e.g. a brand hash)
+
+        Yields:
+            (row, row) index pairs, possibly repeated across bands
+        """
+        rows_per_band = cls.SIGNATURE_SIZE // cls.LSH_BANDS
+        multipliers = np.array([0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F][:rows_per_band], dtype=np.uint64)
+        for band in range(cls.LSH_BANDS):
+            columns = signatures[:, band * rows_per_band:(band + 1) * rows_per_band].astype(np.uint64)
+            keys = (columns * multipliers).sum(axis=1) ^ (groups.astype(np.uint64) << np.uint64(32))
+            order = np.argsort(keys, kind='stable')
+            sorted_keys = keys[order]
+            boundaries = np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+            starts = np.concatenate(([0], boundaries))
+            ends = np.concatenate((boundaries, [len(keys)]))
+            for start, end in zip(starts[ends - starts > 1], ends[ends - starts > 1]):
+                bucket = order[start:end].tolist()
+                if len(bucket) <= cls.PAIRWISE_BUCKET_SIZE:
+                    for i, a in enumerate(bucket):
+                        for b in bucket[i + 1:]:
+                            yield a, b
+                else:
+                    head = bucket[0]
+                    for b in bucket[1:]:
+                        yield head, b
+
+    @classmethod
+    def build_index(cls, foods: Iterable[Tuple[int, str, Optional[str]]], version: int = 0) -> DuplicateIndex:
+        """
+        Find near-duplicate pairs among (id, name, brand) rows.
+
+        Foods are only compared within the same normalized brand.
+        """
+        food_ids: List[int] = []
+        brands: List[int] = []
+        shingle_sets: List[FrozenSet[str]] = []
+        food_count = 0
+        for food_id, name, brand in foods:
+            food_count += 1
+            key = cls.normalize(name)
+            if not key:
+                continue
+            food_ids.append(food_id)
+            brands.append(zlib.crc32(cls.normalize(brand).encode('utf-8')))
+            shingle_sets.append(cls.shingles(key))
+
+        pairs: Dict[Tuple[int, int], float] = {}
+        if len(food_ids) > 1:
+            signatures = cls.signatures(shingle_sets)
+            for a, b in cls.candidate_pairs(signatures, np.array(brands, dtype=np.uint64)):
+                if brands[a] != brands[b]:
+                    continue  # Band keys of different brands can collide
+                pair = (food_ids[a], food_ids[b]) if food_ids[a] < food_ids[b] else (food_ids[b], food_ids[a])
+                if pair not in pairs:
+                    pairs[pair] = cls.jaccard(shingle_sets[a], shingle_sets[b])
+
+        return DuplicateIndex(version, food_count, [
+            (round(similarity, 4), a, b) for (a, b), similarity in pairs.items()
+            if similarity >= cls.MIN_SIMILARITY
+        ])
+
+    @classmethod
+    def get_index(cls) -> DuplicateIndex:
+        """Return the duplicate index for the current catalog version."""
+        version = CatalogVersion.current()
+        index = cls._index
+        if index is not None and index.version == version:
+            return index
+
+        with cls._lock:
+            index = cls._index
+            if index is None or index.version != version:
+                rows = db.session.query(Food.id, Food.name, Food.brand).order_by(Food.id).yield_per(10000)
+                index = cls.build_index(rows, version)
+                cls._index = index
+        return index
+
+    @classmethod
+    def invalidate(cls):
+        """Drop the cached index (e.g. between tests)."""
+        with cls._lock:
+            cls._index = None
+
+    @classmethod
+    def find_clusters(cls, threshold: Optional[float] = None) -> List[DuplicateCluster]:
+        """
+        Likely duplicate clusters in the current catalog.
+
+        Args:
+            threshold: Minimum trigram similarity (clamped to MIN_SIMILARITY..1)
+
+        Returns:
+            Clusters, most similar first
+        """
+        threshold = cls.DEFAULT_THRESHOLD if threshold is None else threshold
+        return cls.get_index().clusters(min(max(threshold, cls.MIN_SIMILARITY), 1.0))
@@ -6,22 +6,35 @@ with filtering capabilities and async job processing for large datasets.
 """
 
 import csv
+import gzip
 import json
 import os
 import threading
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Any, Dict, Iterable, List, Optional
 from flask import current_app
+from sqlalchemy import func
 from app import db
 from app.models import Food, FoodNutrition, FoodServing, ExportJob
+from app.services.export_artifact_store import ExportArtifactStore
+from app.services.sharded_export import ShardedExport
+from app.utils.db_routing import replica_session
+from app.services.food_query_service import FoodQueryService
 import uuid
 
 
 class FoodExportService:
     """Handles food data export functionality."""
     
-    # Export formats
-    SUPPORTED_FORMATS = ['csv', 'json']
+    # Export formats; '.gz' variants download as gzip files instead of being
+    # decompressed by the client (every export is stored gzip-compressed)
+    SUPPORTED_FORMATS = ['csv', 'json', 'ndjson', 'csv.gz', 'json.gz', 'ndjson.gz']
+    
+    # Content type per file format
+    MIMETYPES = {'csv': 'text/csv', 'json': 'application/json', 'ndjson': 'application/x-ndjson'}
+    
+    # Rows fetched per round trip when streaming CSV and NDJSON
+    STREAM_BATCH = 1000
     
     # CSV headers for export (updated to match current Food model)
     CSV_HEADERS = [
@@ -49,7 +62,7 @@ class FoodExportService:
         Start asynchronous food data export.
         
         Args:
-            format_type: Export format ('csv' or 'json')
+            format_type: Export format (see SUPPORTED_FORMATS)
             filters: Optional filters to apply
             user_id: ID of user requesting export
             
@@ -59,12 +72,19 @@ class FoodExportService:
         if format_type not in self.SUPPORTED_FORMATS:
             raise ValueError(f"Unsupported export format: {format_type}")
         
+        # Same type, filters and catalog version: reuse the stored result
+        content_key = ExportArtifactStore.content_key(format_type, filters)
+        existing = ExportArtifactStore.find_existing(format_type, filters, content_key, user_id)
+        if existing is not None:
+            return existing.job_id
+        
         # Create export job
         job = ExportJob(
             export_type=format_type,
             filter_criteria=json.dumps(filters or {}),
             created_by=user_id,
-            status='pending'
+            status='pending',
+            content_key=content_key
         )
         
         db.session.add(job)
@@ -125,27 +145,37 @@ class FoodExportService:
             # Ensure export directory exists
             self._ensure_export_directory()
             
-            # Build query with filters
-            query = self._build_food_query(filters)
-            foods = query.all()
+            with replica_session() as replica:
+                # Build query with filters (read from the replica when one is configured and has
+                # caught up with the catalog version the job is keyed on, else from the primary;
+                # the job's own progress stays on db.session and the primary)
+                reader = replica if ExportArtifactStore.reads_keyed_catalog(job, filters, replica) else db.session
+                query = self._build_food_query(filters).with_session(reader)
+                workers = ShardedExport.workers_for(query)
             
-            # Generate filename
-            timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-            filename = f"food_export_{timestamp}.{format_type}"
-            file_path = os.path.join(self.export_directory, filename)
+                # Generate filename
+                timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+                file_format = format_type.split('.')[0]  # 'ndjson' from 'ndjson.gz'
+                filename = f"food_export_{timestamp}.{format_type}"
+                # Stored gzip-compressed under the job ID, so a shared artifact is never
+                # overwritten by another export started in the same second
+                file_path = os.path.join(self.export_directory, f"{job.job_id}_food_export_{timestamp}.{file_format}.gz")
             
-            # Export data
-            if format_type == 'csv':
-                self._export_to_csv(foods, file_path)
-            elif format_type == 'json':
-                self._export_to_json(foods, file_path)
+                # Export data (large exports are serialized in parallel shards)
+                if workers:
+                    sharded = ShardedExport('foods', workers, reader.get_bind())
+                    total_records = sharded.run(job, file_format, filters, file_path)
+                elif file_format == 'json':
+                    foods = query.all()
+                    self._export_to_json(foods, file_path)
+                    total_records = len(foods)
+                elif file_format == 'ndjson':
+                    total_records = self._export_to_ndjson(query.yield_per(self.STREAM_BATCH), file_path)
+                else:
+                    total_records = self._export_to_csv(query.yield_per(self.STREAM_BATCH), file_path)
             
-            # Update job with file information
-            file_size = os.path.getsize(file_path)
-            job.filename = filename
-            job.file_path = file_path
-            job.file_size = file_size
-            job.total_records = len(foods)
+            # Update job with file information (shared with identical exports)
+            ExportArtifactStore.publish(job, file_path, filename, total_records)
             job.status = 'completed'
             job.completed_at = datetime.utcnow()
             
@@ -166,9 +196,9 @@ class FoodExportService:
             filters: Filter criteria
             
         Returns:
-            SQLAlchemy query object
+            SQLAlchemy query object, in id order (the order of sharded exports)
         """
-        query = Food.query
+        query = Food.query.order_by(Food.id)
         
         if not filters:
             return query
@@ -204,49 +234,80 @@ class FoodExportService:
             except ValueError:
                 pass
         
-        # Nutrition value filters
-        if filters.get('min_protein'):
-            query = query.filter(Food.protein >= filters['min_protein'])
-        
-        if filters.get('max_calories'):
-            query = query.filter(Food.calories <= filters['max_calories'])
+        # Nutrition value filters (min_/max_ on every nutrient column and density ratio)
+        query = FoodQueryService.apply_range_filters(query, filters)
         
-        return query.order_by(Food.name)
+        return query
     
-    def _export_to_csv(self, foods: List[Food], file_path: str):
+    def _build_shard_query(self, filters: Optional[Dict[str, Any]], first_id: int, last_id: int):
+        """Filtered foods with first_id <= id <= last_id, in id order (one export shard)."""
+        return self._build_food_query(filters).filter(Food.id.between(first_id, last_id))
+    
+    def _shard_key_range(self, filters: Optional[Dict[str, Any]]):
+        """Lowest and highest food id matching the filters (None, None if there are none)."""
+        return self._build_food_query(filters).order_by(None).with_entities(
+            func.min(Food.id), func.max(Food.id)
+        ).one()
+    
+    def _export_to_csv(self, foods: Iterable[Food], file_path: str) -> int:
         """
         Export foods to CSV format.
         
         Args:
-            foods: List of Food objects
-            file_path: Output file path
+            foods: Food objects (a list or a streaming query)
+            file_path: Output file path (gzip-compressed)
+            
+        Returns:
+            Number of rows written
         """
-        with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
+        count = 0
+        with gzip.open(file_path, 'wt', newline='', encoding='utf-8', compresslevel=6) as csvfile:
             writer = csv.DictWriter(csvfile, fieldnames=self.CSV_HEADERS)
             writer.writeheader()
             
             for food in foods:
-                # Build row data based on current Food model
-                row = {
-                    'id': food.id,
-                    'name': self._sanitize_csv_value(food.name),
-                    'brand': self._sanitize_csv_value(food.brand or ''),
-                    'category': self._sanitize_csv_value(food.category or ''),
-                    'description': self._sanitize_csv_value(food.description or ''),
-                    'calories_per_100g': food.calories,
-                    'protein_per_100g': food.protein,
-                    'carbs_per_100g': food.carbs,
-                    'fat_per_100g': food.fat,
-                    'fiber_per_100g': food.fiber,
-                    'sugar_per_100g': food.sugar,
-                    'sodium_per_100g': food.sodium,
-                    'serving_size_g': food.serving_size,
-                    'is_verified': food.is_verified,
-                    'created_at': food.created_at.isoformat() if food.created_at else '',
-                    'created_by': food.created_by or ''
-                }
-                
-                writer.writerow(row)
+                writer.writerow(self._csv_row(food))
+                count += 1
+        return count
+    
+    def _export_to_ndjson(self, foods: Iterable[Food], file_path: str) -> int:
+        """
+        Export foods as newline-delimited JSON, one record per line in CSV order.
+        
+        Args:
+            foods: Food objects (a list or a streaming query)
+            file_path: Output file path (gzip-compressed)
+            
+        Returns:
+            Number of records written
+        """
+        count = 0
+        with gzip.open(file_path, 'wt', encoding='utf-8', compresslevel=6) as ndjsonfile:
+            for food in foods:
+                ndjsonfile.write(json.dumps(self._json_record(food), ensure_ascii=False) + '\n')
+                count += 1
+        return count
+    
+    def _csv_row(self, food: Food) -> Dict[str, Any]:
+        """Build the CSV row for a food (based on current Food model)."""
+        return {
+            'id': food.id,
+            'name': self._sanitize_csv_value(food.name),
+            'brand': self._sanitize_csv_value(food.brand or ''),
+            'category': self._sanitize_csv_value(food.category or ''),
+            'description': self._sanitize_csv_value(food.description or ''),
+            'calories_per_100g': food.calories,
+            'protein_per_100g': food.protein,
+            'carbs_per_100g': food.carbs,
+            'fat_per_100g': food.fat,
+            'fiber_per_100g': food.fiber,
+            'sugar_per_100g': food.sugar,
+            'sodium_per_100g': food.sodium,
+            'serving_size_g': food.serving_size,
+            'is_verified': food.is_verified,
+            'created_at': food.created_at.isoformat() if food.created_at else '',
+            'created_by': food.created_by or ''
+        }
     
     def _sanitize_csv_value(self, value):
         """
@@ -283,7 +344,7 @@ class FoodExportService:
         
         Args:
             foods: List of Food objects
-            file_path: Output file path
+            file_path: Output file path (gzip-compressed)
         """
         export_data = {
             'export_info': {
@@ -296,32 +357,34 @@ class FoodExportService:
         }
         
         for food in foods:
-            food_data = {
-                'id': food.id,
-                'name': food.name,
-                'brand': food.brand,
-                'category': food.category,
-                'description': food.description,
-                'nutrition_per_100g': {
-                    'calories': food.calories,
-                    'protein': food.protein,
-                    'carbs': food.carbs,
-                    'fat': food.fat,
-                    'fiber': food.fiber,
-                    'sugar': food.sugar,
-                    'sodium': food.sodium
-                },
-                'serving_size_g': food.serving_size,
-                'is_verified': food.is_verified,
-                'created_at': food.created_at.isoformat() if food.created_at else None,
-                'created_by': food.created_by
-            }
-            
-            export_data['foods'].append(food_data)
+            export_data['foods'].append(self._json_record(food))
         
-        with open(file_path, 'w', encoding='utf-8') as jsonfile:
+        with gzip.open(file_path, 'wt', encoding='utf-8', compresslevel=6) as jsonfile:
             json.dump(export_data, jsonfile, indent=2, ensure_ascii=False)
     
+    def _json_record(self, food: Food) -> Dict[str, Any]:
+        """Build the JSON record for a food."""
+        return {
+            'id': food.id,
+            'name': food.name,
+            'brand': food.brand,
+            'category': food.category,
+            'description': food.description,
+            'nutrition_per_100g': {
+                'calories': food.calories,
+                'protein': food.protein,
+                'carbs': food.carbs,
+                'fat': food.fat,
+                'fiber': food.fiber,
+                'sugar': food.sugar,
+                'sodium': food.sodium
+            },
+            'serving_size_g': food.serving_size,
+            'is_verified': food.is_verified,
+            'created_at': food.created_at.isoformat() if food.created_at else None,
+            'created_by': food.created_by
+        }
+    
     def get_export_status(self, job_id: str) -> Optional[Dict[str, Any]]:
         """
         Get export job status.
@@ -341,6 +404,8 @@ class FoodExportService:
             'export_type': job.export_type,
             'status': job.status,
             'total_records': job.total_records,
+            'shard_count': job.shard_count or 0,
+            'shards_completed': job.shards_completed or 0,
             'filename': job.filename,
             'file_size': job.file_size,
             'error_message': job.error_message,
@@ -371,27 +436,15 @@ class FoodExportService:
         return None
     
     def cleanup_expired_exports(self):
-        """Clean up expired export files and database records."""
+        """
+        Expire old export jobs and delete files no unexpired job references.
+        
+        Identical exports share one file (see ExportArtifactStore), so a file
+        is only removed once every job pointing at it has expired.
+        """
         try:
-            # Find expired jobs
-            expired_jobs = ExportJob.query.filter(
-                ExportJob.expires_at < datetime.utcnow(),
-                ExportJob.status == 'completed'
-            ).all()
-            
-            for job in expired_jobs:
-                # Delete file if exists
-                if job.file_path and os.path.exists(job.file_path):
-                    try:
-                        os.remove(job.file_path)
-                    except OSError:
-                        pass  # File might be in use or already deleted
-                
-                # Update job status
-                job.status = 'expired'
-                job.file_path = None
-            
-            db.session.commit()
+            result = ExportArtifactStore.release_expired()
+            current_app.logger.info(f"Export cleanup removed {result['files']} files ({result['bytes']} bytes)")
             
         except Exception as e:
             current_app.logger.error(f"Error cleaning up expired exports: {str(e)}")
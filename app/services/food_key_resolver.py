@@ -0,0 +1,167 @@
+"""
+Food Key Resolver
+
+Serving uploads identify foods by a free-text food_key. Resolving each row
+with its own query (a primary-key lookup, an exact name match, or a
+leading-wildcard ILIKE over name and brand) scanned the food table per row
+and could silently pick the wrong food when several matched.
+
+FoodKeyResolver loads id, name and brand for the whole catalog once and
+indexes every food under these normalized keys (NFKC, case-folded,
+whitespace collapsed):
+
+    <name>            e.g. "masala dosa"
+    <name> (<brand>)  e.g. "butter (amul)"
+    <brand> <name>    e.g. "amul butter"
+
+A key of digits is a food id. Each lookup is a dict access; a key that
+matches more than one food is reported as ambiguous with its candidates
+instead of being resolved to one of them. The index is cached per catalog
+version, so consecutive uploads share it until the catalog changes.
+"""
+
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from app import db
+from app.models import CatalogVersion, Food
+
+
+class FoodKeyError(ValueError):
+    """A food key that matches no food, or more than one."""
+
+
+class FoodKeyResolution(NamedTuple):
+    """Outcome of resolving one food key."""
+    key: str
+    status: str  # resolved, ambiguous, not_found
+    candidates: Tuple[int, ...]  # Matching food ids (one when resolved)
+
+    @property
+    def food_id(self) -> Optional[int]:
+        return self.candidates[0] if self.status == 'resolved' else None
+
+
+class FoodKeyResolver:
+    """In-memory index from normalized food keys to food ids."""
+
+    # Candidate ids listed in an ambiguity error
+    MAX_LISTED_CANDIDATES = 5
+
+    _cached: Optional['FoodKeyResolver'] = None
+    _lock = threading.Lock()
+
+    def __init__(self, foods: Iterable[Tuple[int, str, Optional[str]]], version: Optional[int] = None):
+        """
+        Args:
+            foods: (id, name, brand) rows
+            version: Catalog version the rows were read at
+        """
+        self.version = version
+        self.food_ids: Set[int] = set()
+        self._index: Dict[str, Tuple[int, ...]] = {}
+
+        index: Dict[str, List[int]] = {}
+        for food_id, name, brand in foods:
+            self.food_ids.add(food_id)
+            name = self.normalize(name)
+            brand = self.normalize(brand)
+            keys = {name, f'{name} ({brand})', f'{brand} {name}'} if brand else {name}
+            for key in keys:
+                if key:
+                    index.setdefault(key, []).append(food_id)
+        self._index = {key: tuple(ids) for key, ids in index.items()}
+
+    @staticmethod
+    def normalize(text: Optional[str]) -> str:
+        """Canonical form of a name, brand or key."""
+        if not text:
+            return ''
+        return ' '.join(unicodedata.normalize('NFKC', str(text)).casefold().split())
+
+    @classmethod
+    def load(cls) -> 'FoodKeyResolver':
+        """Build a resolver from the current catalog."""
+        version = CatalogVersion.current()
+        rows = db.session.query(Food.id, Food.name, Food.brand).order_by(Food.id).yield_per(10000)
+        return cls(rows, version=version)
+
+    @classmethod
+    def current(cls) -> 'FoodKeyResolver':
+        """
+        Return the resolver for the current catalog version.
+
+        One version lookup per call; the index is only rebuilt when the
+        catalog has changed since it was built.
+        """
+        version = CatalogVersion.current()
+        resolver = cls._cached
+        if resolver is not None and resolver.version == version:
+            return resolver
+
+        with cls._lock:
+            resolver = cls._cached
+            if resolver is None or resolver.version != version:
+                resolver = cls.load()
+                cls._cached = resolver
+        return resolver
+
+    @classmethod
+    def invalidate(cls):
+        """Drop the cached index (e.g. between tests)."""
+        with cls._lock:
+            cls._cached = None
+
+    def resolve(self, key: Optional[str]) -> FoodKeyResolution:
+        """
+        Resolve one food key.
+
+        Args:
+            key: Food id, name, "name (brand)" or "brand name"
+
+        Returns:
+            FoodKeyResolution with the matching food ids
+        """
+        text = str(key or '').strip()
+        if text.isdecimal() and int(text) in self.food_ids:  # isdigit() also accepts '²', which int() rejects
+            return FoodKeyResolution(text, 'resolved', (int(text),))
+
+        candidates = self._index.get(self.normalize(text), ())
+        if len(candidates) == 1:
+            return FoodKeyResolution(text, 'resolved', candidates)
+        return FoodKeyResolution(text, 'ambiguous' if candidates else 'not_found', candidates)
+
+    def resolve_all(self, keys: Iterable[str]) -> Dict[str, FoodKeyResolution]:
+        """Resolve each distinct key once."""
+        return {key: self.resolve(key) for key in dict.fromkeys(keys)}
+
+    def resolve_id(self, key: Optional[str]) -> int:
+        """
+        Resolve a key to exactly one food id.
+
+        Raises:
+            FoodKeyError: If the key matches no food or several foods
+        """
+        resolution = self.resolve(key)
+        if resolution.status == 'resolved':
+            return resolution.food_id
+        raise FoodKeyError(self.describe(resolution))
+
+    def describe(self, resolution: FoodKeyResolution) -> str:
+        """Error message for an unresolved key."""
+        if resolution.status == 'not_found':
+            return f"Food not found for key: '{resolution.key}'"
+        listed = ', '.join(str(food_id) for food_id in resolution.candidates[:self.MAX_LISTED_CANDIDATES])
+        more = len(resolution.candidates) - self.MAX_LISTED_CANDIDATES
+        return (f"Ambiguous food key '{resolution.key}' matches {len(resolution.candidates)} foods "
+                f"(ids {listed}{f' and {more} more' if more > 0 else ''}); "
+                f"use the food id or 'name (brand)'")
+
+    @staticmethod
+    def summarize(resolutions: Dict[str, FoodKeyResolution]) -> Dict[str, List[str]]:
+        """Unresolved keys of a resolve_all() result, by status."""
+        return {
+            status: [key for key, resolution in resolutions.items() if resolution.status == status]
+            for status in ('ambiguous', 'not_found')
+        }
@@ -0,0 +1,162 @@
+"""
+Food Merge Service
+
+Merges duplicate foods into the one being kept. Every reference is
+re-pointed with set-based UPDATEs in a single transaction:
+
+- meal_log.food_id, bulk_upload_job_item.food_id and
+  nutrition_propagation_job.food_id move to the kept food
+- servings move to the kept food; a serving the kept food already has (same
+  name and unit) is folded into the existing one, and meal logs and upload
+  items that used it are re-pointed
+- extended nutrition rows move only if the kept food has none
+
+The duplicate foods are then deleted. Moved meal logs still carry nutrition
+computed from the duplicate's values, so a propagation job recomputes them
+when the merged foods' per-100g values differed.
+
+Sharded meal logs (app/utils/sharding.py) are updated on every shard in the
+same session; the shards commit one after the other. Archived meal logs
+(app/utils/meal_log_archive.py) are re-pointed too, and count towards the
+propagation job, which recomputes them and their daily totals.
+"""
+
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import bindparam, func, select
+
+from app import db
+from app.models import (BulkUploadJobItem, CatalogVersion, Food, FoodNutrition, FoodServing, MealLog,
+                        NutritionPropagationJob, ServingUploadJobItem)
+from app.services.nutrition_propagation_service import NutritionPropagationService
+from app.utils.meal_log_archive import execute_on_archives
+from app.utils.sharding import execute_on_shards
+
+
+class FoodMergeService:
+    """Merges duplicate foods and re-points their references in bulk."""
+
+    def merge(self, keep_id: int, duplicate_ids: Iterable[int], merged_by: Optional[int] = None,
+              start_worker: bool = True) -> Dict[str, Any]:
+        """
+        Merge duplicate foods into keep_id.
+
+        Args:
+            keep_id: Food that remains
+            duplicate_ids: Foods merged into it and deleted
+            merged_by: ID of the admin performing the merge
+            start_worker: Start the nutrition propagation worker if a job is queued
+
+        Returns:
+            Summary with keep_id, merged_ids, meal_logs, servings_moved,
+            servings_folded and propagation_job_id
+
+        Raises:
+            ValueError: If no duplicates are given or a food does not exist
+        """
+        duplicate_ids = sorted({int(food_id) for food_id in duplicate_ids} - {keep_id})
+        if not duplicate_ids:
+            raise ValueError('Select at least one duplicate food to merge')
+
+        keeper = db.session.get(Food, keep_id)
+        duplicates = Food.query.filter(Food.id.in_(duplicate_ids)).order_by(Food.id).all()
+        missing = sorted(set(duplicate_ids) - {food.id for food in duplicates})
+        if keeper is None or missing:
+            raise ValueError(f"Food not found: {', '.join(map(str, [keep_id] if keeper is None else missing))}")
+
+        nutrients = NutritionPropagationService.NUTRIENTS
+        keeper_values = {nutrient: getattr(keeper, nutrient) for nutrient in nutrients}
+        changed_ids = [food.id for food in duplicates
+                       if NutritionPropagationService.nutrients_changed(keeper_values, food)]
+        default_servings = [food.default_serving_id for food in duplicates if food.default_serving_id]
+
+        try:
+            session = db.session
+            meal_log = MealLog.__table__
+            serving = FoodServing.__table__
+            food = Food.__table__
+
+            # Fold servings the kept food already has into its own, move the rest
+            kept_servings = {
+                (name, unit): serving_id for serving_id, name, unit in session.execute(
+                    select(serving.c.id, serving.c.serving_name, serving.c.unit).where(serving.c.food_id == keep_id)
+                )
+            }
+            folded: Dict[int, int] = {}
+            moved = []
+            for serving_id, name, unit in session.execute(
+                    select(serving.c.id, serving.c.serving_name, serving.c.unit)
+                    .where(serving.c.food_id.in_(duplicate_ids)).order_by(serving.c.id)):
+                if (name, unit) in kept_servings:
+                    folded[serving_id] = kept_servings[(name, unit)]
+                else:
+                    kept_servings[(name, unit)] = serving_id
+                    moved.append(serving_id)
+
+            if folded:
+                remap = [{'old_id': old, 'new_id': new} for old, new in folded.items()]
+                execute_on_shards(meal_log.update().where(meal_log.c.serving_id == bindparam('old_id'))
+                                  .values(serving_id=bindparam('new_id')), remap)
+                execute_on_archives(lambda table: table.update().where(table.c.serving_id == bindparam('old_id'))
+                                    .values(serving_id=bindparam('new_id')), remap)
+                items = ServingUploadJobItem.__table__
+                session.execute(items.update().where(items.c.serving_id == bindparam('old_id'))
+                                .values(serving_id=bindparam('new_id')), remap)
+            if moved:
+                session.execute(serving.update().where(serving.c.id.in_(moved)).values(food_id=keep_id))
+            if keeper.default_serving_id is None and default_servings:
+                session.execute(food.update().where(food.c.id == keep_id)
+                                .values(default_serving_id=folded.get(default_servings[0], default_servings[0])))
+
+            # Meal logs whose stored nutrition came from different per-100g values
+            stale_logs, from_date = 0, None
+            if changed_ids:
+                for result in execute_on_shards(select(func.count(), func.min(meal_log.c.date))
+                                                .where(meal_log.c.food_id.in_(changed_ids))) + \
+                        execute_on_archives(lambda table: select(func.count(), func.min(table.c.date))
+                                            .where(table.c.food_id.in_(changed_ids))):
+                    count, first_date = result.one()
+                    stale_logs += count
+                    if first_date is not None and (from_date is None or first_date < from_date):
+                        from_date = first_date
+            logs_moved = sum(result.rowcount for result in execute_on_shards(
+                meal_log.update().where(meal_log.c.food_id.in_(duplicate_ids)).values(food_id=keep_id)
+            ))
+            logs_moved += sum(result.rowcount for result in execute_on_archives(
+                lambda table: table.update().where(table.c.food_id.in_(duplicate_ids)).values(food_id=keep_id)
+            ))
+            for table in (BulkUploadJobItem.__table__, NutritionPropagationJob.__table__):
+                session.execute(table.update().where(table.c.food_id.in_(duplicate_ids)).values(food_id=keep_id))
+
+            nutrition = FoodNutrition.__table__
+            if session.execute(select(nutrition.c.id).where(nutrition.c.food_id == keep_id).limit(1)).first():
+                session.execute(nutrition.delete().where(nutrition.c.food_id.in_(duplicate_ids)))
+            else:
+                session.execute(nutrition.update().where(nutrition.c.food_id.in_(duplicate_ids))
+                                .values(food_id=keep_id))
+
+            session.execute(food.update().where(food.c.id.in_(duplicate_ids)).values(default_serving_id=None))
+            if folded:
+                session.execute(serving.delete().where(serving.c.id.in_(list(folded))))
+            session.execute(food.delete().where(food.c.id.in_(duplicate_ids)))
+
+            # Core statements bypass the flush hook that versions the catalog
+            CatalogVersion.bump(session.connection())
+            session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        job = None
+        if stale_logs:
+            job = NutritionPropagationService().enqueue(keep_id, from_date=from_date, created_by=merged_by,
+                                                        reason='food_merge', start_worker=start_worker)
+
+        return {
+            'keep_id': keep_id,
+            'merged_ids': duplicate_ids,
+            'meal_logs': logs_moved,
+            'servings_moved': len(moved),
+            'servings_folded': len(folded),
+            'propagation_job_id': job.job_id if job else None
+        }
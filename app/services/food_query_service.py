@@ -0,0 +1,181 @@
+"""
+Food Nutrient Range Query Service
+
+This service builds interactive range queries over the food catalog, e.g.
+"verified foods with protein >= 20 g and calories <= 150 per 100 g, sorted
+by protein density". Filters map directly onto the composite
+(is_verified, <nutrient>) indexes and the nutrient-density expression
+indexes declared next to the Food model.
+"""
+
+from typing import Any, Dict, Mapping, Optional, Tuple
+from sqlalchemy import asc, desc, func
+from app.models import Food
+
+
+class FoodQueryService:
+    """Builds filtered and sorted food catalog queries on nutrient values."""
+
+    # Per-100g nutrient columns that accept min_/max_ range filters
+    NUTRIENT_COLUMNS = {
+        'calories': Food.calories,
+        'protein': Food.protein,
+        'carbs': Food.carbs,
+        'fat': Food.fat,
+        'fiber': Food.fiber,
+        'sugar': Food.sugar,
+        'sodium': Food.sodium
+    }
+
+    # Computed nutrient ratios (grams per 100 kcal)
+    RATIO_EXPRESSIONS = {
+        'protein_per_100kcal': Food.protein_per_100kcal,
+        'fiber_per_100kcal': Food.fiber_per_100kcal
+    }
+
+    SORT_FIELDS = {
+        'name': Food.name,
+        'id': Food.id,
+        **NUTRIENT_COLUMNS,
+        **RATIO_EXPRESSIONS
+    }
+
+    DEFAULT_PER_PAGE = 20
+    MAX_PER_PAGE = 100
+
+    @classmethod
+    def parse_range_filters(cls, args: Mapping[str, Any]) -> Dict[str, float]:
+        """
+        Extract min_/max_ range filters from request arguments.
+
+        Args:
+            args: Mapping of raw request arguments
+
+        Returns:
+            Dict of filter name to float value (e.g. {'min_protein': 20.0})
+
+        Raises:
+            ValueError: If a filter value is not a valid number or a range is inverted
+        """
+        filters = {}
+        for field in list(cls.NUTRIENT_COLUMNS) + list(cls.RATIO_EXPRESSIONS):
+            for bound in ('min', 'max'):
+                key = f'{bound}_{field}'
+                raw_value = args.get(key)
+                if raw_value is None or str(raw_value).strip() == '':
+                    continue
+                try:
+                    value = float(raw_value)
+                except (ValueError, TypeError):
+                    raise ValueError(f'{key} must be a valid number')
+                if value != value:  # NaN
+                    raise ValueError(f'{key} must be a valid number')
+                filters[key] = value
+
+            low, high = filters.get(f'min_{field}'), filters.get(f'max_{field}')
+            if low is not None and high is not None and low > high:
+                raise ValueError(f'min_{field} cannot be greater than max_{field}')
+
+        return filters
+
+    @classmethod
+    def apply_range_filters(cls, query, filters: Optional[Mapping[str, Any]]):
+        """
+        Apply min_/max_ nutrient and ratio filters to a Food query.
+
+        Unknown keys are ignored so callers can pass a wider filter dict
+        (e.g. export filter criteria).
+        """
+        if not filters:
+            return query
+
+        columns = {**cls.NUTRIENT_COLUMNS, **cls.RATIO_EXPRESSIONS}
+        for field, column in columns.items():
+            low = filters.get(f'min_{field}')
+            high = filters.get(f'max_{field}')
+            if low is not None:
+                query = query.filter(column >= low)
+            if high is not None:
+                query = query.filter(column <= high)
+
+        return query
+
+    @classmethod
+    def parse_sort(cls, sort: Optional[str], order: Optional[str]) -> Tuple[str, str]:
+        """Validate sort field and order against the whitelist."""
+        sort = (sort or 'name').strip().lower()
+        order = (order or '').strip().lower()
+
+        if sort not in cls.SORT_FIELDS:
+            raise ValueError(f'sort must be one of: {", ".join(cls.SORT_FIELDS)}')
+
+        if not order:
+            # Nutrient and density rankings are most useful highest-first
+            order = 'asc' if sort in ('name', 'id') else 'desc'
+        if order not in ('asc', 'desc'):
+            raise ValueError('order must be asc or desc')
+
+        return sort, order
+
+    @classmethod
+    def build_query(cls, filters: Optional[Mapping[str, Any]] = None, category: Optional[str] = None,
+                    verified_only: bool = True, sort: str = 'name', order: str = 'asc'):
+        """
+        Build a food query with range filters and sorting.
+
+        Args:
+            filters: Range filters as returned by parse_range_filters
+            category: Optional exact category match
+            verified_only: Restrict to verified foods (uses the composite indexes)
+            sort: Sort field name from SORT_FIELDS
+            order: 'asc' or 'desc'
+
+        Returns:
+            SQLAlchemy query object
+        """
+        query = Food.query
+
+        if verified_only:
+            query = query.filter(Food.is_verified == True)
+
+        if category:
+            query = query.filter(Food.category == category)
+
+        query = cls.apply_range_filters(query, filters)
+
+        sort_column = cls.SORT_FIELDS[sort]
+        if sort in cls.RATIO_EXPRESSIONS:
+            # Foods without calories have no density; keep them out of density rankings
+            query = query.filter(sort_column.isnot(None))
+
+        direction = desc if order == 'desc' else asc
+        # Food.id as tie-breaker keeps pagination stable
+        return query.order_by(direction(sort_column), direction(Food.id))
+
+    @staticmethod
+    def count(query) -> int:
+        """Count matching foods without wrapping the query in a subquery."""
+        return query.order_by(None).with_entities(func.count(Food.id)).scalar() or 0
+
+    @staticmethod
+    def serialize_food(food: Food) -> Dict[str, Any]:
+        """Compact serialization with per-100g nutrients and computed ratios."""
+        protein_density = food.protein_per_100kcal
+        fiber_density = food.fiber_per_100kcal
+        return {
+            'id': food.id,
+            'name': food.name,
+            'brand': food.brand,
+            'category': food.category,
+            'calories_per_100g': food.calories,
+            'protein_per_100g': food.protein,
+            'carbs_per_100g': food.carbs,
+            'fat_per_100g': food.fat,
+            'fiber_per_100g': food.fiber or 0,
+            'sugar_per_100g': food.sugar or 0,
+            'sodium_per_100g': food.sodium or 0,
+            'protein_per_100kcal': round(protein_density, 2) if protein_density is not None else None,
+            'fiber_per_100kcal': round(fiber_density, 2) if fiber_density is not None else None,
+            'verified': food.is_verified,
+            'default_serving_id': food.default_serving_id
+        }
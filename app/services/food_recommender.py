@@ -0,0 +1,225 @@
+"""
+"Fill my remaining macros" Food Recommender
+
+This service scores every verified food/serving combination against a
+user's remaining daily nutrition (calories, protein, carbs, fat, fiber)
+and returns the best top-K portions. Candidate nutrition is held in an
+in-memory NumPy matrix (one row per nutrient, one column per
+food/serving) so scoring is a handful of vectorized operations rather than a
+Python loop over Food objects. The matrix is rebuilt lazily whenever the
+catalog version changes, from the memory-mapped NutrientSnapshot plus a
+query for serving sizes.
+"""
+
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import func
+
+from app import db
+from app.models import CatalogVersion, Food, FoodServing
+from app.services.nutrient_snapshot import NutrientSnapshot
+
+
+class NutrientMatrix:
+    """Immutable snapshot of candidate portions and their nutrition."""
+
+    def __init__(self, version: int, food_ids: np.ndarray, serving_ids: np.ndarray,
+                 grams: np.ndarray, nutrients: np.ndarray):
+        self.version = version
+        self.food_ids = food_ids
+        self.serving_ids = serving_ids  # -1 where the candidate is a plain 100 g portion
+        self.grams = grams
+        # Column-major: one contiguous float32 row per nutrient, one column per candidate
+        self.nutrients = nutrients
+
+    def __len__(self):
+        return len(self.food_ids)
+
+
+class FoodRecommender:
+    """Recommends portions that best close a nutrition gap."""
+
+    NUTRIENTS = ('calories', 'protein', 'carbs', 'fat', 'fiber')
+
+    # Relative importance of each nutrient when closing the gap
+    WEIGHTS = np.array([1.0, 1.5, 0.75, 0.75, 0.5])
+
+    # Going over a target is worse than leaving some of it unfilled
+    OVERSHOOT_PENALTY = 2.0
+
+    # Floors for normalising small gaps (kcal, then grams), so a remaining
+    # 1 g of fat does not dominate the score
+    SCALE_FLOORS = np.array([100.0, 5.0, 10.0, 5.0, 3.0])
+
+    DEFAULT_K = 10
+    MAX_K = 50
+
+    _matrix: Optional[NutrientMatrix] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_matrix(cls) -> NutrientMatrix:
+        """
+        Return the nutrient matrix for the current catalog version.
+
+        A single-row version lookup is issued per call; the matrix itself is
+        only rebuilt when the version has moved on.
+        """
+        version = CatalogVersion.current()
+        matrix = cls._matrix
+        if matrix is not None and matrix.version == version:
+            return matrix
+
+        with cls._lock:
+            matrix = cls._matrix
+            if matrix is None or matrix.version != version:
+                matrix = cls._build_matrix(version)
+                cls._matrix = matrix
+        return matrix
+
+    @classmethod
+    def invalidate(cls):
+        """Drop the cached matrix (e.g. between tests)."""
+        with cls._lock:
+            cls._matrix = None
+
+    @classmethod
+    def _build_matrix(cls, version: int) -> NutrientMatrix:
+        """Expand the memory-mapped catalog snapshot into one column per serving."""
+        snapshot = NutrientSnapshot.current()
+        servings = np.array(
+            db.session.query(
+                FoodServing.food_id, FoodServing.id, func.coalesce(FoodServing.grams_per_unit, 100.0)
+            ).order_by(FoodServing.food_id, FoodServing.id).all(),
+            dtype=np.float64
+        ).reshape(-1, 3)
+
+        # Servings of unverified foods have no snapshot column
+        serving_positions = snapshot.positions(servings[:, 0].astype(np.int64))
+        verified = serving_positions >= 0
+        servings, serving_positions = servings[verified], serving_positions[verified]
+
+        # Foods without servings are offered as a plain 100 g portion
+        bare = np.setdiff1d(np.arange(len(snapshot)), serving_positions)
+        positions = np.concatenate([serving_positions, bare])
+        serving_ids = np.concatenate([servings[:, 1], np.full(len(bare), -1.0)]).astype(np.int64)
+        grams = np.concatenate([servings[:, 2], np.full(len(bare), 100.0)])
+
+        order = np.lexsort((serving_ids, positions))
+        positions, serving_ids, grams = positions[order], serving_ids[order], grams[order]
+
+        rows = [snapshot.NUTRIENTS.index(nutrient) for nutrient in cls.NUTRIENTS]
+        per_portion = snapshot.nutrients[rows][:, positions] * (grams / 100.0)
+        return NutrientMatrix(
+            version,
+            food_ids=np.asarray(snapshot.food_ids[positions]),
+            serving_ids=serving_ids,
+            grams=grams,
+            nutrients=np.ascontiguousarray(per_portion, dtype=np.float32)
+        )
+
+    @classmethod
+    def score(cls, nutrients: np.ndarray, remaining: np.ndarray) -> np.ndarray:
+        """
+        Score candidate portions against a remaining-nutrition vector.
+
+        The score is the reduction in weighted squared gap achieved by eating
+        the portion, with overshoot penalised more heavily than shortfall.
+        Positive scores mean the portion moves the day closer to its targets.
+        Work is done one nutrient row at a time with reused buffers, which is
+        several times faster than broadcasting over the full 2-D matrix.
+
+        Args:
+            nutrients: Array of shape (len(NUTRIENTS), n) with per-portion nutrition
+            remaining: Array of shape (len(NUTRIENTS),); negative values are treated as 0
+
+        Returns:
+            Array of shape (n,) with one score per candidate
+        """
+        remaining = np.clip(np.asarray(remaining, dtype=np.float64), 0.0, None)
+        scale = np.maximum(remaining, cls.SCALE_FLOORS)
+        normalised_gap = remaining / scale
+
+        count = nutrients.shape[1]
+        cost = np.zeros(count, dtype=nutrients.dtype)
+        excess = np.empty(count, dtype=nutrients.dtype)
+        overshoot = np.empty(count, dtype=nutrients.dtype)
+
+        for j in range(len(cls.NUTRIENTS)):
+            # excess > 0 means the portion goes over the remaining target
+            np.multiply(nutrients[j], 1.0 / scale[j], out=excess)
+            excess -= normalised_gap[j]
+            np.maximum(excess, 0, out=overshoot)
+            np.square(excess, out=excess)
+            np.square(overshoot, out=overshoot)
+            overshoot *= cls.OVERSHOOT_PENALTY - 1.0
+            excess += overshoot
+            excess *= cls.WEIGHTS[j]
+            cost += excess
+
+        cost_before = float((cls.WEIGHTS * normalised_gap ** 2).sum())
+        return cost_before - cost
+
+    @classmethod
+    def recommend(cls, remaining: Dict[str, float], k: int = DEFAULT_K,
+                  exclude_food_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        """
+        Return the top-K portions for the given remaining nutrition.
+
+        Args:
+            remaining: Dict with any of NUTRIENTS as keys (missing keys count as 0)
+            k: Number of recommendations to return
+            exclude_food_ids: Optional food IDs to leave out (e.g. already eaten today)
+
+        Returns:
+            List of recommendation dicts ordered best first
+        """
+        matrix = cls.get_matrix()
+        if len(matrix) == 0 or k <= 0:
+            return []
+
+        target = np.array([float(remaining.get(name) or 0) for name in cls.NUTRIENTS])
+        scores = cls.score(matrix.nutrients, target)
+
+        if exclude_food_ids:
+            scores = np.where(np.isin(matrix.food_ids, exclude_food_ids), -np.inf, scores)
+
+        # Only portions that actually improve the day are worth recommending
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            top = np.argpartition(scores[candidates], -k)[-k:]
+            candidates = candidates[top]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+
+        food_ids = [int(matrix.food_ids[i]) for i in candidates]
+        serving_ids = [int(matrix.serving_ids[i]) for i in candidates if matrix.serving_ids[i] >= 0]
+        foods = {
+            food.id: food for food in
+            db.session.query(Food.id, Food.name, Food.brand).filter(Food.id.in_(food_ids))
+        }
+        serving_names = dict(
+            db.session.query(FoodServing.id, FoodServing.serving_name).filter(FoodServing.id.in_(serving_ids))
+        ) if serving_ids else {}
+
+        recommendations = []
+        for i in candidates:
+            food = foods.get(int(matrix.food_ids[i]))
+            if food is None:
+                continue  # deleted since the matrix was built
+            serving_id = int(matrix.serving_ids[i])
+            recommendations.append({
+                'food_id': food.id,
+                'name': food.name,
+                'brand': food.brand,
+                'serving_id': serving_id if serving_id >= 0 else None,
+                'serving_name': serving_names.get(serving_id, '100 g'),
+                'grams': round(float(matrix.grams[i]), 1),
+                'nutrition': {
+                    nutrient: round(float(value), 1)
+                    for nutrient, value in zip(cls.NUTRIENTS, matrix.nutrients[:, i])
+                },
+                'score': round(float(scores[i]), 4)
+            })
+        return recommendations
@@ -0,0 +1,271 @@
+"""
+Job Progress Stream
+
+Upload and export pages used to poll a status endpoint every few seconds,
+each poll a full authenticated request with its own ORM queries. Instead,
+job progress is published to an in-process channel and pushed to the
+browser over one long-lived Server-Sent Events connection.
+
+Publishing needs no calls in the job runners: session hooks in app.models
+snapshot every BulkUploadJob, ServingUploadJob and ExportJob row written in
+a flush and publish the snapshots once the transaction commits (nothing is
+published for a rolled-back transaction).
+
+A stream starts with the current state of the watched jobs read from the
+database, then sends only the fields that changed. Jobs run by another
+worker process never reach this process's channel, so each stream also
+re-reads its watched jobs with one lightweight query per job type every
+DB_REFRESH_SECONDS.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+
+from app import db
+from app.models import BulkUploadJob, ExportJob, ServingUploadJob
+
+# Job type -> (model, columns included in progress events)
+JOB_TYPES = {
+    'upload': (BulkUploadJob, ('status', 'total_rows', 'processed_rows', 'successful_rows', 'failed_rows',
+                               'reused_rows', 'error_message')),
+    'servings': (ServingUploadJob, ('status', 'total_rows', 'processed_rows', 'successful_rows', 'failed_rows',
+                                    'reused_rows', 'error_message')),
+    'export': (ExportJob, ('status', 'total_records', 'shard_count', 'shards_completed', 'error_message')),
+}
+MODEL_TYPES = {model: job_type for job_type, (model, _) in JOB_TYPES.items()}
+
+ACTIVE_STATUSES = ('pending', 'processing')
+FINISHED_STATUSES = ('completed', 'failed')
+
+
+def progress_percentage(job_type: str, state: Dict[str, Any]) -> float:
+    """Progress of a job snapshot, as the status endpoints report it."""
+    if state.get('status') == 'completed':
+        return 100
+    if job_type == 'export':
+        done, total = state.get('shards_completed') or 0, state.get('shard_count') or 0
+    else:
+        done, total = state.get('processed_rows') or 0, state.get('total_rows') or 0
+    return round(done / total * 100, 2) if total else 0
+
+
+def snapshot(job) -> Optional[Tuple[str, str, int, Dict[str, Any]]]:
+    """(job type, job_id, created_by, state) of a job row, or None for other models."""
+    job_type = MODEL_TYPES.get(type(job))
+    if job_type is None:
+        return None
+    state = {column: getattr(job, column) for column in JOB_TYPES[job_type][1]}
+    return job_type, job.job_id, job.created_by, state
+
+
+class ProgressEvent(NamedTuple):
+    """Latest published state of one job."""
+    seq: int
+    job_type: str
+    job_id: str
+    user_id: Optional[int]
+    state: Dict[str, Any]
+
+
+class JobProgressChannel:
+    """In-process publish/subscribe of the latest state of each job."""
+
+    # Jobs remembered; the least recently updated are dropped first
+    MAX_JOBS = 1000
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._seq = 0
+        self._latest: 'OrderedDict[Tuple[str, str], ProgressEvent]' = OrderedDict()
+
+    @property
+    def seq(self) -> int:
+        """Sequence number of the latest event."""
+        return self._seq
+
+    def publish(self, job_type: str, job_id: str, user_id: Optional[int], state: Dict[str, Any]) -> int:
+        """
+        Publish a job's state and wake waiting streams.
+
+        Returns:
+            The event's sequence number (unchanged if the state is the same as last published)
+        """
+        key = (job_type, job_id)
+        with self._condition:
+            latest = self._latest.get(key)
+            if latest is not None and latest.state == state:
+                return latest.seq
+            self._seq += 1
+            self._latest[key] = ProgressEvent(self._seq, job_type, job_id, user_id, dict(state))
+            self._latest.move_to_end(key)
+            while len(self._latest) > self.MAX_JOBS:
+                self._latest.popitem(last=False)
+            self._condition.notify_all()
+            return self._seq
+
+    def changes(self, since: int, timeout: float) -> List[ProgressEvent]:
+        """
+        Events published after sequence number since, waiting up to timeout seconds for one.
+
+        Only the latest state of each job is returned, oldest first.
+        """
+        with self._condition:
+            if self._seq <= since:
+                self._condition.wait(timeout)
+            events = []
+            for event in reversed(self._latest.values()):  # Ordered by seq
+                if event.seq <= since:
+                    break
+                events.append(event)
+            return events[::-1]
+
+
+progress_channel = JobProgressChannel()
+
+
+class JobProgressStream:
+    """Server-Sent Events for given jobs, or for all of a user's active jobs."""
+
+    # How often a stream re-reads its jobs from the database
+    DB_REFRESH_SECONDS = 5.0
+
+    # Comment line sent when idle, to keep proxies from closing the connection
+    HEARTBEAT_SECONDS = 15.0
+
+    # Streams end after this long; EventSource reconnects after RETRY_MS
+    MAX_SECONDS = 300.0
+    RETRY_MS = 3000
+
+    # Most jobs one stream can watch by ID
+    MAX_JOB_IDS = 100
+
+    def __init__(self, user_id: int, job_type: Optional[str] = None, job_id: Optional[str] = None,
+                 job_ids: Optional[List[str]] = None, channel: Optional[JobProgressChannel] = None,
+                 db_refresh_seconds: Optional[float] = None, max_seconds: Optional[float] = None):
+        """
+        Args:
+            user_id: Owner of the jobs watched when no job IDs are given
+            job_type: Restrict to one of JOB_TYPES
+            job_id: Watch a single job (requires job_type)
+            job_ids: Watch these jobs, whoever started them (requires job_type)
+            channel: Channel to subscribe to (defaults to the process-wide one)
+            db_refresh_seconds: Override DB_REFRESH_SECONDS
+            max_seconds: Override MAX_SECONDS
+        """
+        self.job_ids = tuple(dict.fromkeys(([job_id] if job_id else []) + list(job_ids or [])))
+        if job_type is not None and job_type not in JOB_TYPES:
+            raise ValueError(f"Unknown job type: {job_type}")
+        if self.job_ids and job_type is None:
+            raise ValueError('job_id requires a job type')
+        if len(self.job_ids) > self.MAX_JOB_IDS:
+            raise ValueError(f"At most {self.MAX_JOB_IDS} jobs can be watched at once")
+        self.user_id = user_id
+        self.job_types = (job_type,) if job_type else tuple(JOB_TYPES)
+        self.channel = channel or progress_channel
+        self.db_refresh_seconds = db_refresh_seconds if db_refresh_seconds is not None else self.DB_REFRESH_SECONDS
+        self.max_seconds = max_seconds if max_seconds is not None else self.MAX_SECONDS
+        self._sent: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def _watches(self, job_type: str, job_id: str, user_id: Optional[int]) -> bool:
+        if job_type not in self.job_types:
+            return False
+        if self.job_ids:
+            return job_id in self.job_ids
+        return user_id == self.user_id
+
+    def _load(self, include: Tuple[Tuple[str, str], ...] = ()) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """
+        Current state of the watched jobs from the database.
+
+        In user mode this is the user's active jobs plus the jobs in include
+        (already sent and possibly finished since), one query per job type.
+        Runs on its own short-lived connection so the stream never holds a
+        read transaction open between refreshes.
+        """
+        rows = []
+        with db.engine.connect() as connection:
+            for job_type in self.job_types:
+                model, columns = JOB_TYPES[job_type]
+                table = model.__table__
+                query = select(table.c.job_id, *(table.c[column] for column in columns))
+                if self.job_ids:
+                    query = query.where(table.c.job_id.in_(self.job_ids))
+                else:
+                    known = [job_id for known_type, job_id in include if known_type == job_type]
+                    active = (table.c.created_by == self.user_id) & table.c.status.in_(ACTIVE_STATUSES)
+                    query = query.where(active | table.c.job_id.in_(known) if known else active)
+                for row in connection.execute(query):
+                    rows.append((job_type, row[0], dict(zip(columns, row[1:]))))
+        return rows
+
+    def _event(self, job_type: str, job_id: str, state: Dict[str, Any]) -> Optional[str]:
+        """SSE message with the fields that changed since the last one sent for this job."""
+        key = (job_type, job_id)
+        state = dict(state, progress_percentage=progress_percentage(job_type, state))
+        previous = self._sent.get(key)
+        delta = {field: value for field, value in state.items() if previous is None or previous.get(field) != value}
+        if not delta:
+            return None
+        self._sent[key] = state
+        payload = json.dumps(dict(delta, type=job_type, job_id=job_id), default=str)
+        return f"event: progress\ndata: {payload}\n\n"
+
+    def _finished(self) -> bool:
+        """True once every watched job has finished (and, when watching by ID, at least one was seen)."""
+        if self.job_ids and not self._sent:
+            return False
+        return all(state.get('status') in FINISHED_STATUSES for state in self._sent.values())
+
+    def events(self) -> Iterator[str]:
+        """
+        Yield SSE messages until the watched jobs finish or MAX_SECONDS pass.
+
+        Sends a 'done' event when there is nothing left to watch, which tells
+        the client not to reconnect.
+        """
+        started = last_refresh = last_message = time.monotonic()
+        seq = self.channel.seq  # Subscribe before reading, so nothing published in between is missed
+        yield f"retry: {self.RETRY_MS}\n\n"
+
+        for job_type, job_id, state in self._load():
+            message = self._event(job_type, job_id, state)
+            if message:
+                yield message
+        if self.job_ids and not self._sent:
+            yield 'event: done\ndata: {"reason": "not_found"}\n\n'
+            return
+
+        while True:
+            if self._finished():
+                yield 'event: done\ndata: {"reason": "finished"}\n\n'
+                return
+            now = time.monotonic()
+            if now - started >= self.max_seconds:
+                return  # The client reconnects and starts from a fresh snapshot
+
+            timeout = min(self.db_refresh_seconds - (now - last_refresh), self.HEARTBEAT_SECONDS,
+                          self.max_seconds - (now - started))
+            messages = []
+            for event in self.channel.changes(seq, max(timeout, 0.0)):
+                seq = max(seq, event.seq)
+                if self._watches(event.job_type, event.job_id, event.user_id):
+                    messages.append(self._event(event.job_type, event.job_id, event.state))
+
+            if time.monotonic() - last_refresh >= self.db_refresh_seconds:
+                last_refresh = time.monotonic()
+                for job_type, job_id, state in self._load(tuple(self._sent)):
+                    messages.append(self._event(job_type, job_id, state))
+
+            messages = [message for message in messages if message]
+            for message in messages:
+                yield message
+            if messages:
+                last_message = time.monotonic()
+            elif time.monotonic() - last_message >= self.HEARTBEAT_SECONDS:
+                last_message = time.monotonic()
+                yield ": keepalive\n\n"
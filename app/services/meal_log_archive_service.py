@@ -0,0 +1,144 @@
+"""
+Meal Log Archive Service
+
+Moves meal logs dated before archive_cutoff() (MEAL_LOG_ARCHIVE_AFTER_DAYS
+ago) out of meal_log into monthly archive tables (see
+app/utils/meal_log_archive.py), so meal_log and its indexes only grow with
+the recent window that most reads need.
+
+Each batch is one transaction on its database: copy the rows into their
+month's table, delete them from meal_log and recompute meal_log_daily_total
+for the (user, day, meal type) groups in the batch from the archive. The
+rollups are rebuilt rather than incremented, so a day archived over several
+batches or runs (late-logged meals) still totals correctly, and readers
+adding live rows to rollups never count a log twice or miss one.
+
+The newest meal_log row is never archived: SQLite hands out max(id) + 1 to
+the next row, and archived logs keep their IDs.
+
+Runs from `flask archive-meal-logs` (e.g. nightly) over every meal-log
+database, the shards when meal logs are sharded.
+"""
+
+from collections import defaultdict
+from datetime import date
+from typing import Callable, Dict, Optional
+
+from flask import current_app
+from sqlalchemy import bindparam, func, select
+
+from app.models import MealLog, MealLogDailyTotal
+from app.utils.meal_log_archive import TOTAL_NUTRIENTS, archive_cutoff, archive_table, archive_table_name
+from app.utils.sharding import meal_log_engines
+
+
+class MealLogArchiveService:
+    """Batched archival of old meal logs into monthly tables."""
+
+    # Meal logs moved per transaction
+    BATCH_SIZE = 1000
+
+    def __init__(self, batch_size: Optional[int] = None, log: Callable[[str], None] = None):
+        """
+        Args:
+            batch_size: Meal logs moved per transaction (default MEAL_LOG_ARCHIVE_BATCH_SIZE)
+            log: Progress callback (default: the app logger)
+        """
+        self.batch_size = batch_size or current_app.config.get('MEAL_LOG_ARCHIVE_BATCH_SIZE', self.BATCH_SIZE)
+        self.log = log or current_app.logger.info
+
+    def archive(self, cutoff: Optional[date] = None, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Archive meal logs dated before the cutoff on every meal-log database.
+
+        Args:
+            cutoff: Archive logs dated before this (default archive_cutoff())
+            dry_run: Only count what would be archived
+
+        Returns:
+            Dict with rows (archived, or to archive on a dry run), batches and
+            months (archive tables written)
+        """
+        cutoff = cutoff or archive_cutoff()
+        meal_log = MealLog.__table__
+        newest = select(func.max(meal_log.c.id)).scalar_subquery()
+        rows = batches = 0
+        months = set()
+
+        for engine in meal_log_engines():
+            if dry_run:
+                with engine.connect() as connection:
+                    for day, count in connection.execute(
+                        select(meal_log.c.date, func.count())
+                        .where(meal_log.c.date < cutoff, meal_log.c.id < newest).group_by(meal_log.c.date)
+                    ):
+                        rows += count
+                        months.add(archive_table_name(day))
+                continue
+            while True:
+                moved, written = self._archive_batch(engine, cutoff)
+                if not moved:
+                    break
+                rows += moved
+                batches += 1
+                months.update(written)
+                self.log(f"[ARCHIVE] Moved {moved} meal log(s) into {', '.join(sorted(written))}")
+
+        return {'rows': rows, 'batches': batches, 'months': len(months)}
+
+    def _archive_batch(self, engine, cutoff: date):
+        """Move one batch on one database; returns (rows moved, archive table names)."""
+        meal_log = MealLog.__table__
+        columns = [column.name for column in meal_log.columns]
+
+        with engine.begin() as connection:
+            batch = connection.execute(
+                select(meal_log.c.id, meal_log.c.user_id, meal_log.c.date)
+                .where(meal_log.c.date < cutoff,
+                       meal_log.c.id < select(func.max(meal_log.c.id)).scalar_subquery())
+                .order_by(meal_log.c.id).limit(self.batch_size)
+            ).all()
+            if not batch:
+                return 0, set()
+
+            ids_by_month = defaultdict(list)
+            for row in batch:
+                ids_by_month[archive_table_name(row.date)].append(row.id)
+            tables = {}
+            for name, ids in ids_by_month.items():
+                table = tables[name] = archive_table(name)
+                table.create(connection, checkfirst=True)
+                connection.execute(table.insert().from_select(
+                    columns, select(*[meal_log.c[column] for column in columns]).where(meal_log.c.id.in_(ids))
+                ))
+            connection.execute(meal_log.delete().where(meal_log.c.id.in_([row.id for row in batch])))
+
+            days_by_month = defaultdict(set)
+            for row in batch:
+                days_by_month[archive_table_name(row.date)].add((row.user_id, row.date))
+            for name, days in days_by_month.items():
+                self.rebuild_daily_totals(connection, tables[name], days)
+
+        return len(batch), set(tables)
+
+    def rebuild_daily_totals(self, connection, table, days):
+        """
+        Replace the meal_log_daily_total rows of (user_id, date) pairs with
+        sums over an archive table (also after archived logs are recomputed).
+        """
+        rollup = MealLogDailyTotal.__table__
+        totals = [row for row in connection.execute(
+            select(table.c.user_id, table.c.date, table.c.meal_type, func.count().label('meal_count'),
+                   *[func.coalesce(func.sum(table.c[nutrient]), 0).label(nutrient) for nutrient in TOTAL_NUTRIENTS])
+            .where(table.c.user_id.in_(sorted({user_id for user_id, _ in days})),
+                   table.c.date.in_(sorted({day for _, day in days})))
+            .group_by(table.c.user_id, table.c.date, table.c.meal_type)
+        ) if (row.user_id, row.date) in days]
+
+        connection.execute(
+            rollup.delete().where(rollup.c.user_id == bindparam('key_user_id'),
+                                  rollup.c.date == bindparam('key_date')),
+            [{'key_user_id': user_id, 'key_date': day} for user_id, day in days]
+        )
+        if totals:
+            connection.execute(rollup.insert(), [dict(row._mapping) for row in totals])
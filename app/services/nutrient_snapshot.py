@@ -0,0 +1,179 @@
+"""
+Memory-mapped Nutrient Snapshot
+
+Whole-catalog numeric scans (recommendations, vectorized nutrition) only
+need the verified foods' ids and per-100g nutrients, not Food ORM objects.
+This module writes those columns to NumPy .npy files under the instance
+folder, one directory per catalog version:
+
+    <NUTRIENT_SNAPSHOT_FOLDER>/v00000042/ids.npy        int64, sorted
+    <NUTRIENT_SNAPSHOT_FOLDER>/v00000042/nutrients.npy  float32, one row per nutrient
+
+Workers open the files with mmap_mode='r', so every gunicorn worker on the
+host shares the same page-cache pages instead of holding its own copy. A
+snapshot is built in a temporary directory and renamed into place, which is
+atomic: readers see either no directory or a complete one, and when two
+workers race to build the same version the loser discards its copy. Older
+versions are pruned; a worker still mapping a pruned file keeps its pages
+until it moves to the new version.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import func, select
+
+from app import db
+from app.models import CatalogVersion, Food
+
+
+class NutrientSnapshot:
+    """Read-only columnar view of the verified catalog's per-100g nutrients."""
+
+    NUTRIENTS = ('calories', 'protein', 'carbs', 'fat', 'fiber', 'sugar', 'sodium')
+
+    # Versions kept on disk (the current one plus its predecessor for
+    # workers that have not switched yet)
+    KEEP_VERSIONS = 2
+
+    _current: Optional['NutrientSnapshot'] = None
+    _lock = threading.Lock()
+
+    def __init__(self, version: int, path: str, food_ids: np.ndarray, nutrients: np.ndarray):
+        self.version = version
+        self.path = path
+        self.food_ids = food_ids
+        self.nutrients = nutrients
+
+    def __len__(self):
+        return len(self.food_ids)
+
+    def column(self, nutrient: str) -> np.ndarray:
+        """Per-100g values of one nutrient for every food, in food_ids order."""
+        return self.nutrients[self.NUTRIENTS.index(nutrient)]
+
+    def positions(self, food_ids: Sequence[int]) -> np.ndarray:
+        """
+        Column positions of the given food IDs (binary search on the sorted ids).
+
+        Returns:
+            int64 array with -1 where a food is not in the snapshot
+        """
+        food_ids = np.asarray(food_ids, dtype=np.int64)
+        if len(self.food_ids) == 0:
+            return np.full(food_ids.shape, -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.food_ids, food_ids), len(self.food_ids) - 1)
+        return np.where(self.food_ids[positions] == food_ids, positions, -1)
+
+    def get(self, food_id: int) -> Optional[Dict[str, float]]:
+        """
+        Per-100g nutrients of one food.
+
+        Returns:
+            Dict keyed by NUTRIENTS, or None if the food is not a verified catalog food
+        """
+        position = int(self.positions([food_id])[0])
+        if position < 0:
+            return None
+        return {nutrient: float(value) for nutrient, value in zip(self.NUTRIENTS, self.nutrients[:, position])}
+
+    @classmethod
+    def directory(cls) -> str:
+        folder = current_app.config.get('NUTRIENT_SNAPSHOT_FOLDER', 'nutrient_snapshot')
+        return os.path.join(current_app.instance_path, folder)
+
+    @classmethod
+    def current(cls) -> 'NutrientSnapshot':
+        """
+        Return the snapshot for the current catalog version.
+
+        A single-row version lookup is issued per call. When the version has
+        moved on, the matching files are mapped if another worker already
+        built them, and built otherwise.
+        """
+        version = CatalogVersion.current()
+        directory = cls.directory()
+        snapshot = cls._current
+        if snapshot is not None and snapshot.version == version and os.path.dirname(snapshot.path) == directory:
+            return snapshot
+
+        with cls._lock:
+            snapshot = cls._current
+            if snapshot is None or snapshot.version != version or os.path.dirname(snapshot.path) != directory:
+                path = os.path.join(directory, f'v{version:08d}')
+                if not os.path.isdir(path):
+                    cls.build(version, directory)
+                snapshot = cls.open(version, path)
+                cls._current = snapshot
+        return snapshot
+
+    @classmethod
+    def open(cls, version: int, path: str) -> 'NutrientSnapshot':
+        """Memory-map a built snapshot read-only."""
+        return cls(
+            version, path,
+            food_ids=np.load(os.path.join(path, 'ids.npy'), mmap_mode='r'),
+            nutrients=np.load(os.path.join(path, 'nutrients.npy'), mmap_mode='r')
+        )
+
+    @classmethod
+    def build(cls, version: int, directory: Optional[str] = None) -> str:
+        """
+        Write the verified catalog for `version` and rename it into place.
+
+        Args:
+            version: Catalog version the snapshot is labelled with
+            directory: Snapshot folder (defaults to the configured one)
+
+        Returns:
+            Path of the snapshot directory
+        """
+        directory = directory or cls.directory()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'v{version:08d}')
+
+        food = Food.__table__
+        result = db.session.execute(
+            select(food.c.id, *[func.coalesce(food.c[nutrient], 0) for nutrient in cls.NUTRIENTS])
+            .where(food.c.is_verified == True)  # noqa: E712
+            .order_by(food.c.id)
+        )
+        width = 1 + len(cls.NUTRIENTS)
+        rows = np.array(result.all(), dtype=np.float64).reshape(-1, width)
+
+        building = tempfile.mkdtemp(prefix='.building-', dir=directory)
+        try:
+            for name, array in (('ids.npy', rows[:, 0].astype(np.int64)),
+                                ('nutrients.npy', np.ascontiguousarray(rows[:, 1:].T, dtype=np.float32))):
+                with open(os.path.join(building, name), 'wb') as f:
+                    np.save(f, array)
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.rename(building, path)
+        except OSError:
+            # Another worker renamed the same version into place first
+            shutil.rmtree(building, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise
+
+        cls._prune(directory, keep=path)
+        return path
+
+    @classmethod
+    def _prune(cls, directory: str, keep: str):
+        versions = sorted(name for name in os.listdir(directory) if name.startswith('v'))
+        stale = versions[:-cls.KEEP_VERSIONS]
+        for name in stale:
+            if os.path.join(directory, name) != keep:
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    @classmethod
+    def invalidate(cls):
+        """Drop the mapped snapshot (e.g. between tests)."""
+        with cls._lock:
+            cls._current = None
@@ -0,0 +1,354 @@
+"""
+Nutrition Change Propagation Service
+
+MealLog rows store nutrition computed at log time. When an admin corrects a
+food's per-100g values, this service recomputes the affected meal logs in a
+background job. Each chunk is a single set-based UPDATE that multiplies the
+logged grams by the food's new per-100g factor, committed in its own short
+transaction together with the job's keyset checkpoint, so a large history is
+rewritten without holding long write locks and an interrupted job resumes
+where it stopped.
+
+Daily totals (dashboard, reports, /api/v2 nutrition summaries) are
+aggregated from meal_log at read time, so they reflect the recomputed values
+as soon as each chunk commits; challenge progress for the affected users is
+re-evaluated when the job completes.
+
+With sharded meal logs (app/utils/sharding.py) the shards are processed one
+after the other; the checkpoint is the shard index plus the last meal log ID
+on that shard. A shard's chunk commits before the job row on the primary, so
+an interruption at worst recomputes one chunk again.
+
+Archived meal logs (app/utils/meal_log_archive.py) in the months the job
+covers are recomputed last, one archive table per transaction together with
+the meal_log_daily_total rows of the days it touched. That phase is
+checkpointed as shard index len(engines); resuming it recomputes the archive
+tables again, which gives the same result.
+"""
+
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from app import db
+from app.models import Food, MealLog, NutritionPropagationJob
+from app.services.challenge_progress_service import ChallengeProgressService
+from app.services.meal_log_archive_service import MealLogArchiveService
+from app.utils.meal_log_archive import archive_tables
+from app.utils.sharding import meal_log_engines, scatter_all
+
+
+class NutritionPropagationService:
+    """Queues and runs meal-log nutrition recomputation jobs."""
+
+    NUTRIENTS = ('calories', 'protein', 'carbs', 'fat', 'fiber', 'sugar', 'sodium')
+
+    # Meal logs rewritten per transaction
+    CHUNK_SIZE = 2000
+
+    # Jobs left in 'processing' without progress for this long are resumed
+    STALE_AFTER = timedelta(minutes=10)
+
+    # One worker per process; other gunicorn workers are kept out by the
+    # conditional claim in _claim_next_job
+    processing_lock = threading.Lock()
+
+    def __init__(self, chunk_size: Optional[int] = None):
+        self.chunk_size = chunk_size or self.CHUNK_SIZE
+
+    @classmethod
+    def nutrients_changed(cls, original_values: Dict[str, Any], food: Food) -> bool:
+        """True if any per-100g nutrient differs from original_values."""
+        return any(original_values.get(nutrient) != getattr(food, nutrient) for nutrient in cls.NUTRIENTS)
+
+    def enqueue(self, food_id: int, from_date: Optional[date] = None, created_by: Optional[int] = None,
+                reason: str = 'food_edit', start_worker: bool = True) -> NutritionPropagationJob:
+        """
+        Queue recomputation of a food's meal logs.
+
+        A job still pending for the same food is widened to cover from_date
+        instead of queueing a second pass over the same rows.
+
+        Args:
+            food_id: Food whose meal logs should be recomputed
+            from_date: Only recompute logs on or after this date (None for all history)
+            created_by: ID of the admin who triggered the job
+            reason: 'food_edit', 'manual' or 'food_merge'
+            start_worker: Start a background worker thread after committing
+
+        Returns:
+            The pending NutritionPropagationJob
+        """
+        job = NutritionPropagationJob.query.filter_by(food_id=food_id, status='pending').first()
+        if job is None:
+            job = NutritionPropagationJob(food_id=food_id, from_date=from_date, reason=reason,
+                                          created_by=created_by, status='pending')
+            db.session.add(job)
+        elif job.from_date is not None and (from_date is None or from_date < job.from_date):
+            job.from_date = from_date
+        db.session.commit()
+
+        if start_worker:
+            self.start_worker()
+        return job
+
+    def start_worker(self):
+        """Run pending jobs in a daemon thread."""
+        app = current_app._get_current_object()
+        thread = threading.Thread(target=self._run_worker, args=(app,), daemon=True)
+        thread.start()
+
+    def _run_worker(self, app):
+        """
+        Drain the queue unless another thread in this process already is.
+
+        After releasing the lock the queue is checked again, so a job queued
+        while the previous holder was finishing is not left behind.
+        """
+        while self.processing_lock.acquire(blocking=False):
+            try:
+                with app.app_context():
+                    self.run_pending()
+            finally:
+                self.processing_lock.release()
+
+            with app.app_context():
+                if not self._has_claimable_job():
+                    return
+
+    def run_pending(self) -> int:
+        """
+        Process queued (and stalled) jobs until none are left.
+
+        Returns:
+            Number of jobs processed
+        """
+        processed = 0
+        while True:
+            job_id = self._claim_next_job()
+            if job_id is None:
+                return processed
+            self.process_job(job_id)
+            processed += 1
+
+    def _claimable_filter(self, table):
+        stale_before = datetime.utcnow() - self.STALE_AFTER
+        return (table.c.status == 'pending') | (
+            (table.c.status == 'processing') & (table.c.updated_at < stale_before)
+        )
+
+    def _has_claimable_job(self) -> bool:
+        table = NutritionPropagationJob.__table__
+        return db.session.execute(
+            select(table.c.id).where(self._claimable_filter(table)).limit(1)
+        ).first() is not None
+
+    def _claim_next_job(self) -> Optional[str]:
+        """Atomically move the oldest claimable job to 'processing' and return its job_id."""
+        table = NutritionPropagationJob.__table__
+        with db.engine.begin() as connection:
+            while True:
+                row = connection.execute(
+                    select(table.c.id, table.c.job_id)
+                    .where(self._claimable_filter(table))
+                    .order_by(table.c.id).limit(1)
+                ).first()
+                if row is None:
+                    return None
+
+                now = datetime.utcnow()
+                claimed = connection.execute(
+                    table.update()
+                    .where(table.c.id == row.id, self._claimable_filter(table))
+                    .values(status='processing', started_at=func.coalesce(table.c.started_at, now),
+                            updated_at=now)
+                ).rowcount
+                if claimed:
+                    return row.job_id
+
+    def process_job(self, job_id: str):
+        """
+        Recompute the meal logs covered by a claimed job, chunk by chunk.
+
+        Args:
+            job_id: Job ID (status must already be 'processing')
+        """
+        jobs = NutritionPropagationJob.__table__
+        job = db.session.execute(select(jobs).where(jobs.c.job_id == job_id)).first()
+        if job is None:
+            return
+
+        try:
+            food = db.session.get(Food, job.food_id)
+            if food is None:
+                raise ValueError(f"Food {job.food_id} no longer exists")
+
+            # Snapshot the per-100g values once; a later edit queues a new job
+            factors = {nutrient: (getattr(food, nutrient) or 0.0) / 100.0 for nutrient in self.NUTRIENTS}
+            db.session.commit()
+
+            logs = MealLog.__table__
+            scope = [logs.c.food_id == job.food_id]
+            if job.from_date is not None:
+                scope.append(logs.c.date >= job.from_date)
+
+            engines = meal_log_engines()
+            shard = job.shard_index or 0
+            last_id = job.last_meal_log_id or 0
+            processed_rows = job.processed_rows or 0
+            if last_id == 0 and shard == 0:
+                total_rows = 0
+                for engine in engines:
+                    with engine.begin() as connection:
+                        total_rows += connection.execute(
+                            select(func.count()).select_from(logs).where(*scope)
+                        ).scalar()
+                        for table in archive_tables(connection, job.from_date):
+                            total_rows += connection.execute(
+                                select(func.count()).select_from(table)
+                                .where(*self._archive_scope(table, job.food_id, job.from_date))
+                            ).scalar()
+                with db.engine.begin() as connection:
+                    connection.execute(jobs.update().where(jobs.c.id == job.id).values(
+                        total_rows=total_rows, updated_at=datetime.utcnow()
+                    ))
+
+            grams = func.coalesce(logs.c.logged_grams, logs.c.quantity)
+            assignments = {nutrient: grams * factor for nutrient, factor in factors.items()}
+
+            while shard < len(engines):
+                with self._chunk_transaction(engines[shard]) as (connection, job_connection):
+                    chunk = select(logs.c.id).where(logs.c.id > last_id, *scope) \
+                        .order_by(logs.c.id).limit(self.chunk_size).subquery()
+                    upper_id = connection.execute(select(func.max(chunk.c.id))).scalar()
+                    if upper_id is None:
+                        # Next shard, or the archive phase after the last one
+                        shard += 1
+                        last_id = 0
+                        job_connection.execute(jobs.update().where(jobs.c.id == job.id).values(
+                            shard_index=shard, last_meal_log_id=0, updated_at=datetime.utcnow()
+                        ))
+                        continue
+
+                    updated = connection.execute(
+                        logs.update()
+                        .where(logs.c.id > last_id, logs.c.id <= upper_id, *scope)
+                        .values(**assignments)
+                    ).rowcount
+                    processed_rows += updated
+                    last_id = upper_id
+                    job_connection.execute(jobs.update().where(jobs.c.id == job.id).values(
+                        processed_rows=processed_rows, last_meal_log_id=last_id, updated_at=datetime.utcnow()
+                    ))
+
+            archived_rows, archived_users = self._propagate_archive(job.food_id, job.from_date, factors)
+            processed_rows += archived_rows
+            with db.engine.begin() as connection:
+                connection.execute(jobs.update().where(jobs.c.id == job.id).values(
+                    status='completed', processed_rows=processed_rows, completed_at=datetime.utcnow(),
+                    updated_at=datetime.utcnow()
+                ))
+
+            # Challenge progress is derived from stored nutrition
+            user_ids = select(logs.c.user_id).where(*scope).distinct()
+            if archived_users:
+                user_ids = {row[0] for row in scatter_all(user_ids)} | archived_users
+            ChallengeProgressService().evaluate(user_ids=user_ids)
+
+            current_app.logger.info(
+                f"[AUDIT] Nutrition propagation {job_id} for food {job.food_id} completed: "
+                f"{processed_rows} meal logs recomputed"
+            )
+
+        except Exception as e:
+            db.session.rollback()
+            with db.engine.begin() as connection:
+                connection.execute(jobs.update().where(jobs.c.id == job.id).values(
+                    status='failed', error_message=str(e), completed_at=datetime.utcnow(),
+                    updated_at=datetime.utcnow()
+                ))
+            current_app.logger.error(f"Nutrition propagation {job_id} failed: {e}", exc_info=True)
+
+    @staticmethod
+    def _archive_scope(table, food_id: int, from_date: Optional[date]) -> list:
+        conditions = [table.c.food_id == food_id]
+        if from_date is not None:
+            conditions.append(table.c.date >= from_date)
+        return conditions
+
+    def _propagate_archive(self, food_id: int, from_date: Optional[date], factors: Dict[str, float]):
+        """
+        Recompute a food's archived meal logs from from_date on and rebuild
+        the daily totals of the days they fall on.
+
+        Returns:
+            (archived meal logs recomputed, IDs of their users)
+        """
+        archiver = MealLogArchiveService(log=lambda message: None)
+        updated, user_ids = 0, set()
+        for engine in meal_log_engines():
+            with engine.connect() as connection:
+                tables = archive_tables(connection, from_date)
+            for table in tables:
+                with engine.begin() as connection:
+                    scope = self._archive_scope(table, food_id, from_date)
+                    days = {(row.user_id, row.date) for row in connection.execute(
+                        select(table.c.user_id, table.c.date).where(*scope).distinct()
+                    )}
+                    if not days:
+                        continue
+                    grams = func.coalesce(table.c.logged_grams, table.c.quantity)
+                    updated += connection.execute(table.update().where(*scope).values(
+                        **{nutrient: grams * factor for nutrient, factor in factors.items()}
+                    )).rowcount
+                    archiver.rebuild_daily_totals(connection, table, days)
+                    user_ids.update(user_id for user_id, _ in days)
+        return updated, user_ids
+
+    @contextmanager
+    def _chunk_transaction(self, engine):
+        """
+        (meal log connection, job connection) for one chunk.
+
+        On the primary both are the same transaction; a shard's transaction
+        commits before the primary's, so the checkpoint never gets ahead.
+        """
+        if engine is db.engine:
+            with engine.begin() as connection:
+                yield connection, connection
+        else:
+            with db.engine.begin() as job_connection, engine.begin() as connection:
+                yield connection, job_connection
+
+    def get_job_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get propagation job status.
+
+        Args:
+            job_id: Job ID
+
+        Returns:
+            Job status dictionary or None if not found
+        """
+        job = NutritionPropagationJob.query.filter_by(job_id=job_id).first()
+        if not job:
+            return None
+
+        return {
+            'job_id': job.job_id,
+            'food_id': job.food_id,
+            'from_date': job.from_date.isoformat() if job.from_date else None,
+            'reason': job.reason,
+            'status': job.status,
+            'total_rows': job.total_rows,
+            'processed_rows': job.processed_rows,
+            'progress_percentage': job.progress_percentage,
+            'error_message': job.error_message,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'started_at': job.started_at.isoformat() if job.started_at else None,
+            'completed_at': job.completed_at.isoformat() if job.completed_at else None
+        }
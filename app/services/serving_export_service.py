@@ -6,23 +6,34 @@ with filtering capabilities and async job processing for large datasets.
 """
 
 import csv
+import gzip
 import json
 import os
 import threading
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Any, Dict, Iterable, List, Optional
 from flask import current_app
-from sqlalchemy import and_
+from sqlalchemy import and_, func
 from app import db
 from app.models import Food, FoodServing, ExportJob, User
+from app.services.export_artifact_store import ExportArtifactStore
+from app.services.sharded_export import ShardedExport
+from app.utils.db_routing import replica_session
 import uuid
 
 
 class ServingExportService:
     """Handles serving data export functionality."""
     
-    # Export formats
-    SUPPORTED_FORMATS = ['servings_csv', 'servings_json']
+    # Export formats; '.gz' variants download as gzip files instead of being
+    # decompressed by the client (every export is stored gzip-compressed)
+    SUPPORTED_FORMATS = [
+        'servings_csv', 'servings_json', 'servings_ndjson',
+        'servings_csv.gz', 'servings_json.gz', 'servings_ndjson.gz'
+    ]
+    
+    # Rows fetched per round trip when streaming CSV and NDJSON
+    STREAM_BATCH = 1000
     
     # CSV headers for export
     CSV_HEADERS = [
@@ -49,7 +60,7 @@ class ServingExportService:
         Start asynchronous serving data export.
         
         Args:
-            format_type: Export format ('servings_csv' or 'servings_json')
+            format_type: Export format (see SUPPORTED_FORMATS)
             filters: Optional filters to apply
             user_id: ID of user requesting export
             
@@ -59,12 +70,19 @@ class ServingExportService:
         if format_type not in self.SUPPORTED_FORMATS:
             raise ValueError(f"Unsupported export format: {format_type}")
         
+        # Same type, filters and catalog version: reuse the stored result
+        content_key = ExportArtifactStore.content_key(format_type, filters)
+        existing = ExportArtifactStore.find_existing(format_type, filters, content_key, user_id)
+        if existing is not None:
+            return existing.job_id
+        
         # Create export job
         job = ExportJob(
             export_type=format_type,
             filter_criteria=json.dumps(filters or {}),
             created_by=user_id,
-            status='pending'
+            status='pending',
+            content_key=content_key
         )
         
         db.session.add(job)
@@ -125,28 +143,38 @@ class ServingExportService:
             # Ensure export directory exists
             self._ensure_export_directory()
             
-            # Build query with filters
-            query = self._build_serving_query(filters)
-            servings = query.all()
+            with replica_session() as replica:
+                # Build query with filters (read from the replica when one is configured and has
+                # caught up with the catalog version the job is keyed on, else from the primary;
+                # the job's own progress stays on db.session and the primary)
+                reader = replica if ExportArtifactStore.reads_keyed_catalog(job, filters, replica) else db.session
+                query = self._build_serving_query(filters).with_session(reader)
+                workers = ShardedExport.workers_for(query)
             
-            # Generate filename
-            timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-            file_format = format_type.split('_')[1]  # Extract 'csv' or 'json' from 'servings_csv'
-            filename = f"serving_export_{timestamp}.{file_format}"
-            file_path = os.path.join(self.export_directory, filename)
+                # Generate filename
+                timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+                download_format = format_type.split('_')[1]  # 'ndjson.gz' from 'servings_ndjson.gz'
+                file_format = download_format.split('.')[0]
+                filename = f"serving_export_{timestamp}.{download_format}"
+                # Stored gzip-compressed under the job ID, so a shared artifact is never
+                # overwritten by another export started in the same second
+                file_path = os.path.join(self.export_directory, f"{job.job_id}_serving_export_{timestamp}.{file_format}.gz")
             
-            # Export data
-            if format_type == 'servings_csv':
-                self._export_to_csv(servings, file_path)
-            elif format_type == 'servings_json':
-                self._export_to_json(servings, file_path)
+                # Export data (large exports are serialized in parallel shards)
+                if workers:
+                    sharded = ShardedExport('servings', workers, reader.get_bind())
+                    total_records = sharded.run(job, file_format, filters, file_path)
+                elif file_format == 'json':
+                    servings = query.all()
+                    self._export_to_json(servings, file_path)
+                    total_records = len(servings)
+                elif file_format == 'ndjson':
+                    total_records = self._export_to_ndjson(query.yield_per(self.STREAM_BATCH), file_path)
+                else:
+                    total_records = self._export_to_csv(query.yield_per(self.STREAM_BATCH), file_path)
             
-            # Update job with file information
-            file_size = os.path.getsize(file_path)
-            job.filename = filename
-            job.file_path = file_path
-            job.file_size = file_size
-            job.total_records = len(servings)
+            # Update job with file information (shared with identical exports)
+            ExportArtifactStore.publish(job, file_path, filename, total_records)
             job.status = 'completed'
             job.completed_at = datetime.utcnow()
             
@@ -229,42 +257,78 @@ class ServingExportService:
         
         return query.order_by(Food.id.asc(), FoodServing.serving_name.asc())
     
-    def _export_to_csv(self, servings: List[FoodServing], file_path: str):
+    def _build_shard_query(self, filters: Optional[Dict[str, Any]], first_id: int, last_id: int):
+        """Filtered servings of foods with first_id <= food id <= last_id (one export shard)."""
+        return self._build_serving_query(filters).filter(Food.id.between(first_id, last_id))
+    
+    def _shard_key_range(self, filters: Optional[Dict[str, Any]]):
+        """Lowest and highest food id with servings matching the filters (None, None if there are none)."""
+        return self._build_serving_query(filters).order_by(None).with_entities(
+            func.min(Food.id), func.max(Food.id)
+        ).one()
+    
+    def _export_to_csv(self, servings: Iterable[FoodServing], file_path: str) -> int:
         """
         Export servings to CSV format.
         
         Args:
-            servings: List of FoodServing objects
-            file_path: Output file path
+            servings: FoodServing objects (a list or a streaming query)
+            file_path: Output file path (gzip-compressed)
+            
+        Returns:
+            Number of rows written
         """
-        with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
+        count = 0
+        with gzip.open(file_path, 'wt', newline='', encoding='utf-8', compresslevel=6) as csvfile:
             writer = csv.DictWriter(csvfile, fieldnames=self.CSV_HEADERS)
             writer.writeheader()
             
             for serving in servings:
-                # Get creator username if available
-                created_by_username = ''
-                if serving.created_by:
-                    creator = User.query.get(serving.created_by)
-                    if creator:
-                        created_by_username = creator.username
-                
-                # Build row data
-                row = {
-                    'serving_id': serving.id,
-                    'food_id': serving.food_id,
-                    'food_name': self._sanitize_csv_value(serving.food.name),
-                    'food_brand': self._sanitize_csv_value(serving.food.brand or ''),
-                    'food_category': self._sanitize_csv_value(serving.food.category or ''),
-                    'food_verified': serving.food.is_verified,
-                    'serving_name': self._sanitize_csv_value(serving.serving_name),
-                    'unit': self._sanitize_csv_value(serving.unit),
-                    'grams_per_unit': serving.grams_per_unit,
-                    'created_at': serving.created_at.isoformat() if serving.created_at else '',
-                    'created_by_username': self._sanitize_csv_value(created_by_username)
-                }
-                
-                writer.writerow(row)
+                writer.writerow(self._csv_row(serving))
+                count += 1
+        return count
+    
+    def _export_to_ndjson(self, servings: Iterable[FoodServing], file_path: str) -> int:
+        """
+        Export servings as newline-delimited JSON, one record per line in CSV order.
+        
+        Args:
+            servings: FoodServing objects (a list or a streaming query)
+            file_path: Output file path (gzip-compressed)
+            
+        Returns:
+            Number of records written
+        """
+        count = 0
+        with gzip.open(file_path, 'wt', encoding='utf-8', compresslevel=6) as ndjsonfile:
+            for serving in servings:
+                ndjsonfile.write(json.dumps(self._json_record(serving), ensure_ascii=False) + '\n')
+                count += 1
+        return count
+    
+    def _creator_username(self, serving: FoodServing) -> str:
+        """Username of the serving's creator, or '' if unknown."""
+        if serving.created_by:
+            creator = User.query.get(serving.created_by)
+            if creator:
+                return creator.username
+        return ''
+    
+    def _csv_row(self, serving: FoodServing) -> Dict[str, Any]:
+        """Build the CSV row for a serving."""
+        return {
+            'serving_id': serving.id,
+            'food_id': serving.food_id,
+            'food_name': self._sanitize_csv_value(serving.food.name),
+            'food_brand': self._sanitize_csv_value(serving.food.brand or ''),
+            'food_category': self._sanitize_csv_value(serving.food.category or ''),
+            'food_verified': serving.food.is_verified,
+            'serving_name': self._sanitize_csv_value(serving.serving_name),
+            'unit': self._sanitize_csv_value(serving.unit),
+            'grams_per_unit': serving.grams_per_unit,
+            'created_at': serving.created_at.isoformat() if serving.created_at else '',
+            'created_by_username': self._sanitize_csv_value(self._creator_username(serving))
+        }
     
     def _sanitize_csv_value(self, value):
         """
@@ -301,7 +365,7 @@ class ServingExportService:
         
         Args:
             servings: List of FoodServing objects
-            file_path: Output file path
+            file_path: Output file path (gzip-compressed)
         """
         export_data = {
             'export_info': {
@@ -314,34 +378,29 @@ class ServingExportService:
         }
         
         for serving in servings:
-            # Get creator username if available
-            created_by_username = ''
-            if serving.created_by:
-                creator = User.query.get(serving.created_by)
-                if creator:
-                    created_by_username = creator.username
-            
-            serving_data = {
-                'serving_id': serving.id,
-                'serving_name': serving.serving_name,
-                'unit': serving.unit,
-                'grams_per_unit': serving.grams_per_unit,
-                'created_at': serving.created_at.isoformat() if serving.created_at else None,
-                'created_by_username': created_by_username,
-                'food': {
-                    'id': serving.food.id,
-                    'name': serving.food.name,
-                    'brand': serving.food.brand,
-                    'category': serving.food.category,
-                    'is_verified': serving.food.is_verified
-                }
-            }
-            
-            export_data['servings'].append(serving_data)
+            export_data['servings'].append(self._json_record(serving))
         
-        with open(file_path, 'w', encoding='utf-8') as jsonfile:
+        with gzip.open(file_path, 'wt', encoding='utf-8', compresslevel=6) as jsonfile:
             json.dump(export_data, jsonfile, indent=2, ensure_ascii=False)
     
+    def _json_record(self, serving: FoodServing) -> Dict[str, Any]:
+        """Build the JSON record for a serving."""
+        return {
+            'serving_id': serving.id,
+            'serving_name': serving.serving_name,
+            'unit': serving.unit,
+            'grams_per_unit': serving.grams_per_unit,
+            'created_at': serving.created_at.isoformat() if serving.created_at else None,
+            'created_by_username': self._creator_username(serving),
+            'food': {
+                'id': serving.food.id,
+                'name': serving.food.name,
+                'brand': serving.food.brand,
+                'category': serving.food.category,
+                'is_verified': serving.food.is_verified
+            }
+        }
+    
     def get_export_statistics(self) -> Dict[str, Any]:
         """Get statistics about exportable serving data."""
         total_servings = FoodServing.query.count()
@@ -0,0 +1,335 @@
+"""
+Sharded Export
+
+Exporting millions of foods or servings is CPU-bound on serializing rows in
+a single thread. In sharded mode the food id range of the (filtered) export
+is split into contiguous shards, and a pool of worker processes serializes
+them in parallel. Each worker has its own Flask app and database
+connection and writes its shard as a raw deflate segment ending on a byte
+boundary (the way pigz splits work). The parent joins the segments in id
+order between a gzip header and trailer, combining the shard CRCs, so the
+artifact is an ordinary single-member .gz file and nothing is compressed
+twice.
+
+FoodExportService and ServingExportService switch to this mode when an
+export has at least EXPORT_SHARD_MIN_ROWS records and EXPORT_SHARD_WORKERS
+is greater than 1. It needs a database the workers can open themselves, so
+in-memory SQLite always exports in-process. Workers read from the read
+replica when the export does (see app/utils/db_routing.py). Shard
+progress is recorded on ExportJob.shards_completed / shard_count.
+
+CSV, JSON and NDJSON are supported. Food and serving exports are ordered
+by food id whether sharded or not, so both modes produce the same output.
+Each shard reads in its own transaction, so a catalog edit made during the
+export may show up in some shards and not others.
+"""
+
+import csv
+import io
+import json
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from importlib import import_module
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy.engine import Engine
+
+from app import db
+from app.models import ExportJob
+from app.utils.db_routing import read_engine
+
+# Export service per shard kind; imported lazily (the services import this module)
+SERVICES = {
+    'foods': ('app.services.food_export_service', 'FoodExportService'),
+    'servings': ('app.services.serving_export_service', 'ServingExportService'),
+}
+
+# Rows serialized between writes to the deflate stream
+WRITE_BATCH = 1000
+
+_GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+
+
+class DeflateSegmentWriter:
+    """
+    Writes text as a raw deflate segment that can be concatenated with others.
+
+    The segment ends with a sync flush (byte-aligned, not final), and its CRC32
+    and uncompressed length are tracked so segments can be joined into one
+    gzip member.
+    """
+
+    def __init__(self, fileobj, level: int = 6):
+        self.fileobj = fileobj
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self.crc = 0
+        self.length = 0
+
+    def write(self, text: str):
+        data = text.encode('utf-8')
+        self.crc = zlib.crc32(data, self.crc)
+        self.length += len(data)
+        self.fileobj.write(self.compressor.compress(data))
+
+    def close(self) -> Tuple[int, int]:
+        """Flush the segment; returns (crc32, uncompressed length)."""
+        self.fileobj.write(self.compressor.flush(zlib.Z_SYNC_FLUSH))
+        return self.crc, self.length
+
+
+def _gf2_matrix_times(matrix: List[int], vector: int) -> int:
+    total = 0
+    index = 0
+    while vector:
+        if vector & 1:
+            total ^= matrix[index]
+        vector >>= 1
+        index += 1
+    return total
+
+
+def _gf2_matrix_square(matrix: List[int]) -> List[int]:
+    return [_gf2_matrix_times(matrix, matrix[n]) for n in range(32)]
+
+
+def crc32_combine(crc1: int, crc2: int, length2: int) -> int:
+    """CRC32 of A + B from crc32(A), crc32(B) and len(B) (zlib's crc32_combine)."""
+    if length2 <= 0:
+        return crc1
+
+    odd = [0xEDB88320] + [1 << n for n in range(31)]  # operator for one zero bit
+    even = _gf2_matrix_square(odd)  # two zero bits
+    odd = _gf2_matrix_square(even)  # four zero bits
+
+    # Apply length2 zero bytes to crc1, squaring the operator for each bit of length2
+    while True:
+        even = _gf2_matrix_square(odd)
+        if length2 & 1:
+            crc1 = _gf2_matrix_times(even, crc1)
+        length2 >>= 1
+        if not length2:
+            break
+        odd = _gf2_matrix_square(even)
+        if length2 & 1:
+            crc1 = _gf2_matrix_times(odd, crc1)
+        length2 >>= 1
+        if not length2:
+            break
+    return crc1 ^ crc2
+
+
+def _service(kind: str):
+    module, name = SERVICES[kind]
+    return getattr(import_module(module), name)()
+
+
+_worker_app = None
+
+
+def _init_worker(database_uri: str):
+    """Process pool initializer: an app context with its own engine."""
+    global _worker_app
+    from flask import Flask
+
+    _worker_app = Flask('export_worker')
+    _worker_app.config.update(SQLALCHEMY_DATABASE_URI=database_uri, SQLALCHEMY_TRACK_MODIFICATIONS=False)
+    db.init_app(_worker_app)
+    _worker_app.app_context().push()
+
+
+def export_shard(kind: str, file_format: str, filters: Optional[Dict[str, Any]],
+                 first_id: int, last_id: int, part_path: str) -> Tuple[int, int, int]:
+    """
+    Serialize one shard to a deflate segment file.
+
+    Args:
+        kind: 'foods' or 'servings'
+        file_format: 'csv', 'json' or 'ndjson'
+        filters: Export filters
+        first_id, last_id: Inclusive food id range of the shard
+        part_path: Output file
+
+    Returns:
+        (records, crc32, uncompressed length)
+    """
+    service = _service(kind)
+    query = service._build_shard_query(filters, first_id, last_id)
+    records = 0
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=service.CSV_HEADERS) if file_format == 'csv' else None
+
+    with open(part_path, 'wb') as f:
+        segment = DeflateSegmentWriter(f)
+        for record in query.yield_per(WRITE_BATCH):
+            if writer is not None:
+                writer.writerow(service._csv_row(record))
+            elif file_format == 'ndjson':
+                buffer.write(json.dumps(service._json_record(record), ensure_ascii=False) + '\n')
+            else:
+                if records:
+                    buffer.write(',\n')
+                buffer.write('    ' + json.dumps(service._json_record(record), ensure_ascii=False))
+            records += 1
+            if records % WRITE_BATCH == 0:
+                segment.write(buffer.getvalue())
+                buffer.seek(0)
+                buffer.truncate()
+        segment.write(buffer.getvalue())
+        crc, length = segment.close()
+    return records, crc, length
+
+
+class ShardedExport:
+    """Runs one export job across shards and joins the result."""
+
+    # More shards than workers evens out shards of different density
+    SHARDS_PER_WORKER = 4
+
+    def __init__(self, kind: str, workers: int, engine: Optional[Engine] = None):
+        """
+        Args:
+            kind: 'foods' or 'servings'
+            workers: Worker processes (1 serializes the shards in this process)
+            engine: Database the worker processes read (default read_engine())
+        """
+        self.kind = kind
+        self.workers = workers
+        self.engine = engine or read_engine()
+        self.service = _service(kind)
+
+    @staticmethod
+    def workers_for(query) -> int:
+        """
+        Worker processes to use for an export query.
+
+        Returns:
+            0 if the export should run unsharded
+        """
+        config = current_app.config
+        workers = config.get('EXPORT_SHARD_WORKERS', 0)
+        if workers <= 1:
+            return 0
+        url = query.session.get_bind().url
+        if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+            return 0  # Workers cannot open a private in-memory database
+        if query.order_by(None).count() < config.get('EXPORT_SHARD_MIN_ROWS', 0):
+            return 0
+        return workers
+
+    def plan(self, filters: Optional[Dict[str, Any]], shard_count: int) -> List[Tuple[int, int]]:
+        """Split the filtered food id range into up to shard_count inclusive ranges."""
+        low, high = self.service._shard_key_range(filters)
+        if low is None:
+            return []
+        step = max(1, -(-(high - low + 1) // shard_count))
+        return [(first, min(first + step - 1, high)) for first in range(low, high + 1, step)]
+
+    def run(self, job: ExportJob, file_format: str, filters: Optional[Dict[str, Any]], file_path: str) -> int:
+        """
+        Export all shards and write the joined gzip file.
+
+        Args:
+            job: Export job (shard progress is committed on it)
+            file_format: 'csv', 'json' or 'ndjson'
+            filters: Export filters
+            file_path: Output .gz path
+
+        Returns:
+            Number of exported records
+        """
+        shards = self.plan(filters, self.workers * self.SHARDS_PER_WORKER)
+        parts = [f'{file_path}.part{index:04d}' for index in range(len(shards))]
+        results: List[Optional[Tuple[int, int, int]]] = [None] * len(shards)
+        job.shard_count = len(shards)
+        job.shards_completed = 0
+        db.session.commit()
+
+        try:
+            if self.workers <= 1:
+                for index, (first_id, last_id) in enumerate(shards):
+                    results[index] = export_shard(self.kind, file_format, filters, first_id, last_id, parts[index])
+                    self._shard_completed(job)
+            else:
+                with ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context('spawn'),
+                                         initializer=_init_worker,
+                                         initargs=(self.engine.url.render_as_string(hide_password=False),)) as pool:
+                    futures = {
+                        pool.submit(export_shard, self.kind, file_format, filters, first_id, last_id, parts[index]): index
+                        for index, (first_id, last_id) in enumerate(shards)
+                    }
+                    for future in as_completed(futures):
+                        results[futures[future]] = future.result()
+                        self._shard_completed(job)
+
+            total_records = sum(result[0] for result in results)
+            self._join(parts, results, file_format, total_records, file_path)
+        finally:
+            for part in parts:
+                if os.path.exists(part):
+                    os.remove(part)
+        return total_records
+
+    @staticmethod
+    def _shard_completed(job: ExportJob):
+        job.shards_completed = (job.shards_completed or 0) + 1
+        db.session.commit()
+
+    def _envelope(self, file_format: str, total_records: int) -> Tuple[str, str, str]:
+        """(header, separator between non-empty shards, footer) for a format."""
+        if file_format == 'csv':
+            header = io.StringIO()
+            csv.DictWriter(header, fieldnames=self.service.CSV_HEADERS).writeheader()
+            return header.getvalue(), '', ''
+        if file_format == 'ndjson':
+            return '', '', ''
+
+        export_info = json.dumps({
+            'generated_at': datetime.utcnow().isoformat(),
+            'total_records': total_records,
+            'format': 'json',
+            'version': '1.0'
+        })
+        return f'{{\n  "export_info": {export_info},\n  "{self.kind}": [\n', ',\n', '\n  ]\n}\n'
+
+    def _join(self, parts: List[str], results: List[Tuple[int, int, int]], file_format: str,
+              total_records: int, file_path: str):
+        """Write gzip header, envelope and shard segments in order, then the trailer."""
+        header, separator, footer = self._envelope(file_format, total_records)
+        crc, length = 0, 0
+
+        with open(file_path, 'wb') as out:
+            out.write(_GZIP_HEADER)
+
+            def write_text(text):
+                nonlocal crc, length
+                if text:
+                    segment = DeflateSegmentWriter(out)
+                    segment.write(text)
+                    crc, length = crc32_combine(crc, segment.crc, segment.length), length + segment.length
+                    segment.close()
+
+            write_text(header)
+            first = True
+            for part, (records, part_crc, part_length) in zip(parts, results):
+                if not records:
+                    continue
+                if not first:
+                    write_text(separator)
+                first = False
+                with open(part, 'rb') as segment_file:
+                    while True:
+                        chunk = segment_file.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        out.write(chunk)
+                crc, length = crc32_combine(crc, part_crc, part_length), length + part_length
+            write_text(footer)
+
+            # Final empty block, then CRC32 and size of the uncompressed stream
+            out.write(zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS).flush(zlib.Z_FINISH))
+            out.write(struct.pack('<II', crc, length & 0xFFFFFFFF))
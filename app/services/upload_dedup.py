@@ -0,0 +1,176 @@
+"""
+Upload Deduplication
+
+Makes bulk food and serving uploads idempotent. Each upload job stores the
+SHA-256 of the uploaded file; uploading a file identical to a completed (or
+still running) upload of the same kind returns that job instead of
+importing the rows again, unless the admin forces reprocessing.
+
+Below the file level, rows are grouped into content-defined chunks: a chunk
+ends after a row whose hash hits a boundary value, so inserting or deleting
+a row only changes the chunk it lands in and leaves later chunks (and their
+hashes) intact. Chunks that an earlier upload processed without failures
+are recorded as UploadChunk rows and skipped by later uploads, so a file
+with a few edited rows only re-imports the chunks around those rows.
+
+Skipping is only valid while the catalog still holds what the chunk wrote:
+serving rows are upserts a later upload can overwrite, and imported foods
+can be deleted. A finished upload stamps its chunks with the catalog version
+it left behind (stamp_chunks), and chunks, like identical completed files,
+are only reused while the catalog is still at that version. Any catalog
+change in between means the upload is processed again; a forced upload
+always processes every row.
+"""
+
+import hashlib
+import json
+import zlib
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Union
+
+from app import db
+from app.models import CatalogVersion, UploadChunk
+
+
+class RowChunk(NamedTuple):
+    """A run of consecutive CSV rows and its content hash."""
+    first_row: int  # 0-based index of the first data row
+    rows: List[Dict[str, Any]]
+    chunk_hash: str
+
+
+class UploadDeduplicator:
+    """File-level and chunk-level deduplication for one upload kind."""
+
+    # Content-defined chunk sizes, in rows
+    AVERAGE_CHUNK_ROWS = 64
+    MIN_CHUNK_ROWS = 16
+    MAX_CHUNK_ROWS = 256
+
+    # Statuses of an earlier upload that make a new identical one redundant
+    REUSABLE_STATUSES = ('pending', 'processing', 'completed')
+
+    def __init__(self, upload_type: str, job_model):
+        """
+        Args:
+            upload_type: 'foods' or 'servings'
+            job_model: BulkUploadJob or ServingUploadJob
+        """
+        self.upload_type = upload_type
+        self.job_model = job_model
+
+    @staticmethod
+    def file_hash(content: Union[bytes, str]) -> str:
+        """SHA-256 hex digest of an uploaded file."""
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        return hashlib.sha256(content).hexdigest()
+
+    def find_existing(self, file_hash: str):
+        """
+        Latest upload job of this kind for an identical file.
+
+        Args:
+            file_hash: Hash from file_hash()
+
+        Returns:
+            A pending or processing job, a completed job whose rows the
+            catalog still holds, or None
+        """
+        if not file_hash:
+            return None
+        job = self.job_model.query.filter(
+            self.job_model.file_hash == file_hash,
+            self.job_model.status.in_(self.REUSABLE_STATUSES)
+        ).order_by(self.job_model.created_at.desc(), self.job_model.id.desc()).first()
+        if job is not None and job.status == 'completed' and not self._chunks_current(job.job_id):
+            return None
+        return job
+
+    def _chunks_current(self, job_id: str) -> bool:
+        """Whether every chunk of a job was stamped at the current catalog version."""
+        stale = db.session.query(UploadChunk.id).filter(
+            UploadChunk.upload_type == self.upload_type,
+            UploadChunk.job_id == job_id,
+            (UploadChunk.catalog_version.is_(None)) | (UploadChunk.catalog_version != CatalogVersion.current())
+        ).first()
+        return stale is None
+
+    @staticmethod
+    def _canonical_row(row: Dict[str, Any]) -> bytes:
+        # Column names are part of the row, so reordered columns hash the same
+        items = sorted(row.items(), key=lambda item: str(item[0]))
+        return json.dumps(items, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+    @classmethod
+    def chunks(cls, rows: Iterable[Dict[str, Any]]) -> List[RowChunk]:
+        """
+        Split CSV rows into content-defined chunks.
+
+        Args:
+            rows: Rows from csv.DictReader
+
+        Returns:
+            Chunks covering all rows, in order
+        """
+        chunks = []
+        current: List[Dict[str, Any]] = []
+        digest = hashlib.sha256()
+        first_row = 0
+
+        for index, row in enumerate(rows):
+            data = cls._canonical_row(row)
+            current.append(row)
+            digest.update(data)
+            at_boundary = zlib.crc32(data) % cls.AVERAGE_CHUNK_ROWS == 0
+            if (at_boundary and len(current) >= cls.MIN_CHUNK_ROWS) or len(current) >= cls.MAX_CHUNK_ROWS:
+                chunks.append(RowChunk(first_row, current, digest.hexdigest()))
+                current, digest, first_row = [], hashlib.sha256(), index + 1
+
+        if current:
+            chunks.append(RowChunk(first_row, current, digest.hexdigest()))
+        return chunks
+
+    def processed_chunks(self, chunk_hashes: Iterable[str]) -> Set[str]:
+        """
+        Hashes among chunk_hashes that an earlier upload processed without
+        failures, with no catalog change since it finished.
+        """
+        chunk_hashes = list(set(chunk_hashes))
+        catalog_version = CatalogVersion.current()
+        processed = set()
+        for start in range(0, len(chunk_hashes), 500):  # Stay under SQLite's bound parameter limit
+            processed.update(hash_ for (hash_,) in db.session.query(UploadChunk.chunk_hash).filter(
+                UploadChunk.upload_type == self.upload_type,
+                UploadChunk.chunk_hash.in_(chunk_hashes[start:start + 500]),
+                UploadChunk.failed_rows == 0,
+                UploadChunk.catalog_version == catalog_version
+            ).distinct())
+        return processed
+
+    def record_chunk(self, job_id: str, chunk: RowChunk, failed_rows: int):
+        """
+        Record a processed or reused chunk (added to the session, not committed).
+
+        Args:
+            job_id: job_id of the upload job
+            chunk: The processed chunk
+            failed_rows: Rows of the chunk that failed
+        """
+        db.session.add(UploadChunk(
+            upload_type=self.upload_type,
+            job_id=job_id,
+            chunk_hash=chunk.chunk_hash,
+            first_row=chunk.first_row,
+            row_count=len(chunk.rows),
+            failed_rows=failed_rows
+        ))
+
+    def stamp_chunks(self, job_id: str):
+        """
+        Mark a finished job's chunks reusable at the current catalog version
+        (in the session's transaction, not committed). Call after the job's
+        last catalog write.
+        """
+        UploadChunk.query.filter_by(upload_type=self.upload_type, job_id=job_id).update(
+            {UploadChunk.catalog_version: CatalogVersion.current()}, synchronize_session=False
+        )
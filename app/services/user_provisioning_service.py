@@ -0,0 +1,429 @@
+"""
+Bulk User Provisioning Service
+
+This service onboards a cohort of users from a CSV or JSON file as a
+background job. Compared to creating users one at a time through
+/api/admin/users it:
+- checks user_id, username and email uniqueness with set-based IN queries
+  (plus in-file duplicate detection) instead of per-row lookups
+- allocates generated usernames in batches from one LIKE query per chunk
+  of base names instead of one query per candidate
+- fans the CPU-heavy password hashing out to a process pool
+- inserts users and per-row results in batches
+"""
+
+import csv
+import io
+import json
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.models import User, UserProvisioningJob, UserProvisioningJobItem
+
+
+class UserProvisioningService:
+    """Handles asynchronous bulk creation of user accounts."""
+
+    SUPPORTED_FORMATS = ['csv', 'json']
+
+    REQUIRED_FIELDS = ['first_name', 'last_name', 'password']
+    OPTIONAL_FIELDS = ['user_id', 'username', 'email', 'is_admin']
+
+    MAX_ROWS = 10000
+
+    # Rows per INSERT batch and per uniqueness IN query
+    BATCH_SIZE = 500
+
+    # Below this many passwords the process pool start-up costs more than it saves
+    PARALLEL_HASH_THRESHOLD = 32
+
+    USER_ID_PATTERN = re.compile(r'^[a-zA-Z0-9\-_]+$')
+    USERNAME_PATTERN = re.compile(r'^[a-zA-Z0-9_-]+$')
+
+    def __init__(self, hash_workers: Optional[int] = None):
+        """
+        Initialize the provisioning service.
+
+        Args:
+            hash_workers: Password hashing processes (defaults to the CPU count;
+                0 hashes in the calling thread)
+        """
+        self.hash_workers = (os.cpu_count() or 1) if hash_workers is None else hash_workers
+        self.processing_lock = threading.Lock()
+
+    def parse_content(self, content: str, source_format: str) -> List[Dict[str, Any]]:
+        """
+        Parse an uploaded CSV or JSON file into row dicts.
+
+        JSON may be a list of user objects or an object with a "users" list.
+
+        Raises:
+            ValueError: If the format is unsupported or the file is malformed
+        """
+        if source_format not in self.SUPPORTED_FORMATS:
+            raise ValueError(f"Unsupported format. Supported formats: {', '.join(self.SUPPORTED_FORMATS)}")
+
+        if source_format == 'csv':
+            reader = csv.DictReader(io.StringIO(content))
+            headers = [h.strip() for h in (reader.fieldnames or [])]
+            missing = [h for h in self.REQUIRED_FIELDS if h not in headers]
+            if missing:
+                raise ValueError(f"Missing required headers: {', '.join(missing)}")
+            rows = [{(k or '').strip(): v for k, v in row.items()} for row in reader]
+        else:
+            try:
+                data = json.loads(content)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON: {str(e)}")
+            rows = data.get('users') if isinstance(data, dict) else data
+            if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+                raise ValueError("JSON must be a list of user objects or {\"users\": [...]}")
+
+        if not rows:
+            raise ValueError("File contains no user rows")
+        if len(rows) > self.MAX_ROWS:
+            raise ValueError(f"Too many rows ({len(rows)}). Maximum is {self.MAX_ROWS} per job")
+        return rows
+
+    def start_async_provisioning(self, rows: List[Dict[str, Any]], filename: str,
+                                 source_format: str, created_by: int) -> str:
+        """
+        Create a provisioning job and process it in a background thread.
+
+        Args:
+            rows: Parsed user rows
+            filename: Original filename (or a label for JSON request bodies)
+            source_format: 'csv' or 'json'
+            created_by: ID of the admin starting the job
+
+        Returns:
+            Job ID for tracking progress
+        """
+        job = UserProvisioningJob(
+            filename=filename,
+            source_format=source_format,
+            total_rows=len(rows),
+            created_by=created_by,
+            status='pending'
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        from flask import current_app
+        app = current_app._get_current_object()
+        thread = threading.Thread(
+            target=self._process_async,
+            args=(app, job.job_id, rows),
+            daemon=True
+        )
+        thread.start()
+
+        return job.job_id
+
+    def _process_async(self, app, job_id: str, rows: List[Dict[str, Any]]):
+        """Run process_job inside an app context, recording unexpected failures."""
+        with self.processing_lock:
+            try:
+                with app.app_context():
+                    self.process_job(job_id, rows)
+            except Exception as e:
+                with app.app_context():
+                    db.session.rollback()
+                    job = UserProvisioningJob.query.filter_by(job_id=job_id).first()
+                    if job:
+                        job.status = 'failed'
+                        job.error_message = str(e)
+                        job.completed_at = datetime.utcnow()
+                        db.session.commit()
+
+    def process_job(self, job_id: str, rows: List[Dict[str, Any]]):
+        """
+        Validate, hash and insert all rows of a job.
+
+        Args:
+            job_id: Job ID to process
+            rows: Parsed user rows (row numbers are 1-based positions)
+        """
+        job = UserProvisioningJob.query.filter_by(job_id=job_id).first()
+        if not job:
+            return
+
+        job.status = 'processing'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+
+        candidates, failures = self.validate_rows(rows)
+        self._check_uniqueness(candidates, failures)
+        candidates = [c for c in candidates if c['row_number'] not in failures]
+        self.allocate_usernames(candidates)
+
+        # Password hashing dominates the cost; do it for every row up front
+        hashes = self.hash_passwords([c.pop('password') for c in candidates])
+        for candidate, password_hash in zip(candidates, hashes):
+            candidate['password_hash'] = password_hash
+
+        self._record_failures(job, failures)
+
+        for start in range(0, len(candidates), self.BATCH_SIZE):
+            self._insert_batch(job, candidates[start:start + self.BATCH_SIZE])
+
+        job.status = 'completed'
+        job.completed_at = datetime.utcnow()
+        db.session.commit()
+
+    def validate_rows(self, rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[int, str]]:
+        """
+        Validate row contents without touching the database.
+
+        Returns:
+            Tuple of (normalized candidate rows, {row_number: error message})
+        """
+        candidates = []
+        failures = {}
+
+        for row_number, row in enumerate(rows, 1):
+            errors = []
+            values = {field: str(row.get(field) or '').strip()
+                      for field in self.REQUIRED_FIELDS + self.OPTIONAL_FIELDS}
+
+            for field in self.REQUIRED_FIELDS:
+                if not values[field]:
+                    errors.append(f'{field.replace("_", " ").title()} is required')
+
+            if values['password']:
+                errors.extend(User.validate_password(values['password'])['errors'])
+
+            if values['user_id'] and (len(values['user_id']) > 36 or not self.USER_ID_PATTERN.match(values['user_id'])):
+                errors.append("User ID must be at most 36 letters, numbers, hyphens or underscores")
+
+            if values['username'] and (len(values['username']) > 80 or not self.USERNAME_PATTERN.match(values['username'])):
+                errors.append("Username can only contain letters, numbers, underscores, and hyphens")
+
+            if values['email'] and not User.validate_email(values['email']):
+                errors.append("Invalid email address")
+
+            if errors:
+                failures[row_number] = '; '.join(errors)
+                continue
+
+            candidates.append({
+                'row_number': row_number,
+                'user_id': values['user_id'] or User.generate_user_id(),
+                'username': values['username'],
+                'email': values['email'].lower() or None,
+                'first_name': values['first_name'],
+                'last_name': values['last_name'],
+                'password': values['password'],
+                'is_admin': values['is_admin'].lower() in ('1', 'true', 'yes')
+            })
+
+        return candidates, failures
+
+    def _check_uniqueness(self, candidates: List[Dict[str, Any]], failures: Dict[int, str]):
+        """Flag rows whose user_id, username or email is taken, in the file or the database."""
+        for field, column in (('user_id', User.user_id), ('username', User.username), ('email', User.email)):
+            values = [c[field] for c in candidates if c[field]]
+            existing = self._existing_values(column, values, lowercase=(field == 'email'))
+            label = field.replace('_', ' ').title().replace('Id', 'ID')
+
+            seen = set()
+            for candidate in candidates:
+                value = candidate[field]
+                if not value or candidate['row_number'] in failures:
+                    continue
+                key = value.lower() if field == 'email' else value
+                if key in existing:
+                    failures[candidate['row_number']] = f'{label} already exists'
+                elif key in seen:
+                    failures[candidate['row_number']] = f'Duplicate {label} in file'
+                seen.add(key)
+
+    def _existing_values(self, column, values: Iterable[str], lowercase: bool = False) -> set:
+        """Return which of values already exist in column, using chunked IN queries."""
+        values = list(dict.fromkeys(values))
+        existing = set()
+        for start in range(0, len(values), self.BATCH_SIZE):
+            chunk = values[start:start + self.BATCH_SIZE]
+            target = db.func.lower(column) if lowercase else column
+            existing.update(value for (value,) in db.session.query(target).filter(target.in_(chunk)))
+        return existing
+
+    def allocate_usernames(self, candidates: List[Dict[str, Any]]):
+        """
+        Assign usernames to candidates without one, following User.generate_username's
+        first+last, first+last1, first+last2 ... scheme. Usernames given explicitly
+        elsewhere in the file are treated as taken.
+
+        Existing usernames for each chunk of base names are fetched with one query,
+        then suffixes are assigned in memory (also avoiding clashes within the file).
+        """
+        bases = {}
+        taken = {c['username'] for c in candidates if c['username']}
+        for candidate in candidates:
+            if candidate['username']:
+                continue
+            first = re.sub(r'[^a-zA-Z]', '', candidate['first_name'].lower())
+            last = re.sub(r'[^a-zA-Z]', '', candidate['last_name'].lower())
+            bases.setdefault(f"{first}{last}" or 'user', []).append(candidate)
+
+        base_names = list(bases)
+        for start in range(0, len(base_names), self.BATCH_SIZE):
+            chunk = base_names[start:start + self.BATCH_SIZE]
+            rows = db.session.query(User.username).filter(
+                or_(*[User.username.like(f'{base}%') for base in chunk])
+            )
+            taken.update(username for (username,) in rows)
+
+        for base, group in bases.items():
+            counter = 0
+            for candidate in group:
+                username = base if counter == 0 else f"{base}{counter}"
+                while username in taken:
+                    counter += 1
+                    username = f"{base}{counter}"
+                candidate['username'] = username
+                taken.add(username)
+
+    def hash_passwords(self, passwords: List[str]) -> List[str]:
+        """Hash passwords, in a process pool when the batch is large enough."""
+        if self.hash_workers <= 1 or len(passwords) < self.PARALLEL_HASH_THRESHOLD:
+            return [generate_password_hash(password) for password in passwords]
+
+        workers = min(self.hash_workers, len(passwords))
+        chunksize = max(1, len(passwords) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(generate_password_hash, passwords, chunksize=chunksize))
+
+    def _record_failures(self, job: UserProvisioningJob, failures: Dict[int, str]):
+        """Insert failed row results in one batch."""
+        if not failures:
+            return
+        now = datetime.utcnow()
+        db.session.execute(insert(UserProvisioningJobItem), [
+            {'job_id': job.id, 'row_number': row_number, 'status': 'failed',
+             'error_message': error, 'processed_at': now}
+            for row_number, error in sorted(failures.items())
+        ])
+        job.failed_rows += len(failures)
+        job.processed_rows += len(failures)
+        db.session.commit()
+
+    def _insert_batch(self, job: UserProvisioningJob, batch: List[Dict[str, Any]]):
+        """Insert one batch of users and their job items in a single transaction."""
+        now = datetime.utcnow()
+        mappings = [self._user_mapping(candidate, now) for candidate in batch]
+
+        try:
+            created = db.session.execute(
+                insert(User).returning(User.id, User.user_id), mappings
+            ).all()
+            ids_by_key = {user_key: user_id for user_id, user_key in created}
+            errors = {}
+        except IntegrityError:
+            # A concurrent signup took a value after the uniqueness check; fall
+            # back to row-at-a-time inserts so only the conflicting rows fail
+            db.session.rollback()
+            ids_by_key, errors = self._insert_individually(mappings)
+
+        items = []
+        for candidate in batch:
+            user_id = ids_by_key.get(candidate['user_id'])
+            items.append({
+                'job_id': job.id,
+                'row_number': candidate['row_number'],
+                'user_key': candidate['user_id'],
+                'username': candidate['username'],
+                'email': candidate['email'],
+                'status': 'success' if user_id else 'failed',
+                'error_message': errors.get(candidate['user_id']),
+                'created_user_id': user_id,
+                'processed_at': now
+            })
+        db.session.execute(insert(UserProvisioningJobItem), items)
+
+        job.successful_rows += len(ids_by_key)
+        job.failed_rows += len(batch) - len(ids_by_key)
+        job.processed_rows += len(batch)
+        db.session.commit()
+
+    def _insert_individually(self, mappings: List[Dict[str, Any]]) -> Tuple[Dict[str, int], Dict[str, str]]:
+        """Insert users one by one in savepoints, collecting per-row errors."""
+        ids_by_key = {}
+        errors = {}
+        for mapping in mappings:
+            try:
+                with db.session.begin_nested():
+                    user_id = db.session.execute(insert(User).returning(User.id), [mapping]).scalar()
+                ids_by_key[mapping['user_id']] = user_id
+            except IntegrityError:
+                errors[mapping['user_id']] = 'User ID, username or email already exists'
+        return ids_by_key, errors
+
+    @staticmethod
+    def _user_mapping(candidate: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+        """Column values for a new User row."""
+        return {
+            'user_id': candidate['user_id'],
+            'username': candidate['username'],
+            'email': candidate['email'],
+            'password_hash': candidate['password_hash'],
+            'first_name': candidate['first_name'],
+            'last_name': candidate['last_name'],
+            'is_admin': candidate['is_admin'],
+            'is_active': True,
+            'created_at': now,
+            'password_changed_at': now
+        }
+
+    def get_job_status(self, job_id: str, include_items: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Get current status of a provisioning job.
+
+        Args:
+            job_id: Job ID to check
+            include_items: Include every per-row result (failed rows are always included)
+
+        Returns:
+            Job status information
+        """
+        job = UserProvisioningJob.query.filter_by(job_id=job_id).first()
+        if not job:
+            return None
+
+        items_query = job.job_items
+        if not include_items:
+            items_query = items_query.filter_by(status='failed')
+
+        return {
+            'job_id': job.job_id,
+            'filename': job.filename,
+            'source_format': job.source_format,
+            'status': job.status,
+            'total_rows': job.total_rows,
+            'processed_rows': job.processed_rows,
+            'successful_rows': job.successful_rows,
+            'failed_rows': job.failed_rows,
+            'progress_percentage': job.progress_percentage,
+            'error_message': job.error_message,
+            'created_at': job.created_at.isoformat(),
+            'started_at': job.started_at.isoformat() if job.started_at else None,
+            'completed_at': job.completed_at.isoformat() if job.completed_at else None,
+            'items': [{
+                'row_number': item.row_number,
+                'user_id': item.user_key,
+                'username': item.username,
+                'email': item.email,
+                'status': item.status,
+                'error_message': item.error_message,
+                'created_user_id': item.created_user_id
+            } for item in items_query.order_by(UserProvisioningJobItem.row_number)]
+        }
@@ -0,0 +1,65 @@
+/**
+ * Job Progress Stream
+ * Subscribes to upload and export job progress over Server-Sent Events
+ * (/admin/jobs/events) instead of polling the status endpoints.
+ */
+
+const JobProgress = {
+    /**
+     * Whether the browser supports EventSource; pages keep polling when it doesn't
+     */
+    supported: typeof window.EventSource !== 'undefined',
+
+    /**
+     * Watch one job ({type, jobId}), several jobs ({type, jobIds}) or the current
+     * user's active jobs ({type} or {}).
+     *
+     * The server sends the full state of each job first, then only the fields
+     * that changed; handlers receive the merged state of the job.
+     *
+     * @param {Object} filter - {type: 'upload'|'servings'|'export', jobId, jobIds}
+     * @param {Object} handlers - {onProgress(state), onDone(reason)}
+     * @returns {{close: Function}} Call close() to stop watching
+     */
+    watch: function(filter, handlers) {
+        const params = new URLSearchParams();
+        if (filter.type) params.set('type', filter.type);
+        if (filter.jobId) params.append('job_id', filter.jobId);
+        (filter.jobIds || []).forEach(function(jobId) {
+            params.append('job_id', jobId);
+        });
+
+        const states = {};
+        const source = new EventSource(`/admin/jobs/events?${params.toString()}`);
+
+        source.addEventListener('progress', function(event) {
+            const delta = JSON.parse(event.data);
+            const key = `${delta.type}:${delta.job_id}`;
+            states[key] = Object.assign(states[key] || {}, delta);
+            if (handlers.onProgress) {
+                handlers.onProgress(Object.assign({}, states[key]));
+            }
+        });
+
+        source.addEventListener('done', function(event) {
+            // Nothing left to watch; stop EventSource from reconnecting
+            source.close();
+            if (handlers.onDone) {
+                handlers.onDone(JSON.parse(event.data).reason);
+            }
+        });
+
+        source.onerror = function() {
+            // EventSource reconnects on its own after the server's retry delay
+            console.warn('[Job Progress] Stream interrupted, reconnecting');
+        };
+
+        return {
+            close: function() {
+                source.close();
+            }
+        };
+    }
+};
+
+window.JobProgress = JobProgress;
@@ -6,10 +6,14 @@ from flask import Blueprint
 from flask_restx import Api, Resource, fields, Namespace
 from flask_login import current_user
 from functools import wraps
+from app.utils.sharding import pin_current_user_shard
 
 # Create the blueprint
 swagger_bp = Blueprint('swagger_api', __name__, url_prefix='/api/docs')
 
+# Meal logs are read from the logged-in user's shard
+swagger_bp.before_request(pin_current_user_shard)
+
 # Create the API with Swagger documentation
 api = Api(
     swagger_bp,
@@ -5,7 +5,7 @@ from flask import request
 from flask_restx import Resource
 from flask_login import current_user
 from app.swagger_api import nutrition_ns, nutrition_summary_model, error_model, swagger_login_required
-from app.models import MealLog
+from app.utils.meal_log_archive import daily_totals, meal_log_source
 from app import db
 from datetime import datetime, date, timedelta
 from sqlalchemy import func
@@ -35,10 +35,11 @@ class NutritionSummary(Resource):
         else:
             target_date = date.today()
         
-        # Get all meal logs for the specified date
-        meal_logs = MealLog.query.filter_by(
-            user_id=current_user.id,
-            date=target_date
+        # Get all meal logs for the specified date (archived ones included)
+        source = meal_log_source(current_user.id, target_date, target_date)
+        meal_logs = db.session.query(source).filter(
+            source.user_id == current_user.id,
+            source.date == target_date
         ).all()
         
         # Calculate totals
@@ -103,11 +104,12 @@ class WeeklyNutrition(Resource):
         
         end_date = start_date + timedelta(days=6)
         
-        # Get all meal logs for the date range
-        meal_logs = MealLog.query.filter(
-            MealLog.user_id == current_user.id,
-            MealLog.date >= start_date,
-            MealLog.date <= end_date
+        # Get all meal logs for the date range (archived ones included)
+        source = meal_log_source(current_user.id, start_date, end_date)
+        meal_logs = db.session.query(source).filter(
+            source.user_id == current_user.id,
+            source.date >= start_date,
+            source.date <= end_date
         ).all()
         
         # Group by date
@@ -168,22 +170,23 @@ class NutritionTrends(Resource):
         end_date = date.today()
         start_date = end_date - timedelta(days=days-1)
         
-        # Get aggregated nutrition data by date
+        # Get aggregated nutrition data by date (archived days from their daily totals)
+        totals = daily_totals(start_date)
         nutrition_data = db.session.query(
-            MealLog.date,
-            func.sum(MealLog.calories).label('total_calories'),
-            func.sum(MealLog.protein).label('total_protein'),
-            func.sum(MealLog.carbs).label('total_carbs'),
-            func.sum(MealLog.fat).label('total_fat'),
-            func.sum(MealLog.fiber).label('total_fiber'),
-            func.sum(MealLog.sugar).label('total_sugar'),
-            func.sum(MealLog.sodium).label('total_sodium'),
-            func.count(MealLog.id).label('meal_count')
+            totals.c.date,
+            func.sum(totals.c.calories).label('total_calories'),
+            func.sum(totals.c.protein).label('total_protein'),
+            func.sum(totals.c.carbs).label('total_carbs'),
+            func.sum(totals.c.fat).label('total_fat'),
+            func.sum(totals.c.fiber).label('total_fiber'),
+            func.sum(totals.c.sugar).label('total_sugar'),
+            func.sum(totals.c.sodium).label('total_sodium'),
+            func.sum(totals.c.meal_count).label('meal_count')
         ).filter(
-            MealLog.user_id == current_user.id,
-            MealLog.date >= start_date,
-            MealLog.date <= end_date
-        ).group_by(MealLog.date).order_by(MealLog.date).all()
+            totals.c.user_id == current_user.id,
+            totals.c.date >= start_date,
+            totals.c.date <= end_date
+        ).group_by(totals.c.date).order_by(totals.c.date).all()
         
         # Calculate statistics
         if nutrition_data:
@@ -0,0 +1,168 @@
+"""
+Response compression utilities
+
+An after_request hook that compresses JSON, NDJSON and CSV responses
+with brotli (when the optional `brotli` package is installed) or gzip,
+chosen from the request's Accept-Encoding. Responses smaller than
+COMPRESSION_MIN_SIZE, streamed or file responses, and responses that already
+carry a Content-Encoding are left alone.
+
+Export artifacts are written gzip-compressed by the export services, and
+send_precompressed() serves those bytes as-is to clients that accept gzip,
+so a download never recompresses the file. send_stream() compresses
+generated downloads (user data exports) chunk by chunk as they are written.
+"""
+
+import gzip
+import zlib
+from typing import Iterable, Iterator, Optional, Union
+
+from flask import Response, current_app, request, send_file, stream_with_context
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+
+# Data responses only. HTML pages are never compressed: they carry the CSRF token
+# next to reflected request input, which compression exposes to BREACH. Static
+# CSS and JavaScript are file responses and are skipped anyway.
+COMPRESSIBLE_MIMETYPES = frozenset(['application/json', 'application/x-ndjson', 'text/csv'])
+
+
+def init_compression(app):
+    """Register response compression on an app (defaults come from config)."""
+    app.config.setdefault('COMPRESSION_ENABLED', True)
+    app.config.setdefault('COMPRESSION_MIN_SIZE', 1024)
+    app.config.setdefault('COMPRESSION_GZIP_LEVEL', 6)
+    app.config.setdefault('COMPRESSION_BROTLI_QUALITY', 4)
+    app.after_request(compress_response)
+
+
+def available_encodings():
+    """Encodings this process can produce, in order of preference."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(encodings=None) -> Optional[str]:
+    """
+    Pick the best encoding the client accepts.
+
+    Args:
+        encodings: Candidate encodings in server preference order
+
+    Returns:
+        The chosen encoding, or None for identity
+    """
+    accepted = request.accept_encodings
+    best = None
+    for encoding in encodings or available_encodings():
+        quality = accepted.quality(encoding)
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+
+def compress_response(response: Response) -> Response:
+    """after_request hook compressing eligible responses in place."""
+    config = current_app.config
+    if not config.get('COMPRESSION_ENABLED', True):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or request.method == 'HEAD'):
+        return response
+
+    body = response.get_data()
+    if len(body) < config.get('COMPRESSION_MIN_SIZE', 1024):
+        return response
+
+    encoding = negotiate_encoding()
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=config.get('COMPRESSION_BROTLI_QUALITY', 4))
+    elif encoding == 'gzip':
+        compressed = gzip.compress(body, compresslevel=config.get('COMPRESSION_GZIP_LEVEL', 6), mtime=0)
+    else:
+        return response
+    if len(compressed) >= len(body):
+        return response
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak=weak)
+    return response
+
+
+def send_precompressed(path: str, download_name: str, mimetype: str, chunk_size: int = 64 * 1024) -> Response:
+    """
+    Serve a gzip file as a download of its decompressed content.
+
+    Clients that accept gzip get the stored bytes with Content-Encoding:
+    gzip; others get the content decompressed on the fly.
+
+    Args:
+        path: Path of the .gz artifact
+        download_name: Filename the client should save (without .gz)
+        mimetype: Type of the decompressed content
+        chunk_size: Read size when decompressing for identity clients
+    """
+    if negotiate_encoding(('gzip',)) == 'gzip':
+        response = send_file(path, as_attachment=True, download_name=download_name, mimetype=mimetype)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        def generate():
+            decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield decompressor.decompress(chunk)
+            yield decompressor.flush()
+
+        response = Response(stream_with_context(generate()), mimetype=mimetype)
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def gzip_chunks(chunks: Iterable[Union[str, bytes]], level: int = 6) -> Iterator[bytes]:
+    """Gzip a stream of text or bytes chunks incrementally (one gzip member)."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def send_stream(chunks: Iterable[Union[str, bytes]], download_name: str, mimetype: str,
+                gzip_file: bool = False) -> Response:
+    """
+    Stream a generated download without building it in memory.
+
+    Args:
+        chunks: Text or bytes chunks of the file
+        download_name: Filename the client should save
+        mimetype: Type of the (uncompressed) content
+        gzip_file: Send a .gz file (application/gzip) instead of the content;
+            otherwise the stream is gzip content-encoded for clients that accept it
+    """
+    level = current_app.config.get('COMPRESSION_GZIP_LEVEL', 6)
+    if gzip_file:
+        response = Response(stream_with_context(gzip_chunks(chunks, level)), mimetype='application/gzip')
+    elif current_app.config.get('COMPRESSION_ENABLED', True) and negotiate_encoding(('gzip',)) == 'gzip':
+        response = Response(stream_with_context(gzip_chunks(chunks, level)), mimetype=mimetype)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,257 @@
+"""
+Read-replica routing
+
+Heavy read-only pages (reports, admin listings) and export jobs can read from
+a replica database instead of the primary that takes meal-log writes. The
+replica engine is created from DATABASE_REPLICA_URL by init_read_replica();
+without it everything runs on the primary.
+
+    @read_replica        View decorator: the request's SELECTs go to the replica
+    replica_reads()      The same for a block of code
+    replica_session()    A separate ORM session on the replica, for background jobs
+    read_engine()        The engine replica reads use (shard worker processes)
+
+Writes always go to the primary: RoutingSession only routes SELECT statements
+issued outside a flush. Reads fall back to the primary when the replica is
+unreachable (checked every DATABASE_REPLICA_CHECK_INTERVAL seconds), after
+the session has written anything, and for DATABASE_REPLICA_LAG seconds after
+the user's last committed write, so a user always sees their own changes.
+
+Sharded meal logs (app/utils/sharding.py) are routed to their shard first
+and never read from the replica.
+
+For local development two SQLite files can stand in for a replicated pair;
+`flask sync-replica` copies the primary into the replica with SQLite's online
+backup API (sync_sqlite_replica).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from flask import Response, current_app, has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session as OrmSession
+
+from app.utils.sharding import pin_flushed_shard, shard_bind
+
+EXTENSION_KEY = 'read_replica'  # app.extensions entry holding the replica engine
+LAST_WRITE_KEY = '_last_write'  # Flask session key: time of the user's last committed write
+
+# Replica engine -> (next check time, healthy)
+_health: Dict[Engine, Tuple[float, bool]] = weakref.WeakKeyDictionary()
+_health_lock = threading.Lock()
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends meal logs to their shard and reads to the replica when asked to."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            engine = shard_bind(self, mapper, clause)
+            if engine is not None:
+                return engine
+        if (bind is None and self.info.get('use_replica') and not self.info.get('wrote')
+                and not self._flushing and getattr(clause, 'is_select', False)):
+            engine = replica_engine()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+event.listen(RoutingSession, 'before_flush', pin_flushed_shard)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def mark_flush_write(session, flush_context):
+    """Keep the rest of the session's reads on the primary once it has written."""
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def mark_statement_write(orm_execute_state):
+    """Bulk UPDATE/DELETE and textual statements count as writes."""
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def remember_user_write(session):
+    """Record the time of a request's write in the user's session (read-your-writes)."""
+    if session.info.get('wrote') and has_request_context() and replica_configured():
+        flask_session[LAST_WRITE_KEY] = time.time()
+
+
+def init_read_replica(app):
+    """Create the replica engine from DATABASE_REPLICA_URL (nothing to do when unset)."""
+    url = app.config.get('DATABASE_REPLICA_URL')
+    if not url:
+        return
+    url = make_url(url)
+    is_sqlite = url.get_backend_name() == 'sqlite'
+    if is_sqlite and url.database not in (None, '', ':memory:') and not os.path.isabs(url.database):
+        # Relative like SQLALCHEMY_DATABASE_URI, which Flask-SQLAlchemy resolves in instance_path
+        url = url.set(database=os.path.join(app.instance_path, url.database))
+
+    engine = create_engine(url, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    if is_sqlite:
+        event.listen(engine, 'connect', _sqlite_query_only)
+    app.extensions[EXTENSION_KEY] = engine
+
+
+def replica_configured() -> bool:
+    """Whether the app has a read replica."""
+    return EXTENSION_KEY in current_app.extensions
+
+
+def replica_engine() -> Optional[Engine]:
+    """The replica engine, or None when it is not configured or unhealthy."""
+    engine = current_app.extensions.get(EXTENSION_KEY)
+    if engine is None or not _replica_healthy(engine):
+        return None
+    return engine
+
+
+def read_engine() -> Engine:
+    """The engine replica reads use: the replica, or the primary as a fallback."""
+    return replica_engine() or current_app.extensions['sqlalchemy'].engine
+
+
+def _replica_healthy(engine: Engine) -> bool:
+    """Cached connectivity check of the replica (DATABASE_REPLICA_CHECK_INTERVAL)."""
+    now = time.monotonic()
+    checked = _health.get(engine)
+    if checked is not None and checked[0] > now:
+        return checked[1]
+
+    with _health_lock:
+        checked = _health.get(engine)
+        if checked is not None and checked[0] > now:
+            return checked[1]
+        healthy = _check_replica(engine)
+        if not healthy and (checked is None or checked[1]):
+            current_app.logger.warning(f"[DB] Read replica {engine.url.render_as_string()} is unavailable; "
+                                       f"reading from the primary")
+        interval = current_app.config.get('DATABASE_REPLICA_CHECK_INTERVAL', 30)
+        _health[engine] = (now + interval, healthy)
+    return healthy
+
+
+def _check_replica(engine: Engine) -> bool:
+    url = engine.url
+    if url.get_backend_name() == 'sqlite':
+        # Connecting would create an empty database file
+        if url.database in (None, '', ':memory:') or not os.path.exists(url.database):
+            return False
+    try:
+        with engine.connect() as connection:
+            if url.get_backend_name() == 'sqlite':
+                # An empty file (never synced) has no schema to read from
+                return connection.execute(text('SELECT count(*) FROM sqlite_master')).scalar() > 0
+            connection.execute(text('SELECT 1'))
+        return True
+    except Exception as e:
+        current_app.logger.debug(f"[DB] Read replica check failed: {str(e)}")
+        return False
+
+
+def _sqlite_query_only(dbapi_connection, connection_record):
+    """Refuse writes on SQLite replica connections."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA query_only = ON')
+    cursor.close()
+
+
+def recently_wrote() -> bool:
+    """Whether the current user committed a write within DATABASE_REPLICA_LAG seconds."""
+    if not has_request_context():
+        return False
+    last_write = flask_session.get(LAST_WRITE_KEY)
+    lag = current_app.config.get('DATABASE_REPLICA_LAG', 5)
+    return last_write is not None and time.time() - last_write < lag
+
+
+def _route_reads_to_replica() -> Callable[[], None]:
+    """Flag the current db.session for replica reads; returns a function restoring the flag."""
+    session = current_app.extensions['sqlalchemy'].session()
+    previous = session.info.get('use_replica', False)
+    session.info['use_replica'] = not recently_wrote()
+
+    def restore():
+        session.info['use_replica'] = previous
+    return restore
+
+
+@contextmanager
+def replica_reads() -> Iterator[None]:
+    """Route the current db.session's reads to the replica within the block."""
+    restore = _route_reads_to_replica()
+    try:
+        yield
+    finally:
+        restore()
+
+
+def read_replica(view: Callable) -> Callable:
+    """
+    View decorator: read from the replica for the rest of the request.
+
+    Place it below login_required so the user is loaded from the primary. A
+    streamed response keeps reading from the replica until it is closed.
+    """
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        if not replica_configured():
+            return view(*args, **kwargs)
+        restore = _route_reads_to_replica()
+        try:
+            response = view(*args, **kwargs)
+        except Exception:
+            restore()
+            raise
+        if isinstance(response, Response) and response.is_streamed:
+            response.call_on_close(restore)
+        else:
+            restore()
+        return response
+    return decorated_function
+
+
+@contextmanager
+def replica_session() -> Iterator[OrmSession]:
+    """
+    A separate ORM session reading from read_engine().
+
+    For background jobs whose bookkeeping rows live on db.session: queries
+    re-bound with query.with_session() read from the replica while the job's
+    own commits (and their read-your-writes) stay on the primary.
+    """
+    session = OrmSession(bind=read_engine(), autoflush=False)
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def sync_sqlite_replica(primary_path: str, replica_path: str) -> int:
+    """
+    Copy a SQLite database over its replica with the online backup API.
+
+    The copy is a consistent snapshot; readers of the replica wait for it
+    to finish. Returns the number of pages copied.
+    """
+    source = sqlite3.connect(primary_path)
+    target = sqlite3.connect(replica_path)
+    try:
+        source.backup(target)
+        return target.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        target.close()
+        source.close()
@@ -0,0 +1,43 @@
+"""
+Lazy WSGI dispatch for optional sub-applications.
+
+Flask refuses to register blueprints once an app has handled its first
+request, so an optional, import-heavy feature (the flask-restx Swagger docs)
+cannot be attached on demand. LazyPrefixDispatcher instead routes every
+request under its URL prefixes (the docs and the static files they link)
+to a separate WSGI app that is only built the first time such a request
+arrives.
+"""
+
+import threading
+from typing import Callable, Iterable, Union
+
+
+class LazyPrefixDispatcher:
+    """Route requests under one or more prefixes to an app built on first use."""
+
+    def __init__(self, wsgi_app, prefixes: Union[str, Iterable[str]], factory: Callable):
+        self.wsgi_app = wsgi_app
+        if isinstance(prefixes, str):
+            prefixes = (prefixes,)
+        self.prefixes = tuple(prefix.rstrip('/') for prefix in prefixes)
+        self.factory = factory
+        self._app = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._app is not None
+
+    def _get_app(self):
+        if self._app is None:
+            with self._lock:
+                if self._app is None:
+                    self._app = self.factory()
+        return self._app
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if any(path == prefix or path.startswith(prefix + '/') for prefix in self.prefixes):
+            return self._get_app()(environ, start_response)
+        return self.wsgi_app(environ, start_response)
@@ -0,0 +1,196 @@
+"""
+Monthly meal log archive
+
+Most reads cover recent weeks, so MealLogArchiveService
+(`flask archive-meal-logs`) moves meal logs dated more than
+MEAL_LOG_ARCHIVE_AFTER_DAYS ago out of meal_log into one table per month,
+meal_log_archive_YYYYMM, on the same database (each shard archives its own
+users). The same transaction recomputes the archived days' rows in
+meal_log_daily_total, so daily totals stay complete:
+
+    meal_log_source(user_id, start, end)  MealLog, or an aliased union with the
+                                          archive months the range overlaps
+    daily_totals(start)                   Live meal logs plus archived daily
+                                          totals, for per-day aggregates
+    archive_cutoff()                      Dates before this may be archived
+
+Both helpers only read archive tables when the requested range starts
+before archive_cutoff(), so recent reads never touch them. Lowering
+MEAL_LOG_ARCHIVE_AFTER_DAYS is safe; raising it does not bring archived
+logs back, and ranges between the old and new cutoff then miss them.
+
+Archived logs keep their IDs and are read-only for users: they are loaded
+as MealLog instances for display and export but cannot be edited or
+deleted. Nutrition propagation (including after a food merge) recomputes
+them and rebuilds the daily totals of their days. Archive tables are created
+with meal_log's current columns; a migration adding a meal_log column has to
+add it to them too.
+"""
+
+import re
+from datetime import date, timedelta
+from typing import Callable, List, Optional
+
+from flask import current_app
+from sqlalchemy import Column, Index, MetaData, Table, func, inspect, literal, select, union_all
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql.expression import Executable
+
+ARCHIVE_PREFIX = 'meal_log_archive_'
+ROLLUP_TABLE = 'meal_log_daily_total'
+
+# Summed by daily_totals() and stored per archived day
+TOTAL_NUTRIENTS = ('calories', 'protein', 'carbs', 'fat', 'fiber', 'sugar', 'sodium')
+
+_ARCHIVE_NAME = re.compile(rf'^{ARCHIVE_PREFIX}(\d{{4}})(\d{{2}})$')
+
+
+def archive_cutoff(today: Optional[date] = None, app=None) -> date:
+    """First date that is never archived (MEAL_LOG_ARCHIVE_AFTER_DAYS before today)."""
+    days = (app or current_app).config.get('MEAL_LOG_ARCHIVE_AFTER_DAYS', 365)
+    return (today or date.today()) - timedelta(days=days)
+
+
+def reads_archive(start_date: Optional[date]) -> bool:
+    """Whether a range starting at start_date (None: unbounded) can include archived days."""
+    return start_date is None or start_date < archive_cutoff()
+
+
+def archive_table_name(day: date) -> str:
+    """Name of the archive table holding a date's meal logs."""
+    return f'{ARCHIVE_PREFIX}{day.year:04d}{day.month:02d}'
+
+
+def archive_table(name: str, metadata: Optional[MetaData] = None) -> Table:
+    """An archive table: meal_log's columns without foreign keys, indexed for per-user and per-food reads."""
+    from app.models import MealLog
+
+    table = Table(name, metadata or MetaData(), *[
+        Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+        for column in MealLog.__table__.columns
+    ])
+    Index(f'ix_{name}_user_id_date', table.c.user_id, table.c.date)
+    Index(f'ix_{name}_food_id', table.c.food_id)
+    return table
+
+
+def archive_tables(connection, start_date: Optional[date] = None, end_date: Optional[date] = None) -> List[Table]:
+    """The archive tables on a connection's database, oldest first, limited to months overlapping the range."""
+    first_month = start_date.replace(day=1) if start_date else None
+    last_month = end_date.replace(day=1) if end_date else None
+    tables = []
+    for name in sorted(inspect(connection).get_table_names()):
+        match = _ARCHIVE_NAME.match(name)
+        if not match:
+            continue
+        month = date(int(match.group(1)), int(match.group(2)), 1)
+        if (first_month and month < first_month) or (last_month and month > last_month):
+            continue
+        tables.append(archive_table(name))
+    return tables
+
+
+def _archive_connection():
+    """db.session's connection to the database holding the user's meal logs (shard, replica or primary)."""
+    from app import db
+    from app.models import MealLog
+
+    return db.session.connection(bind_arguments={'mapper': inspect(MealLog), 'clause': select(MealLog.id)})
+
+
+def meal_log_source(user_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None):
+    """
+    The entity to query a user's meal logs between two dates with.
+
+    MealLog itself unless the range starts before the archive cutoff and
+    archive tables exist for it; then an aliased MealLog over the union of
+    meal_log and those months, each branch already filtered by user and
+    date. Filter and order on the returned entity's attributes.
+    """
+    from app.models import MealLog
+
+    if not reads_archive(start_date):
+        return MealLog
+    tables = archive_tables(_archive_connection(), start_date, end_date)
+    if not tables:
+        return MealLog
+
+    def branch(table):
+        conditions = [table.c.user_id == user_id]
+        if start_date is not None:
+            conditions.append(table.c.date >= start_date)
+        if end_date is not None:
+            conditions.append(table.c.date <= end_date)
+        return select(*[table.c[column.name] for column in MealLog.__table__.columns]).where(*conditions)
+
+    union = union_all(branch(MealLog.__table__), *[branch(table) for table in tables])
+    return aliased(MealLog, union.subquery('meal_log_with_archive'))
+
+
+def daily_totals(start_date: Optional[date] = None, include_archived: Optional[bool] = None):
+    """
+    Subquery of rows to sum into per-day totals.
+
+    Columns user_id, date, meal_type, meal_count and TOTAL_NUTRIENTS: one
+    row per live meal log (meal_count 1), plus the meal_log_daily_total rows
+    of archived days when the range starting at start_date needs them
+    (include_archived decides instead, outside an app context). Filter on
+    user_id and date, then group and sum.
+    """
+    from app.models import MealLog, MealLogDailyTotal
+
+    meal_log = MealLog.__table__
+    live = select(meal_log.c.user_id, meal_log.c.date, meal_log.c.meal_type, literal(1).label('meal_count'),
+                  *[meal_log.c[nutrient] for nutrient in TOTAL_NUTRIENTS])
+    if include_archived is None:
+        include_archived = reads_archive(start_date)
+    if not include_archived:
+        return live.subquery('meal_totals')
+    rollup = MealLogDailyTotal.__table__
+    archived = select(rollup.c.user_id, rollup.c.date, rollup.c.meal_type, rollup.c.meal_count,
+                      *[rollup.c[nutrient] for nutrient in TOTAL_NUTRIENTS])
+    if start_date is not None:
+        archived = archived.where(rollup.c.date >= start_date)
+    return union_all(live, archived).subquery('meal_totals')
+
+
+def execute_on_archives(build: Callable[[Table], Executable], params=None, session=None) -> list:
+    """
+    Run a statement built for each archive table on every meal-log database,
+    in a session's transaction (default db.session); returns the results.
+    """
+    from app import db
+    from app.utils.sharding import meal_log_engines
+
+    session = session or db.session
+    results = []
+    for engine in meal_log_engines():
+        connection = session.connection(bind_arguments={'bind': engine})
+        results.extend(connection.execute(build(table), params) for table in archive_tables(connection))
+    return results
+
+
+def delete_archived_logs(user_id: int):
+    """Delete a user's archived meal logs and daily totals in db.session's transaction (user deletion)."""
+    from app import db
+    from app.models import MealLog, MealLogDailyTotal
+
+    connection = db.session.connection(bind_arguments={'mapper': inspect(MealLog)})
+    for table in archive_tables(connection):
+        connection.execute(table.delete().where(table.c.user_id == user_id))
+    rollup = MealLogDailyTotal.__table__
+    connection.execute(rollup.delete().where(rollup.c.user_id == user_id))
+
+
+def count_archived(column_name: str, value) -> int:
+    """Archived meal logs with a column equal to value (e.g. food_id), on every meal-log database."""
+    from app.utils.sharding import meal_log_engines
+
+    total = 0
+    for engine in meal_log_engines():
+        with engine.connect() as connection:
+            for table in archive_tables(connection):
+                total += connection.execute(
+                    select(func.count()).select_from(table).where(table.c[column_name] == value)
+                ).scalar()
+    return total
@@ -0,0 +1,261 @@
+"""
+Rate limiting utilities
+
+Sliding-window-counter rate limiting shared by login, search, export and
+upload endpoints. Each key keeps only two integers (the current and previous
+fixed-window counts); the sliding estimate weights the previous window by how
+much of it still overlaps the sliding window, so every check is O(1).
+
+Two backends are available, selected with RATE_LIMIT_BACKEND:
+    memory    Per-process OrderedDict with LRU eviction (RATE_LIMIT_MAX_KEYS)
+    database  RateLimitBucket table, shared by all gunicorn workers
+"""
+
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import wraps
+from typing import Callable, Iterable, Optional, Tuple
+
+from flask import current_app, jsonify, request
+from flask_login import current_user
+
+
+@dataclass
+class RateLimitResult:
+    """Outcome of a single rate-limit check."""
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: int  # Seconds until the request would be allowed (0 when allowed)
+
+
+def _sliding_estimate(previous: int, current: int, elapsed: float, window_seconds: int) -> float:
+    """Weighted request count over the last window_seconds."""
+    overlap = 1.0 - (elapsed / window_seconds)
+    return previous * overlap + current
+
+
+def _retry_after(previous: int, current: int, elapsed: float, limit: int, window_seconds: int) -> int:
+    """Seconds until one more request would fit under the limit."""
+    if current + 1 > limit:
+        # Blocked by the current window alone: wait for it to become the previous
+        # window, then for it to decay until current * overlap + 1 <= limit
+        wait = window_seconds - elapsed + window_seconds * (1.0 - (limit - 1) / current)
+    else:
+        # previous * (1 - t / window) + current + 1 <= limit, solved for t
+        wait = window_seconds * (1.0 - (limit - current - 1) / previous) - elapsed
+    return max(1, math.ceil(wait))
+
+
+class MemoryRateLimitBackend:
+    """In-process counters bounded by LRU eviction of idle keys."""
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> [window_start, previous_count, current_count]
+        self._lock = threading.Lock()
+
+    def increment(self, key: str, window_start: int, window_seconds: int) -> Tuple[int, int]:
+        """Record a hit and return (previous_count, current_count)."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [window_start, 0, 0]
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                if bucket[0] != window_start:
+                    # Roll forward; a gap of more than one window clears the history
+                    bucket[1] = bucket[2] if window_start - bucket[0] == window_seconds else 0
+                    bucket[2] = 0
+                    bucket[0] = window_start
+            bucket[2] += 1
+            return bucket[1], bucket[2]
+
+    def reset(self, key: Optional[str] = None):
+        """Forget one key, or every key when key is None."""
+        with self._lock:
+            if key is None:
+                self._buckets.clear()
+            else:
+                self._buckets.pop(key, None)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class DatabaseRateLimitBackend:
+    """Counters in the RateLimitBucket table so all workers share limits."""
+
+    # Probability of pruning expired rows on a given hit
+    PRUNE_PROBABILITY = 0.01
+
+    def increment(self, key: str, window_start: int, window_seconds: int) -> Tuple[int, int]:
+        """Atomically record a hit and return (previous_count, current_count)."""
+        from app import db
+        from app.models import RateLimitBucket
+
+        table = RateLimitBucket.__table__
+        insert = self._dialect_insert(db.engine.dialect.name)
+
+        # Separate connection: counts must commit even if the request's own
+        # session transaction is rolled back
+        with db.engine.begin() as connection:
+            statement = insert(table).values(key=key, window_start=window_start, count=1)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.key, table.c.window_start],
+                set_={'count': table.c.count + 1}
+            ).returning(table.c.count)
+            current = connection.execute(statement).scalar()
+
+            previous = connection.execute(
+                table.select().with_only_columns(table.c.count).where(
+                    table.c.key == key,
+                    table.c.window_start == window_start - window_seconds
+                )
+            ).scalar() or 0
+
+            if random.random() < self.PRUNE_PROBABILITY:
+                connection.execute(
+                    table.delete().where(table.c.window_start < window_start - window_seconds)
+                )
+
+        return previous, current
+
+    @staticmethod
+    def _dialect_insert(dialect_name: str):
+        """Return the dialect's INSERT construct supporting ON CONFLICT."""
+        if dialect_name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        return insert
+
+    def reset(self, key: Optional[str] = None):
+        """Forget one key, or every key when key is None."""
+        from app import db
+        from app.models import RateLimitBucket
+
+        table = RateLimitBucket.__table__
+        with db.engine.begin() as connection:
+            statement = table.delete()
+            if key is not None:
+                statement = statement.where(table.c.key == key)
+            connection.execute(statement)
+
+
+class RateLimiter:
+    """Sliding-window-counter rate limiter over a pluggable backend."""
+
+    def __init__(self, backend, clock: Callable[[], float] = time.time):
+        self.backend = backend
+        self.clock = clock
+
+    def hit(self, key: str, limit: int, window_seconds: int) -> RateLimitResult:
+        """
+        Record a request for key and decide whether it is allowed.
+
+        Rejected requests are counted too, so a client hammering a limited
+        endpoint stays blocked until it backs off.
+
+        Args:
+            key: Rate-limit key (e.g. "login:203.0.113.7")
+            limit: Maximum requests per sliding window
+            window_seconds: Sliding window length in seconds
+
+        Returns:
+            RateLimitResult
+        """
+        now = self.clock()
+        window_start = int(now // window_seconds) * window_seconds
+        elapsed = now - window_start
+
+        previous, current = self.backend.increment(key, window_start, window_seconds)
+        estimate = _sliding_estimate(previous, current, elapsed, window_seconds)
+
+        if estimate <= limit:
+            return RateLimitResult(True, limit, max(0, int(limit - estimate)), 0)
+        return RateLimitResult(False, limit, 0, _retry_after(previous, current, elapsed, limit, window_seconds))
+
+    def reset(self, key: Optional[str] = None):
+        """Clear counters for key, or all counters."""
+        self.backend.reset(key)
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the current app's rate limiter, creating it from config on first use."""
+    limiter = current_app.extensions.get('rate_limiter')
+    if limiter is None:
+        backend_name = current_app.config.get('RATE_LIMIT_BACKEND', 'memory')
+        if backend_name == 'database':
+            backend = DatabaseRateLimitBackend()
+        elif backend_name == 'memory':
+            backend = MemoryRateLimitBackend(current_app.config.get('RATE_LIMIT_MAX_KEYS', 10000))
+        else:
+            raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend_name}")
+        limiter = RateLimiter(backend)
+        current_app.extensions['rate_limiter'] = limiter
+    return limiter
+
+
+def _default_key() -> str:
+    """Client IP, plus the user ID when logged in."""
+    client_ip = request.remote_addr or 'unknown'
+    if current_user and current_user.is_authenticated:
+        return f"{client_ip}_{current_user.id}"
+    return client_ip
+
+
+def rate_limit(limit: int, window_seconds: int, scope: Optional[str] = None,
+               key_func: Optional[Callable[[], str]] = None, methods: Optional[Iterable[str]] = None):
+    """
+    Rate limiting decorator for view functions.
+
+    Args:
+        limit: Maximum requests allowed per sliding window
+        window_seconds: Window length in seconds
+        scope: Counter namespace (defaults to the view function name); views
+            sharing a scope share a budget
+        key_func: Callable returning the per-client key (defaults to IP + user ID)
+        methods: Only count these HTTP methods (e.g. ['POST'] for login forms)
+    """
+    counted_methods = {m.upper() for m in methods} if methods else None
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not current_app.config.get('RATE_LIMIT_ENABLED', True):
+                return f(*args, **kwargs)
+            if counted_methods and request.method not in counted_methods:
+                return f(*args, **kwargs)
+
+            rate_key = f"{scope or f.__name__}:{(key_func or _default_key)()}"
+            result = get_rate_limiter().hit(rate_key, limit, window_seconds)
+
+            if not result.allowed:
+                current_app.logger.warning(
+                    f"[SECURITY] Rate limit exceeded for {rate_key}. "
+                    f"Limit: {limit} per {window_seconds} seconds"
+                )
+                message = (f'Rate limit exceeded. Maximum {limit} requests per {window_seconds} seconds. '
+                           f'Try again in {result.retry_after} seconds.')
+                if request.path.startswith('/api/') or request.is_json or \
+                        request.accept_mimetypes.best == 'application/json':
+                    response = jsonify({'error': message, 'retry_after': result.retry_after})
+                else:
+                    response = current_app.response_class(message, mimetype='text/plain')
+                response.status_code = 429
+                response.headers['Retry-After'] = str(result.retry_after)
+                response.headers['X-RateLimit-Limit'] = str(limit)
+                response.headers['X-RateLimit-Remaining'] = '0'
+                return response
+
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
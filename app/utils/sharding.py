@@ -0,0 +1,333 @@
+"""
+User-sharded meal log storage
+
+meal_log and nutrition_goal are only ever read per user, and meal_log is by
+far the largest table. MEAL_LOG_SHARD_URLS (comma-separated database URLs)
+spreads both over several databases: a user's rows live on shard
+jump_hash(user_id, number of shards). Users, foods, challenges and jobs stay
+on the primary. Without the setting both tables live on the primary like
+every other table and nothing here applies.
+
+RoutingSession asks shard_bind() where each statement goes:
+
+    use_user_shard(user_id)   Pin db.session to a user's shard; the dashboard,
+                              API and Swagger blueprints pin the logged-in user
+                              before each request (pin_current_user_shard)
+    scatter_all(statement)    Run a read on every shard and concatenate the rows
+    scatter_sum(statement)    ... and add up a single value (admin aggregates)
+    execute_on_shards(stmt)   Run a write on every shard in the session's transaction
+    meal_log_engines()        The engines holding meal logs, for batch jobs
+
+A flush of one shard's rows pins an unpinned session by itself. Any other
+statement on a sharded table in an unpinned session raises ShardKeyError
+instead of quietly reading one shard, and a join between a sharded table and
+a primary table fails on the shard, which only has the sharded tables.
+
+Shards have no foreign keys to the primary. `flask shards init` creates the
+tables, `flask shards rebalance` moves users whose rows are not on their home
+shard (rows left on the primary when sharding was enabled, or users whose
+shard changed after a shard was added; moved rows get new IDs, archived
+meal logs return to meal_log) and `flask shards status` counts rows per
+shard. Challenge progress updated by a meal log is committed on the primary
+after the shard, not atomically with it.
+"""
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from flask import current_app
+from flask_login import current_user
+from sqlalchemy import Column, Index, MetaData, Table, create_engine, delete, func, insert, inspect, select
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.sql.util import find_tables
+
+from app.utils.meal_log_archive import ROLLUP_TABLE, archive_tables
+
+EXTENSION_KEY = 'meal_log_shards'  # app.extensions entry holding the shard engines
+SHARD_KEY = 'meal_log_shard'  # session.info key: index of the shard the session is pinned to
+
+# Tables whose rows are placed by user_id (meal_log_daily_total: see meal_log_archive.py);
+# meal_log goes last when moving rows
+SHARDED_TABLES = ('nutrition_goal', 'meal_log_daily_total', 'meal_log')
+
+
+class ShardKeyError(RuntimeError):
+    """A sharded table was used without knowing which user's shard to use."""
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """
+    Jump consistent hash (Lamping and Veach) of a user ID.
+
+    Going from N to N+1 buckets moves only the keys that land in the new
+    bucket, so adding a shard moves about 1/(N+1) of the users.
+    """
+    key = int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=8).digest(), 'big')
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def init_meal_log_shards(app):
+    """Create the shard engines from MEAL_LOG_SHARD_URLS (nothing to do when unset)."""
+    urls = app.config.get('MEAL_LOG_SHARD_URLS')
+    if isinstance(urls, str):
+        urls = [url.strip() for url in urls.split(',')]
+    urls = [url for url in urls or () if url]
+    if not urls:
+        return
+
+    engines = []
+    for url in urls:
+        url = make_url(url)
+        if (url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+                and not os.path.isabs(url.database)):
+            # Relative like SQLALCHEMY_DATABASE_URI, which Flask-SQLAlchemy resolves in instance_path
+            url = url.set(database=os.path.join(app.instance_path, url.database))
+        engines.append(create_engine(url, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})))
+    app.extensions[EXTENSION_KEY] = engines
+
+
+def shard_engines(app=None) -> Optional[List[Engine]]:
+    """The shard engines, or None when meal logs are not sharded."""
+    return (app or current_app).extensions.get(EXTENSION_KEY)
+
+
+def meal_log_engines() -> List[Engine]:
+    """The engines holding meal logs: the shards, or just the primary."""
+    return shard_engines() or [current_app.extensions['sqlalchemy'].engine]
+
+
+def shard_index(user_id: int) -> int:
+    """Index of the user's home shard (0 when not sharded)."""
+    engines = shard_engines()
+    return jump_hash(user_id, len(engines)) if engines else 0
+
+
+def shard_metadata() -> MetaData:
+    """The sharded tables as created on a shard: same columns and indexes, no foreign keys."""
+    from app import db
+
+    metadata = MetaData()
+    for name in SHARDED_TABLES:
+        source = db.metadata.tables[name]
+        table = Table(name, metadata, *[
+            Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+            for column in source.columns
+        ])
+        for index in source.indexes:
+            Index(index.name, *[table.c[column.name] for column in index.columns], unique=index.unique)
+    return metadata
+
+
+def create_shard_tables() -> int:
+    """Create missing sharded tables on every shard; returns the number of shards."""
+    engines = shard_engines() or []
+    metadata = shard_metadata()
+    for engine in engines:
+        metadata.create_all(engine)
+    return len(engines)
+
+
+def _touches_shard(mapper, clause) -> bool:
+    if mapper is not None and getattr(mapper, 'local_table', None) is not None \
+            and mapper.local_table.name in SHARDED_TABLES:
+        return True
+    if clause is None:
+        return False
+    return any(getattr(table, 'name', None) in SHARDED_TABLES
+               for table in find_tables(clause, include_crud=True))
+
+
+def shard_bind(session, mapper=None, clause=None) -> Optional[Engine]:
+    """
+    The shard engine for a statement on a sharded table, or None for the primary.
+
+    Raises:
+        ShardKeyError: If the statement uses a sharded table and the session
+            is not pinned to a shard
+    """
+    engines = shard_engines()
+    if not engines or not _touches_shard(mapper, clause):
+        return None
+    index = session.info.get(SHARD_KEY)
+    if index is None:
+        raise ShardKeyError('meal_log and nutrition_goal are sharded by user: call use_user_shard() first, '
+                            'or scatter_all() for reads across users')
+    return engines[index]
+
+
+def use_user_shard(user_id: int, session=None) -> int:
+    """
+    Pin a session (default: db.session) to a user's shard; returns the shard index.
+
+    Raises:
+        ShardKeyError: If the session has pending changes on another shard
+    """
+    from app import db
+
+    session = session or db.session()
+    index = shard_index(user_id)
+    if session.info.get(SHARD_KEY, index) != index and (session.new or session.dirty or session.deleted):
+        raise ShardKeyError(f"Session has unflushed changes on shard {session.info[SHARD_KEY]}, "
+                            f"not user {user_id}'s shard {index}")
+    session.info[SHARD_KEY] = index
+    return index
+
+
+def pin_current_user_shard():
+    """before_request hook: pin db.session to the logged-in user's shard."""
+    if shard_engines() and current_user.is_authenticated:
+        use_user_shard(current_user.id)
+
+
+def pin_flushed_shard(session, flush_context, instances):
+    """before_flush hook: pin an unpinned session to the shard of the rows it flushes."""
+    if not shard_engines():
+        return
+    indexes = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__table__', None)
+        if table is None or table.name not in SHARDED_TABLES:
+            continue
+        user_id = obj.user_id if obj.user_id is not None else getattr(obj.user, 'id', None)
+        if user_id is not None:
+            indexes.add(shard_index(user_id))
+    pinned = session.info.get(SHARD_KEY)
+    if pinned is not None:
+        indexes.add(pinned)
+    if len(indexes) > 1:
+        raise ShardKeyError(f"One flush can only write one shard's meal logs, not shards {sorted(indexes)}")
+    if indexes:
+        session.info[SHARD_KEY] = indexes.pop()
+
+
+def scatter_all(statement) -> list:
+    """
+    Run a read on every meal-log database and concatenate the rows.
+
+    Shards are read in parallel, each on its own connection, so uncommitted
+    changes of db.session are not seen. Unsharded, the statement simply runs
+    on db.session.
+    """
+    engines = shard_engines()
+    if not engines:
+        from app import db
+        return db.session.execute(statement).all()
+
+    def read(engine):
+        with engine.connect() as connection:
+            return connection.execute(statement).all()
+
+    with ThreadPoolExecutor(max_workers=len(engines)) as executor:
+        return [row for rows in executor.map(read, engines) for row in rows]
+
+
+def scatter_sum(statement):
+    """Sum a single-value read (e.g. a count) over every meal-log database."""
+    return sum(row[0] or 0 for row in scatter_all(statement))
+
+
+def execute_on_shards(statement, params=None, session=None) -> list:
+    """
+    Run a statement on every meal-log database in a session's transaction.
+
+    Returns one result per shard; commit with the session as usual (shards
+    commit one after the other, not atomically).
+    """
+    from app import db
+
+    session = session or db.session
+    return [session.execute(statement, params, bind_arguments={'bind': engine})
+            for engine in meal_log_engines()]
+
+
+def rebalance(batch_size: int = 500, dry_run: bool = False,
+              log: Callable[[str], None] = print) -> Dict[str, int]:
+    """
+    Move sharded rows that are not on their user's home shard.
+
+    Each batch is inserted on the target before it is deleted from the
+    source, with the target committed first: an interruption can leave a
+    batch on both databases but never on neither. Rows get new IDs.
+    Archived meal logs move into the target's meal_log and their daily
+    totals are dropped, to be archived and totalled again on the target.
+
+    Args:
+        batch_size: Rows moved per transaction
+        dry_run: Only count what would move
+        log: Progress callback
+
+    Returns:
+        Dict with users and rows (moved, or to move on a dry run)
+    """
+    from app import db
+
+    engines = shard_engines()
+    if not engines:
+        raise ShardKeyError('Meal logs are not sharded (set MEAL_LOG_SHARD_URLS)')
+    primary = db.engine
+    metadata = shard_metadata()
+    meal_log = metadata.tables['meal_log']
+    rollup = metadata.tables[ROLLUP_TABLE]
+    # Rows left on the primary belong on a shard; the primary is never a target
+    sources = [(None, primary)] + list(enumerate(engines))
+    users, moved = set(), 0
+
+    for source_index, source in sources:
+        if source is primary and primary.url in {engine.url for engine in engines}:
+            continue
+        label = 'primary' if source_index is None else f'shard {source_index}'
+        with source.connect() as connection:
+            existing = set(inspect(connection).get_table_names())
+            moves = [(metadata.tables[name], metadata.tables[name]) for name in SHARDED_TABLES
+                     if name != ROLLUP_TABLE and name in existing]
+            # Archived logs go back into meal_log on the new shard and are archived again there
+            moves += [(table, meal_log) for table in archive_tables(connection)]
+            counts = [(table, target_table, connection.execute(
+                select(table.c.user_id, func.count()).group_by(table.c.user_id)
+            ).all()) for table, target_table in moves]
+            stale_totals = [user_id for user_id, in connection.execute(select(rollup.c.user_id.distinct()))
+                            if jump_hash(user_id, len(engines)) != source_index] if ROLLUP_TABLE in existing else []
+
+        for table, target_table, user_counts in counts:
+            columns = [column for column in target_table.columns if column.name != 'id']
+            for user_id, count in user_counts:
+                target_index = jump_hash(user_id, len(engines))
+                if target_index == source_index:
+                    continue
+                users.add(user_id)
+                moved += count
+                log(f"{table.name}: user {user_id}, {count} row(s) {label} -> shard {target_index}")
+                if dry_run:
+                    continue
+                while _move_batch(table, target_table, columns, user_id, source, engines[target_index],
+                                  batch_size):
+                    pass
+
+        if stale_totals and not dry_run:
+            # Daily totals of archived logs that moved; the next archive run recomputes them
+            with source.begin() as connection:
+                connection.execute(delete(rollup).where(rollup.c.user_id.in_(stale_totals)))
+
+    return {'users': len(users), 'rows': moved}
+
+
+def _move_batch(table, target_table, columns, user_id, source, target, batch_size) -> int:
+    with source.begin() as source_connection:
+        rows = source_connection.execute(
+            select(table).where(table.c.user_id == user_id).order_by(table.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return 0
+        with target.begin() as target_connection:
+            target_connection.execute(insert(target_table), [
+                {column.name: row._mapping[column.name] for column in columns} for row in rows
+            ])
+        source_connection.execute(delete(table).where(table.c.id.in_([row.id for row in rows])))
+    return len(rows)
@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+"""
+ASGI entry point: the Flask app behind the asynchronous read-only API tier
+(app/async_api). Needs aiosqlite and an ASGI server, e.g.
+
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+"""
+import os
+import sys
+
+# Add the project directory to Python path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from app import create_app
+from app.async_api import create_asgi_app
+
+# Create the ASGI application instance
+app = create_asgi_app(create_app())
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Load test for the asynchronous read-only API tier (app/async_api).
+
+Seeds a SQLite catalog and a user's meal logs, then serves the app twice on
+local ports and drives --concurrency simultaneous connections at the three
+read endpoints (search-verified, v2 food details, v2 nutrition summary):
+
+    sync   gunicorn wsgi:app with the Procfile's gthread workers
+    async  uvicorn asgi:app (needs the aiosqlite and uvicorn packages)
+
+Each request opens its own connection, so --concurrency is the number of
+requests in flight. Reports throughput, latency percentiles and failed
+requests (errors, timeouts and non-200 responses) per tier. The load
+generator runs on the same machine, so compare tiers rather than absolute
+numbers.
+
+Usage:
+    python benchmarks/bench_async_api.py [--concurrency 1000] [--requests 20000] [--workers 2]
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+SECRET_KEY = 'bench-async-api'
+
+
+def seed(foods):
+    """Create the schema and data; return a session cookie for the seeded user."""
+    from sqlalchemy import text
+    from app import create_app, db
+
+    app = create_app('production')
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO user (id, user_id, username, password_hash, is_admin, is_active) "
+                "VALUES (1, 'bench', 'bench', 'x', 0, 1)"
+            ))
+            connection.execute(text(
+                "INSERT INTO food (name, brand, category, calories, protein, carbs, fat, fiber, sugar, sodium, "
+                "is_verified, default_serving_size_grams) "
+                "SELECT 'Dal tadka ' || value, 'Brand ' || (value % 50), 'Meals', value % 900, value % 40, "
+                "value % 80, value % 30, value % 15, value % 20, value % 500, 1, 100 "
+                "FROM (WITH RECURSIVE seq(value) AS (SELECT 1 UNION ALL SELECT value + 1 FROM seq WHERE value < :rows) "
+                "SELECT value FROM seq)"
+            ), {'rows': foods})
+            connection.execute(text(
+                "INSERT INTO food_serving (food_id, serving_name, unit, grams_per_unit) "
+                "SELECT id, '1 bowl', 'bowl', 250 FROM food"
+            ))
+            connection.execute(text(
+                "INSERT INTO meal_log (user_id, food_id, quantity, original_quantity, unit_type, logged_grams, "
+                "meal_type, date, calories, protein, carbs, fat, fiber, sugar, sodium) "
+                "SELECT 1, id, 100, 100, 'grams', 100, "
+                "CASE id % 4 WHEN 0 THEN 'breakfast' WHEN 1 THEN 'lunch' WHEN 2 THEN 'dinner' ELSE 'snack' END, "
+                "date('now'), calories, protein, carbs, fat, fiber, sugar, sodium FROM food WHERE id <= 12"
+            ))
+        cookie = app.session_interface.get_signing_serializer(app).dumps({'_user_id': '1'})
+    return cookie
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(command, port, env):
+    process = subprocess.Popen(command, cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Server did not start: {' '.join(command)}")
+
+
+async def fetch(port, path, cookie, timeout):
+    """GET path on a new connection; return the status code (0 on error or timeout)."""
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nCookie: session={cookie}\r\n"
+                     f"Connection: close\r\n\r\n".encode())
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+        return int(response.split(b' ', 2)[1]) if response else 0
+    except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+        return 0
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def load(port, cookie, paths, concurrency, requests, timeout):
+    """Run requests requests with concurrency in flight; return (elapsed, latencies, failures)."""
+    latencies, failures = [], 0
+    remaining = iter(range(requests))
+
+    async def client():
+        nonlocal failures
+        for number in remaining:
+            started = time.perf_counter()
+            status = await fetch(port, paths[number % len(paths)], cookie, timeout)
+            latencies.append(time.perf_counter() - started)
+            failures += status != 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - started, sorted(latencies), failures
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=1000, help='Requests in flight')
+    parser.add_argument('--requests', type=int, default=20000, help='Requests per tier')
+    parser.add_argument('--workers', type=int, default=2, help='Server processes per tier')
+    parser.add_argument('--foods', type=int, default=20000)
+    parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database_path = os.path.join(tmp_dir, 'bench.db')
+        env = dict(os.environ, FLASK_ENV='production', SECRET_KEY=SECRET_KEY,
+                   DATABASE_URL=f'sqlite:///{database_path}', RATE_LIMIT_ENABLED='false',
+                   EXPORT_REAPER_INTERVAL='0', UPLOAD_RESUME_INTERVAL='0')
+        os.environ.update(env)
+        cookie = seed(args.foods)
+        paths = ['/api/foods/search-verified?q=tadka%2012', '/api/v2/foods/42', '/api/v2/nutrition/summary']
+
+        tiers = {'sync': [sys.executable, '-m', 'gunicorn', '--worker-class', 'gthread', '--threads', '8',
+                          '--workers', str(args.workers), '--backlog', '4096', '--bind', '127.0.0.1:{port}',
+                          'wsgi:app']}
+        if importlib.util.find_spec('aiosqlite') and importlib.util.find_spec('uvicorn'):
+            tiers['async'] = [sys.executable, '-m', 'uvicorn', '--workers', str(args.workers), '--backlog', '4096',
+                              '--no-access-log', '--host', '127.0.0.1', '--port', '{port}', 'asgi:app']
+        else:
+            print('async tier skipped: install aiosqlite and uvicorn')
+
+        print(f"{args.requests:,} requests, {args.concurrency:,} concurrent, {args.workers} worker(s) per tier")
+        for name, command in tiers.items():
+            port = free_port()
+            process = start_server([part.format(port=port) for part in command], port, env)
+            try:
+                asyncio.run(load(port, cookie, paths, 10, 50, args.timeout))  # Warm up
+                elapsed, latencies, failures = asyncio.run(
+                    load(port, cookie, paths, args.concurrency, args.requests, args.timeout))
+            finally:
+                process.terminate()
+                process.wait()
+            print(f"{name:>6}  {args.requests / elapsed:>8,.0f} req/s  "
+                  f"p50 {percentile(latencies, 0.5) * 1000:>7,.1f} ms  "
+                  f"p95 {percentile(latencies, 0.95) * 1000:>7,.1f} ms  "
+                  f"p99 {percentile(latencies, 0.99) * 1000:>7,.1f} ms  "
+                  f"failed {failures:,}")
+
+
+if __name__ == '__main__':
+    main()
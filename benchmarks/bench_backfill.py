@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark for online backfills (app/migrations).
+
+Fills a temporary SQLite database with synthetic meal logs, then runs the
+quantity -> grams backfill twice: once the way backfill_quantity_to_grams.py
+does it (ORM objects fetched with OFFSET batches) and once as migration
+0006 through MigrationRunner. While each backfill runs, a second thread
+performs small INSERTs like the live app would and records how long each
+one waits for the database write lock.
+
+Usage:
+    python benchmarks/bench_backfill.py [--rows 200000] [--chunk-size 1000] [--throttle-ratio 0.5]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import text
+from config import config
+from app import db
+
+
+def create_bench_app(db_path):
+    """Create a minimal app bound to a file-backed SQLite database."""
+    app = Flask(__name__)
+    app.config.from_object(config['testing'])
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 60}}
+    db.init_app(app)
+    return app
+
+
+def seed(rows):
+    """Insert one user, one food and `rows` meal logs with stale quantities."""
+    from app import models  # noqa: F401
+
+    db.create_all()
+    with db.engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO user (id, user_id, username, password_hash, is_admin, is_active) "
+            "VALUES (1, 'bench', 'bench', 'x', 0, 1)"
+        ))
+        connection.execute(text(
+            "INSERT INTO food (id, name, category, calories, protein, carbs, fat, fiber, is_verified) "
+            "VALUES (1, 'Oats', 'Grains', 389, 16.9, 66.3, 6.9, 10.6, 1)"
+        ))
+        connection.execute(text(
+            "INSERT INTO meal_log (user_id, food_id, quantity, original_quantity, unit_type, logged_grams, meal_type, date) "
+            "SELECT 1, 1, 1.0, 1.0, 'serving', 40 + (value % 60), 'lunch', '2024-01-01' "
+            "FROM (WITH RECURSIVE seq(value) AS (SELECT 1 UNION ALL SELECT value + 1 FROM seq WHERE value < :rows) "
+            "SELECT value FROM seq)"
+        ), {'rows': rows})
+
+
+def legacy_backfill(batch_size=1000):
+    """Mirror backfill_quantity_to_grams.py."""
+    from app.models import MealLog
+
+    total_rows = MealLog.query.count()
+    for offset in range(0, total_rows, batch_size):
+        for meal_log in MealLog.query.offset(offset).limit(batch_size).all():
+            meal_log.quantity = meal_log.logged_grams
+        db.session.commit()
+
+
+def chunked_backfill(chunk_size, throttle_ratio):
+    from app.migrations import MigrationRunner
+    from app.migrations.versions import MIGRATIONS
+
+    migration = next(m for m in MIGRATIONS if m.version == '0006')
+    MigrationRunner(db.engine, migrations=[migration], chunk_size=chunk_size,
+                    throttle_ratio=throttle_ratio, log=lambda message: None).upgrade()
+
+
+def run_with_writer(app, backfill):
+    """Run backfill while a writer thread measures INSERT latency."""
+    waits = []
+    done = threading.Event()
+
+    def writer():
+        with app.app_context():
+            while not done.is_set():
+                started = time.perf_counter()
+                with db.engine.begin() as connection:
+                    connection.execute(text(
+                        "INSERT INTO meal_log (user_id, food_id, quantity, original_quantity, unit_type, "
+                        "logged_grams, meal_type, date) VALUES (1, 1, 80, 80, 'grams', 80, 'snack', '2024-01-02')"
+                    ))
+                waits.append(time.perf_counter() - started)
+                time.sleep(0.01)
+
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+    started = time.perf_counter()
+    backfill()
+    elapsed = time.perf_counter() - started
+    done.set()
+    thread.join()
+    return elapsed, waits
+
+
+def run(label, rows, backfill):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_bench_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            seed(rows)
+            elapsed, waits = run_with_writer(app, backfill)
+            stale = db.session.execute(text("SELECT COUNT(*) FROM meal_log WHERE quantity <> logged_grams")).scalar()
+            db.engine.dispose()
+
+    waits.sort()
+    p99 = waits[int(len(waits) * 0.99) - 1] if waits else 0.0
+    print(f"{label:<28} {elapsed:8.2f} s   writes {len(waits):5d}   "
+          f"p99 wait {p99 * 1000:8.1f} ms   max wait {max(waits, default=0) * 1000:8.1f} ms   stale rows {stale}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--throttle-ratio', type=float, default=0.5)
+    args = parser.parse_args()
+
+    print(f"Backfilling {args.rows} meal logs")
+    run('OFFSET batches (ORM)', args.rows, legacy_backfill)
+    run(f'keyset chunks of {args.chunk_size}', args.rows,
+        lambda: chunked_backfill(args.chunk_size, args.throttle_ratio))
+
+
+if __name__ == '__main__':
+    main()
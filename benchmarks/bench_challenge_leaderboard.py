@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark for challenge leaderboards (ChallengeLeaderboardService).
+
+Reuses the challenge progress benchmark's data set (one participation per
+user across three challenges), fills challenge_ranking with migration 0010
+and compares, per page view, computing the top 10 and the viewer's rank with
+ORDER BY current_progress over all participants against the cached top N
+plus an indexed rank count.
+
+Usage:
+    python benchmarks/bench_challenge_leaderboard.py [--participants 100000] [--views 500]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_challenge_progress import create_bench_app, seed
+from app import db
+
+
+def naive_view(challenge_id, user_id):
+    """Rank every participant on the fly, as a plain query would."""
+    from app.models import User, UserChallenge
+
+    rows = db.session.query(UserChallenge.user_id, User.username, UserChallenge.current_progress).join(
+        User, User.id == UserChallenge.user_id
+    ).filter(
+        UserChallenge.challenge_id == challenge_id
+    ).order_by(UserChallenge.current_progress.desc(), UserChallenge.id).all()
+    top = rows[:10]
+    rank = next(position for position, row in enumerate(rows, start=1) if row.user_id == user_id)
+    return top, rank
+
+
+def precomputed_view(challenge_id, user_id):
+    from app.services.challenge_leaderboard_service import ChallengeLeaderboardService
+
+    return (ChallengeLeaderboardService.get_top(challenge_id),
+            ChallengeLeaderboardService.get_standing(challenge_id, user_id))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--participants', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--views', type=int, default=500)
+    args = parser.parse_args()
+
+    from app.migrations import MigrationRunner
+    from app.migrations.versions import MIGRATIONS
+    from app.services.challenge_progress_service import ChallengeProgressService
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_bench_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            seed(args.participants, args.days)
+            MigrationRunner(db.engine, migrations=[m for m in MIGRATIONS if m.version == '0010'],
+                            log=lambda message: None).upgrade()
+            started = time.perf_counter()
+            ChallengeProgressService().evaluate()
+            print(f"{'batch evaluate() + rankings':<28} {time.perf_counter() - started:8.2f} s")
+
+            # Viewers spread over all users (challenge = 1 + user_id % 3, as seeded)
+            step = max(1, args.participants // args.views)
+            viewers = [(1 + user_id % 3, user_id) for user_id in range(1, args.participants + 1, step)]
+
+            for label, view in (('ORDER BY per view', naive_view), ('precomputed rankings', precomputed_view)):
+                started = time.perf_counter()
+                for challenge_id, user_id in viewers:
+                    view(challenge_id, user_id)
+                elapsed = time.perf_counter() - started
+                print(f"{label:<28} {elapsed / len(viewers) * 1000:8.2f} ms per view ({len(viewers)} views)")
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
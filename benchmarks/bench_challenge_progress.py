@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Benchmark for challenge progress evaluation (ChallengeProgressService).
+
+Seeds a temporary SQLite database with one active challenge participation
+per user (protein, calories and streak challenges in rotation) and a week of
+meal logs each, then measures:
+
+  * batch evaluation of every participant with the grouped queries
+  * the per-participant ORM loop it replaces, timed on a sample and
+    extrapolated to all participants
+  * the latency a single meal-log commit pays for incremental evaluation
+
+Usage:
+    python benchmarks/bench_challenge_progress.py [--participants 100000] [--days 7] [--sample 1000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from config import config
+from app import db
+
+
+START = date.today() - timedelta(days=10)
+
+
+def create_bench_app(db_path):
+    """Create a minimal app bound to a file-backed SQLite database."""
+    app = Flask(__name__)
+    app.config.from_object(config['testing'])
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 60}}
+    db.init_app(app)
+    return app
+
+
+def seed(participants, days):
+    """Insert users, three challenges, one participation per user and `days` logs per user."""
+    from app import models  # noqa: F401
+
+    db.create_all()
+    sequence = ("WITH RECURSIVE seq(value) AS (SELECT 1 UNION ALL SELECT value + 1 FROM seq WHERE value < :rows) "
+                "SELECT value FROM seq")
+    with db.engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO food (id, name, category, calories, protein, carbs, fat, fiber, is_verified) "
+            "VALUES (1, 'Oats', 'Grains', 389, 16.9, 66.3, 6.9, 10.6, 1)"
+        ))
+        connection.execute(text(
+            "INSERT INTO challenge (id, name, challenge_type, target_value, duration_days, is_active) VALUES "
+            "(1, 'Protein', 'protein', 100, 30, 1), (2, 'Calories', 'calories', 2000, 30, 1), "
+            "(3, 'Streak', 'streak', 30, 30, 1)"
+        ))
+        connection.execute(text(
+            f"INSERT INTO user (id, user_id, username, password_hash, is_admin, is_active) "
+            f"SELECT value, 'u' || value, 'u' || value, 'x', 0, 1 FROM ({sequence})"
+        ), {'rows': participants})
+        connection.execute(text(
+            f"INSERT INTO user_challenge (user_id, challenge_id, start_date, end_date, current_progress, is_completed) "
+            f"SELECT value, 1 + value % 3, :start, :end, 0, 0 FROM ({sequence})"
+        ), {'rows': participants, 'start': START, 'end': START + timedelta(days=30)})
+        # Skip one day in five so streaks and qualifying-day counts vary
+        connection.execute(text(
+            f"INSERT INTO meal_log (user_id, food_id, quantity, original_quantity, unit_type, logged_grams, "
+            f"meal_type, date, calories, protein) "
+            f"SELECT 1 + value % :participants, 1, 500, 500, 'grams', 500, 'lunch', "
+            f"date(:start, '+' || (value / :participants) || ' days'), 1500 + value % 900, 80 + value % 40 "
+            f"FROM ({sequence}) WHERE (value / :participants + value) % 5 <> 0"
+        ), {'rows': participants * days - 1, 'participants': participants, 'start': START})
+
+
+def naive_evaluate(user_challenges):
+    """Per-participant evaluation with the ORM, as a dashboard loop would do it."""
+    from app.models import MealLog
+
+    for user_challenge in user_challenges:
+        logs = MealLog.query.filter(MealLog.user_id == user_challenge.user_id,
+                                    MealLog.date >= user_challenge.start_date,
+                                    MealLog.date <= date.today()).all()
+        totals = {}
+        for log in logs:
+            protein, calories = totals.get(log.date, (0, 0))
+            totals[log.date] = (protein + (log.protein or 0), calories + (log.calories or 0))
+        challenge = user_challenge.challenge
+        if challenge.challenge_type == 'protein':
+            progress = sum(1 for protein, _ in totals.values() if protein >= challenge.target_value)
+        elif challenge.challenge_type == 'calories':
+            progress = sum(1 for _, calories in totals.values() if 0 < calories <= challenge.target_value)
+        else:
+            progress = run = 0
+            previous = None
+            for day in sorted(totals):
+                run = run + 1 if previous and day - previous == timedelta(days=1) else 1
+                progress = max(progress, run)
+                previous = day
+        user_challenge.current_progress = progress
+    db.session.commit()
+
+
+def time_meal_log_writes(writes):
+    """Average commit latency of single meal-log inserts."""
+    from app.models import MealLog
+
+    started = time.perf_counter()
+    for user_id in range(1, writes + 1):
+        db.session.add(MealLog(user_id=user_id, food_id=1, quantity=100, original_quantity=100,
+                               unit_type='grams', logged_grams=100, meal_type='snack', date=date.today(),
+                               calories=200, protein=10))
+        db.session.commit()
+    return (time.perf_counter() - started) / writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--participants', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--sample', type=int, default=1000)
+    parser.add_argument('--writes', type=int, default=200)
+    args = parser.parse_args()
+
+    from app.models import UserChallenge, update_challenge_progress
+    from app.services.challenge_progress_service import ChallengeProgressService
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_bench_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            started = time.perf_counter()
+            seed(args.participants, args.days)
+            print(f"Seeded {args.participants} participants x {args.days} days "
+                  f"in {time.perf_counter() - started:.1f} s")
+
+            started = time.perf_counter()
+            sample = UserChallenge.query.order_by(UserChallenge.id).limit(args.sample).all()
+            naive_evaluate(sample)
+            naive = time.perf_counter() - started
+            print(f"{'per-participant ORM loop':<28} {naive:8.2f} s for {args.sample}   "
+                  f"~{naive / args.sample * args.participants:8.1f} s extrapolated")
+
+            started = time.perf_counter()
+            result = ChallengeProgressService().evaluate()
+            batch = time.perf_counter() - started
+            print(f"{'batch evaluate()':<28} {batch:8.2f} s   {result}")
+
+            event.remove(Session, 'after_flush', update_challenge_progress)
+            plain = time_meal_log_writes(args.writes)
+            event.listen(Session, 'after_flush', update_challenge_progress)
+            incremental = time_meal_log_writes(args.writes)
+            print(f"{'meal-log commit':<28} {plain * 1000:8.2f} ms without hook   "
+                  f"{incremental * 1000:8.2f} ms with incremental evaluation")
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
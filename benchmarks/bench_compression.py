@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark for response compression (app/utils/compression.py).
+
+Seeds an in-memory catalog with servings and measures /api/v2/foods/search
+(per_page=100, nested servings) for identity, gzip and, when the brotli
+package is installed, br: bytes on the wire, server time per request and
+the estimated transfer time on a constrained link. It then exports the
+catalog to CSV and compares downloading it by recompressing on every
+request against serving the precompressed .csv.gz artifact.
+
+Usage:
+    python benchmarks/bench_compression.py [--foods 5000] [--requests 50] [--mbps 10]
+"""
+
+import argparse
+import gzip
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app import create_app, db
+from app.utils import compression
+
+
+def seed(foods):
+    with db.engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO user (id, user_id, username, password_hash, is_admin, is_active) "
+            "VALUES (1, 'bench', 'bench', 'x', 1, 1)"
+        ))
+        connection.execute(text(
+            "INSERT INTO food (name, brand, category, description, calories, protein, carbs, fat, fiber, "
+            "sugar, sodium, is_verified) "
+            "SELECT 'Chicken curry ' || value, 'Brand ' || (value % 50), 'Meals', "
+            "'Home-style curry with onions, tomatoes and spices', value % 900, value % 40, value % 80, "
+            "value % 30, value % 15, value % 20, value % 500, value % 2 "
+            "FROM (WITH RECURSIVE seq(value) AS (SELECT 1 UNION ALL SELECT value + 1 FROM seq WHERE value < :rows) "
+            "SELECT value FROM seq)"
+        ), {'rows': foods})
+        for serving_name, unit, grams in (('1 bowl', 'bowl', 250), ('1 cup', 'cup', 240), ('100 g', 'g', 100)):
+            connection.execute(text(
+                "INSERT INTO food_serving (food_id, serving_name, unit, grams_per_unit) "
+                "SELECT id, :serving_name, :unit, :grams FROM food"
+            ), {'serving_name': serving_name, 'unit': unit, 'grams': grams})
+
+
+def time_requests(client, url, accept, requests):
+    headers = {'Accept-Encoding': accept} if accept else {}
+    client.get(url, headers=headers)
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(url, headers=headers)
+    return (time.perf_counter() - started) / requests, len(response.data), response.headers.get('Content-Encoding')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--foods', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--mbps', type=float, default=10.0, help='link speed for the transfer estimate')
+    args = parser.parse_args()
+
+    from app.services.food_export_service import FoodExportService
+
+    app = create_app('testing')
+    app.config['RATE_LIMIT_ENABLED'] = False
+    with app.app_context():
+        db.create_all()
+        seed(args.foods)
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = '1'
+
+        def report(label, seconds, size):
+            transfer = size * 8 / (args.mbps * 1e6)
+            print(f"{label:<32} {size / 1024:9.1f} KiB   server {seconds * 1000:7.2f} ms   "
+                  f"+ transfer @{args.mbps:g} Mbit/s {transfer * 1000:8.1f} ms")
+
+        print(f"/api/v2/foods/search, per_page=100 ({args.foods} foods, 3 servings each)")
+        url = '/api/v2/foods/search?q=curry&per_page=100'
+        for accept in [None, 'gzip'] + (['br'] if compression.brotli is not None else []):
+            seconds, size, encoding = time_requests(client, url, accept, args.requests)
+            report(f'  {encoding or "identity"}', seconds, size)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            service = FoodExportService()
+            service.export_directory = tmp
+            path = os.path.join(tmp, 'export.csv.gz')
+            service._export_to_csv(service._build_food_query(None).all(), path)
+            with gzip.open(path, 'rb') as f:
+                plain = f.read()
+
+            print(f"\nCSV export download ({args.foods} foods)")
+            report('  identity', 0.0, len(plain))
+            started = time.perf_counter()
+            for _ in range(args.requests):
+                body = gzip.compress(plain, compresslevel=6)
+            report('  gzip per download', (time.perf_counter() - started) / args.requests, len(body))
+            with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+                started = time.perf_counter()
+                for _ in range(args.requests):
+                    response = compression.send_precompressed(path, 'export.csv', 'text/csv')
+                    response.direct_passthrough = False
+                    body = response.get_data()
+                    response.close()
+                report('  precompressed .csv.gz', (time.perf_counter() - started) / args.requests, len(body))
+
+
+if __name__ == '__main__':
+    main()
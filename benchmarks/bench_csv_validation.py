@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark for upload CSV validation (app/services/csv_schema.py).
+
+Writes a food upload CSV with --rows rows (one in --invalid-every rows has
+a bad number or unit) to a temporary file, optionally gzip-compressed, and
+measures rows per second for:
+
+  dry run         BulkUploadProcessor.validate_csv_stream over the file, as
+                  the /admin/bulk-upload-dry-run endpoint does
+  DictReader rows sanitize_row_data per csv.DictReader row, as the upload
+                  job does before inserting each food
+
+Usage:
+    python benchmarks/bench_csv_validation.py [--rows 1000000] [--invalid-every 1000] [--gzip]
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.bulk_upload_processor import BulkUploadProcessor
+
+HEADERS = ['name', 'brand', 'category', 'base_unit', 'calories_per_100g', 'protein_per_100g', 'carbs_per_100g',
+           'fat_per_100g', 'fiber_per_100g', 'sugar_per_100g', 'sodium_per_100g', 'description']
+
+
+def write_csv(path, rows, invalid_every, compress):
+    opener = gzip.open if compress else open
+    with opener(path, 'wt', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADERS)
+        for i in range(rows):
+            unit = 'bucket' if invalid_every and i % invalid_every == 1 else ('g', 'ml', 'piece')[i % 3]
+            fat = 'n/a' if invalid_every and i % invalid_every == 0 else str(i % 30)
+            writer.writerow([f'Food {i}', f'Brand {i % 50}', 'Meals', unit, str(i % 900), str(i % 40), str(i % 80),
+                             fat, '1.5', '2', str(i % 500), f'Home-style  dish\tnumber {i}'])
+
+
+def open_text(path, compress):
+    raw = gzip.open(path, 'rb') if compress else open(path, 'rb')
+    return io.TextIOWrapper(raw, encoding='utf-8', newline='')
+
+
+def report(label, rows, elapsed):
+    print(f"{label:<18} {elapsed:8.2f} s   {rows / elapsed:12,.0f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--invalid-every', type=int, default=1000, help='0 for an all-valid file')
+    parser.add_argument('--gzip', action='store_true', help='read the file as .csv.gz')
+    args = parser.parse_args()
+
+    processor = BulkUploadProcessor()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'foods.csv.gz' if args.gzip else 'foods.csv')
+        write_csv(path, args.rows, args.invalid_every, args.gzip)
+        print(f"{args.rows} rows, {os.path.getsize(path) / 2**20:.1f} MiB{' gzip' if args.gzip else ''}")
+
+        with open_text(path, args.gzip) as stream:
+            started = time.perf_counter()
+            result = processor.validate_csv_stream(stream, max_reported=1000)
+            report('dry run', result['row_count'], time.perf_counter() - started)
+        print(f"{'':<18} {result['total_invalid']} invalid rows, {result['total_errors']} errors")
+
+        with open_text(path, args.gzip) as stream:
+            started = time.perf_counter()
+            for row in csv.DictReader(stream):
+                processor.sanitize_row_data(row)
+            report('DictReader rows', args.rows, time.perf_counter() - started)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark for near-duplicate food detection (app/services/food_duplicate_detector.py).
+
+Generates synthetic catalogs of random multi-word food names where one in
+--duplicate-every foods is a variant of an earlier one (case, punctuation,
+word order or a one-letter typo), then reports index build time for
+doubling catalog sizes, so the scaling is visible, and how many of the
+planted duplicates were found at the default threshold.
+
+Usage:
+    python benchmarks/bench_food_duplicates.py [--foods 200000] [--steps 4] [--duplicate-every 20]
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.food_duplicate_detector import FoodDuplicateDetector
+
+
+def make_word(rng):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+
+
+def variant(rng, name):
+    """A likely duplicate of name."""
+    words = name.split()
+    kind = rng.randrange(4)
+    if kind == 0:
+        return name.upper()
+    if kind == 1:
+        return f"{' '.join(words[:-1])} ({words[-1]})"
+    if kind == 2:
+        rng.shuffle(words)
+        return ', '.join(words)
+    word = rng.randrange(len(words))
+    position = rng.randrange(len(words[word]))
+    words[word] = words[word][:position] + rng.choice(string.ascii_lowercase) + words[word][position + 1:]
+    return ' '.join(words)
+
+
+def make_catalog(count, duplicate_every, seed=7):
+    rng = random.Random(seed)
+    vocabulary = [make_word(rng) for _ in range(5000)]
+    foods, planted = [], []
+    for food_id in range(1, count + 1):
+        if duplicate_every and food_id % duplicate_every == 0:
+            original = rng.randrange(len(foods))
+            foods.append((food_id, variant(rng, foods[original][1]), None))
+            planted.append((foods[original][0], food_id))
+        else:
+            foods.append((food_id, ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(2, 4))), None))
+    return foods, planted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--foods', type=int, default=200000, help='Largest catalog size')
+    parser.add_argument('--steps', type=int, default=4, help='Catalog sizes, halving from --foods')
+    parser.add_argument('--duplicate-every', type=int, default=20)
+    args = parser.parse_args()
+
+    threshold = FoodDuplicateDetector.DEFAULT_THRESHOLD
+    for step in reversed(range(args.steps)):
+        count = args.foods >> step
+        foods, planted = make_catalog(count, args.duplicate_every)
+
+        started = time.perf_counter()
+        index = FoodDuplicateDetector.build_index(foods)
+        elapsed = time.perf_counter() - started
+
+        found = {(a, b) for similarity, a, b in index.pairs if similarity >= threshold}
+        recall = sum(pair in found for pair in planted) / len(planted) if planted else 1.0
+        print(f"{count:>9,} foods  {elapsed:7.2f} s  {count / elapsed:>10,.0f} foods/s  "
+              f"{len(index.clusters(threshold)):>7,} clusters  planted found {recall:6.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the nutrient range-query API (/api/v2/foods/query).
+
+Builds a synthetic catalog (500k foods by default) in a temporary SQLite
+database, then times representative range queries with and without the
+nutrient indexes declared on the Food model. The first page of results
+(what the endpoint returns by default) and the opt-in total count are
+timed separately.
+
+Usage:
+    python benchmarks/bench_food_query.py [--foods 500000] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from config import config
+from app import db
+
+
+QUERIES = [
+    ('protein >= 20, calories <= 150, by protein density',
+     {'min_protein': 20, 'max_calories': 150}, 'protein_per_100kcal', 'desc'),
+    ('fiber >= 10, by fiber density',
+     {'min_fiber': 10}, 'fiber_per_100kcal', 'desc'),
+    ('fat <= 1, carbs between 10 and 20, by calories',
+     {'max_fat': 1, 'min_carbs': 10, 'max_carbs': 20}, 'calories', 'asc'),
+    ('top protein density (no filters)',
+     {}, 'protein_per_100kcal', 'desc'),
+]
+
+
+def create_bench_app(db_path):
+    """Create a minimal app bound to a file-backed SQLite database."""
+    app = Flask(__name__)
+    app.config.from_object(config['testing'])
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    db.init_app(app)
+    return app
+
+
+def populate_catalog(count, seed=42):
+    """Insert synthetic foods with plausible per-100g nutrient values."""
+    rng = random.Random(seed)
+    categories = ['Grains', 'Dairy', 'Pulses', 'Vegetables', 'Fruits', 'Meat', 'Snacks', 'Beverages']
+    batch = []
+    insert_sql = (
+        "INSERT INTO food (name, brand, category, calories, protein, carbs, fat, fiber, sugar, sodium, "
+        "serving_size, default_serving_size_grams, is_verified) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 100, 100, ?)"
+    )
+    raw = db.engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for i in range(count):
+            protein = rng.uniform(0, 40)
+            carbs = rng.uniform(0, 80)
+            fat = rng.uniform(0, 40)
+            batch.append((
+                f'Food {i}', f'Brand {i % 500}', rng.choice(categories),
+                protein * 4 + carbs * 4 + fat * 9, protein, carbs, fat,
+                rng.uniform(0, 20), rng.uniform(0, 30), rng.uniform(0, 1500),
+                rng.random() < 0.8
+            ))
+            if len(batch) >= 50000:
+                cursor.executemany(insert_sql, batch)
+                batch = []
+        if batch:
+            cursor.executemany(insert_sql, batch)
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def best_of(repeat, fn):
+    """Return the best wall time of fn() in milliseconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def time_queries(repeat):
+    """Time the first page (21 rows) and the optional total count of each query."""
+    from app.services.food_query_service import FoodQueryService
+
+    results = []
+    for label, filters, sort, order in QUERIES:
+        query = FoodQueryService.build_query(filters=filters, sort=sort, order=order)
+        page_ms = best_of(repeat, lambda: query.limit(21).all())
+        count_ms = best_of(repeat, lambda: FoodQueryService.count(query))
+        results.append((label, page_ms, count_ms))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--foods', type=int, default=500000, help='Number of foods to generate')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per query (best time is reported)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_bench_app(os.path.join(tmp_dir, 'bench.db'))
+        with app.app_context():
+            from app.models import Food
+
+            db.create_all()
+            indexes = [ix for ix in Food.__table__.indexes if ix.name.startswith('ix_food_verified_')]
+            for index in indexes:
+                index.drop(db.engine)
+
+            print(f"Populating {args.foods:,} foods...")
+            start = time.perf_counter()
+            populate_catalog(args.foods)
+            print(f"  done in {time.perf_counter() - start:.1f}s")
+
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('ANALYZE')
+            unindexed = time_queries(args.repeat)
+
+            start = time.perf_counter()
+            for index in indexes:
+                index.create(db.engine)
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('ANALYZE')
+            print(f"Built {len(indexes)} indexes in {time.perf_counter() - start:.1f}s")
+            indexed = time_queries(args.repeat)
+
+    print()
+    print(f"{'query':<52} {'page ms (no idx / idx)':>24} {'count ms (no idx / idx)':>25}")
+    for (label, page_before, count_before), (_, page_after, count_after) in zip(unindexed, indexed):
+        print(f"{label:<52} {page_before:>11.1f} / {page_after:<10.1f} {count_before:>12.1f} / {count_after:<10.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the memory-mapped nutrient snapshot (NutrientSnapshot).
+
+Seeds a temporary SQLite catalog, then compares what one worker pays to
+get whole-catalog nutrient columns by loading Food ORM objects versus
+mapping the snapshot files: wall time, Python heap allocated (tracemalloc)
+and the cost of 10k id lookups.
+
+Usage:
+    python benchmarks/bench_nutrient_snapshot.py [--foods 200000] [--lookups 10000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import text
+from config import config
+from app import db
+
+
+def create_bench_app(db_path, snapshot_dir):
+    """Create a minimal app bound to a file-backed SQLite database."""
+    app = Flask(__name__)
+    app.config.from_object(config['testing'])
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['NUTRIENT_SNAPSHOT_FOLDER'] = snapshot_dir
+    db.init_app(app)
+    return app
+
+
+def seed(foods):
+    from app import models  # noqa: F401
+
+    db.create_all()
+    with db.engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO food (name, category, calories, protein, carbs, fat, fiber, sugar, sodium, is_verified) "
+            "SELECT 'Food ' || value, 'Bench', value % 900, value % 40, value % 80, value % 30, value % 15, "
+            "value % 20, value % 500, 1 "
+            "FROM (WITH RECURSIVE seq(value) AS (SELECT 1 UNION ALL SELECT value + 1 FROM seq WHERE value < :rows) "
+            "SELECT value FROM seq)"
+        ), {'rows': foods})
+        connection.execute(text("INSERT INTO catalog_version (id, version) VALUES (1, 1)"))
+
+
+def measure(label, load):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<30} {elapsed:8.2f} s   heap held {current / 2**20:8.1f} MiB   peak {peak / 2**20:8.1f} MiB")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--foods', type=int, default=200000)
+    parser.add_argument('--lookups', type=int, default=10000)
+    args = parser.parse_args()
+
+    from app.models import Food
+    from app.services.nutrient_snapshot import NutrientSnapshot
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_bench_app(os.path.join(tmp, 'bench.db'), os.path.join(tmp, 'snapshot'))
+        with app.app_context():
+            seed(args.foods)
+            NutrientSnapshot.build(1)
+            print(f"Snapshot for {args.foods} foods: "
+                  f"{sum(f.stat().st_size for f in os.scandir(os.path.join(tmp, 'snapshot', 'v00000001'))) / 2**20:.1f} MiB on disk")
+
+            foods = measure('Food ORM objects', lambda: {food.id: food for food in Food.query.all()})
+            db.session.expunge_all()
+            del foods
+            snapshot = measure('mapped snapshot', NutrientSnapshot.current)
+
+            ids = np.random.default_rng(0).integers(1, args.foods + 1, args.lookups)
+            started = time.perf_counter()
+            for food_id in ids.tolist():
+                db.session.get(Food, food_id).protein
+            print(f"{'session.get() lookups':<30} {(time.perf_counter() - started) / args.lookups * 1e6:8.1f} us each")
+            started = time.perf_counter()
+            snapshot.column('protein')[snapshot.positions(ids)]
+            print(f"{'snapshot.positions() batch':<30} {(time.perf_counter() - started) / args.lookups * 1e6:8.2f} us each")
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the remaining-macros recommender (/api/v2/recommendations/remaining).
+
+Builds a synthetic catalog of verified foods with several servings each in
+a temporary SQLite database, then reports the one-off matrix build time and
+the per-request scoring/top-K time.
+
+Usage:
+    python benchmarks/bench_recommender.py [--foods 100000] [--servings 3] [--repeat 20]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from config import config
+from app import db
+
+
+def create_bench_app(db_path):
+    """Create a minimal app bound to a file-backed SQLite database."""
+    app = Flask(__name__)
+    app.config.from_object(config['testing'])
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    db.init_app(app)
+    return app
+
+
+def populate_catalog(food_count, servings_per_food, seed=42):
+    """Insert verified foods and servings directly, bypassing the ORM."""
+    rng = random.Random(seed)
+    raw = db.engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        foods = []
+        servings = []
+        for food_id in range(1, food_count + 1):
+            protein, carbs, fat = rng.uniform(0, 40), rng.uniform(0, 80), rng.uniform(0, 40)
+            foods.append((food_id, f'Food {food_id}', protein * 4 + carbs * 4 + fat * 9,
+                           protein, carbs, fat, rng.uniform(0, 15)))
+            for n in range(servings_per_food):
+                servings.append((food_id, f'serving {n}', 'g', rng.uniform(10, 400)))
+        cursor.executemany(
+            "INSERT INTO food (id, name, category, calories, protein, carbs, fat, fiber, is_verified) "
+            "VALUES (?, ?, 'Bench', ?, ?, ?, ?, ?, 1)", foods
+        )
+        cursor.executemany(
+            "INSERT INTO food_serving (food_id, serving_name, unit, grams_per_unit) VALUES (?, ?, ?, ?)",
+            servings
+        )
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--foods', type=int, default=100000, help='Number of verified foods')
+    parser.add_argument('--servings', type=int, default=3, help='Servings per food')
+    parser.add_argument('--repeat', type=int, default=20, help='Recommendation requests to time')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_bench_app(os.path.join(tmp_dir, 'bench.db'))
+        with app.app_context():
+            from app.services.food_recommender import FoodRecommender
+
+            db.create_all()
+            print(f"Populating {args.foods:,} foods x {args.servings} servings...")
+            populate_catalog(args.foods, args.servings)
+
+            start = time.perf_counter()
+            matrix = FoodRecommender.get_matrix()
+            print(f"Matrix build: {len(matrix):,} candidates in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+            rng = random.Random(7)
+            timings = []
+            for _ in range(args.repeat):
+                remaining = {'calories': rng.uniform(200, 900), 'protein': rng.uniform(10, 80),
+                             'carbs': rng.uniform(0, 120), 'fat': rng.uniform(0, 40),
+                             'fiber': rng.uniform(0, 15)}
+                start = time.perf_counter()
+                FoodRecommender.recommend(remaining, k=10)
+                timings.append((time.perf_counter() - start) * 1000)
+
+            timings.sort()
+            print(f"Recommend (k=10): median {timings[len(timings) // 2]:.1f} ms, "
+                  f"max {timings[-1]:.1f} ms over {args.repeat} requests")
+
+
+if __name__ == '__main__':
+    main()
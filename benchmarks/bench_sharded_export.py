@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark for sharded exports (app/services/sharded_export.py).
+
+Seeds a temporary SQLite catalog and exports it as gzip CSV (or JSON),
+first with the existing single-threaded path (load all rows, then
+serialize), then through ShardedExport with 1..N worker processes. It
+prints wall time, rows per second and speedup over the unsharded export.
+Worker start-up (spawn and app import) is included in the timings.
+
+Usage:
+    python benchmarks/bench_sharded_export.py [--foods 500000] [--workers 1,2,4,8] [--format csv]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import text
+from config import config
+from app import db
+
+
+def create_bench_app(db_path):
+    """Create a minimal app bound to a file-backed SQLite database."""
+    app = Flask(__name__)
+    app.config.from_object(config['testing'])
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    db.init_app(app)
+    return app
+
+
+def seed(foods):
+    from app import models  # noqa: F401
+
+    db.create_all()
+    with db.engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO user (id, user_id, username, password_hash, is_admin, is_active) "
+            "VALUES (1, 'bench', 'bench', 'x', 1, 1)"
+        ))
+        connection.execute(text(
+            "INSERT INTO food (name, brand, category, description, calories, protein, carbs, fat, fiber, "
+            "sugar, sodium, serving_size, is_verified, created_at) "
+            "SELECT 'Food ' || value, 'Brand ' || (value % 50), 'Meals', 'Home-style dish number ' || value, "
+            "value % 900, value % 40, value % 80, value % 30, value % 15, value % 20, value % 500, 100, "
+            "value % 2, CURRENT_TIMESTAMP "
+            "FROM (WITH RECURSIVE seq(value) AS (SELECT 1 UNION ALL SELECT value + 1 FROM seq WHERE value < :rows) "
+            "SELECT value FROM seq)"
+        ), {'rows': foods})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--foods', type=int, default=500000)
+    parser.add_argument('--workers', default=','.join(str(n) for n in (1, 2, 4, 8) if n <= (os.cpu_count() or 1)),
+                        help='comma-separated worker counts')
+    parser.add_argument('--format', choices=('csv', 'json'), default='csv')
+    args = parser.parse_args()
+
+    from app.models import ExportJob
+    from app.services.food_export_service import FoodExportService
+    from app.services.sharded_export import ShardedExport
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_bench_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            seed(args.foods)
+            service = FoodExportService()
+            job = ExportJob(export_type=args.format, created_by=1, status='processing')
+            db.session.add(job)
+            db.session.commit()
+            print(f"{args.foods} foods, {args.format}, {os.cpu_count()} CPU(s)")
+
+            path = os.path.join(tmp, f'unsharded.{args.format}.gz')
+            started = time.perf_counter()
+            foods = service._build_food_query(None).all()
+            getattr(service, f'_export_to_{args.format}')(foods, path)
+            baseline = time.perf_counter() - started
+            del foods
+            print(f"{'unsharded (one thread)':<32} {baseline:8.2f} s   {args.foods / baseline:10,.0f} rows/s   "
+                  f"{os.path.getsize(path) / 2**20:7.1f} MiB")
+
+            for workers in (int(n) for n in args.workers.split(',')):
+                path = os.path.join(tmp, f'sharded_{workers}.{args.format}.gz')
+                started = time.perf_counter()
+                ShardedExport('foods', workers).run(job, args.format, None, path)
+                elapsed = time.perf_counter() - started
+                label = f"sharded, {workers} worker{'s' if workers > 1 else ''}" + (' (in-process)' if workers == 1 else '')
+                print(f"{label:<32} {elapsed:8.2f} s   {args.foods / elapsed:10,.0f} rows/s   "
+                      f"{os.path.getsize(path) / 2**20:7.1f} MiB   x{baseline / elapsed:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark for application startup (worker boot) and first request.
+
+Each run happens in a fresh interpreter, like a new gunicorn worker, against
+an already-initialised SQLite database. Compares the previous behaviour
+(schema check + admin seeding on boot, Swagger registered eagerly) with the
+default startup mode (no schema work, Swagger docs loaded lazily).
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER_CODE = r"""
+import json, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app('production')
+created = time.perf_counter()
+app.test_client().get('/auth/login')
+first_request = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (first_request - created) * 1000,
+    'total_ms': (first_request - start) * 1000
+}))
+"""
+
+MODES = {
+    'previous (init on boot, eager docs)': {'AUTO_INIT_DB': 'true', 'API_DOCS_MODE': 'eager'},
+    'default (CLI init, lazy docs)': {'AUTO_INIT_DB': 'false', 'API_DOCS_MODE': 'lazy'},
+}
+
+
+def run_worker(env):
+    """Boot the app in a fresh interpreter and return its timings."""
+    result = subprocess.run(
+        [sys.executable, '-c', WORKER_CODE], cwd=PROJECT_ROOT, env=env,
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per mode (best time is reported)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        base_env = {**os.environ, 'PYTHONPATH': PROJECT_ROOT, 'SECRET_KEY': 'bench',
+                    'DATABASE_URL': f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"}
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'wsgi', 'init-db', '--seed-admin'],
+                       cwd=PROJECT_ROOT, env={**base_env, 'FLASK_ENV': 'production'},
+                       capture_output=True, check=True)
+
+        print(f"{'mode':<38} {'import':>9} {'create_app':>11} {'1st request':>12} {'total':>9}")
+        for label, mode_env in MODES.items():
+            runs = [run_worker({**base_env, **mode_env}) for _ in range(args.runs)]
+            best = {key: min(run[key] for run in runs) for key in runs[0]}
+            print(f"{label:<38} {best['import_ms']:>7.0f}ms {best['create_app_ms']:>9.0f}ms "
+                  f"{best['first_request_ms']:>10.0f}ms {best['total_ms']:>7.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
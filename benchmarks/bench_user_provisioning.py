@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark for bulk user provisioning (/api/admin/users/bulk).
+
+Provisions a synthetic cohort twice in temporary SQLite databases: once the
+way /api/admin/users does it (per-row uniqueness queries, serial hashing,
+one commit per user) and once through UserProvisioningService. Reports wall
+time and SQL statement counts. Hashing speedup scales with --workers up to
+the number of CPU cores.
+
+Usage:
+    python benchmarks/bench_user_provisioning.py [--users 500] [--workers N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import event
+from config import config
+from app import db
+
+
+FIRST_NAMES = ['Asha', 'Ravi', 'Meera', 'Arjun', 'Priya', 'Karan', 'Divya', 'Vikram']
+LAST_NAMES = ['Rao', 'Kumar', 'Sharma', 'Iyer', 'Patel', 'Singh', 'Nair', 'Gupta']
+
+
+def create_bench_app(db_path):
+    """Create a minimal app bound to a file-backed SQLite database."""
+    app = Flask(__name__)
+    app.config.from_object(config['testing'])
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    db.init_app(app)
+    return app
+
+
+def cohort(count):
+    """Synthetic rows with many repeated names, so username suffixes are needed."""
+    return [{
+        'first_name': FIRST_NAMES[i % len(FIRST_NAMES)],
+        'last_name': LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)],
+        'email': f'user{i}@example.com',
+        'password': 'Str0ng!Pass'
+    } for i in range(count)]
+
+
+def provision_one_at_a_time(rows):
+    """Mirror the per-row logic of the single-user endpoint."""
+    from app.models import User
+
+    for row in rows:
+        user_id = User.generate_user_id()
+        User.validate_user_id(user_id)
+        User.query.filter_by(email=row['email']).first()
+        user = User(
+            user_id=user_id,
+            username=User.generate_username(row['first_name'], row['last_name']),
+            email=row['email'],
+            first_name=row['first_name'],
+            last_name=row['last_name']
+        )
+        user.set_password(row['password'])
+        db.session.add(user)
+        db.session.commit()
+
+
+def provision_bulk(rows, workers):
+    """Run a provisioning job synchronously."""
+    from app.models import User, UserProvisioningJob
+    from app.services.user_provisioning_service import UserProvisioningService
+
+    admin = User(username='bench_admin', first_name='Bench', last_name='Admin', is_admin=True, password_hash='x')
+    db.session.add(admin)
+    db.session.commit()
+    job = UserProvisioningJob(filename='bench.json', source_format='json', total_rows=len(rows), created_by=admin.id)
+    db.session.add(job)
+    db.session.commit()
+    UserProvisioningService(hash_workers=workers).process_job(job.job_id, rows)
+
+
+def measure(label, fn, *args):
+    """Run fn in a fresh database and report time and statement count."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_bench_app(os.path.join(tmp_dir, 'bench.db'))
+        with app.app_context():
+            from app import models  # noqa: F401 - register tables before create_all
+            db.create_all()
+            statements = [0]
+
+            def count_statement(*_):
+                statements[0] += 1
+
+            event.listen(db.engine, 'before_cursor_execute', count_statement)
+            start = time.perf_counter()
+            fn(*args)
+            elapsed = time.perf_counter() - start
+            event.remove(db.engine, 'before_cursor_execute', count_statement)
+    print(f"{label:<28} {elapsed:>8.1f} s {statements[0]:>10,} statements")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=500, help='Cohort size')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Hashing processes')
+    args = parser.parse_args()
+
+    rows = cohort(args.users)
+    print(f"Provisioning {args.users:,} users ({args.workers} hashing workers, {os.cpu_count()} CPUs)")
+    measure('one at a time', provision_one_at_a_time, [dict(row) for row in rows])
+    measure('bulk job', provision_bulk, [dict(row) for row in rows], args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,22 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///nutri_tracker.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Read replica for reports, admin listings and exports (see app/utils/db_routing.py).
+    # Reads fall back to the primary while the replica is unreachable, and stay on
+    # it for DATABASE_REPLICA_LAG seconds after a user's own write
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    DATABASE_REPLICA_LAG = int(os.environ.get('DATABASE_REPLICA_LAG', 5))  # seconds
+    DATABASE_REPLICA_CHECK_INTERVAL = 30  # seconds between replica health checks
+    
+    # Comma-separated database URLs to shard meal_log and nutrition_goal over by
+    # user (see app/utils/sharding.py); empty keeps them on the primary
+    MEAL_LOG_SHARD_URLS = os.environ.get('MEAL_LOG_SHARD_URLS', '')
+    
+    # Meal logs dated more than this many days ago are moved into monthly
+    # archive tables by `flask archive-meal-logs` (see app/utils/meal_log_archive.py)
+    MEAL_LOG_ARCHIVE_AFTER_DAYS = int(os.environ.get('MEAL_LOG_ARCHIVE_AFTER_DAYS', 365))
+    MEAL_LOG_ARCHIVE_BATCH_SIZE = 1000  # meal logs moved per transaction
+    
     # Azure Storage Configuration
     AZURE_STORAGE_CONNECTION_STRING = os.environ.get('AZURE_STORAGE_CONNECTION_STRING')
     AZURE_CONTAINER_NAME = os.environ.get('AZURE_CONTAINER_NAME', 'food-images')
@@ -18,6 +34,8 @@ class Config:
     POSTS_PER_PAGE = 10
     UPLOAD_FOLDER = 'static/uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    # Memory-mapped catalog snapshots shared by all workers (relative to instance_path)
+    NUTRIENT_SNAPSHOT_FOLDER = os.environ.get('NUTRIENT_SNAPSHOT_FOLDER', 'nutrient_snapshot')
     
     # Password Policy
     MIN_PASSWORD_LENGTH = 8
@@ -25,11 +43,59 @@ class Config:
     REQUIRE_LOWERCASE = True
     REQUIRE_NUMBERS = True
     REQUIRE_SPECIAL_CHARS = True
+    
+    # Startup: run db.create_all() and seed the default admin inside create_app.
+    # Off by default outside development; use `flask init-db` / `flask seed-admin`
+    AUTO_INIT_DB = os.environ.get('AUTO_INIT_DB', 'false').lower() == 'true'
+    
+    # Swagger docs at /api/docs: 'eager' registers at startup, 'lazy' builds the
+    # docs app on the first /api/docs request, 'disabled' turns them off
+    API_DOCS_MODE = os.environ.get('API_DOCS_MODE', 'lazy')
+    
+    # Rate Limiting
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    # 'memory' is per worker process; 'database' shares counts across workers
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+    RATE_LIMIT_MAX_KEYS = 10000  # LRU bound for the in-memory backend
+    
+    # Response compression (gzip, or brotli when the package is installed)
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_SIZE = 1024  # bytes; smaller bodies are sent as-is
+    COMPRESSION_GZIP_LEVEL = 6
+    COMPRESSION_BROTLI_QUALITY = 4
+    
+    # Export reaper: expires old exports, enforces the disk quota on
+    # instance/exports and removes orphan files. 0 disables the periodic run
+    EXPORT_REAPER_INTERVAL = int(os.environ.get('EXPORT_REAPER_INTERVAL', 3600))  # seconds
+    EXPORT_DISK_QUOTA_MB = int(os.environ.get('EXPORT_DISK_QUOTA_MB', 1024))  # 0 = unlimited
+    EXPORT_ORPHAN_GRACE = 3600  # seconds; younger untracked files may still be being written
+    # Exports of at least EXPORT_SHARD_MIN_ROWS records are serialized by this
+    # many worker processes (see app/services/sharded_export.py); 0 or 1 disables
+    EXPORT_SHARD_WORKERS = int(os.environ.get('EXPORT_SHARD_WORKERS', min(4, os.cpu_count() or 1)))
+    EXPORT_SHARD_MIN_ROWS = int(os.environ.get('EXPORT_SHARD_MIN_ROWS', 200000))
+    
+    # Bulk food uploads are spooled here (relative to instance_path) and resumed
+    # from their checkpoint when stalled; 0 disables the periodic resume check
+    UPLOAD_SPOOL_FOLDER = os.environ.get('UPLOAD_SPOOL_FOLDER', 'upload_spool')
+    UPLOAD_RESUME_INTERVAL = int(os.environ.get('UPLOAD_RESUME_INTERVAL', 300))  # seconds
+    
+    # Job progress streams (Server-Sent Events, see app/services/job_progress.py).
+    # Each open stream holds a worker thread, so streams end after
+    # JOB_PROGRESS_STREAM_SECONDS and the browser reconnects
+    JOB_PROGRESS_DB_REFRESH = 5  # seconds between re-reads for jobs run by other processes
+    JOB_PROGRESS_STREAM_SECONDS = int(os.environ.get('JOB_PROGRESS_STREAM_SECONDS', 300))
+    
+    # Asynchronous read-only API tier, used only when served through asgi.py
+    # (see app/async_api): aiosqlite connections per process, and threads
+    # running the Flask app for every other request
+    ASYNC_API_DB_POOL_SIZE = int(os.environ.get('ASYNC_API_DB_POOL_SIZE', 8))
+    ASYNC_API_WSGI_THREADS = int(os.environ.get('ASYNC_API_WSGI_THREADS', 8))
 
 class DevelopmentConfig(Config):
     """Development configuration."""
     DEBUG = True
     SQLALCHEMY_ECHO = True
+    AUTO_INIT_DB = os.environ.get('AUTO_INIT_DB', 'true').lower() == 'true'
 
 class ProductionConfig(Config):
     """Production configuration."""
@@ -40,12 +106,22 @@ class ProductionConfig(Config):
     # Production database configuration
     if os.environ.get('DATABASE_URL'):
         SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+    
+    # Gunicorn runs several workers; share rate-limit counts through the database
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'database')
 
 class TestingConfig(Config):
     """Testing configuration."""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    DATABASE_REPLICA_URL = None
+    MEAL_LOG_SHARD_URLS = ''
     WTF_CSRF_ENABLED = False
+    AUTO_INIT_DB = False
+    API_DOCS_MODE = 'disabled'
+    EXPORT_REAPER_INTERVAL = 0
+    EXPORT_SHARD_WORKERS = 0
+    UPLOAD_RESUME_INTERVAL = 0
 
 config = {
     'development': DevelopmentConfig,
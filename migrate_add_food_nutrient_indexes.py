@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Migration script to add nutrient range-query indexes to the food table
+- Composite (is_verified, <nutrient>) indexes for calories, protein, carbs, fat, fiber, sugar, sodium
+- Expression indexes for protein and fiber density (grams per 100 kcal)
+- Idempotent: existing indexes are left untouched
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from sqlalchemy import inspect
+
+def migrate_add_food_nutrient_indexes():
+    """Create the nutrient range-query indexes declared on the Food model"""
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            print("🔄 Starting migration to add nutrient indexes to food table...")
+            
+            from app.models import Food
+            
+            existing = {ix['name'] for ix in inspect(db.engine).get_indexes('food')}
+            print(f"📋 Current food table indexes: {sorted(existing)}")
+            
+            created = 0
+            for index in sorted(Food.__table__.indexes, key=lambda ix: ix.name):
+                if index.name in existing:
+                    print(f"   ✅ {index.name} already exists")
+                    continue
+                
+                print(f"📝 Creating {index.name}...")
+                index.create(db.engine)
+                created += 1
+            
+            print(f"✅ Created {created} index(es)")
+            
+            # Refresh planner statistics so the new indexes are picked up
+            if db.engine.dialect.name == 'sqlite':
+                with db.engine.begin() as conn:
+                    conn.exec_driver_sql("ANALYZE food")
+            
+            return True
+            
+        except Exception as e:
+            print(f"❌ Error during migration: {e}")
+            return False
+
+if __name__ == "__main__":
+    print("🚀 Starting Food nutrient index migration...")
+    success = migrate_add_food_nutrient_indexes()
+    
+    if success:
+        print("✅ Migration completed successfully!")
+    else:
+        print("❌ Migration failed!")
+        sys.exit(1)
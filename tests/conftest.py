@@ -21,6 +21,8 @@ def app():
     # Create Flask app with testing config
     app = Flask(__name__)
     app.config.from_object(config['testing'])
+    snapshot_dir = tempfile.TemporaryDirectory()
+    app.config['NUTRIENT_SNAPSHOT_FOLDER'] = snapshot_dir.name
     
     # Initialize extensions 
     db.init_app(app)
@@ -44,6 +46,7 @@ def app():
         
         # Clean up database after test
         db.drop_all()
+    snapshot_dir.cleanup()
 
 
 @pytest.fixture
@@ -0,0 +1,106 @@
+"""
+Tests for application startup cost: no schema work on boot, CLI setup
+commands, and lazily loaded Swagger docs.
+"""
+
+import os
+import subprocess
+import sys
+
+from sqlalchemy import inspect
+
+from app import create_app, db
+from app.models import User
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Generous ceiling for importing the app and building it; catches regressions
+# such as heavy optional dependencies being imported eagerly again
+IMPORT_BUDGET_MS = int(os.environ.get('STARTUP_IMPORT_BUDGET_MS', '4000'))
+
+
+def run_python(code, **env):
+    """Run code in a fresh interpreter from the project root."""
+    return subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=120,
+        env={**os.environ, 'PYTHONPATH': PROJECT_ROOT, **env}
+    )
+
+
+def imported_modules(importtime_output):
+    """Parse `-X importtime` output into {module: (cumulative microseconds, indent)}."""
+    modules = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|', 2)
+        modules[name.strip()] = (int(cumulative), len(name) - len(name.lstrip()))
+    return modules
+
+
+class TestStartupImports:
+    """Test suite for import-time budget."""
+
+    def test_create_app_skips_swagger_and_stays_within_budget(self):
+        """Test that building the app does not import flask-restx and stays within budget."""
+        result = run_python("from app import create_app; create_app('testing')")
+        assert result.returncode == 0, result.stderr
+
+        modules = imported_modules(result.stderr)
+        assert 'flask_restx' not in modules
+        assert 'app.swagger_api' not in modules
+
+        # Top-level entries (indent of one space) add up to the total import time
+        total_us = sum(cumulative for cumulative, indent in modules.values() if indent == 1)
+        assert total_us / 1000 < IMPORT_BUDGET_MS
+
+    def test_swagger_docs_load_on_first_request(self, tmp_path):
+        """Test that lazy docs import flask-restx only when /api/docs is requested."""
+        code = (
+            "import sys\n"
+            "from app import create_app\n"
+            "app = create_app('production')\n"
+            "assert 'flask_restx' not in sys.modules\n"
+            "client = app.test_client()\n"
+            "assert client.get('/api/docs/swagger.json').status_code == 200\n"
+            "assert 'flask_restx' in sys.modules\n"
+            "assert client.get('/swaggerui/swagger-ui.css').status_code == 200\n"
+            "assert client.get('/swaggerui/swagger-ui-bundle.js').status_code == 200\n"
+            "assert client.get('/auth/login').status_code == 200\n"
+        )
+        result = run_python(code, SECRET_KEY='test', API_DOCS_MODE='lazy',
+                            DATABASE_URL=f"sqlite:///{tmp_path / 'docs.db'}")
+        assert result.returncode == 0, result.stderr[-2000:]
+
+
+class TestStartupDatabase:
+    """Test suite for schema creation and admin seeding."""
+
+    def test_create_app_does_no_schema_work(self):
+        """Test that create_app neither creates tables nor seeds the admin."""
+        app = create_app('testing')
+        with app.app_context():
+            assert inspect(db.engine).get_table_names() == []
+
+    def test_cli_init_db_and_seed_admin(self):
+        """Test the init-db and seed-admin commands."""
+        app = create_app('testing')
+        runner = app.test_cli_runner()
+
+        result = runner.invoke(args=['init-db', '--seed-admin'])
+        assert result.exit_code == 0, result.output
+        assert 'Default admin user created: admin' in result.output
+
+        result = runner.invoke(args=['seed-admin'])
+        assert "already exists" in result.output
+
+        result = runner.invoke(args=['seed-admin', '--username', 'ops', '--password', 'S3cret!pass'])
+        assert 'Default admin user created: ops' in result.output
+
+        with app.app_context():
+            assert 'user' in inspect(db.engine).get_table_names()
+            ops = User.query.filter_by(username='ops').one()
+            assert ops.is_admin and ops.check_password('S3cret!pass')
+            db.drop_all()
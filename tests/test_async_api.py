@@ -0,0 +1,196 @@
+"""
+Tests for the asynchronous read-only API tier and the shared read queries.
+"""
+
+import asyncio
+import gzip
+import json
+from datetime import date
+
+import pytest
+from flask import Flask, g
+
+from app import db, login_manager
+from app.async_api import AsyncReadApi, create_asgi_app
+from app.models import Food, FoodServing, MealLog, User
+
+
+def make_food(name, verified=True):
+    return Food(name=name, category='Meals', calories=120.0, protein=6.0, carbs=18.0, fat=3.0, fiber=2.0,
+                is_verified=verified)
+
+
+def log_meal(user, food, meal_type, grams, day=date(2024, 5, 1)):
+    log = MealLog(user_id=user.id, food_id=food.id, quantity=grams, original_quantity=grams, unit_type='grams',
+                  logged_grams=grams, meal_type=meal_type, date=day)
+    log.food = food
+    log.calculate_nutrition()
+    db.session.add(log)
+
+
+async def call(api, path, query='', cookie=None, headers=()):
+    """Run one GET request through an ASGI app: (status, headers, body)."""
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': path, 'query_string': query.encode(), 'root_path': '',
+        'http_version': '1.1', 'scheme': 'http', 'server': ('testserver', 80), 'client': ('203.0.113.7', 5000),
+        'headers': [(b'host', b'testserver')] + [(name.encode(), value.encode()) for name, value in headers]
+        + ([(b'cookie', f'session={cookie}'.encode())] if cookie else [])
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await api(scope, receive, send)
+    start = messages[0]
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return start['status'], {k.decode(): v.decode() for k, v in start['headers']}, body
+
+
+@pytest.fixture
+def file_app(tmp_path):
+    """An app on a SQLite file, which the async tier can open alongside Flask-SQLAlchemy."""
+    from config import config
+
+    app = Flask(__name__)
+    app.config.from_object(config['testing'])
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'app.db'}"
+    app.config['RATE_LIMIT_ENABLED'] = False
+    db.init_app(app)
+    login_manager.init_app(app)
+
+    from app.api import bp as api_bp
+    app.register_blueprint(api_bp, url_prefix='/api')
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def catalog(file_app):
+    """A user with a day of meal logs, and verified and unverified foods."""
+    user = User(username='eater', email='eater@example.com')
+    user.set_password('password123')
+    dal, tea, draft = make_food('Moong Dal'), make_food('Masala Tea'), make_food('Dal (draft)', verified=False)
+    db.session.add_all([user, dal, tea, draft])
+    db.session.flush()
+    db.session.add(FoodServing(food_id=dal.id, serving_name='1 bowl', unit='bowl', grams_per_unit=150.0))
+    log_meal(user, dal, 'lunch', 150.0)
+    log_meal(user, dal, 'dinner', 200.0)
+    log_meal(user, tea, 'lunch', 50.0)
+    log_meal(user, tea, 'breakfast', 100.0, day=date(2024, 5, 2))
+    db.session.commit()
+    cookie = file_app.session_interface.get_signing_serializer(file_app).dumps({'_user_id': str(user.id)})
+    return {'user': user, 'dal': dal, 'draft': draft, 'cookie': cookie}
+
+
+def flask_get(app, cookie, url):
+    g.pop('_login_user', None)  # Requests share the fixture's app context, where Flask-Login caches the user
+    client = app.test_client()
+    if cookie:
+        client.set_cookie('session', cookie)
+    return client.get(url)
+
+
+class TestNutritionSummaryRoute:
+    """Test suite for the sync /api/v2/nutrition/summary route."""
+
+    def test_totals_and_breakdown(self, file_app, catalog):
+        """Test the daily totals and per-meal breakdown."""
+        response = flask_get(file_app, catalog['cookie'], '/api/v2/nutrition/summary?date=2024-05-01')
+
+        data = response.get_json()
+        assert response.status_code == 200 and data['date'] == '2024-05-01'
+        assert data['total_calories'] == 480.0 and data['total_protein'] == 24.0
+        assert data['meal_breakdown']['lunch']['count'] == 2 and data['meal_breakdown']['lunch']['calories'] == 240.0
+        assert data['meal_breakdown']['breakfast'] == {'calories': 0, 'protein': 0, 'carbs': 0, 'fat': 0,
+                                                       'fiber': 0, 'sugar': 0, 'sodium': 0, 'count': 0}
+
+    def test_rejects_bad_dates_and_anonymous_users(self, file_app, catalog):
+        """Test the 400 and 401 responses."""
+        assert flask_get(file_app, catalog['cookie'], '/api/v2/nutrition/summary?date=May').status_code == 400
+        assert flask_get(file_app, None, '/api/v2/nutrition/summary').status_code == 401
+
+
+class TestWsgiFallback:
+    """Test suite for requests handed to the Flask app."""
+
+    def test_flask_serves_requests_without_an_async_engine(self, file_app, catalog):
+        """Test that the bridge relays status, headers and body from Flask."""
+        api = AsyncReadApi(file_app)
+        url = f"/api/v2/foods/{catalog['dal'].id}"
+
+        status, headers, body = asyncio.run(call(api, url, cookie=catalog['cookie']))
+        api.fallback.shutdown()
+
+        expected = flask_get(file_app, catalog['cookie'], url)
+        assert status == 200 and headers['content-type'] == 'application/json'
+        assert json.loads(body) == expected.get_json()
+
+
+class TestAsyncReadApi:
+    """Test suite for the endpoints served on the event loop."""
+
+    @pytest.fixture
+    def api(self, file_app):
+        pytest.importorskip('aiosqlite')
+        return create_asgi_app(file_app)
+
+    def run(self, api, *requests):
+        """Run requests on one event loop (the engine's connections belong to it)."""
+        async def main():
+            try:
+                return [await call(api, *request) for request in requests]
+            finally:
+                await api.engine.dispose()
+                api.fallback.shutdown()
+        return asyncio.run(main())
+
+    def test_responses_match_the_flask_routes(self, file_app, catalog, api):
+        """Test that every async endpoint returns the sync route's body."""
+        cookie = catalog['cookie']
+        urls = ['/api/foods/search-verified?q=dal', '/api/foods/search-verified?q=',
+                f"/api/v2/foods/{catalog['dal'].id}", f"/api/v2/foods/{catalog['draft'].id}", '/api/v2/foods/999',
+                '/api/v2/nutrition/summary?date=2024-05-01', '/api/v2/nutrition/summary?date=bad']
+
+        results = self.run(api, *[(url.split('?')[0], url.partition('?')[2], cookie) for url in urls])
+
+        for url, (status, headers, body) in zip(urls, results):
+            expected = flask_get(file_app, cookie, url)
+            assert (status, body) == (expected.status_code, expected.data), url
+        assert [row['name'] for row in json.loads(results[0][2])] == ['Moong Dal']
+        assert results[3][0] == 403
+
+    def test_authentication_and_compression(self, file_app, catalog, api):
+        """Test anonymous and forged sessions, remember-me pass-through and gzip."""
+        results = self.run(
+            api,
+            ('/api/v2/nutrition/summary', '', None),
+            ('/api/v2/nutrition/summary', '', catalog['cookie'][:-2] + 'xx'),
+            ('/api/v2/nutrition/summary', '', None, [('cookie', 'remember_token=abc')]),
+            ('/api/v2/nutrition/summary', 'date=2024-05-01', catalog['cookie'], [('accept-encoding', 'gzip')]),
+        )
+
+        assert [status for status, _, _ in results[:3]] == [401, 401, 401]
+        assert 'vary' not in results[0][1] and results[2][1].get('vary') == 'Cookie'  # Flask answered
+        file_app.config['COMPRESSION_MIN_SIZE'] = 0
+        status, headers, body = self.run(
+            create_asgi_app(file_app),
+            ('/api/v2/nutrition/summary', 'date=2024-05-01', catalog['cookie'], [('accept-encoding', 'gzip')])
+        )[0]
+        assert status == 200 and headers['content-encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(body))['total_calories'] == 480.0
+
+    def test_search_is_rate_limited_with_the_flask_limiter(self, file_app, catalog, api):
+        """Test that the async search shares the sync route's limit."""
+        file_app.config['RATE_LIMIT_ENABLED'] = True
+        results = self.run(api, *[('/api/foods/search-verified', 'q=tea')] * 121)
+
+        assert [status for status, _, _ in results].count(200) == 120
+        assert results[-1][0] == 429 and 'retry-after' in results[-1][1]
@@ -0,0 +1,106 @@
+"""
+Tests for precomputed challenge leaderboards.
+"""
+
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+from app import db
+from app.migrations import MigrationRunner
+from app.migrations.versions import MIGRATIONS
+from app.models import Challenge, ChallengeRanking, LeaderboardVersion, User, UserChallenge
+from app.services.challenge_leaderboard_service import ChallengeLeaderboardService
+
+
+@pytest.fixture
+def challenge(app, monkeypatch):
+    """A streak challenge joined by five users with progress 5, 4, 4, 2 and 1."""
+    ChallengeLeaderboardService.invalidate()
+    monkeypatch.setattr(ChallengeLeaderboardService, 'TOP_N', 3)
+
+    challenge = Challenge(name='Streak', challenge_type='streak', target_value=30, duration_days=30)
+    db.session.add(challenge)
+    db.session.commit()
+    for name, progress in (('ana', 5), ('ben', 4), ('cy', 4), ('dev', 2), ('eve', 1)):
+        user = User(username=name, email=f'{name}@example.com')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(UserChallenge(user_id=user.id, challenge_id=challenge.id, start_date=date.today(),
+                                     current_progress=progress))
+        db.session.commit()
+    yield challenge
+    ChallengeLeaderboardService.invalidate()
+
+
+def participation(username):
+    return UserChallenge.query.join(User).filter(User.username == username).one()
+
+
+def set_progress(username, progress):
+    participation(username).current_progress = progress
+    db.session.commit()
+
+
+class TestChallengeLeaderboard:
+    """Test suite for ranking maintenance and reads."""
+
+    def test_rankings_mirror_participation(self, app, challenge):
+        """Test that joins, progress changes and removals reach the ranking table."""
+        assert ChallengeRanking.query.filter_by(challenge_id=challenge.id).count() == 5
+
+        set_progress('eve', 7)
+        assert db.session.get(ChallengeRanking, participation('eve').id).score == 7
+
+        db.session.delete(participation('eve'))
+        db.session.commit()
+        assert ChallengeRanking.query.filter_by(challenge_id=challenge.id).count() == 4
+
+    def test_top_n_and_standing_share_ranks_on_ties(self, app, challenge):
+        """Test competition ranking in the top N and the per-user count."""
+        top = ChallengeLeaderboardService.get_top(challenge.id)
+
+        assert [(entry['rank'], entry['username']) for entry in top] == [(1, 'ana'), (2, 'ben'), (2, 'cy')]
+
+        dev = User.query.filter_by(username='dev').one()
+        assert ChallengeLeaderboardService.get_standing(challenge.id, dev.id) == \
+            {'rank': 4, 'score': 2, 'participants': 5}
+        assert ChallengeLeaderboardService.get_standing(challenge.id, 9999) is None
+
+    def test_cache_invalidated_only_when_top_n_changes(self, app, challenge):
+        """Test that progress below the N-th score leaves the cached top N in place."""
+        top = ChallengeLeaderboardService.get_top(challenge.id)
+        version = LeaderboardVersion.current(challenge.id)
+
+        set_progress('eve', 3)
+        assert LeaderboardVersion.current(challenge.id) == version
+        assert ChallengeLeaderboardService.get_top(challenge.id) is top
+
+        set_progress('dev', 6)
+        assert LeaderboardVersion.current(challenge.id) > version
+        assert [entry['username'] for entry in ChallengeLeaderboardService.get_top(challenge.id)] == \
+            ['dev', 'ana', 'ben']
+
+        # Dropping out of the top N invalidates as well
+        set_progress('dev', 0)
+        assert [entry['username'] for entry in ChallengeLeaderboardService.get_top(challenge.id)] == \
+            ['ana', 'ben', 'cy']
+
+    def test_migration_copies_existing_participations(self, app, challenge):
+        """Test that migration 0010 fills the ranking table once."""
+        db.session.execute(text("DELETE FROM challenge_ranking"))
+        db.session.commit()
+        runner = MigrationRunner(db.engine, migrations=[m for m in MIGRATIONS if m.version == '0010'],
+                                 chunk_size=2, log=lambda message: None)
+
+        runner.upgrade()
+        # Re-running from scratch skips rows already copied
+        db.session.execute(text("DELETE FROM schema_migration"))
+        db.session.execute(text("DELETE FROM migration_checkpoint"))
+        db.session.commit()
+        runner.upgrade()
+
+        scores = sorted(score for (score,) in db.session.query(ChallengeRanking.score))
+        assert scores == [1, 2, 4, 4, 5]
@@ -0,0 +1,157 @@
+"""
+Tests for challenge progress evaluation.
+"""
+
+from datetime import date, timedelta
+
+import pytest
+
+from app import db
+from app.models import Challenge, Food, MealLog, User, UserChallenge
+from app.services.challenge_progress_service import ChallengeProgressService
+
+
+START = date(2024, 3, 1)
+
+
+@pytest.fixture
+def food(app):
+    food = Food(name='Lentils', category='Legumes', calories=116.0, protein=9.0, carbs=20.0,
+                fat=0.4, fiber=8.0, is_verified=True)
+    db.session.add(food)
+    db.session.commit()
+    return food
+
+
+def make_user(username):
+    user = User(username=username, email=f'{username}@example.com')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def join(user, challenge_type, target_value, duration_days=30, start=START):
+    challenge = Challenge(name=f'{challenge_type} challenge', challenge_type=challenge_type,
+                          target_value=target_value, duration_days=duration_days)
+    db.session.add(challenge)
+    db.session.commit()
+    user_challenge = UserChallenge(user_id=user.id, challenge_id=challenge.id, start_date=start,
+                                   end_date=start + timedelta(days=duration_days))
+    db.session.add(user_challenge)
+    db.session.commit()
+    return user_challenge.id
+
+
+def log(user, food, day, protein=0.0, calories=0.0):
+    db.session.add(MealLog(user_id=user.id, food_id=food.id, quantity=100.0, original_quantity=100.0,
+                           unit_type='grams', logged_grams=100.0, meal_type='lunch', date=day,
+                           protein=protein, calories=calories))
+
+
+def progress_of(user_challenge_id):
+    db.session.expire_all()
+    return db.session.get(UserChallenge, user_challenge_id)
+
+
+class TestChallengeProgressBatch:
+    """Test suite for batch evaluation."""
+
+    def test_protein_counts_days_meeting_target(self, app, food):
+        """Test that only days whose summed protein reaches the target count."""
+        user = make_user('lifter')
+        uc_id = join(user, 'protein', 100)
+        log(user, food, START, protein=60)
+        log(user, food, START, protein=45)                       # 105 g: counts
+        log(user, food, START + timedelta(days=1), protein=99)   # short
+        log(user, food, START + timedelta(days=2), protein=120)  # counts
+        log(user, food, START - timedelta(days=1), protein=200)  # before the challenge
+        db.session.commit()
+
+        result = ChallengeProgressService().evaluate(today=START + timedelta(days=9))
+
+        assert result == {'evaluated': 1, 'updated': 1, 'completed': 0}
+        assert progress_of(uc_id).current_progress == 2
+
+    def test_calories_count_logged_days_under_target(self, app, food):
+        """Test that calorie days count only when logged and at or under the target."""
+        user = make_user('cutter')
+        uc_id = join(user, 'calories', 2000)
+        log(user, food, START, calories=1800)
+        log(user, food, START + timedelta(days=1), calories=2400)
+        log(user, food, START + timedelta(days=2), calories=2000)
+        db.session.commit()
+
+        ChallengeProgressService().evaluate(today=START + timedelta(days=9))
+
+        assert progress_of(uc_id).current_progress == 2
+
+    def test_streak_uses_longest_consecutive_run_and_completes(self, app, food):
+        """Test gaps-and-islands streak length and atomic completion."""
+        user = make_user('streaker')
+        uc_id = join(user, 'streak', 3)
+        for offset in (0, 1, 3, 4, 5, 7):
+            log(user, food, START + timedelta(days=offset), calories=500)
+        db.session.commit()
+        service = ChallengeProgressService()
+
+        assert service.evaluate(today=START + timedelta(days=9))['completed'] == 1
+        user_challenge = progress_of(uc_id)
+        assert user_challenge.current_progress == 3
+        assert user_challenge.is_completed is True
+        completed_at = user_challenge.completed_at
+
+        # Completed challenges are no longer evaluated or re-completed
+        assert service.evaluate(today=START + timedelta(days=9))['evaluated'] == 0
+        assert progress_of(uc_id).completed_at == completed_at
+
+    def test_user_filter_and_inactive_challenges(self, app, food):
+        """Test that evaluation is limited to the given users and active challenges."""
+        first, second = make_user('first'), make_user('second')
+        first_uc = join(first, 'streak', 10)
+        second_uc = join(second, 'streak', 10)
+        inactive_uc = join(first, 'streak', 10)
+        db.session.get(UserChallenge, inactive_uc).challenge.is_active = False
+        for user in (first, second):
+            log(user, food, START, calories=500)
+        db.session.commit()
+
+        ChallengeProgressService().evaluate(user_ids=[first.id], today=START + timedelta(days=1))
+
+        assert progress_of(first_uc).current_progress == 1
+        assert progress_of(second_uc).current_progress == 0
+        assert progress_of(inactive_uc).current_progress == 0
+
+
+class TestChallengeProgressIncremental:
+    """Test suite for evaluation on meal-log writes."""
+
+    def test_meal_log_write_updates_progress(self, app, food):
+        """Test that logging a meal updates the user's challenges in the same commit."""
+        user = make_user('daily')
+        uc_id = join(user, 'protein', 50, start=date.today())
+
+        log(user, food, date.today(), protein=30)
+        db.session.commit()
+        assert progress_of(uc_id).current_progress == 0
+
+        log(user, food, date.today(), protein=25)
+        db.session.commit()
+        assert progress_of(uc_id).current_progress == 1
+
+        meal = MealLog.query.filter_by(user_id=user.id, protein=25).one()
+        db.session.delete(meal)
+        db.session.commit()
+        assert progress_of(uc_id).current_progress == 0
+
+    def test_completion_percentage(self, app, food):
+        """Test progress percentage against the completion target."""
+        user = make_user('percent')
+        uc_id = join(user, 'protein', 50, duration_days=4, start=date.today())
+
+        log(user, food, date.today(), protein=80)
+        db.session.commit()
+
+        user_challenge = progress_of(uc_id)
+        assert user_challenge.challenge.completion_target == 4
+        assert user_challenge.progress_percentage == 25.0
@@ -0,0 +1,124 @@
+"""
+Tests for response compression and precompressed export downloads.
+"""
+
+import gzip
+import os
+
+import pytest
+from flask import jsonify
+
+from app import db
+from app.models import ExportJob, Food, User
+from app.services.food_export_service import FoodExportService
+from app.utils import compression
+from app.utils.compression import init_compression
+
+
+@pytest.fixture
+def compressed_app(app):
+    """Test app with compression, two JSON routes and an HTML page."""
+    init_compression(app)
+
+    @app.route('/test/large')
+    def large():
+        return jsonify({'foods': [{'id': i, 'name': f'Food {i}', 'protein': 10.0} for i in range(200)]})
+
+    @app.route('/test/small')
+    def small():
+        return jsonify({'ok': True})
+
+    @app.route('/test/page')
+    def page():
+        return '<input name="csrf_token" value="secret">' + '<p>Food</p>' * 200
+
+    return app
+
+
+class TestResponseCompression:
+    """Test suite for the after_request compression hook."""
+
+    def test_gzip_when_accepted(self, compressed_app, client, monkeypatch):
+        """Test that large JSON is gzipped for clients that accept it."""
+        monkeypatch.setattr(compression, 'brotli', None)
+        plain = client.get('/test/large')
+        response = client.get('/test/large', headers={'Accept-Encoding': 'gzip, deflate'})
+
+        assert plain.headers.get('Content-Encoding') is None
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert int(response.headers['Content-Length']) < len(plain.data)
+        assert gzip.decompress(response.data) == plain.data
+
+    def test_small_and_refused_responses_are_not_compressed(self, compressed_app, client):
+        """Test the size threshold and q=0 refusals."""
+        assert client.get('/test/small', headers={'Accept-Encoding': 'gzip'}) \
+            .headers.get('Content-Encoding') is None
+        assert client.get('/test/large', headers={'Accept-Encoding': 'gzip;q=0, br;q=0'}) \
+            .headers.get('Content-Encoding') is None
+
+    def test_html_is_not_compressed(self, compressed_app, client):
+        """Test that HTML pages (CSRF tokens, BREACH) are sent uncompressed."""
+        response = client.get('/test/page', headers={'Accept-Encoding': 'gzip, br'})
+
+        assert response.mimetype == 'text/html'
+        assert response.headers.get('Content-Encoding') is None
+
+    def test_negotiation_prefers_brotli_when_available(self, compressed_app):
+        """Test that br wins over gzip only when the brotli package is present."""
+        with compressed_app.test_request_context(headers={'Accept-Encoding': 'gzip, br'}):
+            expected = 'br' if compression.brotli is not None else 'gzip'
+            assert compression.negotiate_encoding() == expected
+        with compressed_app.test_request_context(headers={'Accept-Encoding': 'br;q=0.5, gzip'}):
+            assert compression.negotiate_encoding() == 'gzip'
+
+
+class TestPrecompressedExports:
+    """Test suite for gzip export artifacts."""
+
+    @pytest.fixture
+    def export_job(self, app, tmp_path):
+        admin = User(username='admin', email='admin@example.com', is_admin=True)
+        admin.set_password('admin123')
+        db.session.add_all([admin, Food(name='Dal', category='Legumes', calories=116.0, protein=9.0,
+                                        carbs=20.0, fat=0.4, fiber=8.0)])
+        db.session.commit()
+        job = ExportJob(export_type='csv', created_by=admin.id, status='pending')
+        db.session.add(job)
+        db.session.commit()
+
+        service = FoodExportService()
+        service.export_directory = str(tmp_path)
+        service._process_export_job(job.job_id, 'csv', None)
+        return admin, db.session.get(ExportJob, job.id)
+
+    def test_export_is_written_compressed(self, app, export_job):
+        """Test that the stored artifact is gzip and the download name is not."""
+        _, job = export_job
+
+        assert job.status == 'completed'
+        assert job.file_path.endswith('.csv.gz') and job.filename.endswith('.csv')
+        with gzip.open(job.file_path, 'rt', encoding='utf-8') as f:
+            assert f.readline().startswith('id,name,brand')
+        assert job.file_size == os.path.getsize(job.file_path)
+
+    def test_download_sends_stored_bytes_or_decompresses(self, app, client, export_job):
+        """Test Content-Encoding negotiation on export downloads."""
+        admin, job = export_job
+        from app.admin import bp as admin_bp
+        app.register_blueprint(admin_bp, url_prefix='/admin')
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(admin.id)
+        url = f'/admin/download-export/{job.job_id}'
+        with open(job.file_path, 'rb') as f:
+            stored = f.read()
+
+        response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.mimetype == 'text/csv'
+        assert response.data == stored
+
+        response = client.get(url)
+        assert response.headers.get('Content-Encoding') is None
+        assert response.data == gzip.decompress(stored)
+        assert job.filename in response.headers['Content-Disposition']
@@ -0,0 +1,128 @@
+"""
+Tests for schema-driven CSV validation and the upload dry run.
+"""
+
+import codecs
+import gzip
+import io
+
+import pytest
+
+from app import db
+from app.models import BulkUploadJob, Food, User
+from app.services.bulk_upload_processor import BulkUploadProcessor
+from app.services.csv_schema import Column, CsvSchema
+
+HEADER = 'name,brand,category,base_unit,calories_per_100g,protein_per_100g,carbs_per_100g,fat_per_100g\n'
+
+
+class TestCsvSchema:
+    """Test suite for CsvSchema."""
+
+    def test_converts_and_validates_in_one_pass(self):
+        """Test converted values and errors for one row."""
+        compiled = BulkUploadProcessor.SCHEMA.compile(HEADER.strip().split(','))
+
+        data, errors = compiled.convert(['  Masala \t Dosa ', '', 'Breakfast', ' ML ', '168', ' 3.9 ', 'lots', ''])
+
+        assert errors == ['Invalid numeric value for carbs_per_100g: lots']
+        assert data['name'] == 'Masala Dosa' and 'brand' not in data and data['base_unit'] == 'ML'
+        assert data['calories_per_100g'] == 168.0 and data['protein_per_100g'] == 3.9
+        assert data['carbs_per_100g'] == 0.0 and data['fat_per_100g'] == 0.0
+        assert data['fiber_per_100g'] == 0.0  # Column missing from the header
+
+    def test_check_reports_the_same_errors_as_convert(self):
+        """Test the validation-only path against full conversion."""
+        schema = CsvSchema([Column('name', required=True, max_length=5, label='Food name'),
+                            Column('unit', choices=['g', 'fl oz'], label='Unit'),
+                            Column('kcal', kind='number')])
+        compiled = schema.compile(['name', 'unit', 'kcal'])
+        rows = [['Idli', 'G', '58'], ['', 'fl  oz', '1e3'], ['Paniyaram', 'cup', 'x'], [' ', '', ' '], ['Vada']]
+
+        for row in rows:
+            assert compiled.check(row) == compiled.convert(row)[1]
+        assert compiled.check(rows[2]) == ['Food name too long (max 5 characters)', 'Unsupported unit: cup',
+                                           'Invalid numeric value for kcal: x']
+        assert compiled.check(rows[3]) == ['Food name is required']
+
+    def test_validate_counts_every_invalid_row(self):
+        """Test that all rows are counted while only max_reported are listed."""
+        lines = [f'Food {i},Home,Meals,{"bucket" if i % 10 == 0 else "g"},100,1,2,3\n' for i in range(100)]
+        result = BulkUploadProcessor().validate_csv_format(HEADER + '\n'.join(lines), max_reported=3)
+
+        assert result['row_count'] == 100 and not result['is_valid']
+        assert result['total_invalid'] == 10 and len(result['invalid_rows']) == 3
+        assert result['invalid_rows'][0]['row'] == 1
+        assert result['error'].startswith('10 invalid row(s); row 1: Unsupported base unit: bucket')
+
+    def test_missing_headers_and_empty_files(self):
+        """Test header and empty file errors."""
+        processor = BulkUploadProcessor()
+
+        missing = processor.validate_csv_format('name,brand\nIdli,Home\n')
+        empty = processor.validate_csv_format(HEADER)
+
+        assert missing['missing_headers'] == ['category', 'base_unit', 'calories_per_100g', 'protein_per_100g',
+                                              'carbs_per_100g', 'fat_per_100g']
+        assert missing['error'].startswith('Missing required headers: category')
+        assert empty['error'] == 'CSV file contains no data rows'
+
+
+class TestDryRunEndpoint:
+    """Test suite for /admin/bulk-upload-dry-run."""
+
+    @pytest.fixture
+    def admin_client(self, app, client):
+        from app.admin import bp as admin_bp
+        app.register_blueprint(admin_bp, url_prefix='/admin')
+        app.config['RATE_LIMIT_ENABLED'] = False
+        admin = User(username='admin', email='admin@example.com', is_admin=True)
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.commit()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(admin.id)
+        return client
+
+    def test_gzip_dry_run_reports_errors_without_importing(self, admin_client):
+        """Test a compressed dry run: every row checked, nothing written."""
+        rows = ''.join(f'Food {i},Home,Meals,g,{"?" if i in (7, 700) else 100},1,2,3\n' for i in range(1000))
+        payload = gzip.compress((HEADER + rows).encode('utf-8'))
+
+        response = admin_client.post('/admin/bulk-upload-dry-run', content_type='multipart/form-data',
+                                     data={'file': (io.BytesIO(payload), 'foods.csv.gz'), 'max_errors': '1'})
+        result = response.get_json()
+
+        assert response.status_code == 200 and result['dry_run']
+        assert result['row_count'] == 1000 and result['total_invalid'] == 2 and result['truncated']
+        assert result['invalid_rows'] == [{'row': 8, 'errors': ['Invalid numeric value for calories_per_100g: ?'],
+                                           'data': {'name': 'Food 7', 'brand': 'Home', 'category': 'Meals',
+                                                    'base_unit': 'g', 'calories_per_100g': '?',
+                                                    'protein_per_100g': '1', 'carbs_per_100g': '2',
+                                                    'fat_per_100g': '3'}}]
+        assert result['rows_per_second'] > 0
+        assert Food.query.count() == 0 and BulkUploadJob.query.count() == 0
+
+    def test_unreadable_file_is_rejected(self, admin_client):
+        """Test that a file that is not UTF-8 text is a client error."""
+        response = admin_client.post('/admin/bulk-upload-dry-run', content_type='multipart/form-data',
+                                     data={'file': (io.BytesIO(b'\x1f\x8b\x08broken'), 'foods.csv.gz')})
+
+        assert response.status_code == 400
+        assert 'could not be read' in response.get_json()['error']
+
+    def test_bom_prefixed_file_is_read_alike_by_dry_run_and_upload(self, admin_client, monkeypatch):
+        """Test that a UTF-8 file with a byte order mark (Excel's "CSV UTF-8") passes both checks."""
+        payload = codecs.BOM_UTF8 + (HEADER + 'Poha,Home,Breakfast,g,130,2.5,25,3\n').encode('utf-8')
+        started = {}
+        monkeypatch.setattr(BulkUploadProcessor, 'start_async_upload',
+                            lambda self, csv_content, **kwargs: started.setdefault('csv', csv_content) and 'job')
+
+        dry_run = admin_client.post('/admin/bulk-upload-dry-run', content_type='multipart/form-data',
+                                    data={'file': (io.BytesIO(payload), 'foods.csv')}).get_json()
+        upload = admin_client.post('/admin/bulk-upload-async', content_type='multipart/form-data',
+                                   data={'file': (io.BytesIO(payload), 'foods.csv')})
+
+        assert dry_run['is_valid']
+        assert upload.status_code == 200 and upload.get_json()['success']
+        assert started['csv'].startswith('name,')
@@ -0,0 +1,159 @@
+"""
+Tests for content-addressed export reuse.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import ExportArtifact, ExportJob, Food, User
+from app.services import food_export_service
+from app.services.export_artifact_store import ExportArtifactStore
+from app.services.food_export_service import FoodExportService
+
+
+class InlineThread:
+    """Runs the export worker synchronously."""
+
+    def __init__(self, target, args, daemon=None):
+        self.target, self.args = target, args
+
+    def start(self):
+        self.target(*self.args)
+
+
+@pytest.fixture
+def export_service(app, tmp_path, monkeypatch):
+    """Export service writing to tmp_path, with jobs run inline."""
+    monkeypatch.setattr(food_export_service.threading, 'Thread', InlineThread)
+    admin = User(username='admin', email='admin@example.com', is_admin=True)
+    admin.set_password('admin123')
+    db.session.add_all([
+        admin,
+        Food(name='Dal', category='Legumes', calories=116.0, protein=9.0, carbs=20.0, fat=0.4, is_verified=True),
+        Food(name='Ghee', category='Dairy', calories=900.0, protein=0.0, carbs=0.0, fat=100.0, is_verified=True)
+    ])
+    db.session.commit()
+
+    service = FoodExportService()
+    service.export_directory = str(tmp_path)
+    service.writes = 0
+    original = service._export_to_csv
+
+    def counting_export(foods, file_path):
+        service.writes += 1
+        return original(foods, file_path)
+
+    service._export_to_csv = counting_export
+    service.admin_id = admin.id
+    return service
+
+
+def get_job(job_id):
+    return ExportJob.query.filter_by(job_id=job_id).one()
+
+
+def expire(*jobs):
+    for job in jobs:
+        job.expires_at = datetime.utcnow() - timedelta(minutes=1)
+    db.session.commit()
+
+
+class TestExportReuse:
+    """Test suite for reusing identical export results."""
+
+    def test_identical_request_reuses_completed_file(self, app, export_service):
+        """Test that equal filters against an unchanged catalog share one file."""
+        first = get_job(export_service.start_export('csv', {'category': 'Dairy', 'brand': ''},
+                                                    export_service.admin_id))
+        second = get_job(export_service.start_export('csv', {'brand': None, 'category': 'Dairy'},
+                                                     export_service.admin_id))
+
+        assert export_service.writes == 1
+        assert first.job_id != second.job_id
+        assert second.status == 'completed'
+        assert second.file_path == first.file_path and second.total_records == 1
+        assert first.artifact_id == second.artifact_id
+        assert db.session.get(ExportArtifact, first.artifact_id).ref_count == 2
+
+    def test_catalog_change_or_other_filters_export_again(self, app, export_service):
+        """Test that the key covers filters, format and catalog version."""
+        first = get_job(export_service.start_export('csv', {}, export_service.admin_id))
+        export_service.start_export('csv', {'category': 'Dairy'}, export_service.admin_id)
+        assert export_service.writes == 2
+
+        food = Food.query.filter_by(name='Dal').one()
+        food.protein = 9.5
+        db.session.commit()
+        again = get_job(export_service.start_export('csv', {}, export_service.admin_id))
+
+        assert export_service.writes == 3
+        assert again.content_key != first.content_key
+        assert again.file_path != first.file_path
+
+    def test_in_flight_request_is_returned(self, app, export_service):
+        """Test that a running identical export is not started twice."""
+        key = ExportArtifactStore.content_key('csv', {'category': 'Dairy'})
+        running = ExportJob(export_type='csv', created_by=export_service.admin_id, status='processing',
+                            content_key=key)
+        db.session.add(running)
+        db.session.commit()
+
+        assert export_service.start_export('csv', {'category': 'Dairy'}, export_service.admin_id) == running.job_id
+        assert export_service.writes == 0
+
+    def test_publish_shares_artifact_finished_meanwhile(self, app, export_service, tmp_path):
+        """Test that a duplicate file is discarded when an equal artifact already exists."""
+        first = get_job(export_service.start_export('csv', {}, export_service.admin_id))
+        duplicate = tmp_path / 'duplicate.csv.gz'
+        duplicate.write_bytes(b'x')
+        job = ExportJob(export_type='csv', created_by=export_service.admin_id, status='processing',
+                        content_key=first.content_key)
+        db.session.add(job)
+
+        ExportArtifactStore.publish(job, str(duplicate), 'duplicate.csv', 2)
+        db.session.commit()
+
+        assert not duplicate.exists()
+        assert job.artifact_id == first.artifact_id
+        assert job.file_path == first.file_path
+
+
+class TestExportCleanup:
+    """Test suite for ref-counted cleanup."""
+
+    def test_file_deleted_only_when_unreferenced(self, app, export_service):
+        """Test that cleanup keeps shared files until every job has expired."""
+        first = get_job(export_service.start_export('csv', {}, export_service.admin_id))
+        second = get_job(export_service.start_export('csv', {}, export_service.admin_id))
+        artifact_id, file_path = first.artifact_id, first.file_path
+
+        expire(first)
+        export_service.cleanup_expired_exports()
+        assert os.path.exists(file_path)
+        assert db.session.get(ExportArtifact, artifact_id).ref_count == 1
+        assert get_job(first.job_id).status == 'expired'
+        assert get_job(second.job_id).file_path == file_path
+
+        expire(second)
+        export_service.cleanup_expired_exports()
+        assert not os.path.exists(file_path)
+        assert db.session.get(ExportArtifact, artifact_id) is None
+
+        # The next identical request exports afresh
+        export_service.start_export('csv', {}, export_service.admin_id)
+        assert export_service.writes == 2
+
+    def test_legacy_job_file_is_removed(self, app, export_service, tmp_path):
+        """Test that jobs without an artifact still have their own file deleted."""
+        legacy_file = tmp_path / 'food_export_legacy.csv'
+        legacy_file.write_text('id,name\n')
+        job = ExportJob(export_type='csv', created_by=export_service.admin_id, status='completed',
+                        file_path=str(legacy_file), expires_at=datetime.utcnow() - timedelta(hours=1))
+        db.session.add(job)
+        db.session.commit()
+
+        assert ExportArtifactStore.release_expired()['files'] == 1
+        assert not legacy_file.exists()
@@ -0,0 +1,139 @@
+"""
+Tests for NDJSON and gzip export formats.
+"""
+
+import csv
+import gzip
+import io
+import json
+from datetime import date, timedelta
+
+import pytest
+
+from app import db
+from app.models import ExportJob, Food, FoodServing, MealLog, User
+from app.services.food_export_service import FoodExportService
+from app.services.serving_export_service import ServingExportService
+from app.utils.compression import init_compression
+
+
+@pytest.fixture
+def catalog(app):
+    admin = User(username='admin', email='admin@example.com', is_admin=True)
+    admin.set_password('admin123')
+    db.session.add(admin)
+    for name in ('Upma', 'Appam', 'Idli', 'Dosa'):
+        food = Food(name=name, brand='Café', category='Breakfast', calories=150.0, protein=4.0, carbs=30.0, fat=2.0)
+        db.session.add(food)
+        db.session.flush()
+        for serving_name in ('2 pieces', '1 plate'):
+            db.session.add(FoodServing(food_id=food.id, serving_name=serving_name, unit='piece', grams_per_unit=60.0))
+    db.session.commit()
+    return admin
+
+
+def run_export(service, format_type, admin, tmp_path):
+    job = ExportJob(export_type=format_type, created_by=admin.id, status='pending')
+    db.session.add(job)
+    db.session.commit()
+    service.export_directory = str(tmp_path)
+    service._process_export_job(job.job_id, format_type, None)
+    return db.session.get(ExportJob, job.id)
+
+
+def read_gzip(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return f.read()
+
+
+class TestNdjsonExports:
+    """Test suite for NDJSON export jobs."""
+
+    def test_food_ndjson_matches_csv_order(self, app, catalog, tmp_path):
+        """Test one food record per line, in the same order as the CSV export."""
+        service = FoodExportService()
+        csv_job = run_export(service, 'csv', catalog, tmp_path)
+        ndjson_job = run_export(service, 'ndjson', catalog, tmp_path)
+
+        csv_ids = [int(row['id']) for row in csv.DictReader(io.StringIO(read_gzip(csv_job.file_path)))]
+        records = [json.loads(line) for line in read_gzip(ndjson_job.file_path).splitlines()]
+
+        assert ndjson_job.status == 'completed' and ndjson_job.total_records == 4
+        assert ndjson_job.filename.endswith('.ndjson')
+        assert [record['id'] for record in records] == csv_ids
+        assert records[0] == service._json_record(db.session.get(Food, records[0]['id']))
+
+    def test_serving_ndjson_gz_variant(self, app, catalog, tmp_path):
+        """Test the serving NDJSON export and its .gz download name."""
+        service = ServingExportService()
+        csv_job = run_export(service, 'servings_csv', catalog, tmp_path)
+        job = run_export(service, 'servings_ndjson.gz', catalog, tmp_path)
+
+        csv_rows = list(csv.DictReader(io.StringIO(read_gzip(csv_job.file_path))))
+        records = [json.loads(line) for line in read_gzip(job.file_path).splitlines()]
+
+        assert job.filename.endswith('.ndjson.gz') and job.file_path.endswith('.ndjson.gz')
+        assert not job.file_path.endswith('.gz.gz')
+        assert [(r['serving_id'], r['food']['name']) for r in records] == \
+            [(int(row['serving_id']), row['food_name']) for row in csv_rows]
+
+    def test_gz_download_is_not_content_encoded(self, app, client, catalog, tmp_path):
+        """Test that '.gz' formats download as gzip files."""
+        job = run_export(FoodExportService(), 'ndjson.gz', catalog, tmp_path)
+        from app.admin import bp as admin_bp
+        app.register_blueprint(admin_bp, url_prefix='/admin')
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(catalog.id)
+
+        response = client.get(f'/admin/download-export/{job.job_id}', headers={'Accept-Encoding': 'gzip'})
+
+        assert response.mimetype == 'application/gzip'
+        assert response.headers.get('Content-Encoding') is None
+        assert job.filename in response.headers['Content-Disposition']
+        assert len(gzip.decompress(response.data).splitlines()) == 4
+
+
+class TestUserDataExport:
+    """Test suite for the streamed dashboard export."""
+
+    @pytest.fixture
+    def logged_in(self, app, client, catalog):
+        from app.dashboard import bp as dashboard_bp
+        app.register_blueprint(dashboard_bp, url_prefix='/dashboard')
+        app.config['RATE_LIMIT_ENABLED'] = False
+        init_compression(app)
+        foods = Food.query.order_by(Food.id).all()
+        for offset, food in enumerate(foods):
+            db.session.add(MealLog(user_id=catalog.id, food_id=food.id, quantity=100.0, original_quantity=100.0,
+                                   unit_type='grams', logged_grams=100.0, meal_type='lunch',
+                                   date=date.today() - timedelta(days=offset), calories=150.0 + offset / 3))
+        db.session.commit()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(catalog.id)
+        return client
+
+    def test_ndjson_is_streamed_in_csv_order(self, logged_in):
+        """Test NDJSON rows, their order and the streamed response."""
+        csv_rows = list(csv.DictReader(io.StringIO(
+            logged_in.get('/dashboard/export-data?format=csv&period=7').get_data(as_text=True)
+        )))
+        response = logged_in.get('/dashboard/export-data?format=ndjson&period=7')
+
+        assert response.is_streamed and response.mimetype == 'application/x-ndjson'
+        records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert [r['food_name'] for r in records] == [row['Food Name'] for row in csv_rows] == \
+            ['Upma', 'Appam', 'Idli', 'Dosa']
+        assert records[1]['calories'] == 150.3 and csv_rows[1]['Calories'] == '150.3'
+
+    def test_gzip_variants(self, logged_in):
+        """Test the .gz file download and gzip content-encoding of the CSV stream."""
+        gz_response = logged_in.get('/dashboard/export-data?format=csv.gz&period=7')
+        gz_file = gz_response.data
+        encoded = logged_in.get('/dashboard/export-data?format=csv&period=7', headers={'Accept-Encoding': 'gzip'})
+
+        assert gz_response.mimetype == 'application/gzip'
+        assert '.csv.gz' in gz_response.headers['Content-Disposition']
+        assert gz_response.headers.get('Content-Encoding') is None
+        assert encoded.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(gz_file) == gzip.decompress(encoded.data)
+        assert gzip.decompress(gz_file).decode('utf-8').startswith('Date,Meal Type,Food Name')
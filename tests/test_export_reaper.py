@@ -0,0 +1,109 @@
+"""
+Tests for the export reaper (batched cleanup, disk quota, orphan files).
+"""
+
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import ExportArtifact, ExportJob, User
+from app.services.export_reaper import ExportReaper
+
+
+@pytest.fixture
+def admin(app):
+    user = User(username='admin', email='admin@example.com', is_admin=True)
+    user.set_password('admin123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def write_file(directory, name, size=1000, age=0):
+    path = directory / name
+    path.write_bytes(b'x' * size)
+    if age:
+        stamp = time.time() - age
+        os.utime(path, (stamp, stamp))
+    return str(path)
+
+
+def add_artifact(directory, admin, key, last_used_at, jobs=1):
+    """Artifact with its file and `jobs` completed jobs sharing it."""
+    path = write_file(directory, f'{key}.csv.gz')
+    artifact = ExportArtifact(content_key=key * 64, export_type='csv', filename=f'{key}.csv', file_path=path,
+                              file_size=1000, ref_count=jobs, last_used_at=last_used_at)
+    db.session.add(artifact)
+    db.session.flush()
+    for _ in range(jobs):
+        db.session.add(ExportJob(export_type='csv', created_by=admin.id, status='completed',
+                                 artifact_id=artifact.id, file_path=path))
+    db.session.commit()
+    return artifact
+
+
+class TestExportReaper:
+    """Test suite for ExportReaper."""
+
+    def test_expires_in_batches_and_reports_bytes(self, app, admin, tmp_path):
+        """Test that a backlog larger than one batch is fully reclaimed."""
+        for i in range(5):
+            db.session.add(ExportJob(export_type='csv', created_by=admin.id, status='completed',
+                                     file_path=write_file(tmp_path, f'legacy_{i}.csv'),
+                                     expires_at=datetime.utcnow() - timedelta(hours=1)))
+        db.session.commit()
+
+        metrics = ExportReaper(export_directory=str(tmp_path), quota_bytes=0, batch_size=2).run()
+
+        assert metrics['jobs_expired'] == 5
+        assert metrics['files_deleted'] == 5 and metrics['bytes_reclaimed'] == 5000
+        assert metrics['disk_usage'] == 0
+        assert ExportJob.query.filter_by(status='expired').count() == 5
+        assert ExportReaper.totals()['runs'] >= 1
+
+    def test_quota_evicts_least_recently_used_first(self, app, admin, tmp_path):
+        """Test that the oldest artifacts go first and their jobs are expired."""
+        now = datetime.utcnow()
+        oldest = add_artifact(tmp_path, admin, 'a', now - timedelta(hours=3), jobs=2)
+        older = add_artifact(tmp_path, admin, 'b', now - timedelta(hours=2))
+        newest = add_artifact(tmp_path, admin, 'c', now - timedelta(hours=1))
+        oldest_id, oldest_path = oldest.id, oldest.file_path
+
+        metrics = ExportReaper(export_directory=str(tmp_path), quota_bytes=2500, batch_size=1).run()
+
+        assert metrics['evicted'] == 1 and metrics['disk_usage'] == 2000
+        assert not os.path.exists(oldest_path)
+        assert db.session.get(ExportArtifact, oldest_id) is None
+        assert ExportJob.query.filter_by(status='expired').count() == 2
+        assert os.path.exists(older.file_path) and os.path.exists(newest.file_path)
+
+    def test_orphans_removed_after_grace_period(self, app, admin, tmp_path):
+        """Test that only old, untracked, not in-flight files are deleted."""
+        running = ExportJob(export_type='csv', created_by=admin.id, status='processing')
+        db.session.add(running)
+        db.session.commit()
+        kept = add_artifact(tmp_path, admin, 'k', datetime.utcnow())
+        os.utime(kept.file_path, (time.time() - 7200, time.time() - 7200))
+        orphan = write_file(tmp_path, 'food_export_crashed.csv.gz', size=300, age=7200)
+        young = write_file(tmp_path, 'food_export_new.csv.gz', age=60)
+        in_flight = write_file(tmp_path, f'{running.job_id}_food_export.csv.gz', age=7200)
+
+        metrics = ExportReaper(export_directory=str(tmp_path), quota_bytes=0, orphan_grace=3600).run()
+
+        assert metrics['orphans'] == 1 and metrics['bytes_reclaimed'] == 300
+        assert not os.path.exists(orphan)
+        assert all(os.path.exists(path) for path in (kept.file_path, young, in_flight))
+
+    def test_cli_and_scheduler_switch(self, app, tmp_path):
+        """Test the reap-exports command and that interval 0 disables the thread."""
+        from app.cli import register_commands
+        register_commands(app)
+        app.instance_path = str(tmp_path)
+        result = app.test_cli_runner().invoke(args=['reap-exports', '--quota-mb', '0'])
+
+        assert result.exit_code == 0, result.output
+        assert 'deleted 0 file(s)' in result.output
+        assert ExportReaper.start_scheduler(app) is None
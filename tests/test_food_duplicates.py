@@ -0,0 +1,185 @@
+"""
+Tests for near-duplicate food detection and merging.
+"""
+
+import os
+from datetime import date
+
+import pytest
+
+from app import db
+from app.models import CatalogVersion, Food, FoodServing, MealLog, NutritionPropagationJob, User
+from app.services.food_duplicate_detector import FoodDuplicateDetector
+from app.services.food_merge_service import FoodMergeService
+
+
+def make_food(name, brand=None, calories=100.0, **kwargs):
+    return Food(name=name, brand=brand, category='Meals', calories=calories, protein=5.0, carbs=15.0, fat=2.0,
+                **kwargs)
+
+
+@pytest.fixture
+def detector(app):
+    FoodDuplicateDetector.invalidate()
+    yield FoodDuplicateDetector
+    FoodDuplicateDetector.invalidate()
+
+
+@pytest.fixture
+def user(app):
+    user = User(username='eater', email='eater@example.com')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def log_meal(user, food, serving=None, day=1):
+    log = MealLog(user_id=user.id, food_id=food.id, serving_id=serving.id if serving else None, quantity=100.0,
+                  original_quantity=1.0 if serving else 100.0, unit_type='serving' if serving else 'grams',
+                  logged_grams=100.0, meal_type='lunch', date=date(2024, 5, day))
+    log.food = food
+    log.calculate_nutrition()
+    db.session.add(log)
+    return log
+
+
+class TestFoodDuplicateDetector:
+    """Test suite for MinHash/LSH duplicate clustering."""
+
+    def test_normalization_ignores_case_punctuation_and_word_order(self):
+        """Test the normalized name key."""
+        keys = {FoodDuplicateDetector.normalize(name)
+                for name in ('Moong Dal (cooked)', 'Moong dal cooked', 'cooked,  MOONG-dal')}
+        assert keys == {'cooked dal moong'}
+
+    def test_clusters_variants_within_a_brand(self):
+        """Test which foods are grouped, and at what threshold."""
+        index = FoodDuplicateDetector.build_index([
+            (1, 'Moong Dal (cooked)', None), (2, 'Moong dal cooked', None), (3, 'Cooked moong dal', ''),
+            (4, 'Chapati', None), (5, 'Chapathi', None),
+            (6, 'Paneer Tikka', 'Haldiram'), (7, 'Paneer tikka', 'Bikano'),
+            (8, 'Rice', None), (9, '()', None)
+        ])
+
+        assert index.food_count == 9
+        assert index.clusters(0.7) == [((1, 2, 3), 1.0)]
+        assert index.clusters(0.4) == [((1, 2, 3), 1.0), ((4, 5), 0.5)]
+
+    def test_lsh_finds_the_same_pairs_as_all_pairs(self):
+        """Test LSH recall against a brute-force comparison on a synthetic catalog."""
+        dishes = ['Masala Dosa', 'Rava Idli', 'Aloo Paratha', 'Chicken Biryani', 'Palak Paneer', 'Chana Masala',
+                  'Vegetable Pulao', 'Dal Makhani', 'Gulab Jamun', 'Poha', 'Upma', 'Rajma Chawal']
+        variants = ['{}', '{} (homemade)', '{}, restaurant style', 'Spicy {}', '{} with ghee']
+        foods = [(len(dishes) * v + d + 1, variant.format(dish), None)
+                 for v, variant in enumerate(variants) for d, dish in enumerate(dishes)]
+
+        index = FoodDuplicateDetector.build_index(foods)
+
+        shingles = {food_id: FoodDuplicateDetector.shingles(FoodDuplicateDetector.normalize(name))
+                    for food_id, name, _ in foods}
+        expected = {(a, b) for a in shingles for b in shingles
+                    if a < b and FoodDuplicateDetector.jaccard(shingles[a], shingles[b]) >= 0.6}
+        found = {(a, b) for similarity, a, b in index.pairs if similarity >= 0.6}
+        assert expected and found == expected
+
+    def test_index_is_cached_per_catalog_version(self, detector):
+        """Test that the index is rebuilt only after the catalog changes."""
+        db.session.add_all([make_food('Masala Dosa'), make_food('masala-dosa')])
+        db.session.commit()
+
+        index = detector.get_index()
+        assert detector.get_index() is index and len(detector.find_clusters()) == 1
+
+        db.session.add(make_food('Dosa, Masala'))
+        db.session.commit()
+        assert [len(c.food_ids) for c in detector.find_clusters()] == [3]
+
+
+class TestFoodMergeService:
+    """Test suite for merging duplicate foods."""
+
+    def test_merge_repoints_logs_and_servings(self, app, user):
+        """Test that references move to the kept food and duplicates are deleted."""
+        keep, dup, other_dup = make_food('Moong Dal'), make_food('Moong dal (cooked)', calories=120.0), \
+            make_food('moong dal')
+        db.session.add_all([keep, dup, other_dup])
+        db.session.flush()
+        bowl = FoodServing(food_id=keep.id, serving_name='1 bowl', unit='bowl', grams_per_unit=150.0)
+        dup_bowl = FoodServing(food_id=dup.id, serving_name='1 bowl', unit='bowl', grams_per_unit=160.0)
+        cup = FoodServing(food_id=dup.id, serving_name='1 cup', unit='cup', grams_per_unit=200.0)
+        db.session.add_all([bowl, dup_bowl, cup])
+        db.session.flush()
+        dup.default_serving_id = cup.id
+        log_meal(user, keep, bowl)
+        log_meal(user, dup, dup_bowl, day=3)
+        log_meal(user, dup, cup, day=4)
+        log_meal(user, other_dup, day=2)
+        db.session.commit()
+        version = CatalogVersion.current()
+        keep_id, dup_ids = keep.id, [dup.id, other_dup.id]
+        bowl_id, cup_id = bowl.id, cup.id
+
+        result = FoodMergeService().merge(keep_id, dup_ids + [keep_id], start_worker=False)
+
+        assert result['merged_ids'] == dup_ids and result['meal_logs'] == 3
+        assert result['servings_moved'] == 1 and result['servings_folded'] == 1
+        assert Food.query.count() == 1 and CatalogVersion.current() > version
+        assert {log.food_id for log in MealLog.query} == {keep_id}
+        assert sorted(log.serving_id or 0 for log in MealLog.query) == [0, bowl_id, bowl_id, cup_id]
+        assert sorted(s.id for s in FoodServing.query.filter_by(food_id=keep_id)) == [bowl_id, cup_id]
+        assert db.session.get(Food, keep_id).default_serving_id == cup_id
+
+        # Only the duplicate with different nutrition needs its logs recomputed
+        job = NutritionPropagationJob.query.one()
+        assert job.job_id == result['propagation_job_id']
+        assert job.food_id == keep_id and job.reason == 'food_merge' and job.from_date == date(2024, 5, 3)
+
+    def test_invalid_merges_are_rejected(self, app):
+        """Test missing foods and empty selections."""
+        food = make_food('Idli')
+        db.session.add(food)
+        db.session.commit()
+
+        with pytest.raises(ValueError, match='at least one'):
+            FoodMergeService().merge(food.id, [food.id])
+        with pytest.raises(ValueError, match='Food not found: 999'):
+            FoodMergeService().merge(food.id, [999])
+        assert Food.query.count() == 1
+
+
+class TestDuplicateReviewRoutes:
+    """Test suite for the admin review page and merge action."""
+
+    @pytest.fixture
+    def admin_client(self, app, client, detector):
+        from app.admin import bp as admin_bp
+        app.register_blueprint(admin_bp, url_prefix='/admin')
+        app.template_folder = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'app', 'templates')
+        admin = User(username='admin', email='admin@example.com', is_admin=True)
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.commit()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(admin.id)
+        return client
+
+    def test_review_and_merge(self, admin_client):
+        """Test that the page lists a cluster, suggests the verified food and merges it."""
+        unverified, verified = make_food('Aloo Paratha (homemade)'), make_food('aloo paratha homemade',
+                                                                               is_verified=True)
+        db.session.add_all([unverified, verified, make_food('Rajma')])
+        db.session.commit()
+        keep_id, dup_id = verified.id, unverified.id
+
+        page = admin_client.get('/admin/foods/duplicates')
+        html = page.get_data(as_text=True)
+        assert page.status_code == 200 and '100% similar' in html and 'Rajma' not in html
+        assert f'name="keep_id" value="{keep_id}" checked' in html
+        assert f'name="duplicate_ids" value="{dup_id}" checked' in html
+
+        response = admin_client.post('/admin/foods/merge', data={'keep_id': keep_id, 'duplicate_ids': [dup_id]})
+
+        assert response.status_code == 302
+        assert Food.query.filter_by(id=dup_id).count() == 0 and Food.query.count() == 2
+        assert 'No likely duplicates' in admin_client.get('/admin/foods/duplicates').get_data(as_text=True)
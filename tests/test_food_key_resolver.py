@@ -0,0 +1,106 @@
+"""
+Tests for resolving serving upload food keys.
+"""
+
+import csv
+import io
+
+import pytest
+
+from app import db
+from app.models import Food, FoodServing, ServingUploadJob, User
+from app.services.food_key_resolver import FoodKeyError, FoodKeyResolver
+
+
+@pytest.fixture
+def foods(app):
+    """Foods with a shared name, a branded variant and a numeric-looking name."""
+    FoodKeyResolver.invalidate()
+    items = {
+        'butter': Food(name='Butter', brand='Amul', category='Dairy', calories=717.0, protein=0.9, carbs=0.1,
+                       fat=81.0),
+        'butter_plain': Food(name='Butter', category='Dairy', calories=717.0, protein=0.9, carbs=0.1, fat=81.0),
+        'peanut_butter': Food(name='Peanut Butter', brand='Sundrop', category='Spreads', calories=588.0,
+                              protein=25.0, carbs=20.0, fat=50.0),
+        'dosa': Food(name='Masala  Dosa', category='Breakfast', calories=168.0, protein=3.9, carbs=29.0, fat=3.7)
+    }
+    db.session.add_all(items.values())
+    db.session.commit()
+    yield items
+    FoodKeyResolver.invalidate()
+
+
+class TestFoodKeyResolver:
+    """Test suite for FoodKeyResolver."""
+
+    def test_resolves_ids_names_and_brands(self, foods):
+        """Test each supported key form, normalized."""
+        resolver = FoodKeyResolver.current()
+
+        assert resolver.resolve_id(str(foods['butter'].id)) == foods['butter'].id
+        assert resolver.resolve_id(' masala dosa ') == foods['dosa'].id
+        assert resolver.resolve_id('BUTTER (amul)') == foods['butter'].id
+        assert resolver.resolve_id('Amul Butter') == foods['butter'].id
+        assert resolver.resolve_id('sundrop peanut butter') == foods['peanut_butter'].id
+
+    def test_ambiguous_and_unknown_keys_are_reported(self, foods):
+        """Test that a shared name is never resolved to an arbitrary food."""
+        resolver = FoodKeyResolver.current()
+
+        ambiguous = resolver.resolve('Butter')
+        assert ambiguous.status == 'ambiguous' and ambiguous.food_id is None
+        assert set(ambiguous.candidates) == {foods['butter'].id, foods['butter_plain'].id}
+        with pytest.raises(FoodKeyError, match="Ambiguous food key 'Butter' matches 2 foods"):
+            resolver.resolve_id('Butter')
+
+        # Substrings no longer match (the old ILIKE '%dosa%' lookup did)
+        assert resolver.resolve('Dosa').status == 'not_found'
+        assert resolver.resolve('99999').status == 'not_found'
+        assert resolver.resolve('²').status == 'not_found'  # A digit, but not a decimal number
+        assert resolver.summarize(resolver.resolve_all(['Butter', 'Dosa', 'Amul Butter', 'Butter'])) == \
+            {'ambiguous': ['Butter'], 'not_found': ['Dosa']}
+
+    def test_index_is_cached_per_catalog_version(self, foods):
+        """Test that the index is reused until the catalog changes."""
+        first = FoodKeyResolver.current()
+        assert FoodKeyResolver.current() is first
+
+        db.session.add(Food(name='Idli', category='Breakfast', calories=58.0, protein=2.0, carbs=12.0, fat=0.2))
+        db.session.commit()
+
+        second = FoodKeyResolver.current()
+        assert second is not first and second.resolve('idli').status == 'resolved'
+
+
+class TestServingUploadFoodKeys:
+    """Test suite for food keys in the serving upload route."""
+
+    def test_upload_reports_unresolved_keys(self, app, client, foods):
+        """Test that ambiguous and unknown keys fail their rows and are listed."""
+        from app.admin import bp as admin_bp
+        app.register_blueprint(admin_bp, url_prefix='/admin')
+        app.config['RATE_LIMIT_ENABLED'] = False
+        admin = User(username='admin', email='admin@example.com', is_admin=True)
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.commit()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(admin.id)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['food_key', 'serving_name', 'unit', 'grams_per_unit', 'is_default'])
+        writer.writerows([['Butter (Amul)', '1 tbsp', 'tbsp', '14', 'true'],
+                          ['Butter', '1 pat', 'piece', '5', 'false'],
+                          ['masala dosa', '1 dosa', 'piece', '120', 'false'],
+                          ['Pesarattu', '1 piece', 'piece', '90', 'false']])
+
+        result = client.post('/admin/food-servings/upload-async', content_type='multipart/form-data',
+                             data={'file': (io.BytesIO(buffer.getvalue().encode()), 'servings.csv')}).get_json()
+
+        assert result['success']
+        assert result['unresolved_keys'] == {'ambiguous': ['Butter'], 'not_found': ['Pesarattu']}
+        job = ServingUploadJob.query.filter_by(job_id=result['job_id']).one()
+        assert job.successful_rows == 2 and job.failed_rows == 2
+        assert {s.food_id for s in FoodServing.query.all()} == {foods['butter'].id, foods['dosa'].id}
+        assert db.session.get(Food, foods['butter'].id).default_serving_id is not None
@@ -0,0 +1,159 @@
+"""
+Tests for the nutrient range-query service and /api/v2/foods/query endpoint.
+"""
+
+import pytest
+from flask import g
+
+from app import db
+from app.models import Food, User
+from app.services.food_query_service import FoodQueryService
+
+
+def add_foods(rows):
+    """Insert foods given as (name, calories, protein, fiber, is_verified) tuples."""
+    for name, calories, protein, fiber, verified in rows:
+        db.session.add(Food(
+            name=name, category='Test', calories=calories, protein=protein,
+            carbs=10.0, fat=1.0, fiber=fiber, is_verified=verified
+        ))
+    db.session.commit()
+
+
+@pytest.fixture
+def catalog(app):
+    """Small catalog with distinct nutrient densities."""
+    add_foods([
+        ('Chicken Breast', 165.0, 31.0, 0.0, True),    # 18.79 g protein / 100 kcal
+        ('Egg White', 52.0, 11.0, 0.0, True),          # 21.15
+        ('Lentils', 116.0, 9.0, 8.0, True),            # 7.76
+        ('Rice', 130.0, 3.0, 0.4, True),               # 2.31
+        ('Water', 0.0, 0.0, 0.0, True),                # no density
+        ('Unverified Whey', 120.0, 24.0, 0.0, False)   # 20.0
+    ])
+
+
+class TestFoodQueryServiceParsing:
+    """Test suite for request argument parsing."""
+
+    def test_parse_range_filters(self):
+        """Test that min_/max_ arguments become float filters."""
+        filters = FoodQueryService.parse_range_filters(
+            {'min_protein': '20', 'max_calories': '150', 'min_fat': '', 'unknown': '5'}
+        )
+
+        assert filters == {'min_protein': 20.0, 'max_calories': 150.0}
+
+    def test_invalid_number_raises_error(self):
+        """Test that a non-numeric filter raises ValueError."""
+        with pytest.raises(ValueError, match="min_protein must be a valid number"):
+            FoodQueryService.parse_range_filters({'min_protein': 'abc'})
+
+    def test_inverted_range_raises_error(self):
+        """Test that min greater than max raises ValueError."""
+        with pytest.raises(ValueError, match="min_calories cannot be greater than max_calories"):
+            FoodQueryService.parse_range_filters({'min_calories': '200', 'max_calories': '100'})
+
+    def test_parse_sort_defaults(self):
+        """Test default sort orders and whitelist enforcement."""
+        assert FoodQueryService.parse_sort(None, None) == ('name', 'asc')
+        assert FoodQueryService.parse_sort('protein_per_100kcal', None) == ('protein_per_100kcal', 'desc')
+
+        with pytest.raises(ValueError):
+            FoodQueryService.parse_sort('password_hash', None)
+
+
+class TestFoodQueryServiceQueries:
+    """Test suite for query building against the database."""
+
+    def test_range_filters(self, app, catalog):
+        """Test combined nutrient range filters on verified foods."""
+        query = FoodQueryService.build_query(filters={'min_protein': 10, 'max_calories': 150})
+
+        assert [food.name for food in query.all()] == ['Egg White']
+
+    def test_sort_by_protein_density(self, app, catalog):
+        """Test density ranking excludes zero-calorie foods and unverified foods."""
+        query = FoodQueryService.build_query(sort='protein_per_100kcal', order='desc')
+
+        assert [food.name for food in query.all()] == ['Egg White', 'Chicken Breast', 'Lentils', 'Rice']
+
+    def test_ratio_filter(self, app, catalog):
+        """Test filtering on a computed ratio."""
+        query = FoodQueryService.build_query(filters={'min_fiber_per_100kcal': 5})
+
+        assert [food.name for food in query.all()] == ['Lentils']
+
+    def test_every_filterable_column_is_indexed(self, app):
+        """Test that each nutrient range filter has an (is_verified, nutrient) index."""
+        indexed = {tuple(str(expr) for expr in index.expressions) for index in Food.__table__.indexes}
+
+        for column in FoodQueryService.NUTRIENT_COLUMNS.values():
+            assert ('food.is_verified', str(column.expression)) in indexed
+        for expression in FoodQueryService.RATIO_EXPRESSIONS.values():
+            assert ('food.is_verified', str(expression.expression)) in indexed
+
+    def test_count(self, app, catalog):
+        """Test count of matching foods."""
+        query = FoodQueryService.build_query(filters={'min_protein': 5}, sort='protein')
+
+        assert FoodQueryService.count(query) == 3
+
+
+class TestFoodQueryEndpoint:
+    """Test suite for /api/v2/foods/query."""
+
+    def login(self, client, username):
+        user = User(username=username, email=f'{username}@example.com', is_admin=(username == 'admin'))
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.commit()
+        # Requests share the fixture's app context, and so the user Flask-Login caches on g
+        g.pop('_login_user', None)
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user.id)
+
+    def test_query_with_pagination(self, app, client, catalog):
+        """Test paginated results with opt-in total."""
+        self.login(client, 'testuser')
+
+        response = client.get('/api/v2/foods/query?min_protein=5&sort=protein_per_100kcal'
+                              '&per_page=2&include_total=true')
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert [food['name'] for food in data['foods']] == ['Egg White', 'Chicken Breast']
+        assert data['foods'][0]['protein_per_100kcal'] == 21.15
+        assert data['pagination']['has_next'] is True
+        assert data['pagination']['total'] == 3
+        assert data['pagination']['pages'] == 2
+
+    def test_total_is_opt_in(self, app, client, catalog):
+        """Test that the total count is skipped by default."""
+        self.login(client, 'testuser')
+
+        data = client.get('/api/v2/foods/query?min_protein=5&page=2&per_page=2').get_json()
+
+        assert len(data['foods']) == 1
+        assert data['pagination']['has_next'] is False
+        assert data['pagination']['has_prev'] is True
+        assert 'total' not in data['pagination']
+
+    def test_invalid_filter_returns_400(self, app, client, catalog):
+        """Test that invalid filters are rejected."""
+        self.login(client, 'testuser')
+
+        response = client.get('/api/v2/foods/query?min_protein=lots')
+
+        assert response.status_code == 400
+        assert 'min_protein' in response.get_json()['error']
+
+    def test_unverified_requires_admin(self, app, client, catalog):
+        """Test that only admins can include unverified foods."""
+        self.login(client, 'testuser')
+        data = client.get('/api/v2/foods/query?verified=false&min_protein=20').get_json()
+        assert {food['name'] for food in data['foods']} == {'Chicken Breast'}
+
+        self.login(client, 'admin')
+        data = client.get('/api/v2/foods/query?verified=false&min_protein=20').get_json()
+        assert {food['name'] for food in data['foods']} == {'Chicken Breast', 'Unverified Whey'}
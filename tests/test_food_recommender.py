@@ -0,0 +1,121 @@
+"""
+Tests for the remaining-macros food recommender and catalog versioning.
+"""
+
+import numpy as np
+import pytest
+
+from app import db
+from app.models import CatalogVersion, Food, FoodServing, User
+from app.services.food_recommender import FoodRecommender
+
+
+@pytest.fixture
+def catalog(app):
+    """Verified foods with servings, plus an unverified food."""
+    FoodRecommender.invalidate()
+    chicken = Food(name='Chicken Breast', category='Meat', calories=165.0, protein=31.0,
+                   carbs=0.0, fat=3.6, fiber=0.0, is_verified=True)
+    rice = Food(name='Rice', category='Grains', calories=130.0, protein=2.7,
+                carbs=28.0, fat=0.3, fiber=0.4, is_verified=True)
+    butter = Food(name='Butter', category='Dairy', calories=717.0, protein=0.9,
+                  carbs=0.1, fat=81.0, fiber=0.0, is_verified=True)
+    whey = Food(name='Unverified Whey', category='Supplements', calories=400.0, protein=80.0,
+                carbs=8.0, fat=6.0, fiber=0.0, is_verified=False)
+    db.session.add_all([chicken, rice, butter, whey])
+    db.session.flush()
+    db.session.add_all([
+        FoodServing(food_id=chicken.id, serving_name='1 breast', unit='piece', grams_per_unit=150.0),
+        FoodServing(food_id=rice.id, serving_name='1 cup', unit='cup', grams_per_unit=195.0),
+        FoodServing(food_id=butter.id, serving_name='1 tbsp', unit='tbsp', grams_per_unit=14.0)
+    ])
+    db.session.commit()
+    yield
+    FoodRecommender.invalidate()
+
+
+class TestCatalogVersion:
+    """Test suite for catalog version bumps."""
+
+    def test_food_changes_bump_version(self, app):
+        """Test that inserting and updating foods bumps the version."""
+        assert CatalogVersion.current() == 0
+
+        food = Food(name='Oats', category='Grains', calories=389.0, protein=17.0, carbs=66.0, fat=7.0)
+        db.session.add(food)
+        db.session.commit()
+        after_insert = CatalogVersion.current()
+        assert after_insert > 0
+
+        food.protein = 16.9
+        db.session.commit()
+        assert CatalogVersion.current() > after_insert
+
+    def test_unrelated_changes_do_not_bump_version(self, app):
+        """Test that non-catalog writes leave the version alone."""
+        user = User(username='someone', email='someone@example.com')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.commit()
+
+        assert CatalogVersion.current() == 0
+
+
+class TestFoodRecommender:
+    """Test suite for vectorized scoring and top-K selection."""
+
+    def test_score_prefers_matching_portion(self):
+        """Test that the portion closest to the gap scores highest."""
+        nutrients = np.array([
+            [250.0, 46.0, 0.0, 5.0, 0.0],    # lean protein
+            [250.0, 5.0, 55.0, 0.5, 1.0],    # starch
+            [700.0, 1.0, 0.0, 80.0, 0.0]     # fat bomb
+        ]).T
+        remaining = np.array([300.0, 50.0, 10.0, 5.0, 0.0])
+
+        scores = FoodRecommender.score(nutrients, remaining)
+
+        assert scores.argmax() == 0
+        assert scores[2] < 0  # overshooting calories and fat makes the day worse
+
+    def test_recommend_high_protein_gap(self, app, catalog):
+        """Test recommendations for a protein-heavy gap."""
+        results = FoodRecommender.recommend({'calories': 300, 'protein': 50, 'fat': 5}, k=2)
+
+        assert results[0]['name'] == 'Chicken Breast'
+        assert results[0]['serving_name'] == '1 breast'
+        assert results[0]['nutrition']['protein'] == 46.5
+        assert all(r['name'] != 'Unverified Whey' for r in results)
+
+    def test_matrix_refreshes_on_catalog_change(self, app, catalog):
+        """Test that the matrix is rebuilt when the catalog version changes."""
+        first = FoodRecommender.get_matrix()
+        assert FoodRecommender.get_matrix() is first
+
+        db.session.add(Food(name='Tofu', category='Pulses', calories=76.0, protein=8.0,
+                            carbs=1.9, fat=4.8, fiber=0.3, is_verified=True))
+        db.session.commit()
+
+        refreshed = FoodRecommender.get_matrix()
+        assert refreshed is not first
+        assert len(refreshed) == len(first) + 1
+        assert refreshed.serving_ids[-1] == -1
+        assert refreshed.grams[-1] == 100.0
+
+    def test_endpoint(self, app, client, catalog):
+        """Test the recommendations endpoint with explicit remaining values."""
+        user = User(username='testuser', email='test@example.com')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.commit()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user.id)
+
+        response = client.get('/api/v2/recommendations/remaining?calories=300&protein=50&fat=5&k=1')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['source'] == 'request'
+        assert [r['name'] for r in data['recommendations']] == ['Chicken Breast']
+
+        response = client.get('/api/v2/recommendations/remaining')
+        assert response.status_code == 400  # no active goal and no explicit values
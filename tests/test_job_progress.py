@@ -0,0 +1,174 @@
+"""
+Tests for job progress streaming over Server-Sent Events.
+"""
+
+import json
+
+import pytest
+
+from app import db
+from app.models import BulkUploadJob, ExportJob, User
+from app.services.job_progress import JobProgressChannel, JobProgressStream, progress_channel
+
+
+def parse(message):
+    """(event, data) of an SSE message."""
+    fields = dict(line.split(': ', 1) for line in message.strip().split('\n'))
+    return fields.get('event'), json.loads(fields['data']) if 'data' in fields else None
+
+
+@pytest.fixture
+def user(app):
+    user = User(username='uploader', email='uploader@example.com', is_admin=True)
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+class TestJobProgressChannel:
+    """Test suite for the in-process channel."""
+
+    def test_changes_return_latest_state_per_job(self):
+        """Test that only the newest state of each job after a sequence number is returned."""
+        channel = JobProgressChannel()
+        start = channel.seq
+        channel.publish('upload', 'a', 1, {'processed_rows': 1})
+        channel.publish('upload', 'b', 1, {'processed_rows': 5})
+        middle = channel.publish('upload', 'a', 1, {'processed_rows': 2})
+
+        assert channel.publish('upload', 'a', 1, {'processed_rows': 2}) == middle  # Unchanged state
+        assert [(e.job_id, e.state) for e in channel.changes(start, 0)] == \
+            [('b', {'processed_rows': 5}), ('a', {'processed_rows': 2})]
+        assert channel.changes(middle, 0.01) == []
+
+    def test_commit_publishes_and_rollback_does_not(self, app, user):
+        """Test the session hooks that publish job rows."""
+        start = progress_channel.seq
+        job = BulkUploadJob(job_id='job-commit', filename='foods.csv', created_by=user.id)
+        db.session.add(job)
+        db.session.commit()
+
+        job.processed_rows = 10
+        db.session.flush()
+        db.session.rollback()
+
+        events = [e for e in progress_channel.changes(start, 0) if e.job_id == 'job-commit']
+        assert len(events) == 1
+        assert events[0].user_id == user.id and events[0].state['status'] == 'pending'
+        assert events[0].state['processed_rows'] == 0
+
+
+class TestJobProgressStream:
+    """Test suite for the SSE message stream."""
+
+    def test_single_job_snapshot_then_deltas(self, app, user):
+        """Test that a stream sends the full state, then only changed fields, then done."""
+        job = BulkUploadJob(job_id='job-1', filename='foods.csv', created_by=user.id, total_rows=4)
+        db.session.add(job)
+        db.session.commit()
+
+        events = JobProgressStream(user.id, 'upload', 'job-1', db_refresh_seconds=0.01, max_seconds=5).events()
+        assert next(events).startswith('retry: ')
+        event, data = parse(next(events))
+        assert event == 'progress' and data['status'] == 'pending' and data['progress_percentage'] == 0
+
+        job.status, job.processed_rows = 'processing', 2
+        db.session.commit()
+        event, data = parse(next(events))
+        assert data == {'type': 'upload', 'job_id': 'job-1', 'status': 'processing', 'processed_rows': 2,
+                        'progress_percentage': 50.0}
+
+        job.status, job.processed_rows, job.successful_rows = 'completed', 4, 4
+        db.session.commit()
+        event, data = parse(next(events))
+        assert data['status'] == 'completed' and data['progress_percentage'] == 100
+        assert parse(next(events)) == ('done', {'reason': 'finished'})
+        assert list(events) == []
+
+    def test_user_streams_follow_active_jobs(self, app, user):
+        """Test that user mode watches only the user's active jobs."""
+        other = User(username='other', email='other@example.com')
+        other.set_password('password123')
+        db.session.add(other)
+        db.session.commit()
+        db.session.add_all([
+            ExportJob(job_id='export-1', export_type='csv', created_by=user.id, status='processing'),
+            ExportJob(job_id='export-old', export_type='csv', created_by=user.id, status='completed'),
+            ExportJob(job_id='export-other', export_type='csv', created_by=other.id, status='processing'),
+        ])
+        db.session.commit()
+
+        events = JobProgressStream(user.id, db_refresh_seconds=60, max_seconds=5).events()
+        next(events)
+        event, data = parse(next(events))
+        assert data['job_id'] == 'export-1' and data['type'] == 'export'
+
+        ExportJob.query.filter_by(job_id='export-other').one().status = 'failed'
+        ExportJob.query.filter_by(job_id='export-1').one().status = 'failed'
+        db.session.commit()
+        assert parse(next(events))[1] == {'type': 'export', 'job_id': 'export-1', 'status': 'failed'}
+        assert parse(next(events)) == ('done', {'reason': 'finished'})
+
+    def test_listed_jobs_are_watched_whoever_started_them(self, app, user):
+        """Test that a stream watching job IDs follows other users' jobs until they all finish."""
+        other = User(username='other', email='other@example.com', is_admin=True)
+        other.set_password('password123')
+        db.session.add(other)
+        db.session.commit()
+        db.session.add_all([
+            ExportJob(job_id='export-a', export_type='csv', created_by=other.id, status='processing'),
+            ExportJob(job_id='export-b', export_type='csv', created_by=other.id, status='processing'),
+        ])
+        db.session.commit()
+
+        events = JobProgressStream(user.id, 'export', job_ids=['export-a', 'export-b'],
+                                   db_refresh_seconds=60, max_seconds=5).events()
+        next(events)
+        assert {parse(next(events))[1]['job_id'] for _ in range(2)} == {'export-a', 'export-b'}
+
+        ExportJob.query.filter_by(job_id='export-a').one().status = 'completed'
+        db.session.commit()
+        assert parse(next(events))[1]['job_id'] == 'export-a'
+        ExportJob.query.filter_by(job_id='export-b').one().status = 'failed'
+        db.session.commit()
+        assert parse(next(events))[1] == {'type': 'export', 'job_id': 'export-b', 'status': 'failed'}
+        assert parse(next(events)) == ('done', {'reason': 'finished'})
+
+    def test_missing_job_and_invalid_filters(self, app, user):
+        """Test the not-found event and rejected filters."""
+        events = list(JobProgressStream(user.id, 'servings', 'missing', max_seconds=5).events())
+        assert parse(events[-1]) == ('done', {'reason': 'not_found'})
+
+        with pytest.raises(ValueError, match='Unknown job type'):
+            JobProgressStream(user.id, 'nope')
+        with pytest.raises(ValueError, match='requires a job type'):
+            JobProgressStream(user.id, job_id='job-1')
+        with pytest.raises(ValueError, match='At most'):
+            JobProgressStream(user.id, 'export', job_ids=[str(n) for n in range(JobProgressStream.MAX_JOB_IDS + 1)])
+
+    def test_events_route(self, app, client, user):
+        """Test the admin endpoint's content type and filter validation."""
+        from app.admin import bp as admin_bp
+        app.register_blueprint(admin_bp, url_prefix='/admin')
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user.id)
+
+        response = client.get('/admin/jobs/events?type=upload&job_id=missing')
+        assert response.mimetype == 'text/event-stream'
+        assert 'not_found' in response.get_data(as_text=True)
+        response = client.get('/admin/jobs/events?type=upload&job_id=missing&job_id=gone')
+        assert 'not_found' in response.get_data(as_text=True)
+        assert client.get('/admin/jobs/events?type=nope').status_code == 400
+
+    def test_events_route_releases_the_request_session(self, app, client, user):
+        """Test that an open stream does not keep the request's database session (and connection)."""
+        from app.admin import bp as admin_bp
+        app.register_blueprint(admin_bp, url_prefix='/admin')
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user.id)
+
+        response = client.get('/admin/jobs/events', buffered=False)
+        assert next(iter(response.response)).startswith(b'retry: ')
+        assert not db.session.registry.has()
+        response.close()
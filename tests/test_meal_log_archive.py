@@ -0,0 +1,225 @@
+"""
+Tests for archiving old meal logs into monthly tables.
+"""
+
+import csv
+import io
+import os
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import func, inspect, select
+
+import app as app_package
+from app import db
+from app.models import Challenge, Food, MealLog, MealLogDailyTotal, User, UserChallenge
+from app.services.challenge_progress_service import ChallengeProgressService
+from app.services.meal_log_archive_service import MealLogArchiveService
+from app.utils.meal_log_archive import (archive_cutoff, archive_table_name, count_archived, daily_totals,
+                                        meal_log_source)
+
+TODAY = date.today()
+# Days ago of each logged meal; with a 30-day horizon the last three are archived
+LOGGED_DAYS_AGO = (0, 10, 40, 40, 75)
+
+
+@pytest.fixture
+def archive_app(app):
+    """The test app with the dashboard and a 30-day archive horizon."""
+    from app.cli import register_commands
+    from app.dashboard import bp as dashboard_bp
+    app.register_blueprint(dashboard_bp, url_prefix='/dashboard')
+    app.template_folder = os.path.join(os.path.dirname(app_package.__file__), 'templates')
+    register_commands(app)
+    app.config['RATE_LIMIT_ENABLED'] = False
+    app.config['MEAL_LOG_ARCHIVE_AFTER_DAYS'] = 30
+    return app
+
+
+@pytest.fixture
+def food(archive_app):
+    food = Food(name='Paneer', category='Dairy', calories=265.0, protein=18.0, carbs=1.2, fat=21.0,
+                is_verified=True)
+    db.session.add(food)
+    db.session.commit()
+    return food
+
+
+@pytest.fixture
+def user(archive_app):
+    user = User(username='archivist', email='archivist@example.com', password_hash='unused')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def log(user, food, days_ago, grams=100.0, meal_type='lunch'):
+    meal_log = MealLog(user_id=user.id, food_id=food.id, quantity=grams, original_quantity=grams,
+                       unit_type='grams', logged_grams=grams, meal_type=meal_type,
+                       date=TODAY - timedelta(days=days_ago), protein=18.0 * grams / 100,
+                       calories=265.0 * grams / 100)
+    db.session.add(meal_log)
+    db.session.commit()
+    return meal_log
+
+
+@pytest.fixture
+def meal_logs(user, food):
+    # Oldest first, so today's log is the newest row
+    return [log(user, food, days_ago, grams=50.0 * (number + 1))
+            for number, days_ago in enumerate(sorted(LOGGED_DAYS_AGO, reverse=True))]
+
+
+def per_day(start_date):
+    totals = daily_totals(start_date)
+    return dict(db.session.query(totals.c.date, func.sum(totals.c.protein))
+                .filter(totals.c.date >= start_date).group_by(totals.c.date).all())
+
+
+def archive(batch_size=None):
+    return MealLogArchiveService(batch_size=batch_size, log=lambda message: None).archive()
+
+
+class TestArchiveJob:
+    """Test suite for MealLogArchiveService."""
+
+    def test_old_logs_move_into_monthly_tables(self, archive_app, meal_logs):
+        """Test that logs before the cutoff move, in batches, into their month's table."""
+        result = archive(batch_size=2)
+
+        assert (result['rows'], result['batches']) == (3, 2)
+        assert sorted(meal_log.date for meal_log in MealLog.query) == [TODAY - timedelta(days=10), TODAY]
+        names = {archive_table_name(TODAY - timedelta(days=days_ago)) for days_ago in (40, 75)}
+        assert names <= set(inspect(db.session.connection()).get_table_names())
+        assert result['months'] == len(names)
+        assert archive()['rows'] == 0
+
+    def test_daily_totals_stay_complete(self, archive_app, user, meal_logs):
+        """Test that per-day totals and challenge progress are unchanged by archiving."""
+        challenge = Challenge(name='Protein', challenge_type='protein', target_value=10, duration_days=90)
+        db.session.add(challenge)
+        db.session.commit()
+        db.session.add(UserChallenge(user_id=user.id, challenge_id=challenge.id,
+                                     start_date=TODAY - timedelta(days=80)))
+        db.session.commit()
+        ChallengeProgressService().evaluate()
+        before = per_day(TODAY - timedelta(days=90))
+
+        archive(batch_size=1)
+
+        assert per_day(TODAY - timedelta(days=90)) == before
+        assert ChallengeProgressService().evaluate()['updated'] == 0
+        assert db.session.execute(select(UserChallenge.current_progress)).scalar() == 3
+        assert MealLogDailyTotal.query.filter_by(date=TODAY - timedelta(days=40)).one().meal_count == 2
+
+    def test_late_logs_for_archived_days_are_totalled_again(self, archive_app, user, food, meal_logs):
+        """Test that a meal logged late for an archived day is added to that day's totals."""
+        archive()
+        day = TODAY - timedelta(days=75)
+        log(user, food, 75, grams=100.0, meal_type='dinner')
+        log(user, food, 0)  # Keeps the late log from being the newest row
+
+        assert archive()['rows'] == 1
+        assert per_day(day)[day] == pytest.approx(9.0 + 18.0)
+        assert {total.meal_type: total.meal_count
+                for total in MealLogDailyTotal.query.filter_by(date=day)} == {'lunch': 1, 'dinner': 1}
+
+    def test_dry_run_and_cli(self, archive_app, meal_logs):
+        """Test the archive-meal-logs command."""
+        runner = archive_app.test_cli_runner()
+
+        result = runner.invoke(args=['archive-meal-logs', '--dry-run'])
+        assert result.exit_code == 0 and 'Would archive 3 meal log(s)' in result.output
+        assert MealLog.query.count() == len(LOGGED_DAYS_AGO)
+
+        result = runner.invoke(args=['archive-meal-logs', '--batch-size', '2'])
+        assert result.exit_code == 0
+        assert f'Archived 3 meal log(s) dated before {archive_cutoff().isoformat()}' in result.output
+
+
+class TestArchiveReads:
+    """Test suite for reading archived meal logs."""
+
+    def test_source_reads_the_archive_only_when_needed(self, archive_app, user, meal_logs):
+        """Test that recent ranges query meal_log alone and older ranges include the archive."""
+        archive()
+
+        assert meal_log_source(user.id, TODAY - timedelta(days=20)) is MealLog
+        assert meal_log_source(user.id, TODAY - timedelta(days=100), TODAY - timedelta(days=90)) is MealLog
+        source = meal_log_source(user.id, TODAY - timedelta(days=50))
+        assert source is not MealLog
+        logs = db.session.query(source).filter(source.date >= TODAY - timedelta(days=50)).all()
+        assert sorted(meal_log.logged_grams for meal_log in logs) == [100.0, 150.0, 200.0, 250.0]
+        assert all(meal_log.food.name == 'Paneer' for meal_log in logs)
+
+    def test_history_and_export_include_archived_logs(self, archive_app, client, user, meal_logs):
+        """Test the history page and the 90-day export over archived months."""
+        archive()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+
+        start = (TODAY - timedelta(days=80)).isoformat()
+        page = client.get(f'/dashboard/history?start_date={start}').get_data(as_text=True)
+        assert page.count('Paneer</strong>') == len(LOGGED_DAYS_AGO)
+
+        rows = list(csv.DictReader(io.StringIO(
+            client.get('/dashboard/export-data?format=csv&period=90').get_data(as_text=True)
+        )))
+        assert [row['Date'] for row in rows] == sorted(
+            ((TODAY - timedelta(days=days_ago)).isoformat() for days_ago in LOGGED_DAYS_AGO), reverse=True
+        )
+
+    def test_archived_logs_count_as_food_references_and_follow_merges(self, archive_app, meal_logs, food):
+        """Test that archived logs count as food references and are re-pointed by a merge."""
+        from app.services.food_merge_service import FoodMergeService
+
+        archive()
+        assert count_archived('food_id', food.id) == 3
+        keeper = Food(name='Paneer (fresh)', category='Dairy', calories=265.0, protein=18.0, carbs=1.2, fat=21.0)
+        db.session.add(keeper)
+        db.session.commit()
+
+        result = FoodMergeService().merge(keeper.id, [food.id], start_worker=False)
+
+        assert result['meal_logs'] == len(LOGGED_DAYS_AGO)
+        assert count_archived('food_id', keeper.id) == 3
+
+
+class TestArchivePropagation:
+    """Test suite for nutrition changes reaching archived meal logs."""
+
+    def test_propagation_recomputes_archived_logs_and_daily_totals(self, archive_app, food, meal_logs):
+        """Test that applying a food edit to history rewrites archived days and their totals."""
+        from app.services.nutrition_propagation_service import NutritionPropagationService
+
+        archive()
+        food.protein = 20.0
+        db.session.commit()
+        service = NutritionPropagationService()
+        job = service.enqueue(food.id, from_date=TODAY - timedelta(days=60), start_worker=False)
+
+        service.run_pending()
+
+        day = TODAY - timedelta(days=40)
+        assert per_day(day)[day] == pytest.approx(20.0 * (100.0 + 150.0) / 100)
+        old_day = TODAY - timedelta(days=75)
+        assert per_day(old_day)[old_day] == pytest.approx(18.0 * 50.0 / 100)  # Before from_date
+        status = service.get_job_status(job.job_id)
+        assert status['status'] == 'completed' and status['processed_rows'] == status['total_rows'] == 4
+
+    def test_merge_recomputes_archived_logs_of_merged_foods(self, archive_app, food, meal_logs):
+        """Test that archived logs moved by a merge get the kept food's nutrition."""
+        from app.services.food_merge_service import FoodMergeService
+        from app.services.nutrition_propagation_service import NutritionPropagationService
+
+        archive()
+        keeper = Food(name='Paneer (fresh)', category='Dairy', calories=300.0, protein=20.0, carbs=1.2, fat=21.0)
+        db.session.add(keeper)
+        db.session.commit()
+
+        result = FoodMergeService().merge(keeper.id, [food.id], start_worker=False)
+        NutritionPropagationService().run_pending()
+
+        assert result['propagation_job_id'] is not None
+        old_day = TODAY - timedelta(days=75)
+        assert per_day(old_day)[old_day] == pytest.approx(20.0 * 50.0 / 100)
@@ -0,0 +1,303 @@
+"""
+Tests for user-sharded meal log storage, using several SQLite files as shards.
+"""
+
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+from flask import Flask, g
+from sqlalchemy import create_engine, func, select
+
+from app import db, login_manager
+from app.cli import register_commands
+from app.models import Challenge, Food, MealLog, MealLogDailyTotal, NutritionGoal, User, UserChallenge
+from app.services.challenge_progress_service import ChallengeProgressService
+from app.services.meal_log_archive_service import MealLogArchiveService
+from app.services.nutrition_propagation_service import NutritionPropagationService
+from app.utils.meal_log_archive import archive_table_name
+from app.utils.sharding import (EXTENSION_KEY, ShardKeyError, create_shard_tables, jump_hash, scatter_all,
+                                scatter_sum, shard_index, use_user_shard)
+
+SHARD_COUNT = 3
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return {'primary': str(tmp_path / 'primary.db'),
+            'shards': [str(tmp_path / f'shard{index}.db') for index in range(SHARD_COUNT)]}
+
+
+@pytest.fixture
+def sharded_app(paths):
+    """An app whose meal logs are sharded over three SQLite files."""
+    from config import config
+    from app.utils.sharding import init_meal_log_shards
+
+    app = Flask(__name__)
+    app.config.from_object(config['testing'])
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{paths['primary']}"
+    app.config['MEAL_LOG_SHARD_URLS'] = ','.join(f'sqlite:///{path}' for path in paths['shards'])
+    db.init_app(app)
+    login_manager.init_app(app)
+    init_meal_log_shards(app)
+    register_commands(app)
+
+    from app.api import bp as api_bp
+    app.register_blueprint(api_bp, url_prefix='/api')
+
+    with app.app_context():
+        db.create_all()
+        create_shard_tables()
+        yield app
+        db.session.remove()
+        db.drop_all()
+    for engine in app.extensions[EXTENSION_KEY]:
+        engine.dispose()
+
+
+@pytest.fixture
+def food(sharded_app):
+    """ID of a verified food."""
+    food = Food(name='Lentils', category='Legumes', calories=116.0, protein=9.0, carbs=20.0, fat=0.4,
+                fiber=8.0, is_verified=True)
+    db.session.add(food)
+    db.session.commit()
+    return food.id
+
+
+@pytest.fixture
+def users(sharded_app):
+    """IDs of users spread so that every shard has at least one."""
+    # Logins are faked through the session cookie, so no password hashing
+    users = [User(username=f'user{number}', email=f'user{number}@example.com', password_hash='unused')
+             for number in range(12)]
+    db.session.add_all(users)
+    db.session.commit()
+    user_ids = [user.id for user in users]
+    assert {shard_index(user_id) for user_id in user_ids} == set(range(SHARD_COUNT))
+    return user_ids
+
+
+def log(user_id, food_id, day=None, grams=100.0):
+    use_user_shard(user_id)
+    meal_log = MealLog(user_id=user_id, food_id=food_id, quantity=grams, original_quantity=grams,
+                       unit_type='grams', logged_grams=grams, meal_type='lunch', date=day or date.today(),
+                       protein=9.0 * grams / 100, calories=116.0 * grams / 100)
+    db.session.add(meal_log)
+    db.session.commit()
+    return meal_log
+
+
+def rows_in(path, table='meal_log'):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(f'SELECT user_id, COUNT(*) FROM {table} GROUP BY user_id').fetchall()
+    finally:
+        connection.close()
+
+
+def paths_of(app):
+    return [engine.url.database for engine in app.extensions[EXTENSION_KEY]]
+
+
+def login(client, user_id):
+    # Requests share the fixture's app context, and so its session and the user Flask-Login caches on g
+    db.session.remove()
+    g.pop('_login_user', None)
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+
+class TestShardPlacement:
+    """Test suite for placing and reading meal logs by user."""
+
+    def test_jump_hash_moves_only_keys_for_the_new_shard(self):
+        """Test that growing from 3 to 4 shards only moves keys onto the new shard."""
+        before = [jump_hash(key, 3) for key in range(1, 2001)]
+        after = [jump_hash(key, 4) for key in range(1, 2001)]
+
+        moved = [new for old, new in zip(before, after) if old != new]
+        assert set(moved) == {3}
+        assert 400 < len(moved) < 600
+        assert all(before.count(index) > 550 for index in range(3))
+
+    def test_meals_are_stored_on_the_users_shard(self, paths, users, food):
+        """Test that each user's meal logs land on their shard and nowhere else."""
+        for user_id in users:
+            log(user_id, food)
+
+        for user_id in users:
+            assert (user_id, 1) in rows_in(paths['shards'][shard_index(user_id)])
+        assert sum(len(rows_in(path)) for path in paths['shards']) == len(users)
+        assert rows_in(paths['primary']) == []
+
+    def test_api_meal_routes_use_the_logged_in_users_shard(self, sharded_app, paths, users, food):
+        """Test that the API reads and deletes the logged-in user's meals on their shard."""
+        meal_ids = {user_id: log(user_id, food, grams=50.0 * (number + 1)).id
+                    for number, user_id in enumerate(users[:4])}
+        client = sharded_app.test_client()
+
+        for number, user_id in enumerate(users[:4]):
+            login(client, user_id)
+            meal = client.get(f'/api/meals/{meal_ids[user_id]}').get_json()
+            assert (meal['food_name'], meal['quantity']) == ('Lentils', 50.0 * (number + 1))
+            summary = client.get('/api/v2/nutrition/summary').get_json()
+            assert summary['total_protein'] == pytest.approx(4.5 * (number + 1))
+
+        login(client, users[0])
+        assert client.delete(f'/api/meals/{meal_ids[users[0]]}').status_code == 200
+        assert (users[0], 1) not in rows_in(paths['shards'][shard_index(users[0])])
+
+    def test_unpinned_session_refuses_sharded_reads(self, sharded_app, users, food):
+        """Test that a query without a user's shard fails instead of reading one shard."""
+        log(users[0], food)
+        db.session.remove()
+
+        with pytest.raises(ShardKeyError):
+            MealLog.query.count()
+        db.session.rollback()
+
+        use_user_shard(users[0])
+        assert MealLog.query.count() == 1
+        assert db.session.get(User, users[0]).meal_logs.count() == 1
+
+    def test_flush_pins_an_unpinned_session(self, sharded_app, paths, users, food):
+        """Test that writing one user's goal picks that user's shard."""
+        db.session.remove()
+        goal = NutritionGoal(user_id=users[1], target_calories=2000, target_protein=120, goal_type='maintain')
+        db.session.add(goal)
+        db.session.commit()
+
+        assert rows_in(paths['shards'][shard_index(users[1])], 'nutrition_goal') == [(users[1], 1)]
+        assert db.session.get(User, users[1]).get_current_nutrition_goal().target_protein == 120
+
+
+class TestCrossShardOperations:
+    """Test suite for scatter-gather aggregates and jobs spanning shards."""
+
+    def test_scatter_aggregates_every_shard(self, sharded_app, users, food):
+        """Test counts and grouped reads across all shards."""
+        for user_id in users:
+            log(user_id, food)
+        db.session.remove()
+
+        assert scatter_sum(select(func.count()).select_from(MealLog)) == len(users)
+        rows = scatter_all(select(MealLog.food_id, func.count()).group_by(MealLog.food_id))
+        assert len(rows) == SHARD_COUNT and sum(count for _, count in rows) == len(users)
+
+    def test_challenge_progress_reads_the_flushed_shard(self, sharded_app, users, food):
+        """Test that a meal log updates challenge progress stored on the primary."""
+        user_id = users[2]
+        challenge = Challenge(name='Protein', challenge_type='protein', target_value=10, duration_days=30)
+        db.session.add(challenge)
+        db.session.commit()
+        db.session.add(UserChallenge(user_id=user_id, challenge_id=challenge.id, start_date=date.today()))
+        db.session.commit()
+
+        log(user_id, food, grams=150.0)  # 13.5 g protein
+
+        progress = db.session.execute(select(UserChallenge.current_progress)).scalar()
+        assert progress == 1
+        assert ChallengeProgressService().evaluate()['evaluated'] == 1
+
+    def test_propagation_recomputes_logs_on_every_shard(self, sharded_app, users, food):
+        """Test that a propagation job walks all shards and completes."""
+        for user_id in users:
+            log(user_id, food)
+        db.session.get(Food, food).protein = 20.0
+        db.session.commit()
+        service = NutritionPropagationService(chunk_size=2)
+
+        job = service.enqueue(food, start_worker=False)
+        assert service.run_pending() == 1
+
+        db.session.refresh(job)
+        assert job.status == 'completed'
+        assert job.processed_rows == job.total_rows == len(users)
+        assert scatter_sum(select(func.sum(MealLog.protein))) == pytest.approx(20.0 * len(users))
+
+
+class TestShardCommands:
+    """Test suite for the shards CLI group."""
+
+    def test_rebalance_moves_primary_rows_to_home_shards(self, sharded_app, paths, users, food):
+        """Test that rows logged before sharding was enabled move to their shards."""
+        with db.engine.begin() as connection:
+            connection.execute(MealLog.__table__.insert(), [
+                {'user_id': user_id, 'food_id': food, 'quantity': 100.0, 'original_quantity': 100.0,
+                 'unit_type': 'grams', 'logged_grams': 100.0, 'meal_type': 'lunch', 'date': date.today()}
+                for user_id in users for _ in range(3)
+            ])
+        runner = sharded_app.test_cli_runner()
+
+        result = runner.invoke(args=['shards', 'rebalance', '--dry-run'])
+        assert result.exit_code == 0 and f'Would move {3 * len(users)} row(s)' in result.output
+        assert len(rows_in(paths['primary'])) == len(users)
+
+        result = runner.invoke(args=['shards', 'rebalance', '--batch-size', '2'])
+        assert result.exit_code == 0 and f'Moved {3 * len(users)} row(s)' in result.output
+        assert rows_in(paths['primary']) == []
+        for user_id in users:
+            assert (user_id, 3) in rows_in(paths['shards'][shard_index(user_id)])
+
+        result = runner.invoke(args=['shards', 'rebalance'])
+        assert 'Moved 0 row(s)' in result.output
+
+    def test_rebalance_after_adding_a_shard(self, sharded_app, tmp_path, users, food):
+        """Test that only users whose home is the new shard move, and stay readable."""
+        for user_id in users:
+            log(user_id, food)
+        db.session.remove()
+        new_shard = str(tmp_path / 'shard3.db')
+        sharded_app.extensions[EXTENSION_KEY].append(create_engine(f'sqlite:///{new_shard}'))
+
+        result = sharded_app.test_cli_runner().invoke(args=['shards', 'rebalance'])
+
+        movers = [user_id for user_id in users if jump_hash(user_id, SHARD_COUNT + 1) == SHARD_COUNT]
+        assert result.exit_code == 0 and f'Moved {len(movers)} row(s)' in result.output
+        assert sorted(rows_in(new_shard)) == sorted((user_id, 1) for user_id in movers)
+        for user_id in users:
+            db.session.remove()
+            use_user_shard(user_id)
+            assert MealLog.query.filter_by(user_id=user_id).count() == 1
+
+    def test_archived_logs_follow_users_to_a_new_shard(self, sharded_app, tmp_path, users, food):
+        """Test archiving on every shard, and rebalancing archived logs back into meal_log."""
+        sharded_app.config['MEAL_LOG_ARCHIVE_AFTER_DAYS'] = 30
+        old_day = date.today() - timedelta(days=60)
+        for user_id in users:
+            log(user_id, food, day=old_day)
+        for user_id in users:
+            log(user_id, food)  # Newest rows, never archived
+        db.session.remove()
+
+        assert MealLogArchiveService(log=lambda message: None).archive()['rows'] == len(users)
+        archive_name = archive_table_name(old_day)
+        assert sum(len(rows_in(path, archive_name)) for path in paths_of(sharded_app)) == len(users)
+        assert scatter_sum(select(func.count()).select_from(MealLogDailyTotal)) == len(users)
+
+        new_shard = str(tmp_path / 'shard3.db')
+        sharded_app.extensions[EXTENSION_KEY].append(create_engine(f'sqlite:///{new_shard}'))
+        create_shard_tables()
+        result = sharded_app.test_cli_runner().invoke(args=['shards', 'rebalance'])
+
+        movers = [user_id for user_id in users if jump_hash(user_id, SHARD_COUNT + 1) == SHARD_COUNT]
+        assert result.exit_code == 0 and f'Moved {2 * len(movers)} row(s)' in result.output
+        assert sorted(rows_in(new_shard)) == sorted((user_id, 2) for user_id in movers)
+        assert scatter_sum(select(func.count()).select_from(MealLogDailyTotal)) == len(users) - len(movers)
+        log(movers[0], food)  # The newest row on a shard is never archived
+        db.session.remove()
+        assert MealLogArchiveService(log=lambda message: None).archive()['rows'] == len(movers)
+        assert sorted(rows_in(new_shard, archive_name)) == sorted((user_id, 1) for user_id in movers)
+
+    def test_status_lists_every_database(self, sharded_app, users, food):
+        """Test the per-shard row counts."""
+        log(users[0], food)
+
+        result = sharded_app.test_cli_runner().invoke(args=['shards', 'status'])
+
+        assert result.exit_code == 0
+        assert result.output.count('meal_log:') == SHARD_COUNT + 1
+        assert 'meal_log: 1 row(s), 1 user(s)' in result.output
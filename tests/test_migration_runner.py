@@ -0,0 +1,147 @@
+"""
+Tests for the versioned migration runner and chunked backfills.
+"""
+
+import pytest
+from sqlalchemy import inspect, text
+
+from app import db
+from app.migrations import AddColumn, Migration, MigrationRunner
+from app.migrations.versions import MIGRATIONS
+from app.models import Food, MealLog, MigrationCheckpoint, SchemaMigration, User
+
+
+def migration(version):
+    return next(m for m in MIGRATIONS if m.version == version)
+
+
+def make_runner(migrations=None, **kwargs):
+    kwargs.setdefault('log', lambda message: None)
+    return MigrationRunner(db.engine, migrations=migrations, **kwargs)
+
+
+@pytest.fixture
+def meal_logs(app):
+    """Ten meal logs whose legacy quantity disagrees with logged_grams."""
+    user = User(username='migrator', email='migrator@example.com')
+    user.set_password('password123')
+    food = Food(name='Oats', category='Grains', calories=389.0, protein=16.9, carbs=66.3,
+                fat=6.9, fiber=10.6, is_verified=True)
+    db.session.add_all([user, food])
+    db.session.commit()
+    for i in range(10):
+        db.session.add(MealLog(user_id=user.id, food_id=food.id, quantity=1.0, original_quantity=1.0,
+                               unit_type='serving', logged_grams=50.0 + i, meal_type='breakfast'))
+    db.session.commit()
+    return food
+
+
+class TestMigrationRunner:
+    """Test suite for version bookkeeping."""
+
+    def test_upgrade_records_versions_and_is_idempotent(self, app):
+        """Test that a full upgrade records every version once."""
+        runner = make_runner()
+
+        assert runner.upgrade() == [m.version for m in MIGRATIONS]
+        assert runner.upgrade() == []
+        assert db.session.query(SchemaMigration).count() == len(MIGRATIONS)
+
+    def test_upgrade_to_target(self, app):
+        """Test that --target stops after the given version."""
+        runner = make_runner()
+
+        assert runner.upgrade('0002') == ['0001', '0002']
+        assert [m.version for m in runner.pending()] == [m.version for m in MIGRATIONS[2:]]
+
+    def test_unknown_target_raises_error(self, app):
+        """Test that an unknown version is rejected."""
+        with pytest.raises(ValueError, match="Unknown migration version"):
+            make_runner().upgrade('9999')
+
+    def test_stamp_skips_steps(self, app, meal_logs):
+        """Test that stamping records versions without touching data."""
+        runner = make_runner()
+
+        assert runner.stamp('0006') == ['0001', '0002', '0003', '0004', '0005', '0006']
+        assert db.session.query(MealLog).filter(MealLog.quantity == 1.0).count() == 10
+
+    def test_add_column_is_idempotent(self, app):
+        """Test that AddColumn only alters the table when the column is missing."""
+        with db.engine.begin() as connection:
+            connection.execute(text("CREATE TABLE legacy_thing (id INTEGER PRIMARY KEY)"))
+        step = Migration('0100', 'legacy', [AddColumn('legacy_thing', 'note', 'VARCHAR(50)')])
+        runner = make_runner([step])
+
+        runner.apply(step)
+        step.steps[0].apply(runner, step)
+
+        assert 'note' in {c['name'] for c in inspect(db.engine).get_columns('legacy_thing')}
+
+
+class TestBackfill:
+    """Test suite for chunked, resumable backfills."""
+
+    def test_backfill_runs_in_chunks(self, app, meal_logs):
+        """Test that the backfill visits every row in keyset chunks with throttling."""
+        pauses = []
+        runner = make_runner([migration('0006')], chunk_size=3, throttle_seconds=0.5, sleep=pauses.append)
+
+        runner.upgrade()
+
+        assert db.session.query(MealLog).filter(MealLog.quantity != MealLog.logged_grams).count() == 0
+        assert pauses == [0.5] * 4  # ceil(10 / 3) chunks
+        checkpoint = db.session.get(MigrationCheckpoint, ('0006', 'quantity_from_logged_grams'))
+        assert checkpoint.status == 'completed'
+        assert checkpoint.rows_processed == 10
+
+    def test_interrupted_backfill_resumes_from_checkpoint(self, app, meal_logs):
+        """Test that a second run continues after the last committed chunk."""
+        def interrupt(seconds):
+            raise KeyboardInterrupt
+
+        runner = make_runner([migration('0006')], chunk_size=4, throttle_seconds=0.1, sleep=interrupt)
+        with pytest.raises(KeyboardInterrupt):
+            runner.upgrade()
+
+        first_id = db.session.query(db.func.min(MealLog.id)).scalar()
+        checkpoint = db.session.get(MigrationCheckpoint, ('0006', 'quantity_from_logged_grams'))
+        assert checkpoint.status == 'running'
+        assert checkpoint.last_key == first_id + 3
+        assert db.session.query(SchemaMigration).count() == 0
+
+        # Rows edited behind the checkpoint are not revisited
+        db.session.execute(text("UPDATE meal_log SET quantity = -1 WHERE id = :id"), {'id': first_id})
+        db.session.commit()
+
+        make_runner([migration('0006')], chunk_size=4).upgrade()
+
+        db.session.expire_all()
+        checkpoint = db.session.get(MigrationCheckpoint, ('0006', 'quantity_from_logged_grams'))
+        assert checkpoint.status == 'completed'
+        assert checkpoint.rows_processed == 10
+        assert db.session.get(MealLog, first_id).quantity == -1
+        assert db.session.get(SchemaMigration, '0006') is not None
+
+    def test_nutrition_backfill_uses_per_100g_values(self, app, meal_logs):
+        """Test that missing nutrition is recomputed from the food in SQL."""
+        db.session.execute(text("UPDATE meal_log SET calories = NULL, protein = NULL WHERE id % 2 = 0"))
+        db.session.commit()
+
+        make_runner([migration('0007')], chunk_size=4).upgrade()
+
+        db.session.expire_all()
+        for log in db.session.query(MealLog):
+            assert log.calories == pytest.approx(389.0 * log.logged_grams / 100)
+            assert log.protein == pytest.approx(16.9 * log.logged_grams / 100)
+
+    def test_where_clause_limits_updates(self, app, meal_logs):
+        """Test that rows already satisfying the step are skipped."""
+        db.session.execute(text("UPDATE meal_log SET quantity = logged_grams WHERE id % 2 = 1"))
+        db.session.commit()
+        step = migration('0006')
+
+        make_runner([step], chunk_size=100).upgrade()
+
+        checkpoint = db.session.get(MigrationCheckpoint, ('0006', 'quantity_from_logged_grams'))
+        assert checkpoint.rows_processed == 5
@@ -0,0 +1,74 @@
+"""
+Tests for the memory-mapped nutrient snapshot.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from app import db
+from app.models import CatalogVersion, Food
+from app.services.nutrient_snapshot import NutrientSnapshot
+
+
+@pytest.fixture
+def foods(app):
+    """Two verified foods and one unverified food."""
+    NutrientSnapshot.invalidate()
+    foods = [
+        Food(name='Lentils', category='Legumes', calories=116.0, protein=9.0, carbs=20.0, fat=0.4,
+             fiber=8.0, sugar=1.8, sodium=2.0, is_verified=True),
+        Food(name='Paneer', category='Dairy', calories=300.0, protein=18.0, carbs=3.0, fat=25.0,
+             fiber=0.0, is_verified=True),
+        Food(name='Mystery Bar', category='Snacks', calories=450.0, protein=20.0, carbs=40.0, fat=20.0,
+             is_verified=False)
+    ]
+    db.session.add_all(foods)
+    db.session.commit()
+    yield foods
+    NutrientSnapshot.invalidate()
+
+
+class TestNutrientSnapshot:
+    """Test suite for snapshot building and lookups."""
+
+    def test_lookup_by_id(self, app, foods):
+        """Test per-100g lookups against the memory-mapped columns."""
+        lentils, paneer, mystery = foods
+        snapshot = NutrientSnapshot.current()
+
+        assert isinstance(snapshot.nutrients, np.memmap)
+        assert len(snapshot) == 2
+        assert snapshot.get(lentils.id) == pytest.approx(
+            {'calories': 116.0, 'protein': 9.0, 'carbs': 20.0, 'fat': 0.4, 'fiber': 8.0, 'sugar': 1.8, 'sodium': 2.0}
+        )
+        assert snapshot.get(mystery.id) is None
+        assert snapshot.positions([paneer.id, 999, lentils.id]).tolist() == [1, -1, 0]
+        assert snapshot.column('protein').tolist() == [9.0, 18.0]
+
+    def test_snapshot_follows_catalog_version(self, app, foods):
+        """Test that a catalog change maps a new version and prunes old ones."""
+        lentils = foods[0]
+        first = NutrientSnapshot.current()
+        assert NutrientSnapshot.current() is first
+        assert first.version == CatalogVersion.current()
+
+        for protein in (9.5, 10.0, 10.5):
+            lentils.protein = protein
+            db.session.commit()
+            latest = NutrientSnapshot.current()
+
+        assert latest.version == CatalogVersion.current()
+        assert latest.get(lentils.id)['protein'] == 10.5
+        directory = NutrientSnapshot.directory()
+        assert sorted(os.listdir(directory)) == [f'v{latest.version - 1:08d}', f'v{latest.version:08d}']
+
+    def test_build_is_idempotent_when_version_exists(self, app, foods):
+        """Test that losing a build race keeps the existing files."""
+        version = CatalogVersion.current()
+        path = NutrientSnapshot.build(version)
+
+        assert NutrientSnapshot.build(version) == path
+        assert sorted(os.listdir(path)) == ['ids.npy', 'nutrients.npy']
+        assert not [name for name in os.listdir(NutrientSnapshot.directory()) if name.startswith('.')]
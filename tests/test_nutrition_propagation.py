@@ -0,0 +1,155 @@
+"""
+Tests for propagating corrected food nutrition to stored meal logs.
+"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import Food, MealLog, NutritionPropagationJob, User
+from app.services.nutrition_propagation_service import NutritionPropagationService
+
+
+@pytest.fixture
+def logged_food(app):
+    """A food with seven daily 200 g meal logs ending 2024-03-07."""
+    user = User(username='eater', email='eater@example.com')
+    user.set_password('password123')
+    food = Food(name='Paneer', category='Dairy', calories=300.0, protein=18.0, carbs=3.0,
+                fat=25.0, fiber=0.0, is_verified=True)
+    other = Food(name='Rice', category='Grains', calories=130.0, protein=3.0, carbs=28.0,
+                 fat=0.3, fiber=0.4, is_verified=True)
+    db.session.add_all([user, food, other])
+    db.session.commit()
+
+    for day in range(1, 8):
+        for logged_food_item in (food, other):
+            log = MealLog(user_id=user.id, food_id=logged_food_item.id, quantity=200.0,
+                          original_quantity=200.0, unit_type='grams', logged_grams=200.0,
+                          meal_type='lunch', date=date(2024, 3, day))
+            log.food = logged_food_item
+            log.calculate_nutrition()
+            db.session.add(log)
+    db.session.commit()
+    return food
+
+
+def correct(food, **values):
+    for field, value in values.items():
+        setattr(food, field, value)
+    db.session.commit()
+
+
+class TestNutritionPropagationService:
+    """Test suite for the propagation engine."""
+
+    def test_recomputes_all_history_in_chunks(self, app, logged_food):
+        """Test that every log for the food picks up the corrected values."""
+        correct(logged_food, calories=265.0, protein=20.0)
+        service = NutritionPropagationService(chunk_size=3)
+
+        job = service.enqueue(logged_food.id, start_worker=False)
+        assert service.run_pending() == 1
+
+        db.session.expire_all()
+        logs = MealLog.query.filter_by(food_id=logged_food.id).all()
+        assert {log.calories for log in logs} == {530.0}
+        assert {log.protein for log in logs} == {40.0}
+        # Other foods are untouched
+        assert {log.calories for log in MealLog.query.filter(MealLog.food_id != logged_food.id)} == {260.0}
+
+        status = service.get_job_status(job.job_id)
+        assert status['status'] == 'completed'
+        assert status['total_rows'] == 7
+        assert status['processed_rows'] == 7
+        assert status['progress_percentage'] == 100
+
+    def test_from_date_limits_history(self, app, logged_food):
+        """Test that only logs on or after from_date are recomputed."""
+        correct(logged_food, calories=250.0)
+        service = NutritionPropagationService()
+
+        service.enqueue(logged_food.id, from_date=date(2024, 3, 5), start_worker=False)
+        service.run_pending()
+
+        db.session.expire_all()
+        calories = {log.date.day: log.calories for log in MealLog.query.filter_by(food_id=logged_food.id)}
+        assert calories == {1: 600.0, 2: 600.0, 3: 600.0, 4: 600.0, 5: 500.0, 6: 500.0, 7: 500.0}
+
+    def test_pending_job_is_widened_not_duplicated(self, app, logged_food):
+        """Test that a second request for a pending food widens the existing job."""
+        service = NutritionPropagationService()
+
+        first = service.enqueue(logged_food.id, from_date=date(2024, 3, 5), start_worker=False)
+        second = service.enqueue(logged_food.id, from_date=date(2024, 3, 2), start_worker=False)
+        third = service.enqueue(logged_food.id, from_date=date(2024, 3, 6), start_worker=False)
+
+        assert first.id == second.id == third.id
+        assert NutritionPropagationJob.query.count() == 1
+        assert db.session.get(NutritionPropagationJob, first.id).from_date == date(2024, 3, 2)
+
+    def test_stalled_job_resumes_from_checkpoint(self, app, logged_food):
+        """Test that an abandoned job continues after its last committed meal log."""
+        correct(logged_food, calories=100.0)
+        ids = [log.id for log in MealLog.query.filter_by(food_id=logged_food.id).order_by(MealLog.id)]
+        job = NutritionPropagationJob(food_id=logged_food.id, status='processing', total_rows=7,
+                                      processed_rows=3, last_meal_log_id=ids[2],
+                                      updated_at=datetime.utcnow() - timedelta(hours=1))
+        db.session.add(job)
+        db.session.commit()
+
+        assert NutritionPropagationService().run_pending() == 1
+
+        db.session.expire_all()
+        calories = [db.session.get(MealLog, log_id).calories for log_id in ids]
+        assert calories == [600.0] * 3 + [200.0] * 4
+        assert db.session.get(NutritionPropagationJob, job.id).processed_rows == 7
+
+    def test_running_job_is_not_claimed_twice(self, app, logged_food):
+        """Test that a job with recent progress is left to its worker."""
+        db.session.add(NutritionPropagationJob(food_id=logged_food.id, status='processing',
+                                               updated_at=datetime.utcnow()))
+        db.session.commit()
+
+        assert NutritionPropagationService().run_pending() == 0
+
+    def test_nutrients_changed(self, app, logged_food):
+        """Test change detection against the audit snapshot."""
+        original = {nutrient: getattr(logged_food, nutrient) for nutrient in NutritionPropagationService.NUTRIENTS}
+
+        assert NutritionPropagationService.nutrients_changed(original, logged_food) is False
+        logged_food.name = 'Cottage Cheese'
+        assert NutritionPropagationService.nutrients_changed(original, logged_food) is False
+        logged_food.fat = 20.0
+        assert NutritionPropagationService.nutrients_changed(original, logged_food) is True
+
+
+class TestNutritionPropagationAdmin:
+    """Test suite for the admin propagation control."""
+
+    def test_manual_propagation_queues_job(self, app, client, logged_food, monkeypatch):
+        """Test that the admin control queues a job from the chosen date."""
+        monkeypatch.setattr(NutritionPropagationService, 'start_worker', lambda self: None)
+        from app.admin import bp as admin_bp
+        app.register_blueprint(admin_bp, url_prefix='/admin')
+        app.config['WTF_CSRF_ENABLED'] = False
+
+        admin = User(username='admin', email='admin@example.com', is_admin=True)
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.commit()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(admin.id)
+
+        response = client.post(f'/admin/foods/{logged_food.id}/propagate-nutrition',
+                               data={'from_date': '2024-03-04'})
+
+        assert response.status_code == 302
+        job = NutritionPropagationJob.query.one()
+        assert job.food_id == logged_food.id
+        assert job.from_date == date(2024, 3, 4)
+        assert job.reason == 'manual'
+
+        status = client.get(f'/admin/nutrition-propagation/{job.job_id}/status').get_json()
+        assert status['job_id'] == job.job_id
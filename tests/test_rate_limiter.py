@@ -0,0 +1,123 @@
+"""
+Tests for the sliding-window rate limiter and its backends.
+"""
+
+import pytest
+
+from app.utils.rate_limiter import (
+    DatabaseRateLimitBackend, MemoryRateLimitBackend, RateLimiter
+)
+
+
+class FakeClock:
+    """Controllable time source."""
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestMemoryRateLimiter:
+    """Test suite for the in-memory backend."""
+
+    def test_blocks_after_limit_with_retry_after(self):
+        """Test that requests over the limit are rejected with a retry delay."""
+        clock = FakeClock(1_000_020.0)  # aligned to a 60s window boundary
+        limiter = RateLimiter(MemoryRateLimitBackend(), clock=clock)
+
+        results = [limiter.hit('login:1.2.3.4', 3, 60) for _ in range(4)]
+
+        assert [r.allowed for r in results] == [True, True, True, False]
+        assert results[0].remaining == 2
+        assert 1 <= results[3].retry_after <= 120
+
+    def test_sliding_window_decays_previous_window(self):
+        """Test that the previous window's hits count proportionally."""
+        clock = FakeClock(1_000_020.0)
+        limiter = RateLimiter(MemoryRateLimitBackend(), clock=clock)
+        for _ in range(10):
+            limiter.hit('k', 10, 60)
+
+        # Halfway through the next window half of the previous 10 hits still count
+        clock.now = 1_000_020.0 + 90
+        allowed = [limiter.hit('k', 10, 60).allowed for _ in range(6)]
+        assert allowed == [True, True, True, True, True, False]
+
+        # Two windows later the history is gone
+        clock.now += 180
+        assert limiter.hit('k', 10, 60).remaining == 9
+
+    def test_retry_after_is_honoured(self):
+        """Test that waiting Retry-After seconds lets the next request through."""
+        clock = FakeClock(1_000_010.0)
+        limiter = RateLimiter(MemoryRateLimitBackend(), clock=clock)
+        for _ in range(5):
+            limiter.hit('k', 5, 60)
+        blocked = limiter.hit('k', 5, 60)
+        assert not blocked.allowed
+
+        clock.now += blocked.retry_after
+        assert limiter.hit('k', 5, 60).allowed
+
+    def test_lru_eviction_bounds_memory(self):
+        """Test that idle keys are evicted once max_keys is reached."""
+        backend = MemoryRateLimitBackend(max_keys=3)
+        limiter = RateLimiter(backend, clock=FakeClock())
+
+        for key in ('a', 'b', 'c'):
+            limiter.hit(key, 5, 60)
+        limiter.hit('a', 5, 60)  # refresh 'a'
+        limiter.hit('d', 5, 60)  # evicts 'b', the least recently used
+
+        assert len(backend) == 3
+        assert limiter.hit('b', 5, 60).remaining == 4
+        assert limiter.hit('a', 5, 60).remaining == 2
+
+
+class TestDatabaseRateLimiter:
+    """Test suite for the shared database backend."""
+
+    def test_counts_are_shared_between_limiters(self, app):
+        """Test that two limiters (e.g. two workers) share one budget."""
+        clock = FakeClock()
+        worker_a = RateLimiter(DatabaseRateLimitBackend(), clock=clock)
+        worker_b = RateLimiter(DatabaseRateLimitBackend(), clock=clock)
+
+        assert worker_a.hit('export:1.2.3.4', 2, 60).allowed
+        assert worker_b.hit('export:1.2.3.4', 2, 60).allowed
+        assert not worker_a.hit('export:1.2.3.4', 2, 60).allowed
+
+        worker_b.reset('export:1.2.3.4')
+        assert worker_a.hit('export:1.2.3.4', 2, 60).allowed
+
+
+class TestRateLimitDecorator:
+    """Test suite for the rate_limit decorator on real endpoints."""
+
+    def test_login_posts_are_limited(self, app, client):
+        """Test that repeated login attempts get 429 with Retry-After."""
+        for _ in range(10):
+            response = client.post('/auth/login', data={'username': 'nobody', 'password': 'wrong'})
+            assert response.status_code != 429
+
+        response = client.post('/auth/login', data={'username': 'nobody', 'password': 'wrong'})
+        assert response.status_code == 429
+        assert int(response.headers['Retry-After']) >= 1
+
+    def test_api_search_returns_json_429(self, app, client):
+        """Test that API endpoints get a JSON error body."""
+        app.config['RATE_LIMIT_ENABLED'] = True
+        for _ in range(120):
+            client.get('/api/foods/search-verified?q=rice')
+
+        response = client.get('/api/foods/search-verified?q=rice')
+        assert response.status_code == 429
+        assert response.get_json()['retry_after'] >= 1
+
+    def test_disabled_by_config(self, app, client):
+        """Test that RATE_LIMIT_ENABLED = False bypasses limiting."""
+        app.config['RATE_LIMIT_ENABLED'] = False
+        for _ in range(15):
+            response = client.post('/auth/login', data={'username': 'nobody', 'password': 'wrong'})
+            assert response.status_code != 429
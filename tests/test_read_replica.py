@@ -0,0 +1,179 @@
+"""
+Tests for read-replica routing, using two SQLite files synced with the backup API.
+"""
+
+import os
+
+import pytest
+from flask import Flask, jsonify
+from sqlalchemy import text
+
+from app import db, login_manager
+from app.cli import register_commands
+from app.models import CatalogVersion, ExportJob, Food, User
+from app.services import food_export_service
+from app.services.export_artifact_store import ExportArtifactStore
+from app.services.food_export_service import FoodExportService
+from app.utils.db_routing import (LAST_WRITE_KEY, init_read_replica, read_replica, replica_session,
+                                  sync_sqlite_replica)
+
+
+def make_food(name):
+    return Food(name=name, category='Legumes', calories=116.0, protein=9.0, carbs=20.0, fat=0.4, is_verified=True)
+
+
+class InlineThread:
+    """Runs the export worker synchronously."""
+
+    def __init__(self, target, args, daemon=None):
+        self.target, self.args = target, args
+
+    def start(self):
+        self.target(*self.args)
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return {'primary': str(tmp_path / 'primary.db'), 'replica': str(tmp_path / 'replica.db')}
+
+
+@pytest.fixture
+def replica_app(paths):
+    """An app whose replica bind is a second SQLite file, with routes reporting what they read."""
+    from config import config
+
+    app = Flask(__name__)
+    app.config.from_object(config['testing'])
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{paths['primary']}"
+    app.config['DATABASE_REPLICA_URL'] = f"sqlite:///{paths['replica']}"
+    app.config['DATABASE_REPLICA_CHECK_INTERVAL'] = 0
+    db.init_app(app)
+    login_manager.init_app(app)
+    init_read_replica(app)
+    register_commands(app)
+
+    @app.route('/foods/count')
+    @read_replica
+    def replica_count():
+        return jsonify(count=Food.query.count())
+
+    @app.route('/foods/count-primary')
+    def primary_count():
+        return jsonify(count=Food.query.count())
+
+    @app.route('/foods/add', methods=['POST'])
+    @read_replica
+    def add_food():
+        db.session.add(make_food('Rajma'))
+        db.session.commit()
+        return jsonify(count=Food.query.count())
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(make_food('Moong Dal'))
+        db.session.commit()
+        sync_sqlite_replica(paths['primary'], paths['replica'])
+        # The replica now lags the primary by one food
+        db.session.add(make_food('Chana'))
+        db.session.commit()
+        db.session.remove()
+        yield app
+        db.session.remove()
+        db.drop_all()
+    app.extensions['read_replica'].dispose()
+
+
+def get_count(client, url):
+    db.session.remove()  # Requests share the fixture's app context and so its session
+    return client.get(url).get_json()['count']
+
+
+class TestReadRouting:
+    """Test suite for @read_replica and RoutingSession."""
+
+    def test_decorated_views_read_from_the_replica(self, replica_app):
+        """Test that only the decorated view sees the replica's data."""
+        client = replica_app.test_client()
+
+        assert get_count(client, '/foods/count') == 1
+        assert get_count(client, '/foods/count-primary') == 2
+
+    def test_writes_go_to_the_primary_and_are_read_back(self, replica_app, paths):
+        """Test read-your-writes within and across requests."""
+        client = replica_app.test_client()
+        db.session.remove()
+
+        assert client.post('/foods/add').get_json()['count'] == 3  # Read after the write: primary
+        with client.session_transaction() as session:
+            assert LAST_WRITE_KEY in session
+        assert get_count(client, '/foods/count') == 3  # Within DATABASE_REPLICA_LAG
+
+        replica_app.config['DATABASE_REPLICA_LAG'] = 0
+        assert get_count(client, '/foods/count') == 1
+        assert get_count(replica_app.test_client(), '/foods/count') == 1  # Other users read the replica
+
+    def test_falls_back_to_the_primary_without_a_replica(self, replica_app, paths):
+        """Test the fallback while the replica file is missing, and recovery once synced."""
+        os.remove(paths['replica'])
+        client = replica_app.test_client()
+
+        assert get_count(client, '/foods/count') == 2
+        assert not os.path.exists(paths['replica'])  # Not created by the health check
+
+        sync_sqlite_replica(paths['primary'], paths['replica'])
+        assert get_count(client, '/foods/count') == 2
+        db.session.add(make_food('Rajma'))
+        db.session.commit()
+        assert get_count(client, '/foods/count') == 2
+
+    def test_replica_connections_are_read_only(self, replica_app):
+        """Test that a replica session refuses writes."""
+        with replica_session() as session:
+            session.add(make_food('Rajma'))
+            with pytest.raises(Exception, match='readonly'):
+                session.flush()
+
+
+class TestReplicaExportsAndSync:
+    """Test suite for export jobs on the replica and the sync-replica command."""
+
+    def export(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(food_export_service.threading, 'Thread', InlineThread)
+        admin = User(username='admin', email='admin@example.com', is_admin=True)
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.commit()
+        service = FoodExportService()
+        service.export_directory = str(tmp_path / 'exports')
+
+        job_id = service.start_export('csv', user_id=admin.id)
+
+        job = ExportJob.query.filter_by(job_id=job_id).one()
+        assert job.status == 'completed'
+        return job
+
+    def test_export_job_reads_from_the_replica(self, replica_app, paths, tmp_path, monkeypatch):
+        """Test that export data comes from a current replica while the job row is updated on the primary."""
+        sync_sqlite_replica(paths['primary'], paths['replica'])
+        # Only on the primary, and without a catalog version bump
+        db.session.execute(text("DELETE FROM food WHERE name = 'Chana'"))
+        db.session.commit()
+
+        assert self.export(tmp_path, monkeypatch).total_records == 2
+
+    def test_export_job_skips_a_lagging_replica(self, replica_app, tmp_path, monkeypatch):
+        """Test that an export keyed on a catalog version the replica lacks reads the primary."""
+        job = self.export(tmp_path, monkeypatch)
+
+        assert job.total_records == 2
+        assert job.content_key == ExportArtifactStore.content_key('csv', None, CatalogVersion.current())
+
+    def test_sync_replica_command(self, replica_app):
+        """Test that the command brings the replica up to date."""
+        client = replica_app.test_client()
+        assert get_count(client, '/foods/count') == 1
+
+        result = replica_app.test_cli_runner().invoke(args=['sync-replica'])
+
+        assert result.exit_code == 0 and 'Synced' in result.output
+        assert get_count(client, '/foods/count') == 2
@@ -0,0 +1,132 @@
+"""
+Tests for sharded (process pool) exports.
+"""
+
+import csv
+import gzip
+import io
+import json
+import zlib
+
+from flask import Flask
+
+from app import db
+from app.models import ExportJob, Food, FoodServing, User
+from app.services.food_export_service import FoodExportService
+from app.services.serving_export_service import ServingExportService
+from app.services.sharded_export import ShardedExport, crc32_combine
+
+
+def seed_catalog(foods=40):
+    admin = User(username='admin', email='admin@example.com', is_admin=True)
+    admin.set_password('admin123')
+    db.session.add(admin)
+    for i in range(foods):
+        # Names sort differently from ids, and the id range has gaps
+        food = Food(id=i * 3 + 1, name=f'Food {foods - i:03d}', brand='=Brand' if i % 7 == 0 else 'Brand',
+                    category='Meals', calories=float(i), protein=1.0, carbs=2.0, fat=3.0)
+        db.session.add(food)
+        for unit, grams in (('cup', 240.0), ('piece', 50.0)):
+            db.session.add(FoodServing(food_id=food.id, serving_name=f'1 {unit}', unit=unit, grams_per_unit=grams))
+    db.session.commit()
+    job = ExportJob(export_type='csv', created_by=admin.id, status='processing')
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def single_member(path):
+    """Decompress a .gz file, asserting it is exactly one gzip member."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    text = decompressor.decompress(data) + decompressor.flush()
+    assert decompressor.eof and decompressor.unused_data == b''
+    return text.decode('utf-8')
+
+
+class TestShardedExport:
+    """Test suite for ShardedExport."""
+
+    def test_crc32_combine(self):
+        """Test that combined CRCs equal the CRC of the concatenation."""
+        for first, second in ((b'', b'abc'), (b'header\n', b''), (b'id,name\n', b'1,Dal\n' * 1000)):
+            assert crc32_combine(zlib.crc32(first), zlib.crc32(second), len(second)) == zlib.crc32(first + second)
+
+    def test_serving_csv_matches_unsharded_export(self, app, tmp_path):
+        """Test that shards joined in order reproduce the single-threaded CSV."""
+        job = seed_catalog()
+        service = ServingExportService()
+        expected_path = str(tmp_path / 'expected.csv.gz')
+        service._export_to_csv(service._build_serving_query(None).all(), expected_path)
+
+        sharded_path = str(tmp_path / 'sharded.csv.gz')
+        total = ShardedExport('servings', workers=1).run(job, 'csv', None, sharded_path)
+
+        assert total == 80
+        assert single_member(sharded_path) == gzip.decompress(open(expected_path, 'rb').read()).decode('utf-8')
+        assert job.shard_count == 4 and job.shards_completed == 4
+        assert sorted(p.name for p in tmp_path.iterdir()) == ['expected.csv.gz', 'sharded.csv.gz']
+
+    def test_food_csv_matches_unsharded_export(self, app, tmp_path):
+        """Test that food exports have the same order sharded or not (names sort opposite to ids)."""
+        job = seed_catalog()
+        service = FoodExportService()
+        expected_path = str(tmp_path / 'expected.csv.gz')
+        service._export_to_csv(service._build_food_query(None).all(), expected_path)
+
+        sharded_path = str(tmp_path / 'sharded.csv.gz')
+        ShardedExport('foods', workers=1).run(job, 'csv', None, sharded_path)
+
+        assert single_member(sharded_path) == gzip.decompress(open(expected_path, 'rb').read()).decode('utf-8')
+
+    def test_food_json_with_filters_in_id_order(self, app, tmp_path):
+        """Test the JSON envelope, filters and id ordering of a sharded food export."""
+        job = seed_catalog()
+        path = str(tmp_path / 'foods.json.gz')
+        sharded = ShardedExport('foods', workers=1)
+        sharded.SHARDS_PER_WORKER = 7
+
+        total = sharded.run(job, 'json', {'min_calories': 10}, path)
+        data = json.loads(single_member(path))
+
+        assert total == 30 and data['export_info']['total_records'] == 30
+        assert [food['id'] for food in data['foods']] == [i * 3 + 1 for i in range(10, 40)]
+        assert data['foods'][0] == FoodExportService()._json_record(db.session.get(Food, 31))
+
+    def test_export_job_uses_process_pool(self, tmp_path):
+        """Test a real multi-process export against a file database."""
+        from config import config
+        app = Flask(__name__)
+        app.config.from_object(config['testing'])
+        app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'catalog.db'}",
+                          EXPORT_SHARD_WORKERS=2, EXPORT_SHARD_MIN_ROWS=10)
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            job = seed_catalog()
+            service = FoodExportService()
+            service.export_directory = str(tmp_path / 'exports')
+            job.export_type = 'csv'
+            db.session.commit()
+
+            service._process_export_job(job.job_id, 'csv', {'category': 'Meals'})
+            job = db.session.get(ExportJob, job.id)
+
+            assert job.status == 'completed', job.error_message
+            assert job.total_records == 40 and job.shards_completed == job.shard_count == 8
+            rows = list(csv.DictReader(io.StringIO(single_member(job.file_path))))
+            assert [int(row['id']) for row in rows] == [i * 3 + 1 for i in range(40)]
+            assert rows[0]['brand'] == "'=Brand"
+            db.session.remove()
+            db.engine.dispose()
+
+    def test_small_or_in_memory_exports_stay_in_process(self, app):
+        """Test that sharding needs a shareable database and enough rows."""
+        seed_catalog()
+        query = FoodExportService()._build_food_query(None)
+
+        app.config.update(EXPORT_SHARD_WORKERS=4, EXPORT_SHARD_MIN_ROWS=10)
+        assert ShardedExport.workers_for(query) == 0  # in-memory SQLite
+        app.config['EXPORT_SHARD_WORKERS'] = 1
+        assert ShardedExport.workers_for(query) == 0
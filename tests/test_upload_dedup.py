@@ -0,0 +1,215 @@
+"""
+Tests for idempotent bulk uploads (file hashes and chunk reuse).
+"""
+
+import csv
+import io
+
+import pytest
+
+from app import db
+from app.models import BulkUploadJob, Food, FoodNutrition, FoodServing, ServingUploadJob, UploadChunk, User
+from app.services.bulk_upload_processor import BulkUploadProcessor
+from app.services.upload_dedup import UploadDeduplicator
+
+FOOD_HEADERS = ['name', 'brand', 'category', 'base_unit', 'calories_per_100g',
+                'protein_per_100g', 'carbs_per_100g', 'fat_per_100g']
+
+
+@pytest.fixture
+def admin(app):
+    user = User(username='admin', email='admin@example.com', is_admin=True)
+    user.set_password('admin123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def food_rows(count, start=0):
+    return [{'name': f'Dish {i}', 'brand': 'Home', 'category': 'Meals', 'base_unit': 'g',
+             'calories_per_100g': str(100 + i), 'protein_per_100g': '5', 'carbs_per_100g': '20',
+             'fat_per_100g': '3'} for i in range(start, start + count)]
+
+
+def to_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FOOD_HEADERS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def run_food_upload(processor, csv_content, admin, reuse_chunks=True):
+    """Run a food upload job in this thread."""
+    job = BulkUploadJob(filename='foods.csv', total_rows=csv_content.count('\n') - 1, created_by=admin.id,
+                        file_hash=UploadDeduplicator.file_hash(csv_content))
+    db.session.add(job)
+    db.session.commit()
+    processor._process_upload_job(job.job_id, csv_content, admin.id, reuse_chunks)
+    return db.session.get(BulkUploadJob, job.id)
+
+
+class TestUploadChunks:
+    """Test suite for content-defined chunking."""
+
+    def test_inserted_row_only_changes_nearby_chunks(self):
+        """Test that chunks after an inserted row keep their hashes."""
+        rows = food_rows(1000)
+        edited = rows[:500] + food_rows(1, start=5000) + rows[500:]
+
+        before = UploadDeduplicator.chunks(rows)
+        after = UploadDeduplicator.chunks(edited)
+        changed = {c.chunk_hash for c in after} - {c.chunk_hash for c in before}
+
+        assert [row for chunk in after for row in chunk.rows] == edited
+        assert all(UploadDeduplicator.MIN_CHUNK_ROWS <= len(c.rows) <= UploadDeduplicator.MAX_CHUNK_ROWS
+                   for c in before[:-1])
+        assert len(before) > 4 and len(changed) <= 2
+        assert after[-1].first_row + len(after[-1].rows) == 1001
+
+    def test_column_order_does_not_change_hashes(self):
+        """Test that rows hash by column name, not position."""
+        rows = food_rows(50)
+        reordered = [dict(reversed(list(row.items()))) for row in rows]
+        assert [c.chunk_hash for c in UploadDeduplicator.chunks(rows)] == \
+            [c.chunk_hash for c in UploadDeduplicator.chunks(reordered)]
+
+
+class TestFoodUploadDedup:
+    """Test suite for food upload deduplication."""
+
+    def test_identical_file_is_found(self, app, admin):
+        """Test that a completed upload is returned for the same file hash."""
+        processor = BulkUploadProcessor()
+        content = to_csv(food_rows(30))
+        job = run_food_upload(processor, content, admin)
+
+        assert job.status == 'completed' and job.successful_rows == 30
+        assert processor.find_existing_upload(UploadDeduplicator.file_hash(content)).job_id == job.job_id
+        assert processor.find_existing_upload(UploadDeduplicator.file_hash(to_csv(food_rows(31)))) is None
+        assert processor.get_job_status(job.job_id)['file_hash'] == job.file_hash
+
+    def test_changed_file_skips_unchanged_chunks(self, app, admin):
+        """Test that only chunks with new rows are processed again."""
+        processor = BulkUploadProcessor()
+        rows = food_rows(600)
+        first = run_food_upload(processor, to_csv(rows), admin)
+
+        edited = rows[:300] + food_rows(1, start=9000) + rows[300:]
+        second = run_food_upload(processor, to_csv(edited), admin)
+        known = {c.chunk_hash for c in UploadDeduplicator.chunks(rows)}
+        unchanged = sum(len(c.rows) for c in UploadDeduplicator.chunks(edited) if c.chunk_hash in known)
+
+        assert first.reused_rows == 0 and first.successful_rows == 600
+        assert second.status == 'completed' and second.processed_rows == 601
+        assert unchanged > 0 and second.reused_rows == unchanged
+        assert second.reused_rows + second.job_items.count() == 601
+        assert Food.query.filter_by(name='Dish 9000').count() == 1
+        assert Food.query.count() == 601
+
+    def test_failed_chunks_and_forced_uploads_are_reprocessed(self, app, admin, monkeypatch):
+        """Test that chunks with failures are retried and force ignores chunk hashes."""
+        processor = BulkUploadProcessor()
+        process_row = processor._process_single_row
+
+        def failing_row(job, row, row_number, user_id):
+            if row['name'] == 'Dish 5':
+                raise ValueError('Invalid nutrition values')
+            return process_row(job, row, row_number, user_id)
+
+        monkeypatch.setattr(processor, '_process_single_row', failing_row)
+        rows = food_rows(40)
+        first = run_food_upload(processor, to_csv(rows), admin)
+        assert first.failed_rows == 1
+        assert UploadChunk.query.filter(UploadChunk.failed_rows > 0).count() == 1
+
+        retried = run_food_upload(processor, to_csv(rows), admin)
+        forced = run_food_upload(processor, to_csv(rows), admin, reuse_chunks=False)
+
+        assert retried.failed_rows == 1 and retried.reused_rows < 40
+        assert forced.reused_rows == 0 and forced.processed_rows == 40
+
+
+class TestServingUploadDedup:
+    """Test suite for the serving upload route."""
+
+    def test_duplicate_upload_returns_prior_job(self, app, client, admin):
+        """Test short-circuiting of an identical serving CSV and the force flag."""
+        from app.admin import bp as admin_bp
+        app.register_blueprint(admin_bp, url_prefix='/admin')
+        app.config['RATE_LIMIT_ENABLED'] = False
+        food = Food(name='Poha', brand='Home', category='Breakfast', calories=130.0, protein=2.5, carbs=25.0, fat=3.0)
+        db.session.add(food)
+        db.session.commit()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(admin.id)
+        content = b'food_key,serving_name,unit,grams_per_unit,is_default\nPoha,1 bowl,bowl,150,true\n'
+
+        def upload(**form):
+            return client.post('/admin/food-servings/upload-async',
+                               data={'file': (io.BytesIO(content), 'servings.csv'), **form},
+                               content_type='multipart/form-data').get_json()
+
+        first, second, forced = upload(), upload(), upload(force='1')
+
+        assert first['success'] and not first.get('duplicate')
+        assert second['duplicate'] and second['job_id'] == first['job_id']
+        assert not forced.get('duplicate') and forced['job_id'] != first['job_id']
+        assert ServingUploadJob.query.count() == 2
+        assert FoodServing.query.filter_by(serving_name='1 bowl').count() == 1
+        assert ServingUploadJob.query.filter_by(job_id=first['job_id']).one().file_hash == \
+            UploadDeduplicator.file_hash(content)
+
+    def test_reupload_after_a_catalog_change_is_applied_again(self, app, client, admin):
+        """Test that an upload overwritten by a later one is not skipped when uploaded again."""
+        from app.admin import bp as admin_bp
+        app.register_blueprint(admin_bp, url_prefix='/admin')
+        app.config['RATE_LIMIT_ENABLED'] = False
+        food = Food(name='Poha', brand='Home', category='Breakfast', calories=130.0, protein=2.5, carbs=25.0, fat=3.0)
+        db.session.add(food)
+        db.session.commit()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(admin.id)
+
+        def upload(grams):
+            content = f'food_key,serving_name,unit,grams_per_unit,is_default\nPoha,1 bowl,bowl,{grams},true\n'
+            return client.post('/admin/food-servings/upload-async',
+                               data={'file': (io.BytesIO(content.encode()), 'servings.csv')},
+                               content_type='multipart/form-data').get_json()
+
+        first, _, third = upload(100), upload(150), upload(100)
+
+        assert not third.get('duplicate') and third['job_id'] != first['job_id']
+        assert FoodServing.query.filter_by(serving_name='1 bowl').one().grams_per_unit == 100
+        assert ServingUploadJob.query.filter_by(job_id=third['job_id']).one().reused_rows == 0
+
+
+class TestFoodUploadCatalogChanges:
+    """Test suite for chunk reuse after the catalog changed."""
+
+    def test_deleted_foods_are_imported_again(self, app, admin):
+        """Test that chunks whose foods were deleted since are not skipped."""
+        processor = BulkUploadProcessor()
+        rows = food_rows(40)
+        run_food_upload(processor, to_csv(rows), admin)
+        food = Food.query.filter_by(name='Dish 3').one()
+        for nutrition in FoodNutrition.query.filter_by(food_id=food.id):
+            db.session.delete(nutrition)
+        db.session.delete(food)
+        db.session.commit()
+
+        again = run_food_upload(processor, to_csv(rows + food_rows(1, start=500)), admin)
+
+        assert again.reused_rows == 0
+        assert Food.query.filter_by(name='Dish 3').count() == 1
+
+    def test_unchanged_catalog_still_reuses_chunks(self, app, admin):
+        """Test that chunks are reused while nothing changed, including chunks reused before."""
+        processor = BulkUploadProcessor()
+        rows = food_rows(200)
+        run_food_upload(processor, to_csv(rows), admin)
+        second = run_food_upload(processor, to_csv(rows + food_rows(1, start=500)), admin)
+        third = run_food_upload(processor, to_csv(rows + food_rows(2, start=500)), admin)
+
+        assert second.reused_rows > 0
+        assert third.reused_rows >= second.reused_rows
@@ -0,0 +1,126 @@
+"""
+Tests for resuming interrupted bulk food uploads.
+"""
+
+import csv
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import BulkUploadJob, BulkUploadJobItem, Food, User
+from app.services.bulk_upload_processor import BulkUploadProcessor
+from app.services.upload_dedup import UploadDeduplicator
+
+
+@pytest.fixture
+def admin(app, tmp_path):
+    app.instance_path = str(tmp_path)
+    user = User(username='admin', email='admin@example.com', is_admin=True)
+    user.set_password('admin123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def spooled_job(admin, rows=300):
+    """A pending upload job with its CSV spooled, as start_async_upload leaves it."""
+    content = 'name,brand,category,base_unit,calories_per_100g,protein_per_100g,carbs_per_100g,fat_per_100g\n' + \
+        ''.join(f'Curry {i},Home,Meals,g,{100 + i},5,20,3\n' for i in range(rows))
+    job = BulkUploadJob(filename='foods.csv', total_rows=rows, created_by=admin.id, status='pending',
+                        file_hash=UploadDeduplicator.file_hash(content))
+    job.spool_path = BulkUploadProcessor._spool(job.job_id, content)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def make_stale(job):
+    job.updated_at = datetime.utcnow() - BulkUploadProcessor.STALE_AFTER - timedelta(minutes=1)
+    db.session.commit()
+
+
+class TestUploadResume:
+    """Test suite for checkpointed, resumable uploads."""
+
+    def test_crash_mid_chunk_resumes_without_reapplying_rows(self, app, admin, monkeypatch):
+        """Test that a job killed mid-chunk is resumed from its last committed chunk."""
+        job = spooled_job(admin)
+        with open(job.spool_path, newline='') as f:
+            second_chunk = UploadDeduplicator.chunks(csv.DictReader(f))[1]
+        crash_at = second_chunk.first_row + len(second_chunk.rows) // 2 + 1
+        processor = BulkUploadProcessor()
+        process_row = processor._process_single_row
+
+        def dying_row(job, row, row_number, user_id):
+            if row_number == crash_at:
+                raise SystemExit('worker restarted')
+            return process_row(job, row, row_number, user_id)
+
+        monkeypatch.setattr(processor, '_process_single_row', dying_row)
+        with pytest.raises(SystemExit):
+            processor._process_upload_job(job.job_id)
+        db.session.rollback()  # The uncommitted chunk dies with the worker
+
+        job = db.session.get(BulkUploadJob, job.id)
+        assert job.status == 'processing' and job.checkpoint_row == second_chunk.first_row
+        assert Food.query.count() == job.successful_rows == second_chunk.first_row
+
+        make_stale(job)
+        assert BulkUploadProcessor().resume_stalled_jobs() == 1
+
+        job = db.session.get(BulkUploadJob, job.id)
+        assert job.status == 'completed' and job.checkpoint_row == 300
+        assert job.successful_rows == 300 and job.failed_rows == 0
+        assert Food.query.count() == 300
+        assert BulkUploadJobItem.query.filter_by(status='skipped').count() == 0
+        assert job.spool_path is None and os.listdir(os.path.join(app.instance_path, 'upload_spool')) == []
+
+    def test_active_and_finished_jobs_are_not_resumed(self, app, admin):
+        """Test that only stalled jobs are claimed."""
+        fresh = spooled_job(admin, rows=5)
+        done = spooled_job(admin, rows=5)
+        done.status = 'completed'
+        make_stale(done)
+
+        assert BulkUploadProcessor().resume_stalled_jobs() == 0
+        assert db.session.get(BulkUploadJob, fresh.id).status == 'pending'
+
+    def test_missing_spool_fails_the_job(self, app, admin):
+        """Test that a stalled job without its input is failed rather than retried forever."""
+        job = spooled_job(admin, rows=5)
+        os.remove(job.spool_path)
+        make_stale(job)
+
+        assert BulkUploadProcessor().resume_stalled_jobs() == 1
+        job = db.session.get(BulkUploadJob, job.id)
+        assert job.status == 'failed' and 'cannot be resumed' in job.error_message
+
+    def test_cli_resumes_stalled_uploads(self, app, admin):
+        """Test the resume-uploads command."""
+        from app.cli import register_commands
+        register_commands(app)
+        make_stale(spooled_job(admin, rows=20))
+
+        result = app.test_cli_runner().invoke(args=['resume-uploads'])
+
+        assert result.exit_code == 0, result.output
+        assert 'Resumed 1 stalled upload(s)' in result.output
+        assert Food.query.count() == 20
+
+    def test_scheduler_starts_with_the_first_request_not_cli_commands(self, monkeypatch):
+        """Test that only a process serving requests starts resuming uploads."""
+        from app import create_app
+        from config import config
+        monkeypatch.setattr(config['testing'], 'UPLOAD_RESUME_INTERVAL', 3600)
+        monkeypatch.setattr(BulkUploadProcessor, '_resume_periodically', classmethod(lambda cls, *args: None))
+        app = create_app('testing')
+
+        result = app.test_cli_runner().invoke(args=['init-db'])
+        assert result.exit_code == 0, result.output
+        assert 'upload_resumer' not in app.extensions
+
+        app.test_client().get('/')
+        assert 'upload_resumer' in app.extensions
+        assert BulkUploadProcessor.start_resume_scheduler(app) is None
@@ -0,0 +1,161 @@
+"""
+Tests for bulk user provisioning.
+"""
+
+import io
+import json
+
+import pytest
+from werkzeug.security import check_password_hash
+
+from app import db
+from app.models import User, UserProvisioningJob
+from app.services.user_provisioning_service import UserProvisioningService
+
+
+PASSWORD = 'Str0ng!Pass'
+
+
+@pytest.fixture
+def admin(app):
+    """Admin user who owns provisioning jobs."""
+    user = User(username='admin', email='admin@example.com', first_name='Admin', last_name='User', is_admin=True)
+    user.set_password('admin123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def run_job(admin, rows, source_format='json'):
+    """Create and synchronously process a job, returning its status."""
+    service = UserProvisioningService(hash_workers=0)
+    job = UserProvisioningJob(filename=f'users.{source_format}', source_format=source_format,
+                              total_rows=len(rows), created_by=admin.id)
+    db.session.add(job)
+    db.session.commit()
+    service.process_job(job.job_id, rows)
+    return service.get_job_status(job.job_id, include_items=True)
+
+
+class TestUserProvisioningParsing:
+    """Test suite for file parsing."""
+
+    def test_parse_csv(self):
+        """Test CSV parsing with header whitespace."""
+        content = "first_name, last_name ,password,email\nAsha,Rao,Str0ng!Pass,asha@example.com\n"
+        rows = UserProvisioningService(hash_workers=0).parse_content(content, 'csv')
+
+        assert rows == [{'first_name': 'Asha', 'last_name': 'Rao', 'password': PASSWORD,
+                         'email': 'asha@example.com'}]
+
+    def test_parse_csv_missing_headers(self):
+        """Test that CSV without required headers is rejected."""
+        with pytest.raises(ValueError, match="Missing required headers: password"):
+            UserProvisioningService(hash_workers=0).parse_content("first_name,last_name\nA,B\n", 'csv')
+
+    def test_parse_json_wrapped(self):
+        """Test JSON object with a users list."""
+        content = json.dumps({'users': [{'first_name': 'A', 'last_name': 'B', 'password': PASSWORD}]})
+        rows = UserProvisioningService(hash_workers=0).parse_content(content, 'json')
+
+        assert len(rows) == 1
+
+
+class TestUserProvisioningJob:
+    """Test suite for job processing."""
+
+    def test_creates_users_with_batched_usernames(self, app, admin):
+        """Test username allocation against existing and in-file names."""
+        existing = User(username='asharao', email='existing@example.com', first_name='Asha', last_name='Rao')
+        existing.set_password(PASSWORD)
+        db.session.add(existing)
+        db.session.commit()
+
+        status = run_job(admin, [
+            {'first_name': 'Asha', 'last_name': 'Rao', 'password': PASSWORD},
+            {'first_name': 'Asha', 'last_name': 'Rao', 'password': PASSWORD, 'email': 'Asha2@Example.com'},
+            {'first_name': 'Ravi', 'last_name': 'Kumar', 'password': PASSWORD, 'username': 'asharao2'},
+        ])
+
+        assert status['status'] == 'completed'
+        assert status['successful_rows'] == 3
+        assert [item['username'] for item in status['items']] == ['asharao1', 'asharao3', 'asharao2']
+
+        created = User.query.filter_by(username='asharao3').one()
+        assert created.email == 'asha2@example.com'
+        assert created.check_password(PASSWORD)
+        assert created.user_id and not created.is_admin
+
+    def test_reports_per_row_failures(self, app, admin):
+        """Test validation, existing and in-file duplicate failures."""
+        status = run_job(admin, [
+            {'first_name': 'A', 'last_name': 'One', 'password': 'weak'},
+            {'first_name': 'B', 'last_name': 'Two', 'password': PASSWORD, 'email': 'admin@example.com'},
+            {'first_name': 'C', 'last_name': 'Three', 'password': PASSWORD, 'user_id': 'emp-1'},
+            {'first_name': 'D', 'last_name': 'Four', 'password': PASSWORD, 'user_id': 'emp-1'},
+            {'first_name': 'E', 'last_name': 'Five', 'password': PASSWORD, 'username': 'admin'},
+        ])
+
+        items = {item['row_number']: item for item in status['items']}
+        assert status['successful_rows'] == 1
+        assert status['failed_rows'] == 4
+        assert 'at least 8 characters' in items[1]['error_message']
+        assert items[2]['error_message'] == 'Email already exists'
+        assert items[3]['status'] == 'success'
+        assert items[4]['error_message'] == 'Duplicate User ID in file'
+        assert items[5]['error_message'] == 'Username already exists'
+
+    def test_parallel_hashing(self):
+        """Test that pooled hashing produces valid hashes in order."""
+        service = UserProvisioningService(hash_workers=2)
+        service.PARALLEL_HASH_THRESHOLD = 0
+
+        hashes = service.hash_passwords(['first-pass', 'second-pass'])
+
+        assert check_password_hash(hashes[0], 'first-pass')
+        assert check_password_hash(hashes[1], 'second-pass')
+
+
+class TestUserProvisioningEndpoints:
+    """Test suite for /api/admin/users/bulk."""
+
+    def login(self, client, user):
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user.id)
+
+    def test_requires_admin(self, app, client):
+        """Test that non-admins are rejected."""
+        user = User(username='member', email='member@example.com')
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+        self.login(client, user)
+
+        response = client.post('/api/admin/users/bulk', json=[])
+        assert response.status_code == 403
+
+    def test_rejects_bad_files(self, app, client, admin):
+        """Test unsupported file types and malformed content."""
+        self.login(client, admin)
+
+        response = client.post('/api/admin/users/bulk', data={'file': (io.BytesIO(b'x'), 'users.xlsx')},
+                               content_type='multipart/form-data')
+        assert response.status_code == 400
+
+        response = client.post('/api/admin/users/bulk', data={'file': (io.BytesIO(b'name\nx\n'), 'users.csv')},
+                               content_type='multipart/form-data')
+        assert response.status_code == 400
+        assert 'Missing required headers' in response.get_json()['error']
+
+    def test_status_endpoint(self, app, client, admin):
+        """Test polling a finished job."""
+        status = run_job(admin, [{'first_name': 'Asha', 'last_name': 'Rao', 'password': PASSWORD}])
+        self.login(client, admin)
+
+        response = client.get(f"/api/admin/users/bulk/{status['job_id']}")
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['successful_rows'] == 1
+        assert data['items'] == []  # only failures unless include_items=true
+
+        assert client.get('/api/admin/users/bulk/unknown').status_code == 404